@@ -1,4 +1,4 @@
-from flask import Flask, send_from_directory, send_file
+from flask import Flask, request
 from flask_cors import CORS
 from config import Config
 from extensions import db, jwt
@@ -7,6 +7,7 @@ from routes.banners import banners_bp
 from routes.benefits import benefits_bp
 from routes.categories import categories_bp
 from routes.category_aliases import category_aliases_bp
+from routes.catalog_bulk import catalog_bulk_bp
 from routes.clients_routes import clients_bp
 from routes.footer_settings import footer_settings_bp
 from routes.homepage_block_titles import homepage_block_titles_bp
@@ -58,18 +59,34 @@ from routes.header_settings import header_settings_bp
 from routes.section_cards import section_cards_bp
 from routes.static_pages import static_pages_bp
 from models.systemuser import SystemUser
+from utils import compression, file_delivery, image_variants, json_provider, metrics, query_budget
 # Импорт нужен чтобы db.create_all() увидел модель шаблонов на свежей БД.
 from models.kp_template import KpTemplate  # noqa: F401
+from models.category_closure import CategoryClosure  # noqa: F401
+from models.media_file import MediaFile  # noqa: F401
+from models.media_blob import MediaBlob  # noqa: F401
+from models.catalog_tombstone import CatalogTombstone  # noqa: F401
+from models.product_attribute import ProductAttribute  # noqa: F401
 
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    # orjson (если установлен) вместо stdlib json в jsonify.
+    json_provider.init_app(app)
 
     CORS(app)
 
     db.init_app(app)
     jwt.init_app(app)
+    # Латентность / SQL по endpoint'ам, /metrics и Server-Timing.
+    metrics.init_app(app)
+    # gzip/brotli. after_request-хуки идут в обратном порядке регистрации:
+    # сжатие — после подмены ответа бюджетом SQL, но до метрик, чтобы
+    # response_bytes считал байты, ушедшие по сети.
+    compression.init_app(app)
+    # Dev/тесты: детектор N+1 и бюджеты SQL (QUERY_BUDGET_MODE).
+    query_budget.init_app(app)
 
     # 🔹 Категории, товары, характеристики
     app.register_blueprint(categories_bp, url_prefix="/categories")  # /categories/*
@@ -135,6 +152,8 @@ def create_app():
     app.register_blueprint(integrations_bp, url_prefix='/api/admin/integrations')
     # Blueprint содержит роуты и /category-aliases/* и /categories/merge, find-similar
     app.register_blueprint(category_aliases_bp, url_prefix='/api/admin')
+    # Пакетный импорт каталога (NDJSON) для миграций и выгрузок
+    app.register_blueprint(catalog_bulk_bp, url_prefix='/api/admin')  # /api/admin/catalog/*
     app.register_blueprint(collector_bp, url_prefix='/api/admin/collector')
 
     # 🔹 Видимость каталогов (публичный + админский под /api)
@@ -668,6 +687,127 @@ def create_app():
             db.session.rollback()
             print(f"⚠️ Миграция pg_trgm + idx_product_name_trgm: {e}")
 
+        # category_closure — closure-таблица дерева категорий (фильтр по
+        # ветке одним JOIN'ом вместо WITH RECURSIVE). db.create_all() выше
+        # создаёт таблицу; здесь бэкфилл на свежей инсталляции и починка,
+        # если дерево правили в обход кода (у каждой категории должна быть
+        # строка depth=0, иначе полная пересборка — миллисекунды).
+        try:
+            from services.category_closure import ensure_consistent
+            if ensure_consistent():
+                print("ℹ️ category_closure пересобрана")
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Миграция category_closure: {e}")
+
+        # media_blobs — content-addressed хранилище файлов товаров. Таблицу
+        # создаёт db.create_all(); ссылки из существующих таблиц — здесь.
+        # Перенос старых файлов из products/<id>/ — migrations/apply_blob_store.py.
+        try:
+            db.session.execute(db.text(
+                "ALTER TABLE product_media ADD COLUMN IF NOT EXISTS blob_sha256 VARCHAR(64) "
+                "REFERENCES media_blobs(sha256)"
+            ))
+            db.session.execute(db.text(
+                "ALTER TABLE product_document ADD COLUMN IF NOT EXISTS blob_sha256 VARCHAR(64) "
+                "REFERENCES media_blobs(sha256)"
+            ))
+            db.session.execute(db.text(
+                "CREATE INDEX IF NOT EXISTS ix_product_media_blob_sha256 ON product_media(blob_sha256)"
+            ))
+            db.session.execute(db.text(
+                "CREATE INDEX IF NOT EXISTS ix_product_document_blob_sha256 ON product_document(blob_sha256)"
+            ))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Миграция blob_sha256: {e}")
+
+        # product.updated_at — для выгрузки ?updated_since (services/catalog_export.py).
+        # Ставит триггер, а не onupdate модели: товары массово обновляются
+        # сырым SQL (пакетный импорт, пересчёт цен), ORM этого не видит.
+        # WHEN (OLD.* IS DISTINCT FROM NEW.*) — холостой UPDATE не двигает.
+        try:
+            db.session.execute(db.text(
+                "ALTER TABLE product ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP "
+                "DEFAULT timezone('utc', now())"
+            ))
+            db.session.execute(db.text(
+                "CREATE INDEX IF NOT EXISTS idx_product_updated_at ON product(updated_at)"
+            ))
+            has_trigger = db.session.execute(db.text(
+                "SELECT 1 FROM pg_trigger WHERE tgname = 'trg_product_updated_at'"
+            )).first()
+            if not has_trigger:
+                db.session.execute(db.text("""
+                    CREATE OR REPLACE FUNCTION product_touch_updated_at() RETURNS trigger AS $$
+                    BEGIN
+                        NEW.updated_at = timezone('utc', now());
+                        RETURN NEW;
+                    END
+                    $$ LANGUAGE plpgsql
+                """))
+                db.session.execute(db.text("""
+                    CREATE TRIGGER trg_product_updated_at
+                    BEFORE UPDATE ON product
+                    FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*)
+                    EXECUTE FUNCTION product_touch_updated_at()
+                """))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Миграция product.updated_at: {e}")
+
+        # Лента изменений /products/changes: change_seq у product и
+        # product_warehouse_cost + триггеры (services/change_feed.py).
+        try:
+            from services.change_feed import install as install_change_feed
+            if install_change_feed():
+                print("ℹ️ Лента изменений каталога: триггеры установлены")
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Миграция change_seq: {e}")
+
+        # Индекс характеристик для attr-фильтров /products/search: функции
+        # разбора + триггеры, первое заполнение (services/attribute_index.py).
+        try:
+            from services.attribute_index import install as install_attribute_index
+            if install_attribute_index():
+                print("ℹ️ Индекс характеристик: триггеры установлены, индекс заполнен")
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Миграция product_attribute: {e}")
+
+        # NOTIFY на вставку команд воркерам — будит long-poll ручки
+        # pending-command / next-task (services/command_channel.py).
+        try:
+            from services.command_channel import install as install_command_channel
+            if install_command_channel():
+                print("ℹ️ Канал команд воркеров: триггеры NOTIFY установлены")
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Миграция command_channel: {e}")
+
+        # presence_heartbeat — UNLOGGED-таблица отметок heartbeat'ов
+        # (services/presence.py).
+        try:
+            from services.presence import install as install_presence
+            install_presence()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Миграция presence_heartbeat: {e}")
+
+        # media_files — индекс файлов товаров на диске. Таблицу создаёт
+        # db.create_all(); наполняет и чинит фоновая сверка (первый прогон
+        # через ~минуту после старта, дальше раз в MEDIA_RECONCILE_INTERVAL).
+        from services.media_index import start_reconcile_loop
+        start_reconcile_loop(app, app.config.get('MEDIA_RECONCILE_INTERVAL', 0))
+
         # Создаем системного пользователя по умолчанию
         create_default_system_user()
 
@@ -727,62 +867,42 @@ def api_index():
     return {"message": "POSPRO API", "version": "1.0", "status": "ok"}
 
 
+def _send_upload(directory, filename, **kwargs):
+    """
+    Отдаёт файл из uploads со strong ETag / Range, блобы — immutable
+    (utils/file_delivery.py); `?w=&h=&fmt=` на растровой картинке — её
+    уменьшенную копию из кэша вариантов (utils/image_variants.py).
+    """
+    if request.args:
+        variant = image_variants.send_variant(
+            directory, filename, request.args, immutable=kwargs.get('immutable', False),
+        )
+        if variant is not None:
+            return variant
+    return file_delivery.send_upload(directory, filename, **kwargs)
+
+
 @app.route('/uploads/products/<int:product_id>/<filename>')
 def serve_product_file(product_id, filename):
     folder = os.path.join(app.config['UPLOAD_FOLDER'], 'products', str(product_id))
-    full_path = os.path.join(folder, filename)
-    
-    # Отладочная информация
-    print(f"File request: {filename}")
-    print(f"Product folder: {folder}")
-    print(f"Full path: {full_path}")
-    print(f"File exists: {os.path.exists(full_path)}")
-    print(f"UPLOAD_FOLDER: {app.config['UPLOAD_FOLDER']}")
-    
-    if not os.path.exists(full_path):
-        print(f"File not found: {full_path}")
-        return "File not found", 404
-    
-    return send_from_directory(folder, filename)
+    return _send_upload(folder, filename)
 
 
 @app.route('/uploads/products/<int:product_id>/documents/<filename>')
 def serve_product_document(product_id, filename):
     folder = os.path.join(app.config['UPLOAD_FOLDER'], 'products', str(product_id), 'documents')
-    full_path = os.path.join(folder, filename)
-    
-    print(f"Document request: {filename}")
-    print(f"Documents folder: {folder}")
-    print(f"Full path: {full_path}")
-    print(f"File exists: {os.path.exists(full_path)}")
-    
-    if not os.path.exists(full_path):
-        print(f"Document not found: {full_path}")
-        return "Document not found", 404
-    
-    return send_file(full_path, as_attachment=True, download_name=filename)
+    return file_delivery.send_upload(folder, filename, as_attachment=True, download_name=filename)
 
 
 @app.route('/uploads/products/<int:product_id>/drivers/<filename>')
 def serve_product_driver(product_id, filename):
     folder = os.path.join(app.config['UPLOAD_FOLDER'], 'products', str(product_id), 'drivers')
-    full_path = os.path.join(folder, filename)
-    
-    print(f"Driver request: {filename}")
-    print(f"Drivers folder: {folder}")
-    print(f"Full path: {full_path}")
-    print(f"File exists: {os.path.exists(full_path)}")
-    
-    if not os.path.exists(full_path):
-        print(f"Driver not found: {full_path}")
-        return "Driver not found", 404
-    
-    return send_file(full_path, as_attachment=True, download_name=filename)
+    return file_delivery.send_upload(folder, filename, as_attachment=True, download_name=filename)
 
 
 @app.route('/uploads/brands/<int:brand_id>/<filename>')
 def serve_brand_image(brand_id, filename):
-    return send_from_directory(
+    return _send_upload(
         os.path.join(app.config['UPLOAD_FOLDER'], 'brands', str(brand_id)),
         filename
     )
@@ -790,7 +910,7 @@ def serve_brand_image(brand_id, filename):
 
 @app.route('/uploads/categories/<int:category_id>/<filename>')
 def serve_category_image(category_id, filename):
-    return send_from_directory(
+    return _send_upload(
         os.path.join(app.config['UPLOAD_FOLDER'], 'categories', str(category_id)),
         filename
     )
@@ -798,7 +918,7 @@ def serve_category_image(category_id, filename):
 
 @app.route('/uploads/help/<int:article_id>/<filename>')
 def serve_help_video(article_id, filename):
-    return send_from_directory(
+    return file_delivery.send_upload(
         os.path.join(app.config['UPLOAD_FOLDER'], 'help', str(article_id)),
         filename
     )
@@ -806,7 +926,7 @@ def serve_help_video(article_id, filename):
 
 @app.route('/uploads/drivers/<int:driver_id>/image/<filename>')
 def serve_driver_image(driver_id, filename):
-    return send_from_directory(
+    return _send_upload(
         os.path.join(app.config['UPLOAD_FOLDER'], 'drivers', str(driver_id), 'image'),
         filename,
     )
@@ -814,53 +934,49 @@ def serve_driver_image(driver_id, filename):
 
 @app.route('/uploads/drivers/<int:driver_id>/<filename>')
 def serve_driver_file(driver_id, filename):
-    return send_file(
-        os.path.join(app.config['UPLOAD_FOLDER'], 'drivers', str(driver_id), filename),
+    return file_delivery.send_upload(
+        os.path.join(app.config['UPLOAD_FOLDER'], 'drivers', str(driver_id)),
+        filename,
         as_attachment=True,
         download_name=filename,
     )
 
 
+@app.route('/uploads/blobs/<path:blob_path>')
+def serve_blob(blob_path):
+    """
+    Файл из content-addressed хранилища: имя — хэш содержимого, поэтому
+    кэшируется навсегда. `?download=<имя>` — документы и драйверы,
+    отдаются вложением под исходным именем.
+    """
+    root = os.path.join(app.config['UPLOAD_FOLDER'], 'blobs')
+    download_name = request.args.get('download')
+    if download_name:
+        return file_delivery.send_upload(
+            root, blob_path, immutable=True, as_attachment=True, download_name=download_name,
+        )
+    return _send_upload(root, blob_path, immutable=True)
+
+
 @app.route('/uploads/<path:filename>')
 def serve_uploads(filename):
+    """Универсальный маршрут для обслуживания загруженных файлов"""
     upload_dir = app.config['UPLOAD_FOLDER']
-    return send_from_directory(upload_dir, filename)
+    return _send_upload(upload_dir, filename)
 
 
 @app.route('/uploads/banners/<int:banner_id>/<filename>')
 def serve_banner_image(banner_id, filename):
     """Обслуживание изображений баннеров"""
     upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'banners', str(banner_id))
-    return send_from_directory(upload_dir, filename)
+    return _send_upload(upload_dir, filename)
 
 
 @app.route('/uploads/banners/small_banners/<int:banner_id>/<filename>')
 def serve_small_banner_image(banner_id, filename):
     """Обслуживание изображений малых баннеров"""
     upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'banners', 'small_banners', str(banner_id))
-    return send_from_directory(upload_dir, filename)
-
-
-@app.route('/uploads/<path:filename>')
-def serve_uploaded_file(filename):
-    """Универсальный маршрут для обслуживания загруженных файлов"""
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    
-    # Отладочная информация
-    print(f"File request: {filename}")
-    print(f"Full path: {file_path}")
-    print(f"File exists: {os.path.exists(file_path)}")
-    print(f"UPLOAD_FOLDER: {app.config['UPLOAD_FOLDER']}")
-    
-    if not os.path.exists(file_path):
-        print(f"File not found: {file_path}")
-        return "File not found", 404
-    
-    # Определяем директорию и имя файла
-    directory = os.path.dirname(file_path)
-    file_name = os.path.basename(file_path)
-    
-    return send_from_directory(directory, file_name)
+    return _send_upload(upload_dir, filename)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,412 @@
+"""
+Синтетический каталог для бенчмарков (см. benchmarks/__init__.py).
+
+Что создаётся (размеры — аргументами, генератор детерминирован по --seed):
+
+  - дерево категорий в 3 уровня (~600 узлов), ~200 брендов;
+  - товары (по умолчанию 50 000) с 6–9 характеристиками: вес строкой
+    «12,5 кг», габариты «600х450х900» (кириллическая х, латинская x,
+    «*» — как приходит из выгрузок), мощность то в Вт, то в кВт,
+    напряжение, цвет, материал…;
+  - поставщики и склады в трёх валютах с формулами из
+    utils/pricing_presets и цепочкой переменных склада
+    (Расчётный_вес → Доставка → итоговая формула), 1–3 закупки на товар;
+  - 1–4 картинки на товар (строки product_media, файлов на диске нет);
+  - статусы наличия, блоки главной;
+  - --months месяцев product_views / site_visitors.
+
+Таблицы заполняются пачками через Core insert с явными id, затем
+сдвигаются sequence'ы — последующие вставки из бенчмарков (upsert-many)
+идут как в обычной базе. Индексы, которые на рабочей базе держат
+триггеры и роуты (closure категорий, индекс характеристик), в конце
+пересобираются целиком.
+
+Запуск:
+    python -u -m benchmarks.dataset --reset
+    python -u -m benchmarks.dataset --reset --products 5000 --months 1   # быстрый
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app import app
+from extensions import db
+from models.brand import Brand
+from models.category import Category
+from models.characteristic import ProductCharacteristic
+from models.characteristics_list import CharacteristicsList
+from models.currency import Currency
+from models.homepage_block import HomepageBlock
+from models.homepage_block_title import HomepageBlockItem
+from models.media import ProductMedia
+from models.product import Product
+from models.product_availability_status import ProductAvailabilityStatus
+from models.product_view import ProductView
+from models.product_warehouse_cost import ProductWarehouseCost
+from models.site_visitor import SiteVisitor
+from models.supplier import Supplier
+from models.warehouse import Warehouse, WarehouseFormula, WarehouseVariable
+from routes.products import safe_slugify
+from services import attribute_index, category_closure
+from utils.pricing_presets import MARGIN_VAR_DEFAULT, MARGIN_VAR_NAME, select_price_formula
+
+
+CHUNK = 5000
+
+# Заполняемые таблицы; порядок — для TRUNCATE (CASCADE добирает зависимые).
+TABLES = (
+    'homepage_block_items', 'homepage_blocks', 'product_views', 'site_visitors',
+    'product_media', 'product_characteristic', 'product_warehouse_cost',
+    'product', 'characteristics_list', 'product_availability_statuses',
+    'warehouse_variable', 'warehouse_formula', 'warehouse', 'supplier',
+    'currency', 'brand', 'category',
+)
+
+ROOT_CATEGORIES = (
+    'Холодильное оборудование', 'Тепловое оборудование', 'Электромеханическое оборудование',
+    'Посудомоечное оборудование', 'Барное оборудование', 'Хлебопекарное оборудование',
+    'Торговые весы', 'POS-оборудование', 'Кассовые аппараты', 'Сканеры штрих-кода',
+    'Принтеры этикеток', 'Денежные ящики', 'Нейтральное оборудование', 'Кофейное оборудование',
+    'Оборудование для фастфуда', 'Упаковочное оборудование', 'Прачечное оборудование',
+    'Вентиляция', 'Мебель для кафе', 'Посуда и инвентарь', 'Витрины', 'Льдогенераторы',
+    'Пароконвектоматы', 'Печи для пиццы', 'Миксеры', 'Слайсеры', 'Мясорубки',
+    'Овощерезки', 'Соковыжималки', 'Блендеры',
+)
+PRODUCT_TYPES = (
+    'Шкаф холодильный', 'Витрина', 'Плита индукционная', 'Пароконвектомат', 'Блендер',
+    'Кофемашина', 'Посудомоечная машина', 'Морозильный ларь', 'Печь для пиццы',
+    'Фритюрница', 'Миксер планетарный', 'Слайсер', 'Весы торговые', 'Термопринтер',
+    'Сканер штрих-кода', 'POS-терминал', 'Денежный ящик', 'Холодильный стол',
+    'Льдогенератор', 'Соковыжималка', 'Мясорубка', 'Овощерезка', 'Тестомес', 'Гриль',
+)
+BRAND_SYLLABLES = ('po', 'lar', 'ab', 'at', 'ra', 'tio', 'nal', 'un', 'ox', 'hen', 'ny',
+                   'bar', 'tec', 'mi', 'ko', 'sta', 'vin', 'gel', 'fri', 'mo')
+COLORS = ('Белый', 'Чёрный', 'Серебристый', 'Нержавеющая сталь', 'Красный', 'Серый')
+MATERIALS = ('Нержавеющая сталь', 'Окрашенная сталь', 'Пластик', 'Алюминий', 'Стекло')
+COUNTRIES = ('Россия', 'Китай', 'Италия', 'Германия', 'Турция', 'Казахстан', 'Беларусь')
+
+# (ключ, единица справочника)
+CHARACTERISTICS = (
+    ('Вес', 'кг'),
+    ('Размер в упаковке', 'мм'),
+    ('Размер без упаковки', 'мм'),
+    ('Мощность', None),
+    ('Напряжение', 'В'),
+    ('Цвет', None),
+    ('Материал корпуса', None),
+    ('Объём', 'л'),
+    ('Гарантия', 'мес'),
+    ('Страна производства', None),
+    ('Температурный режим', '°C'),
+    ('Количество полок', 'шт'),
+)
+
+# (код, название, курс к тенге)
+CURRENCIES = (('KZT', 'Тенге', 1.0), ('RUB', 'Рубль', 5.6), ('USD', 'Доллар США', 480.0))
+
+# (поставщик, [(склад, город, валюта, vat_enabled)])
+SUPPLIERS = (
+    ('Equip', [('Equip Алматы', 'Алматы', 'KZT', True), ('Equip Астана', 'Астана', 'KZT', True),
+               ('Equip Москва', 'Москва', 'RUB', True)]),
+    ('BIO', [('BIO Москва', 'Москва', 'RUB', True), ('BIO Санкт-Петербург', 'Санкт-Петербург', 'RUB', True)]),
+    ('Local Trade', [('Local Алматы', 'Алматы', 'KZT', False)]),
+    ('Import Direct', [('Import Гуанчжоу', 'Гуанчжоу', 'USD', True), ('Import Шымкент', 'Шымкент', 'KZT', False)]),
+)
+
+# Цепочка переменных склада: Расчётный_вес → Доставка → итоговая формула.
+WAREHOUSE_VARIABLES = (
+    ('НДС', 'НДС', '1.16'),
+    (MARGIN_VAR_NAME, 'Торговая наценка', MARGIN_VAR_DEFAULT),
+    ('Расчётный_вес', 'Расчётный вес, кг', 'max(вес, габариты / 5000000)'),
+    ('Доставка', 'Доставка за единицу', 'ceil(Расчётный_вес * 350 + 1500)'),
+)
+
+
+def _check_database(allow_any: bool) -> None:
+    name = db.engine.url.database or ''
+    if 'bench' not in name and not allow_any:
+        raise SystemExit(
+            f'База "{name}" не похожа на бенчмарочную (в имени нет "bench"). '
+            f'Укажите DATABASE_URL на отдельную БД или --allow-any-db.'
+        )
+
+
+def _insert(model, rows: list[dict]) -> None:
+    table = model.__table__
+    for start in range(0, len(rows), CHUNK):
+        db.session.execute(table.insert(), rows[start:start + CHUNK])
+
+
+def _reset_sequences() -> None:
+    for table in TABLES:
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"
+        ))
+
+
+def _brand_name(rng: random.Random) -> str:
+    return ''.join(rng.choice(BRAND_SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+
+
+def _dims(rng: random.Random) -> tuple[int, int, int]:
+    return rng.randint(20, 120) * 10, rng.randint(20, 90) * 10, rng.randint(15, 200) * 10
+
+
+def _dims_string(rng: random.Random, dims) -> str:
+    sep = rng.choices(('х', 'x', '*', ' х '), weights=(70, 20, 5, 5))[0]
+    return sep.join(str(d) for d in dims)
+
+
+def _characteristic_value(rng: random.Random, key: str) -> str:
+    if key == 'Вес':
+        return f'{rng.uniform(0.3, 180):.1f}'.replace('.', ',') + ' кг'
+    if key in ('Размер в упаковке', 'Размер без упаковки'):
+        return _dims_string(rng, _dims(rng))
+    if key == 'Мощность':
+        watts = rng.choice((60, 150, 350, 800, 1200, 1500, 2200, 3500, 5000, 9000))
+        return f'{watts / 1000:g}'.replace('.', ',') + ' кВт' if watts >= 1000 and rng.random() < 0.6 else f'{watts} Вт'
+    if key == 'Напряжение':
+        return rng.choice(('220', '220', '380', '12', '24'))
+    if key == 'Цвет':
+        return rng.choice(COLORS)
+    if key == 'Материал корпуса':
+        return rng.choice(MATERIALS)
+    if key == 'Объём':
+        return str(rng.choice((1, 2, 5, 10, 20, 50, 120, 250, 400, 700, 1200)))
+    if key == 'Гарантия':
+        return str(rng.choice((6, 12, 12, 24, 36)))
+    if key == 'Страна производства':
+        return rng.choice(COUNTRIES)
+    if key == 'Температурный режим':
+        lo = rng.choice((-24, -18, -5, 0, 2))
+        return f'{lo}...{lo + rng.choice((6, 8, 10))}'
+    return str(rng.randint(1, 8))
+
+
+def _categories(rng: random.Random) -> tuple[list[dict], list[int]]:
+    rows, leaves = [], []
+    next_id = 1
+    for order, root_name in enumerate(ROOT_CATEGORIES):
+        root_id = next_id
+        next_id += 1
+        rows.append({'id': root_id, 'name': root_name, 'slug': safe_slugify(root_name),
+                     'parent_id': None, 'order': order, 'show_in_menu': True})
+        for i in range(8):
+            child_id = next_id
+            next_id += 1
+            child_name = f'{root_name} — группа {i + 1}'
+            rows.append({'id': child_id, 'name': child_name, 'slug': f'{safe_slugify(root_name)}-{i + 1}',
+                         'parent_id': root_id, 'order': i, 'show_in_menu': True})
+            grandchildren = rng.randint(0, 3)
+            if not grandchildren:
+                leaves.append(child_id)
+            for j in range(grandchildren):
+                rows.append({'id': next_id, 'name': f'{child_name}.{j + 1}',
+                             'slug': f'{safe_slugify(root_name)}-{i + 1}-{j + 1}',
+                             'parent_id': child_id, 'order': j, 'show_in_menu': True})
+                leaves.append(next_id)
+                next_id += 1
+    return rows, leaves
+
+
+def generate(products: int, months: int, views_per_day: int, visitors_per_day: int, seed: int) -> dict:
+    """Заполняет пустую базу. Коммитит. Возвращает число строк по таблицам."""
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+
+    category_rows, leaves = _categories(rng)
+    _insert(Category, category_rows)
+
+    brand_names = sorted({_brand_name(rng) for _ in range(400)})[:200]
+    _insert(Brand, [{'id': i + 1, 'name': name, 'country': rng.choice(COUNTRIES)}
+                    for i, name in enumerate(brand_names)])
+
+    _insert(Currency, [{'id': i + 1, 'code': code, 'name': name, 'rate_to_tenge': rate}
+                       for i, (code, name, rate) in enumerate(CURRENCIES)])
+    currency_ids = {code: i + 1 for i, (code, _, _) in enumerate(CURRENCIES)}
+
+    supplier_rows, warehouse_rows, formula_rows, variable_rows = [], [], [], []
+    warehouses_by_supplier = {}
+    for s_id, (s_name, warehouses) in enumerate(SUPPLIERS, start=1):
+        supplier_rows.append({'id': s_id, 'name': s_name})
+        for w_name, city, code, vat in warehouses:
+            w_id = len(warehouse_rows) + 1
+            warehouse_rows.append({'id': w_id, 'supplier_id': s_id, 'name': w_name, 'city': city,
+                                   'currency_id': currency_ids[code], 'vat_enabled': vat})
+            formula_rows.append({'id': w_id, 'warehouse_id': w_id,
+                                 'formula': select_price_formula(code, vat),
+                                 'delivery_formula': 'Доставка',
+                                 'cost_formula': 'ceil(себестоимость * курс_валюты + Доставка)'})
+            for order, (name, label, formula) in enumerate(WAREHOUSE_VARIABLES):
+                variable_rows.append({'id': len(variable_rows) + 1, 'warehouse_id': w_id, 'name': name,
+                                      'label': label, 'formula': formula, 'sort_order': order})
+            warehouses_by_supplier.setdefault(s_id, []).append((w_id, code))
+    _insert(Supplier, supplier_rows)
+    _insert(Warehouse, warehouse_rows)
+    _insert(WarehouseFormula, formula_rows)
+    _insert(WarehouseVariable, variable_rows)
+
+    _insert(ProductAvailabilityStatus, [
+        {'id': 1, 'status_name': 'В наличии', 'condition_operator': '>', 'condition_value': 0,
+         'background_color': '#e6f4ea', 'text_color': '#137333', 'order': 0, 'active': True},
+        {'id': 2, 'status_name': 'Под заказ', 'condition_operator': '=', 'condition_value': 0,
+         'background_color': '#fef7e0', 'text_color': '#b06000', 'order': 1, 'active': True},
+    ])
+
+    _insert(CharacteristicsList, [{'id': i + 1, 'characteristic_key': key, 'unit_of_measurement': unit}
+                                  for i, (key, unit) in enumerate(CHARACTERISTICS)])
+    char_ids = {key: i + 1 for i, (key, _) in enumerate(CHARACTERISTICS)}
+    always = ('Вес', 'Размер в упаковке', 'Мощность', 'Напряжение')
+    optional = [key for key, _ in CHARACTERISTICS if key not in always]
+
+    product_rows, char_rows, cost_rows, media_rows = [], [], [], []
+    char_id = cost_id = media_id = 0
+    supplier_ids = list(warehouses_by_supplier)
+    for pid in range(1, products + 1):
+        p_type = rng.choice(PRODUCT_TYPES)
+        brand_id = rng.randint(1, len(brand_names))
+        model = f'{rng.choice("ABCDEFKMRSTV")}{rng.choice("ABCDEFKMRSTV")}{rng.randint(10, 999)}-{rng.choice(("G", "S", "N", "X", "P"))}'
+        name = f'{p_type} {brand_names[brand_id - 1]} {model}'
+        supplier_id = rng.choice(supplier_ids)
+        product_rows.append({
+            'id': pid, 'name': name, 'article': f'BN-{pid:06d}', 'slug': f'{safe_slugify(name)}-{pid}',
+            'price': float(rng.randint(5, 3000) * 1000), 'wholesale_price': None,
+            'quantity': rng.choice((0, 0, 1, 2, 5, 10, 25, 100)), 'is_visible': rng.random() < 0.95,
+            'is_draft': False, 'country': rng.choice(COUNTRIES), 'brand_id': brand_id,
+            'supplier_id': supplier_id, 'description': f'{name}. Синтетический товар для бенчмарков.',
+            'category_id': rng.choice(leaves),
+        })
+
+        keys = list(always) + rng.sample(optional, rng.randint(2, 5))
+        for order, key in enumerate(keys):
+            char_id += 1
+            char_rows.append({'id': char_id, 'product_id': pid, 'key': str(char_ids[key]),
+                              'value': _characteristic_value(rng, key), 'sort_order': order})
+
+        # Закупки: склад поставщика товара + иногда склады других поставщиков.
+        extra = [w for s in supplier_ids if s != supplier_id for w in warehouses_by_supplier[s]]
+        picked = rng.sample(warehouses_by_supplier[supplier_id], 1) + rng.sample(extra, rng.choice((0, 0, 1, 2)))
+        for w_id, code in picked:
+            cost_id += 1
+            rate = CURRENCIES[currency_ids[code] - 1][2]
+            cost_rows.append({'id': cost_id, 'product_id': pid, 'warehouse_id': w_id,
+                              'cost_price': round(rng.randint(3, 2500) * 1000 / rate, 2),
+                              'quantity': rng.choice((0, 1, 3, 10, 50))})
+
+        for order in range(rng.choice((1, 1, 2, 3, 4))):
+            media_id += 1
+            media_rows.append({'id': media_id, 'product_id': pid,
+                               'url': f'/uploads/products/{pid}/{order + 1}.jpg',
+                               'media_type': 'image', 'order': order})
+
+        if pid % CHUNK == 0 or pid == products:
+            _insert(Product, product_rows)
+            _insert(ProductCharacteristic, char_rows)
+            _insert(ProductWarehouseCost, cost_rows)
+            _insert(ProductMedia, media_rows)
+            product_rows, char_rows, cost_rows, media_rows = [], [], [], []
+            print(f'  товары: {pid}/{products}', flush=True)
+
+    blocks = [
+        {'id': 1, 'title': 'Хиты продаж', 'type': 'products', 'order': 0, 'active': True, 'carusel': True},
+        {'id': 2, 'title': 'Популярные категории', 'type': 'categories', 'order': 1, 'active': True},
+        {'id': 3, 'title': 'Новинки', 'type': 'products', 'order': 2, 'active': True, 'carusel': True},
+    ]
+    _insert(HomepageBlock, blocks)
+    items = []
+    for block_id, pool in ((1, range(1, products + 1)), (2, range(1, len(ROOT_CATEGORIES) + 1)),
+                           (3, range(1, products + 1))):
+        for order, item_id in enumerate(rng.sample(list(pool), min(24, len(pool)))):
+            items.append({'id': len(items) + 1, 'block_id': block_id, 'item_id': item_id, 'order': order})
+    _insert(HomepageBlockItem, items)
+
+    _fill_statistics(rng, now, products, months, views_per_day, visitors_per_day)
+
+    _reset_sequences()
+    category_closure.rebuild()
+    attribute_index.rebuild()
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+    return {table: db.session.execute(text(f'SELECT COUNT(*) FROM {table}')).scalar() for table in TABLES}
+
+
+def _fill_statistics(rng, now, products, months, views_per_day, visitors_per_day) -> None:
+    """product_views / site_visitors за months месяцев: дневная волна и «горячие» товары."""
+    days = months * 30
+    # ~20% товаров собирают ~80% просмотров.
+    hot = rng.sample(range(1, products + 1), max(1, products // 5))
+    user_agents = (
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/126.0 Safari/537.36',
+        'Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148',
+        'Mozilla/5.0 (Linux; Android 14; SM-A546E) AppleWebKit/537.36 Chrome/126.0 Mobile Safari/537.36',
+    )
+    view_id = visitor_id = 0
+    views, visitors = [], []
+    for day in range(days):
+        day_start = (now - timedelta(days=day)).replace(hour=0, minute=0, second=0)
+        weekday_factor = 0.6 if day_start.weekday() >= 5 else 1.0
+        for _ in range(int(views_per_day * weekday_factor)):
+            view_id += 1
+            pid = rng.choice(hot) if rng.random() < 0.8 else rng.randint(1, products)
+            views.append({
+                'id': view_id, 'product_id': pid, 'product_name': None, 'product_slug': None,
+                'ip_address': f'10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}',
+                'user_agent': rng.choice(user_agents),
+                'view_type': 'detail' if rng.random() < 0.7 else 'quick',
+                'viewed_at': day_start + timedelta(seconds=int(rng.triangular(0, 86399, 50000))),
+            })
+        for _ in range(int(visitors_per_day * weekday_factor)):
+            visitor_id += 1
+            ua = rng.choice(user_agents)
+            visitors.append({
+                'id': visitor_id,
+                'ip_address': f'10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}',
+                'device_type': 'web' if 'Windows' in ua else 'mobile', 'user_agent': ua,
+                'visited_at': day_start + timedelta(seconds=int(rng.triangular(0, 86399, 50000))),
+            })
+        if len(views) >= CHUNK * 4 or day == days - 1:
+            _insert(ProductView, views)
+            _insert(SiteVisitor, visitors)
+            views, visitors = [], []
+            print(f'  статистика: {day + 1}/{days} дн.', flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Синтетический каталог для бенчмарков')
+    parser.add_argument('--products', type=int, default=50000)
+    parser.add_argument('--months', type=int, default=6)
+    parser.add_argument('--views-per-day', type=int, default=2000)
+    parser.add_argument('--visitors-per-day', type=int, default=1500)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help='очистить заполняемые таблицы перед генерацией')
+    parser.add_argument('--allow-any-db', action='store_true', help='не проверять имя базы')
+    args = parser.parse_args()
+
+    with app.app_context():
+        _check_database(args.allow_any_db)
+        if args.reset:
+            db.session.execute(text(f'TRUNCATE {", ".join(TABLES)} RESTART IDENTITY CASCADE'))
+            db.session.commit()
+        elif db.session.query(Product.id).first() is not None:
+            raise SystemExit('В базе уже есть товары — запустите с --reset.')
+
+        started = time.monotonic()
+        counts = generate(args.products, args.months, args.views_per_day, args.visitors_per_day, args.seed)
+        print(f'Готово за {time.monotonic() - started:.0f} с:')
+        for table, count in counts.items():
+            print(f'  {table}: {count}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Сериализация JSON: штатный провайдер Flask против utils/json_provider.
+
+Полезные нагрузки берутся настоящие — ответы /products/?per_page=200 и
+/products/articles-map на синтетическом каталоге (benchmarks.dataset);
+дальше одни и те же объекты кодируются --repeat раз каждым способом:
+
+  - flask_default — json.dumps(sort_keys=True, ensure_ascii=True), как
+    jsonify до FastJSONProvider;
+  - stdlib_compact — запасной путь json_provider без orjson;
+  - fast — json_provider.dumps (orjson, если установлен).
+
+    python -u -m benchmarks.json_encoding
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask.json.provider import DefaultJSONProvider
+from flask_jwt_extended import create_access_token
+
+from app import app
+from utils import json_provider
+
+
+PAYLOADS = (
+    ('products_admin_200', '/products/?page=1&per_page=200'),
+    ('articles_map', '/products/articles-map'),
+)
+
+
+def _encoders():
+    default = DefaultJSONProvider.default
+    return {
+        'flask_default': lambda obj: json.dumps(obj, default=default, sort_keys=True).encode(),
+        'stdlib_compact': lambda obj: json.dumps(obj, default=default, ensure_ascii=False,
+                                                 separators=(',', ':')).encode(),
+        'fast': json_provider.dumps,
+    }
+
+
+def _load_payloads() -> dict:
+    with app.app_context():
+        token = create_access_token(identity='1', additional_claims={'role': 'admin'})
+    client = app.test_client()
+    payloads = {}
+    for name, path in PAYLOADS:
+        response = client.get(path, headers={'Authorization': f'Bearer {token}'})
+        if response.status_code != 200:
+            raise SystemExit(f'{path}: статус {response.status_code}')
+        payloads[name] = json.loads(response.get_data())
+    return payloads
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение JSON-кодировщиков на реальных ответах')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'orjson: {"да" if json_provider.orjson is not None else "нет (stdlib)"}')
+    payloads = _load_payloads()
+    for name, obj in payloads.items():
+        print(f'\n{name}:')
+        baseline = None
+        for encoder_name, encode in _encoders().items():
+            samples = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                data = encode(obj)
+                samples.append((time.perf_counter() - started) * 1000)
+            median = statistics.median(samples)
+            baseline = baseline or median
+            print(f'  {encoder_name:15} {median:8.2f} мс  {len(data) / 1024:8.0f} КБ  ×{baseline / median:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,378 @@
+"""
+Нагрузочный прогон против запущенного инстанса: смесь трафика витрины,
+админки и синка, чтобы проверять настройки gunicorn.conf.py (воркеры ×
+потоки) и новые фичи до деплоя, а не по ощущениям.
+
+Кто создаёт нагрузку (все — потоки этого процесса, keep-alive соединение
+на поток, как у браузера / клиента миграции):
+
+  - --users N — посетители; каждая итерация — сценарий по весам --mix:
+      browse  главная, дерево каталога, категория, карточка товара;
+      search  /products/search с facets, иногда с фильтром по цене;
+      track   маяки /api/track-visit и /api/track-product-view;
+      admin   dashboard-stats, список товаров админки, интеграции;
+  - --sse N — открытые SSE-потоки админки
+    (/api/admin/integrations/<type>/stream): каждый держит поток gthread
+    всё время прогона — ровно то, что съедает ёмкость 4×4;
+  - --sync-threads N — клиент Equip-синка: upsert-many по товарам
+    одного поставщика в N потоков без пауз.
+
+Отчёт по каждой метке: запросы, ошибки (статус >= 400 и обрывы),
+запросов/с, p50/p95/p99/max в мс. --json — сохранить то же в файл.
+
+Админские сценарии, SSE и синк требуют JWT роли admin: --token, либо
+токен выпускается локально из JWT_SECRET_KEY (config.py/.env) — тогда
+секрет должен совпадать с инстансом.
+
+Пример (локальный gunicorn на 8000, база из benchmarks.dataset):
+    python -u -m benchmarks.load --base-url http://127.0.0.1:8000 \\
+        --users 32 --sse 4 --sync-threads 8 --duration 120
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+DEFAULT_MIX = 'browse=55,search=25,track=15,admin=5'
+SEARCH_TERMS = ('шкаф', 'витрина', 'плита', 'блендер', 'кофемашина', 'ларь', 'печь',
+                'миксер', 'весы', 'принтер', 'сканер', 'холодильный стол', 'льдогенератор')
+USER_AGENTS = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/126.0 Safari/537.36',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148',
+    'Mozilla/5.0 (Linux; Android 14; SM-A546E) AppleWebKit/537.36 Chrome/126.0 Mobile Safari/537.36',
+)
+TIMEOUT = 60
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency: dict[str, list[float]] = {}
+        self._errors: dict[str, int] = {}
+
+    def record(self, label: str, elapsed_ms: float, ok: bool) -> None:
+        with self._lock:
+            self._latency.setdefault(label, []).append(elapsed_ms)
+            if not ok:
+                self._errors[label] = self._errors.get(label, 0) + 1
+
+    def report(self, duration: float) -> dict:
+        def pct(ordered, q):
+            return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+        with self._lock:
+            result = {}
+            for label, samples in sorted(self._latency.items()):
+                ordered = sorted(samples)
+                result[label] = {
+                    'requests': len(ordered),
+                    'errors': self._errors.get(label, 0),
+                    'error_rate': round(self._errors.get(label, 0) / len(ordered), 4),
+                    'rps': round(len(ordered) / duration, 2),
+                    'p50_ms': round(pct(ordered, 0.50), 1),
+                    'p95_ms': round(pct(ordered, 0.95), 1),
+                    'p99_ms': round(pct(ordered, 0.99), 1),
+                    'max_ms': round(ordered[-1], 1),
+                }
+            return result
+
+
+class Client:
+    """Одно keep-alive соединение на поток; при обрыве переподключается."""
+
+    def __init__(self, base_url: str, stats: Stats, token: str = None):
+        parts = urlsplit(base_url)
+        self._cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self._netloc = parts.netloc
+        self._prefix = parts.path.rstrip('/')
+        self._conn = None
+        self.stats = stats
+        self.token = token
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = self._cls(self._netloc, timeout=TIMEOUT)
+        return self._conn
+
+    def request(self, label: str, method: str, path: str, body=None, admin=False, headers=None):
+        """Возвращает (статус, JSON или None). Время и ошибки — в stats под label."""
+        hdrs = {'Accept': 'application/json', 'Accept-Encoding': 'identity'}
+        if headers:
+            hdrs.update(headers)
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            hdrs['Content-Type'] = 'application/json'
+        if admin and self.token:
+            hdrs['Authorization'] = f'Bearer {self.token}'
+        started = time.perf_counter()
+        try:
+            conn = self._connection()
+            conn.request(method, self._prefix + path, body=payload, headers=hdrs)
+            response = conn.getresponse()
+            data = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.close()
+            self.stats.record(label, (time.perf_counter() - started) * 1000, ok=False)
+            return 0, None
+        self.stats.record(label, (time.perf_counter() - started) * 1000, ok=status < 400)
+        try:
+            return status, json.loads(data) if data else None
+        except ValueError:
+            return status, None
+
+    def close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except OSError:
+                pass
+            self._conn = None
+
+
+# ---------- Сценарии ----------
+
+def scenario_browse(client: Client, rng: random.Random, data: dict) -> None:
+    if rng.random() < 0.3:
+        client.request('homepage', 'GET', '/api/public/homepage')
+    client.request('catalog_categories', 'GET', '/api/public/catalog/categories')
+    if data['categories']:
+        slug = rng.choice(data['categories'])
+        client.request('category', 'GET', f'/api/public/category/{quote(slug)}?page={rng.randint(1, 3)}&per_page=24')
+    if data['products']:
+        for slug in rng.sample(data['products'], min(len(data['products']), rng.randint(1, 3))):
+            client.request('product', 'GET', f'/products/{quote(slug)}')
+
+
+def scenario_search(client: Client, rng: random.Random, data: dict) -> None:
+    q = quote(rng.choice(SEARCH_TERMS))
+    path = f'/products/search?q={q}&with_facets=1&per_page=24&page={rng.randint(1, 2)}'
+    if rng.random() < 0.3:
+        path += f'&pmin={rng.randint(1, 50) * 10000}'
+    client.request('search', 'GET', path)
+
+
+def scenario_track(client: Client, rng: random.Random, data: dict) -> None:
+    ip = f'10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}'
+    ua = rng.choice(USER_AGENTS)
+    client.request('track_visit', 'POST', '/api/track-visit', body={'ip': ip, 'user_agent': ua})
+    if data['product_ids']:
+        client.request('track_product_view', 'POST', '/api/track-product-view', body={
+            'product_id': rng.choice(data['product_ids']), 'user_agent': ua, 'ip': ip,
+            'view_type': rng.choice(('detail', 'quick')),
+        })
+
+
+def scenario_admin(client: Client, rng: random.Random, data: dict) -> None:
+    client.request('dashboard_stats', 'GET', f'/api/dashboard-stats?period={rng.choice(("today", "week", "month"))}',
+                   admin=True)
+    client.request('admin_products', 'GET', f'/products/?page={rng.randint(1, 20)}&per_page=50', admin=True)
+    client.request('admin_integrations', 'GET', '/api/admin/integrations/', admin=True)
+
+
+SCENARIOS = {
+    'browse': scenario_browse,
+    'search': scenario_search,
+    'track': scenario_track,
+    'admin': scenario_admin,
+}
+
+
+def _parse_mix(raw: str) -> list[tuple[str, float]]:
+    mix = []
+    for part in raw.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f'--mix: неизвестный сценарий "{name}" (есть: {", ".join(SCENARIOS)})')
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+# ---------- Потоки ----------
+
+def user_loop(base_url, token, stats, data, mix, think_ms, deadline, seed):
+    rng = random.Random(seed)
+    client = Client(base_url, stats, token)
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        if name == 'admin' and not token:
+            continue
+        SCENARIOS[name](client, rng, data)
+        if think_ms:
+            time.sleep(rng.uniform(0, think_ms * 2) / 1000)
+    client.close()
+
+
+def sync_loop(base_url, token, stats, data, deadline, seed):
+    """Как Equip-миграция: upsert-many подряд без пауз."""
+    rng = random.Random(seed)
+    client = Client(base_url, stats, token)
+    sync = data['sync']
+    while time.monotonic() < deadline:
+        items = [{'warehouse_id': w_id, 'cost_price': round(rng.uniform(1000, 500000), 2),
+                  'quantity': rng.randint(0, 50)}
+                 for w_id in rng.sample(sync['warehouse_ids'], rng.randint(1, len(sync['warehouse_ids'])))]
+        client.request('sync_upsert_many', 'POST', '/meta/product-costs/upsert-many', admin=True, body={
+            'product_id': rng.choice(data['product_ids']),
+            'supplier_id': sync['supplier_id'],
+            'prune': False,
+            'items': items,
+        })
+    client.close()
+
+
+def sse_loop(base_url, token, stats, integration_type, deadline):
+    """Держит SSE-поток открытым; время до первого события — метка sse_connect."""
+    parts = urlsplit(base_url)
+    cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    path = f'{parts.path.rstrip("/")}/api/admin/integrations/{integration_type}/stream?token={quote(token)}'
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        conn = cls(parts.netloc, timeout=TIMEOUT)
+        try:
+            conn.request('GET', path, headers={'Accept': 'text/event-stream'})
+            response = conn.getresponse()
+            if response.status >= 400:
+                stats.record('sse_connect', (time.perf_counter() - started) * 1000, ok=False)
+                time.sleep(1)
+                continue
+            first = True
+            while time.monotonic() < deadline:
+                line = response.readline()
+                if not line:
+                    break
+                if first and line.startswith(b'event:'):
+                    stats.record('sse_connect', (time.perf_counter() - started) * 1000, ok=True)
+                    first = False
+        except (OSError, http.client.HTTPException):
+            stats.record('sse_connect', (time.perf_counter() - started) * 1000, ok=False)
+            time.sleep(1)
+        finally:
+            conn.close()
+
+
+# ---------- Подготовка ----------
+
+def _mint_token() -> str:
+    """admin-JWT, подписанный JWT_SECRET_KEY из config.py (без БД и create_app)."""
+    from flask import Flask
+    from flask_jwt_extended import JWTManager, create_access_token
+    from datetime import timedelta
+    from config import Config
+
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = Config.JWT_SECRET_KEY
+    app.config['JWT_IDENTITY_CLAIM'] = Config.JWT_IDENTITY_CLAIM
+    JWTManager(app)
+    with app.app_context():
+        return create_access_token(identity='1', additional_claims={'role': 'admin'},
+                                   expires_delta=timedelta(hours=6))
+
+
+def _prepare(base_url: str, token: str, need_sync: bool) -> dict:
+    """Slug'и, id товаров и склады для синка — через тот же HTTP API."""
+    client = Client(base_url, Stats(), token)
+    status, slugs = client.request('prepare', 'GET', '/api/public/sitemap-slugs')
+    if status != 200 or not slugs:
+        raise SystemExit(f'{base_url}: /api/public/sitemap-slugs ответил {status}')
+    status, articles = client.request('prepare', 'GET', '/products/articles-map')
+    data = {
+        'products': slugs.get('products') or [],
+        'categories': slugs.get('categories') or [],
+        'product_ids': list((articles or {}).values()),
+        'sync': None,
+    }
+    if need_sync:
+        if not data['product_ids']:
+            raise SystemExit('Нет товаров для синка (/products/articles-map пуст)')
+        status, warehouses = client.request('prepare', 'GET', '/meta/warehouses/', admin=True)
+        if status != 200:
+            raise SystemExit(f'/meta/warehouses/ ответил {status} — проверьте токен')
+        by_supplier = {}
+        for w in warehouses.get('data') or []:
+            by_supplier.setdefault(w['supplier_id'], []).append(w['id'])
+        if not by_supplier:
+            raise SystemExit('Нет складов для синка')
+        supplier_id, warehouse_ids = max(by_supplier.items(), key=lambda kv: len(kv[1]))
+        data['sync'] = {'supplier_id': supplier_id, 'warehouse_ids': warehouse_ids}
+    client.close()
+    return data
+
+
+def _print_report(report: dict, duration: float) -> None:
+    print(f'\nЗа {duration:.0f} с:')
+    print(f'{"метка":22} {"запросов":>9} {"ошибок":>7} {"rps":>8} {"p50":>8} {"p95":>8} {"p99":>8} {"max":>8}')
+    total = errors = 0
+    for label, row in report.items():
+        total += row['requests']
+        errors += row['errors']
+        print(f'{label:22} {row["requests"]:>9} {row["errors"]:>7} {row["rps"]:>8} '
+              f'{row["p50_ms"]:>8} {row["p95_ms"]:>8} {row["p99_ms"]:>8} {row["max_ms"]:>8}')
+    if total:
+        print(f'{"итого":22} {total:>9} {errors:>7} {total / duration:>8.1f}   ошибок {errors / total:.2%}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный прогон смеси трафика')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--duration', type=int, default=60, help='секунды')
+    parser.add_argument('--users', type=int, default=16)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'веса сценариев, по умолчанию {DEFAULT_MIX}')
+    parser.add_argument('--think-ms', type=int, default=200, help='средняя пауза посетителя между итерациями')
+    parser.add_argument('--sse', type=int, default=0, help='открытых SSE-потоков админки')
+    parser.add_argument('--sse-type', default='equip')
+    parser.add_argument('--sync-threads', type=int, default=0, help='потоков upsert-many (Equip-синк)')
+    parser.add_argument('--token', default=os.getenv('LOAD_TOKEN'), help='admin JWT; иначе выпускается локально')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='сохранить отчёт в файл')
+    args = parser.parse_args()
+
+    mix = _parse_mix(args.mix)
+    needs_admin = args.sse or args.sync_threads or any(name == 'admin' and w > 0 for name, w in mix)
+    token = args.token or (_mint_token() if needs_admin else None)
+    data = _prepare(args.base_url, token, need_sync=args.sync_threads > 0)
+
+    stats = Stats()
+    started = time.monotonic()
+    deadline = started + args.duration
+    threads = []
+    for i in range(args.users):
+        threads.append(threading.Thread(target=user_loop, daemon=True, args=(
+            args.base_url, token, stats, data, mix, args.think_ms, deadline, args.seed * 1000 + i)))
+    for i in range(args.sync_threads):
+        threads.append(threading.Thread(target=sync_loop, daemon=True, args=(
+            args.base_url, token, stats, data, deadline, args.seed * 2000 + i)))
+    for _ in range(args.sse):
+        threads.append(threading.Thread(target=sse_loop, daemon=True, args=(
+            args.base_url, token, stats, args.sse_type, deadline)))
+    for t in threads:
+        t.start()
+    print(f'{args.users} посетителей, {args.sse} SSE, {args.sync_threads} потоков синка, '
+          f'{args.duration} с → {args.base_url}', flush=True)
+    for t in threads:
+        t.join(timeout=max(0.0, deadline - time.monotonic()) + TIMEOUT)
+
+    duration = time.monotonic() - started
+    report = stats.report(duration)
+    _print_report(report, duration)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': {k: v for k, v in vars(args).items() if k != 'token'},
+                       'duration': round(duration, 1), 'endpoints': report}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
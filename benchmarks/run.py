@@ -0,0 +1,321 @@
+"""
+Повторяемые замеры на синтетическом каталоге (benchmarks/dataset.py).
+
+HTTP-сценарии идут через app.test_client() — без сети и gunicorn, так
+что в цифрах только Flask + SQLAlchemy + PostgreSQL. На каждый сценарий
+один прогрев и --repeat замеров; в результат — min/median/p95/max в мс,
+число SQL (из Server-Timing, utils/metrics.py), статус и размер ответа.
+
+Кэшируемые ручки (utils/response_cache.py) по умолчанию меряются
+холодными: перед каждым замером области кэша бампаются (вне замера).
+--warm — мерить попадания в кэш.
+
+Пересчёт склада зовёт _do_recalculate синхронно на самом большом складе
+(без похода за курсами в банк, который делает POST /recalculate).
+
+Результат — benchmarks/results/<время>-<коммит>.json; сравнение:
+    python -u -m benchmarks.run --compare results/A.json results/B.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import func, text
+
+from app import app
+from extensions import db
+from models.characteristics_list import CharacteristicsList
+from models.category import Category
+from models.product import Product
+from models.product_warehouse_cost import ProductWarehouseCost
+from models.warehouse import Warehouse, WarehouseVariable
+from utils import response_cache
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+CACHE_SCOPES = ('products', 'categories', 'homepage', 'brands_statuses', 'header')
+
+
+class Case:
+    def __init__(self, name, method, path, admin=False, cached=False, body=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.admin = admin
+        self.cached = cached
+        self.body = body  # None | callable(номер повтора) → JSON
+
+
+def _cases(ctx: dict) -> list[Case]:
+    power, voltage = ctx['power_id'], ctx['voltage_id']
+    return [
+        Case('search_facets', 'GET', '/products/search?q=шкаф&with_facets=1&per_page=24&page=1'),
+        Case('search_facets_attrs', 'GET',
+             f'/products/search?q=шкаф&with_facets=1&per_page=24&page=1'
+             f'&attr[{power}]=1000..5000&attr[{voltage}]=220'),
+        Case('search_100', 'GET', '/products/search?q=витрина&with_count=1&per_page=100&page=1'),
+        Case('products_admin_50', 'GET', '/products/?page=1&per_page=50', admin=True),
+        Case('products_admin_200', 'GET', '/products/?page=1&per_page=200', admin=True),
+        Case('articles_map', 'GET', '/products/articles-map'),
+        Case('products_admin_filtered', 'GET',
+             f'/products/?page=1&per_page=50&supplier={ctx["supplier_id"]}&quantity=true', admin=True),
+        Case('category_root', 'GET', f'/api/public/category/{ctx["root_slug"]}?page=1&per_page=24'),
+        Case('category_leaf', 'GET', f'/api/public/category/{ctx["leaf_slug"]}?page=1&per_page=24'),
+        Case('homepage', 'GET', '/api/public/homepage', cached=True),
+        Case('dashboard_stats_month', 'GET', '/api/dashboard-stats?period=month', admin=True),
+        Case('dashboard_stats_3months', 'GET', '/api/dashboard-stats?period=3months', admin=True),
+        Case('upsert_many', 'POST', '/meta/product-costs/upsert-many', admin=True,
+             body=lambda i: _upsert_body(ctx, i)),
+    ]
+
+
+def _upsert_body(ctx: dict, i: int) -> dict:
+    # Каждый повтор — другой товар: в замер не попадает «ничего не изменилось».
+    product_id = ctx['product_ids'][i % len(ctx['product_ids'])]
+    return {
+        'product_id': product_id,
+        'supplier_id': ctx['supplier_id'],
+        'prune': True,
+        'items': [
+            {'warehouse_id': w_id, 'cost_price': 1000.0 + i * 10 + n, 'quantity': (i + n) % 7}
+            for n, w_id in enumerate(ctx['supplier_warehouse_ids'])
+        ],
+    }
+
+
+def _context() -> dict:
+    """Параметры сценариев из данных (id характеристик, slug'и, склады)."""
+    char_ids = dict(db.session.query(CharacteristicsList.characteristic_key, CharacteristicsList.id).all())
+    root = Category.query.filter(Category.parent_id.is_(None)).order_by(Category.order).first()
+    leaf = (db.session.query(Category.slug)
+            .join(Product, Product.category_id == Category.id)
+            .group_by(Category.id, Category.slug)
+            .order_by(func.count(Product.id).desc())
+            .first())
+    biggest = (db.session.query(ProductWarehouseCost.warehouse_id, func.count(ProductWarehouseCost.id))
+               .group_by(ProductWarehouseCost.warehouse_id)
+               .order_by(func.count(ProductWarehouseCost.id).desc())
+               .first())
+    if root is None or leaf is None or biggest is None:
+        raise SystemExit('Каталог пуст — сначала python -m benchmarks.dataset --reset')
+    warehouse = Warehouse.query.get(biggest[0])
+    supplier_warehouse_ids = [w.id for w in Warehouse.query.filter_by(supplier_id=warehouse.supplier_id)
+                              .order_by(Warehouse.id).all()]
+    product_ids = [pid for (pid,) in db.session.query(Product.id)
+                   .filter(Product.supplier_id == warehouse.supplier_id)
+                   .order_by(Product.id).limit(200).all()]
+    return {
+        'power_id': char_ids.get('Мощность'),
+        'voltage_id': char_ids.get('Напряжение'),
+        'root_slug': root.slug,
+        'leaf_slug': leaf[0],
+        'warehouse_id': warehouse.id,
+        'supplier_id': warehouse.supplier_id,
+        'supplier_warehouse_ids': supplier_warehouse_ids,
+        'product_ids': product_ids,
+    }
+
+
+def _summary(samples_ms: list[float]) -> dict:
+    ordered = sorted(samples_ms)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        'runs': len(ordered),
+        'min_ms': round(ordered[0], 2),
+        'median_ms': round(statistics.median(ordered), 2),
+        'p95_ms': round(p95, 2),
+        'max_ms': round(ordered[-1], 2),
+    }
+
+
+def _sql_count(response) -> Optional[int]:
+    header = response.headers.get('Server-Timing', '')
+    marker = 'desc="'
+    if marker not in header:
+        return None
+    try:
+        return int(header.split(marker, 1)[1].split(' ', 1)[0])
+    except ValueError:
+        return None
+
+
+def _run_http(client, case: Case, token: str, repeat: int, warm: bool,
+              accept_encoding: Optional[str] = None) -> dict:
+    headers = {'Authorization': f'Bearer {token}'} if case.admin else {}
+    if accept_encoding:
+        headers['Accept-Encoding'] = accept_encoding
+    samples, statuses, sizes, sql = [], set(), [], []
+    # Нулевой проход — прогрев (соединения, планы запросов, кэш ОС).
+    for i in range(repeat + 1):
+        if case.cached and not warm:
+            response_cache.invalidate(*CACHE_SCOPES)
+        kwargs = {'headers': headers}
+        if case.body is not None:
+            kwargs['json'] = case.body(i)
+        started = time.perf_counter()
+        response = client.open(case.path, method=case.method, **kwargs)
+        body = response.get_data()
+        elapsed = (time.perf_counter() - started) * 1000
+        if i == 0:
+            continue
+        samples.append(elapsed)
+        statuses.add(response.status_code)
+        sizes.append(len(body))
+        sql.append(_sql_count(response))
+    result = _summary(samples)
+    result.update({
+        'method': case.method,
+        'path': case.path,
+        'status': sorted(statuses),
+        'bytes': int(statistics.median(sizes)),
+        'sql': max((n for n in sql if n is not None), default=None),
+    })
+    return result
+
+
+def _run_recalculate(ctx: dict, repeat: int) -> dict:
+    from routes.warehouses import _do_recalculate, _recalc_status
+
+    warehouse_id = ctx['warehouse_id']
+    warehouse = Warehouse.query.get(warehouse_id)
+    variables = (WarehouseVariable.query.filter_by(warehouse_id=warehouse_id)
+                 .order_by(WarehouseVariable.sort_order).all())
+    var_list = [{'name': v.name, 'formula': v.formula} for v in variables]
+    cost_ids = [cid for (cid,) in db.session.query(ProductWarehouseCost.id)
+                .filter_by(warehouse_id=warehouse_id).all()]
+    args = (app, warehouse_id, warehouse.currency.rate_to_tenge, var_list, cost_ids,
+            warehouse.formula.formula, warehouse.formula.delivery_formula, warehouse.formula.cost_formula)
+    db.session.commit()
+
+    samples = []
+    for _ in range(repeat):
+        _recalc_status[warehouse_id] = {
+            'status': 'running', 'total': len(cost_ids), 'processed': 0, 'price_calculated': 0,
+            'delivery_calculated': 0, 'cost_no_margin_calculated': 0, 'zero_price': 0,
+            'zero_price_reasons': [], 'error_count': 0, 'errors': [],
+        }
+        started = time.perf_counter()
+        _do_recalculate(*args)
+        samples.append((time.perf_counter() - started) * 1000)
+    status = _recalc_status[warehouse_id]
+    result = _summary(samples)
+    result.update({
+        'warehouse_id': warehouse_id,
+        'items': len(cost_ids),
+        'status': status['status'],
+        'errors': status['error_count'],
+    })
+    return result
+
+
+def _git_commit() -> tuple[str, bool]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+    return commit, dirty
+
+
+def run(repeat: int, recalc_repeat: int, warm: bool, only: Optional[list[str]],
+        accept_encoding: Optional[str] = None) -> dict:
+    commit, dirty = _git_commit()
+    with app.app_context():
+        ctx = _context()
+        token = create_access_token(identity='1', additional_claims={'role': 'admin'})
+        dataset = {table: db.session.execute(text(f'SELECT COUNT(*) FROM {table}')).scalar()
+                   for table in ('product', 'product_characteristic', 'product_warehouse_cost',
+                                 'product_media', 'product_views', 'site_visitors')}
+        db.session.commit()
+
+    results = {}
+    client = app.test_client()
+    for case in _cases(ctx):
+        if only and case.name not in only:
+            continue
+        with app.app_context():
+            results[case.name] = _run_http(client, case, token, repeat, warm, accept_encoding)
+        print(f'  {case.name}: median {results[case.name]["median_ms"]} мс, '
+              f'SQL {results[case.name]["sql"]}, статус {results[case.name]["status"]}', flush=True)
+
+    if not only or 'warehouse_recalculate' in only:
+        with app.app_context():
+            results['warehouse_recalculate'] = _run_recalculate(ctx, recalc_repeat)
+        print(f'  warehouse_recalculate: median {results["warehouse_recalculate"]["median_ms"]} мс '
+              f'на {results["warehouse_recalculate"]["items"]} позиций', flush=True)
+
+    return {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'repeat': repeat,
+            'warm_cache': warm,
+            'accept_encoding': accept_encoding,
+            'dataset': dataset,
+        },
+        'cases': results,
+    }
+
+
+def compare(old_path: str, new_path: str) -> None:
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f'{old["meta"]["commit"]} → {new["meta"]["commit"]}')
+    print(f'{"сценарий":32} {"было, мс":>10} {"стало, мс":>10} {"Δ":>8} {"SQL":>10}')
+    for name in sorted(set(old['cases']) | set(new['cases'])):
+        a, b = old['cases'].get(name), new['cases'].get(name)
+        if a is None or b is None:
+            print(f'{name:32} {"—" if a is None else a["median_ms"]:>10} {"—" if b is None else b["median_ms"]:>10}')
+            continue
+        delta = (b['median_ms'] - a['median_ms']) / a['median_ms'] * 100 if a['median_ms'] else 0.0
+        sql = f'{a.get("sql")}→{b.get("sql")}' if 'sql' in a or 'sql' in b else ''
+        print(f'{name:32} {a["median_ms"]:>10} {b["median_ms"]:>10} {delta:>+7.1f}% {sql:>10}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замеры на синтетическом каталоге')
+    parser.add_argument('--repeat', type=int, default=15)
+    parser.add_argument('--recalc-repeat', type=int, default=3)
+    parser.add_argument('--warm', action='store_true', help='не сбрасывать кэш ответов между замерами')
+    parser.add_argument('--only', nargs='*', help='имена сценариев')
+    parser.add_argument('--accept-encoding', help='например "br, gzip" — замер со сжатием ответов')
+    parser.add_argument('--output', help='путь к JSON (по умолчанию benchmarks/results/...)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    result = run(args.repeat, args.recalc_repeat, args.warm, args.only, args.accept_encoding)
+    path = args.output
+    if not path:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        suffix = '-dirty' if result['meta']['dirty'] else ''
+        path = os.path.join(RESULTS_DIR, f'{stamp}-{result["meta"]["commit"]}{suffix}.json')
+    with open(path, 'w') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f'Результат: {path}')
+
+
+if __name__ == '__main__':
+    main()
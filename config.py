@@ -23,6 +23,36 @@ class Config:
     }
     MAX_CONTENT_LENGTH = 500 * 1024 * 1024  # 500MB (общий лимит; для драйверов проверка 200MB в роуте)
     DRIVER_MAX_SIZE = 200 * 1024 * 1024  # 200MB для драйверов товара
+    # Кэш публичных ответов витрины (utils/response_cache.py). TTL — страховка
+    # для изменений в обход админских blueprint'ов (фоновый пересчёт цен,
+    # выгрузки поставщиков); админские правки инвалидируют кэш сразу.
+    RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+    # Кэш уменьшенных копий картинок (utils/image_variants.py) в
+    # UPLOAD_FOLDER/.variants; сверх лимита вытесняются давно не запрошенные.
+    IMAGE_VARIANT_CACHE_MAX_BYTES = int(os.getenv("IMAGE_VARIANT_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+    # Отдача uploads фронтовым прокси вместо потока gunicorn
+    # (utils/file_delivery.py): nginx — internal location для
+    # X-Accel-Redirect (например "/_uploads/"), Apache/lighttpd — X-Sendfile.
+    UPLOADS_X_ACCEL_PREFIX = os.getenv("UPLOADS_X_ACCEL_PREFIX") or None
+    USE_X_SENDFILE = os.getenv("USE_X_SENDFILE", "").lower() in ("1", "true", "yes")
+    # Период фоновой сверки индекса файлов товаров с диском
+    # (services/media_index.py), секунды; 0 — выключить.
+    MEDIA_RECONCILE_INTERVAL = int(os.getenv("MEDIA_RECONCILE_INTERVAL", "21600"))
+    # /metrics (utils/metrics.py): ключ для Authorization: Bearer — без него
+    # ручка выключена; каталог снимков, общий для gunicorn-воркеров.
+    METRICS_KEY = os.getenv("METRICS_KEY") or None
+    METRICS_DIR = os.getenv("METRICS_DIR") or None
+    # Детектор N+1 и бюджеты SQL на запрос (utils/query_budget.py) для
+    # dev/тестов: "warn" — в лог, "raise" — превышение бюджета даёт 500.
+    # В проде пусто — слушатели не вешаются.
+    QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "").lower()
+    # Сжатие ответов по Accept-Encoding (utils/compression.py): порог в
+    # байтах и уровни по умолчанию; роуты переопределяют их через
+    # @compress_level. 0 — кодировка выключена (например, жмёт nginx).
+    COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+    COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+    COMPRESS_BR_LEVEL = int(os.getenv("COMPRESS_BR_LEVEL", "4"))
     ALLOWED_EXTENSIONS = {
         'png', 'jpg', 'jpeg', 'gif', 'pdf', 'zip', 'rar', 'doc', 'docx',
         'mp4', 'mov', 'avi', 'mkv', 'wmv', 'flv', 'webm'
@@ -1,26 +1,32 @@
 """
 Скрипт для миграции данных из старой базы products.db в новую базу через API.
 
+Весь каталог уходит через пакетный импорт POST /api/admin/catalog/import
+(см. services/catalog_import.py): товары вместе с брендом, путём категории
+и характеристиками — NDJSON-пачками по --batch-size записей, сервер сам
+резолвит бренды / категории / характеристики и пишет всё пачками.
+Раньше каждая сущность шла отдельным HTTP-запросом.
+
 Порядок выполнения:
 1. Авторизация
-2. Создание характеристик из справочника (из таблицы product_properties)
-3. Создание категорий с учетом иерархии и установкой изображений
-4. Создание брендов
-5. Создание товаров с изображениями и характеристиками
+2. Чтение products.db в память (категории, бренды, характеристики, товары)
+3. Импорт товаров пачками (бренды, категории и характеристики создаются
+   сервером по мере необходимости)
+4. Картинки товаров: ссылки, которые сервер ещё не скачивал, — через
+   POST /upload/upload_product_from_urls (одна ссылка — один товар, пачкой)
+5. Изображения категорий (только тем, у кого изображения ещё нет)
+6. Деактивация товаров поставщика, которых нет в products.db
 """
 
-import sqlite3
-import requests
-import time
+import json
 import os
+import sqlite3
 import sys
-from urllib.parse import quote, urlparse
-from io import BytesIO
-import unicodedata
-import re
-import threading
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+import requests
+
 # Настройки API
 # По умолчанию используем Render сервер, можно переопределить через переменную окружения или аргумент
 API_BASE_URL = os.getenv('API_BASE_URL', 'https://pospro-new-server.onrender.com/api')
@@ -29,1574 +35,489 @@ OLD_DB_PATH = os.path.join(os.path.dirname(__file__), 'products.db')
 # ID поставщика по умолчанию для всех мигрируемых товаров
 DEFAULT_SUPPLIER_ID = 2
 
+# Сколько записей в одном запросе импорта и сколько из них сервер пишет
+# одной транзакцией.
+DEFAULT_BATCH_SIZE = 1000
+SERVER_CHUNK_SIZE = 500
+MEDIA_WORKERS = 5
+
+# У уже существующих товаров обновляем только цену, остатки, поставщика,
+# характеристики и картинки — описание/бренд/категорию могли поправить
+# руками в админке.
+UPDATE_EXISTING = 'price,quantity,supplier_id,characteristics,media'
+
 # JWT токен для авторизации
 JWT_TOKEN = None
 
-# Словари для маппинга старых ID на новые
-brands_map = {}  # {old_brand_id: new_brand_id}
-categories_map = {}  # {old_category_id: new_category_id}
-brands_cache = {}  # {(name, country): brand_id} для быстрого поиска
-categories_cache = {}  # {(name, parent_id): category_id} для быстрого поиска
-characteristics_cache = {}  # {characteristic_key: characteristic_id} для быстрого поиска
-products_cache = {}  # {name: {'id': product_id, 'supplier_id': supplier_id}} для быстрого поиска товаров
-existing_brands_loaded = False  # Флаг загрузки существующих брендов
-existing_categories_loaded = False  # Флаг загрузки существующих категорий
-existing_characteristics_loaded = False  # Флаг загрузки существующих характеристик
-existing_products_loaded = False  # Флаг загрузки существующих товаров
-products_cache_lock = threading.Lock()  # Lock для синхронизации products_cache
-
-
-def get_auth_headers():
+
+def get_auth_headers(content_type='application/json'):
     """Получает заголовки авторизации с JWT токеном"""
-    headers = {'Content-Type': 'application/json'}
+    headers = {'Content-Type': content_type}
     if JWT_TOKEN:
         headers['Authorization'] = f'Bearer {JWT_TOKEN}'
     return headers
 
 
+def normalize_url(api_url, endpoint):
+    """
+    Нормализует URL, убирая /api из пути для эндпоинтов, которые не имеют префикса /api
+    """
+    # Убираем /api из базового URL, если он есть
+    base_url = api_url.replace('/api', '') if '/api' in api_url else api_url
+    # Убираем лишние слеши
+    base_url = base_url.rstrip('/')
+    endpoint = endpoint.lstrip('/')
+    return f"{base_url}/{endpoint}"
+
+
 def login(api_url, email='bocan.anton@mail.ru', password='1'):
     """Авторизация и получение JWT токена"""
     global JWT_TOKEN
-    
-    login_url = f"{api_url.replace('/api', '')}/auth/login" if '/api' in api_url else f"{api_url}/auth/login"
+
     try:
         response = requests.post(
-            login_url,
+            normalize_url(api_url, 'auth/login'),
             json={'email': email, 'password': password},
             headers={'Content-Type': 'application/json'},
             timeout=60
         )
         if response.status_code == 200:
-            data = response.json()
-            JWT_TOKEN = data.get('token')
-            print(f"✓ Успешная авторизация")
+            JWT_TOKEN = response.json().get('token')
+            print("✓ Успешная авторизация")
             return True
-        else:
-            print(f"✗ Ошибка авторизации: {response.status_code} - {response.text}")
-            return False
+        print(f"✗ Ошибка авторизации: {response.status_code} - {response.text}")
+        return False
     except Exception as e:
         print(f"✗ Ошибка при авторизации: {e}")
         return False
 
 
-def normalize_url(api_url, endpoint):
-    """
-    Нормализует URL, убирая /api из пути для эндпоинтов, которые не имеют префикса /api
-    """
-    # Убираем /api из базового URL, если он есть
-    base_url = api_url.replace('/api', '') if '/api' in api_url else api_url
-    # Убираем лишние слеши
-    base_url = base_url.rstrip('/')
-    endpoint = endpoint.lstrip('/')
-    return f"{base_url}/{endpoint}"
-
-
-def safe_slugify(text):
-    """Создание slug из текста"""
-    if not text:
-        return ''
-    
-    # Нормализуем Unicode символы
-    text = unicodedata.normalize('NFKD', str(text))
-    
-    # Заменяем русские символы на латинские аналоги
-    russian_to_latin = {
-        'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
-        'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
-        'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
-        'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
-        'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
-        'А': 'A', 'Б': 'B', 'В': 'V', 'Г': 'G', 'Д': 'D', 'Е': 'E', 'Ё': 'E',
-        'Ж': 'Zh', 'З': 'Z', 'И': 'I', 'Й': 'Y', 'К': 'K', 'Л': 'L', 'М': 'M',
-        'Н': 'N', 'О': 'O', 'П': 'P', 'Р': 'R', 'С': 'S', 'Т': 'T', 'У': 'U',
-        'Ф': 'F', 'Х': 'H', 'Ц': 'Ts', 'Ч': 'Ch', 'Ш': 'Sh', 'Щ': 'Sch',
-        'Ъ': '', 'Ы': 'Y', 'Ь': '', 'Э': 'E', 'Ю': 'Yu', 'Я': 'Ya'
-    }
-    
-    for russian, latin in russian_to_latin.items():
-        text = text.replace(russian, latin)
-    
-    # Удаляем все символы кроме букв, цифр и пробелов
-    text = re.sub(r'[^\w\s-]', '', text)
-    
-    # Заменяем пробелы на дефисы
-    text = re.sub(r'[-\s]+', '-', text)
-    
-    # Удаляем начальные и конечные дефисы
-    text = text.strip('-')
-    
-    return text.lower()
-
-
 def check_db_structure(conn):
     """Проверяет структуру базы данных и возвращает список таблиц и их колонок"""
     cursor = conn.cursor()
-    
-    # Получаем список таблиц
+
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
     tables = [row[0] for row in cursor.fetchall()]
-    
+
     print(f"Найдено таблиц: {len(tables)}")
     print(f"Таблицы: {', '.join(tables)}")
-    
+
     structure = {}
     for table in tables:
         cursor.execute(f"PRAGMA table_info({table})")
         columns = [col[1] for col in cursor.fetchall()]
         structure[table] = columns
         print(f"\nТаблица '{table}' колонки: {', '.join(columns)}")
-    
+
     return structure
 
 
-def load_existing_characteristics(api_url):
-    """Загружает все существующие характеристики в кеш"""
-    global existing_characteristics_loaded, characteristics_cache
-    
-    if existing_characteristics_loaded:
-        return
-    
-    characteristics_url = normalize_url(api_url, 'characteristics-list')
-    print(f"  Загрузка существующих характеристик с {characteristics_url}...")
-    try:
-        response = requests.get(characteristics_url, headers=get_auth_headers(), timeout=60)
-        if response.status_code == 200:
-            result = response.json()
-            if result.get('success') and result.get('data'):
-                for char in result['data']:
-                    key = char.get('characteristic_key', '')
-                    if key:
-                        characteristics_cache[key] = char['id']
-                existing_characteristics_loaded = True
-                print(f"  ✓ Загружено {len(characteristics_cache)} существующих характеристик в кеш")
-            else:
-                print(f"  ⚠ Неожиданный формат ответа")
-        else:
-            print(f"  ⚠ Ошибка загрузки характеристик: {response.status_code}")
-    except requests.exceptions.Timeout:
-        print(f"  ⚠ Таймаут при загрузке характеристик (сервер может быть в режиме сна)")
-    except Exception as e:
-        print(f"  ✗ Ошибка при загрузке существующих характеристик: {e}")
-
-
-def create_characteristic(key, api_url=None):
-    """Создает характеристику через API с проверкой на дубликаты"""
-    if api_url is None:
-        api_url = globals().get('API_BASE_URL', 'https://pospro-new-server.onrender.com/api')
-    
-    # Загружаем существующие характеристики при первом вызове
-    load_existing_characteristics(api_url)
-    
-    # Проверяем кеш
-    if key in characteristics_cache:
-        existing_id = characteristics_cache[key]
-        print(f"  ✓ Характеристика '{key}' уже существует (ID: {existing_id}), пропускаем")
-        return existing_id
-    
-    # Создаем новую характеристику
-    characteristics_url = normalize_url(api_url, 'characteristics-list')
-    try:
-        data = {
-            'characteristic_key': key.strip()
-        }
-        response = requests.post(
-            characteristics_url,
-            json=data,
-            headers=get_auth_headers(),
-            timeout=60
-        )
-        
-        if response.status_code == 201:
-            result = response.json()
-            if result.get('success') and result.get('data'):
-                char_id = result['data'].get('id')
-                characteristics_cache[key] = char_id
-                print(f"✓ Создана характеристика: {key} (ID: {char_id})")
-                return char_id
-        elif response.status_code == 400:
-            # Может быть дубликат
-            result = response.json()
-            if 'уже существует' in result.get('message', '').lower() or 'already exists' in result.get('message', '').lower():
-                print(f"  ✓ Характеристика '{key}' уже существует, пропускаем")
-                # Попробуем загрузить снова и найти
-                load_existing_characteristics(api_url)
-                if key in characteristics_cache:
-                    return characteristics_cache[key]
-        print(f"✗ Ошибка создания характеристики {key}: {response.status_code} - {response.text}")
-        return None
-    except Exception as e:
-        print(f"✗ Ошибка при создании характеристики {key}: {e}")
-        return None
+def find_tables(structure):
+    """Имена таблиц брендов, категорий, характеристик и товаров в старой БД."""
+    tables = {'brands': None, 'categories': None, 'properties': None, 'products': None}
+    for table in structure:
+        table_lower = table.lower()
+        if 'brand' in table_lower:
+            tables['brands'] = table
+        elif 'categor' in table_lower:
+            tables['categories'] = table
+        elif 'product_propert' in table_lower or 'property' in table_lower:
+            tables['properties'] = table
+    for table in structure:
+        table_lower = table.lower()
+        if 'product' in table_lower and 'property' not in table_lower:
+            tables['products'] = table
+            break
+    return tables
+
+
+def read_rows(conn, structure, table):
+    """Все строки таблицы списком словарей."""
+    if not table:
+        return []
+    columns = structure[table]
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT * FROM {table}")
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
 
-def load_existing_brands(api_url):
-    """Загружает все существующие бренды в кеш"""
-    global existing_brands_loaded, brands_cache
-    
-    if existing_brands_loaded:
-        return
-    
-    brands_url = normalize_url(api_url, 'meta/brands')
-    print(f"  Загрузка существующих брендов с {brands_url}...")
-    try:
-        # Увеличиваем таймаут для Render (может "просыпаться" до 30 секунд)
-        response = requests.get(brands_url, timeout=60)
-        if response.status_code == 200:
-            existing_brands = response.json()
-            for brand in existing_brands:
-                cache_key = (brand.get('name', ''), brand.get('country', ''))
-                brands_cache[cache_key] = brand['id']
-            existing_brands_loaded = True
-            print(f"  ✓ Загружено {len(brands_cache)} существующих брендов в кеш")
-        else:
-            print(f"  ⚠ Ошибка загрузки брендов: {response.status_code}")
-    except requests.exceptions.Timeout:
-        print(f"  ⚠ Таймаут при загрузке брендов (сервер может быть в режиме сна)")
-        print(f"     Попробуйте подождать несколько секунд и запустить снова")
-    except Exception as e:
-        print(f"  ✗ Ошибка при загрузке существующих брендов: {e}")
-
-
-def create_brand(name, country='', api_url=None):
-    """Создает бренд через API с проверкой на дубликаты"""
-    if api_url is None:
-        api_url = globals().get('API_BASE_URL', 'https://pospro-new-server.onrender.com/api')
-    
-    # Загружаем существующие бренды при первом вызове
-    load_existing_brands(api_url)
-    
-    # Проверяем кеш
-    cache_key = (name, country)
-    if cache_key in brands_cache:
-        existing_id = brands_cache[cache_key]
-        print(f"  ✓ Бренд '{name}' ({country}) уже существует (ID: {existing_id}), пропускаем")
-        return existing_id
-    
-    # Создаем новый бренд
-    brands_url = normalize_url(api_url, 'meta/brands')
-    try:
-        data = {
-            'name': name,
-            'country': country or '',
-            'description': '',
-            'image_url': None
-        }
-        response = requests.post(
-            brands_url,
-            json=data,
-            headers={'Content-Type': 'application/json'},
-            timeout=60
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            brand_id = result.get('id')
-            brands_cache[cache_key] = brand_id
-            print(f"✓ Создан бренд: {name} (ID: {brand_id})")
-            return brand_id
-        else:
-            print(f"✗ Ошибка создания бренда {name}: {response.status_code} - {response.text}")
-            return None
-    except Exception as e:
-        print(f"✗ Ошибка при создании бренда {name}: {e}")
-        return None
+def category_paths(categories):
+    """{old_category_id: [имя корня, ..., имя категории]} по parent_id."""
+    by_id = {c.get('id'): c for c in categories}
+    paths = {}
 
+    def path_for(cat_id, seen=()):
+        if cat_id in paths:
+            return paths[cat_id]
+        cat = by_id.get(cat_id)
+        if not cat or cat_id in seen:
+            return []
+        name = (cat.get('name') or '').strip()
+        parent = cat.get('parent_id')
+        prefix = path_for(parent, seen + (cat_id,)) if parent else []
+        paths[cat_id] = prefix + [name] if name else prefix
+        return paths[cat_id]
+
+    for cat_id in by_id:
+        path_for(cat_id)
+    return paths
+
+
+def product_name(product):
+    return (product.get('name') or product.get('fullName') or '').strip()
+
+
+def build_records(products, brands, paths, properties):
+    """NDJSON-записи для /api/admin/catalog/import."""
+    brands_by_id = {}
+    for brand in brands:
+        name = (brand.get('brand') or brand.get('name') or '').strip()
+        if name:
+            brands_by_id[brand.get('id')] = {'name': name, 'country': brand.get('country') or ''}
+
+    props_by_product = {}
+    for prop in properties:
+        key = (prop.get('property_name') or '').strip()
+        if key and prop.get('product_id'):
+            props_by_product.setdefault(prop['product_id'], []).append(
+                {'key': key, 'value': '' if prop.get('property_value') is None else str(prop['property_value'])}
+            )
 
-def load_existing_categories(api_url):
-    """Загружает все существующие категории в кеш"""
-    global existing_categories_loaded, categories_cache
-    
-    if existing_categories_loaded:
+    records = []
+    for product in products:
+        name = product_name(product)
+        if not name:
+            continue
+        try:
+            quantity = int(product.get('inStock') or 0)
+        except (ValueError, TypeError):
+            quantity = 0
+        record = {
+            'ref': product.get('id'),
+            'name': name,
+            'price': float(product.get('price') or 0),
+            'quantity': quantity,
+            'supplier_id': DEFAULT_SUPPLIER_ID,
+            'description': product.get('description') or '',
+            'is_visible': True,
+        }
+        brand = brands_by_id.get(product.get('brand_id'))
+        if brand:
+            record['brand'] = brand
+        path = paths.get(product.get('category_id'))
+        if path:
+            record['category_path'] = path
+        if product.get('id') in props_by_product:
+            record['characteristics'] = props_by_product[product['id']]
+        image_url = product.get('img') or product.get('image') or product.get('image_url')
+        if image_url and str(image_url).startswith(('http://', 'https://')):
+            record['media'] = [str(image_url).strip()]
+        records.append(record)
+    return records
+
+
+def import_batch(api_url, records, update=None):
+    """Один запрос импорта. Тело отдаётся генератором — requests шлёт его chunked."""
+    params = {'chunk_size': SERVER_CHUNK_SIZE, 'media': 'fetch'}
+    if update:
+        params['update'] = update
+
+    def body():
+        for record in records:
+            yield (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+
+    response = requests.post(
+        normalize_url(api_url, 'api/admin/catalog/import'),
+        params=params,
+        data=body(),
+        headers=get_auth_headers('application/x-ndjson'),
+        timeout=600,
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.status_code} - {response.text[:300]}")
+    return response.json()['data']
+
+
+def fetch_media(api_url, product_id, urls):
+    """Скачивание картинок товара на сервер (дубликаты по хэшу сервер пропускает)."""
+    response = requests.post(
+        normalize_url(api_url, 'upload/upload_product_from_urls'),
+        json={'product_id': product_id, 'urls': urls},
+        headers=get_auth_headers(),
+        timeout=300,
+    )
+    if response.status_code != 200:
+        return 0, f"{response.status_code} - {response.text[:200]}"
+    return response.json().get('created', 0), None
+
+
+def upload_category_images(api_url, categories, paths):
+    """Изображения категорий — только тем, у кого их ещё нет."""
+    with_images = [c for c in categories if c.get('img') or c.get('image') or c.get('image_url')]
+    if not with_images:
         return
-    
-    categories_url = normalize_url(api_url, 'categories/')
-    print(f"  Загрузка существующих категорий с {categories_url}...")
-    try:
-        # Увеличиваем таймаут для Render (может "просыпаться" до 30 секунд)
-        response = requests.get(categories_url, timeout=60)
-        if response.status_code == 200:
-            existing_categories = response.json()
-            for category in existing_categories:
-                cache_key = (category.get('name', ''), category.get('parent_id'))
-                categories_cache[cache_key] = category['id']
-            existing_categories_loaded = True
-            print(f"  ✓ Загружено {len(categories_cache)} существующих категорий в кеш")
-        else:
-            print(f"  ⚠ Ошибка загрузки категорий: {response.status_code}")
-    except requests.exceptions.Timeout:
-        print(f"  ⚠ Таймаут при загрузке категорий (сервер может быть в режиме сна)")
-        print(f"     Попробуйте подождать несколько секунд и запустить снова")
-    except Exception as e:
-        print(f"  ✗ Ошибка при загрузке существующих категорий: {e}")
+    response = requests.get(normalize_url(api_url, 'categories/'), headers=get_auth_headers(), timeout=60)
+    if response.status_code != 200:
+        print(f"  ⚠ Не удалось загрузить категории: {response.status_code}")
+        return
+    server = response.json()
+    children = {}
+    for cat in server:
+        children.setdefault(cat.get('parent_id'), {})[(cat.get('name') or '').strip().lower()] = cat
+
+    for old in with_images:
+        parent_id, cat = None, None
+        for name in paths.get(old.get('id')) or []:
+            cat = children.get(parent_id, {}).get(name.lower())
+            if cat is None:
+                break
+            parent_id = cat['id']
+        if cat is None:
+            print(f"  ⚠ Категория '{old.get('name')}' не найдена на сервере, изображение пропущено")
+            continue
+        if (cat.get('image_url') or '').strip():
+            continue
+        image_url = str(old.get('img') or old.get('image') or old.get('image_url')).strip()
+        if not image_url.startswith(('http://', 'https://')):
+            continue
+        try:
+            img = requests.get(image_url, timeout=30)
+            if img.status_code != 200:
+                print(f"  ⚠ Не удалось скачать {image_url}: {img.status_code}")
+                continue
+            filename = os.path.basename(image_url.split('?', 1)[0]) or 'image.jpg'
+            upload = requests.post(
+                normalize_url(api_url, f"upload/category/{cat['id']}"),
+                files={'file': (filename, img.content, img.headers.get('Content-Type', 'image/jpeg'))},
+                headers={'Authorization': f'Bearer {JWT_TOKEN}'} if JWT_TOKEN else {},
+                timeout=60,
+            )
+            if upload.status_code == 200:
+                print(f"  ✓ Изображение категории {cat['id']} загружено")
+            else:
+                print(f"  ⚠ Ошибка загрузки изображения категории {cat['id']}: {upload.status_code}")
+        except Exception as e:
+            print(f"  ⚠ Ошибка при загрузке изображения категории {cat['id']}: {e}")
 
 
-def get_category_info(category_id, api_url):
-    """Получает информацию о категории через API"""
-    try:
-        category_url = normalize_url(api_url, f'categories/{category_id}')
+def load_supplier_products(api_url):
+    """{lower(name): name} товаров поставщика DEFAULT_SUPPLIER_ID на сервере."""
+    names = {}
+    page = 1
+    while True:
         response = requests.get(
-            category_url,
+            normalize_url(api_url, 'products/'),
+            params={'per_page': 200, 'page': page},
             headers=get_auth_headers(),
-            timeout=60
+            timeout=120,
         )
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
+        if response.status_code != 200:
+            print(f"  ⚠ Ошибка загрузки товаров: {response.status_code}")
             return None
-    except Exception as e:
-        print(f"  ⚠ Ошибка при получении информации о категории {category_id}: {e}")
-        return None
-
-
-def upload_category_image_from_url(category_id, image_url, api_url):
-    """Загружает изображение категории по URL, если у категории еще нет изображения"""
-    if not image_url or not category_id:
-        return False
-    
-    # Проверяем есть ли уже изображение у категории
-    category_info = get_category_info(category_id, api_url)
-    if category_info:
-        existing_image_url = category_info.get('image_url')
-        if existing_image_url and existing_image_url.strip():
-            # У категории уже есть изображение
-            print(f"  ℹ У категории {category_id} уже есть изображение: {existing_image_url}, пропускаем загрузку")
-            return True
-    
-    # Проверяем тип URL изображения
-    image_url = str(image_url).strip()
-    
-    # Если это локальное изображение (уже на сервере), просто пропускаем
-    if image_url.startswith('/uploads/categories/'):
-        print(f"  ℹ Локальное изображение категории, пропускаем: {image_url}")
-        return True
-    
-    # Если это внешнее изображение - скачиваем и загружаем
-    if not (image_url.startswith('http://') or image_url.startswith('https://')):
-        print(f"  ⚠ Неизвестный формат URL изображения категории: {image_url}")
-        return False
-    
-    try:
-        print(f"  🔄 Скачивание и загрузка изображения категории: {image_url}")
-        # Скачиваем изображение
-        img_response = requests.get(image_url, timeout=30, stream=True)
-        if img_response.status_code != 200:
-            print(f"  ⚠ Не удалось скачать изображение {image_url}: {img_response.status_code}")
-            return False
-        
-        # Определяем имя файла
-        parsed_url = urlparse(image_url)
-        filename = os.path.basename(parsed_url.path) or 'image.jpg'
-        
-        # Загружаем на сервер
-        upload_url = normalize_url(api_url, f'upload/category/{category_id}')
-        files = {'file': (filename, img_response.content, img_response.headers.get('Content-Type', 'image/jpeg'))}
-        
-        response = requests.post(
-            upload_url,
-            files=files,
-            headers={'Authorization': f'Bearer {JWT_TOKEN}'} if JWT_TOKEN else {},
-            timeout=60
-        )
-        
-        if response.status_code == 200:
-            print(f"  ✓ Загружено изображение для категории {category_id}")
-            return True
+        data = response.json()
+        if isinstance(data, list):
+            items, has_more = data, len(data) == 200
         else:
-            print(f"  ⚠ Ошибка загрузки изображения: {response.status_code} - {response.text}")
-            return False
-    except Exception as e:
-        print(f"  ⚠ Ошибка при загрузке изображения категории: {e}")
-        return False
-
-
-def create_category(name, parent_id=None, image_url=None, api_url=None):
-    """Создает категорию через API с проверкой на дубликаты и установкой изображения"""
-    if not name:
-        return None
-    
-    if api_url is None:
-        api_url = globals().get('API_BASE_URL', 'https://pospro-new-server.onrender.com/api')
-    
-    # Загружаем существующие категории при первом вызове
-    load_existing_categories(api_url)
-    
-    # Проверяем кеш
-    cache_key = (name, parent_id)
-    if cache_key in categories_cache:
-        existing_id = categories_cache[cache_key]
-        print(f"  ✓ Категория '{name}' уже существует (ID: {existing_id})")
-        # Если есть изображение, проверяем и загружаем только если его еще нет
-        if image_url:
-            upload_category_image_from_url(existing_id, image_url, api_url)
-        return existing_id
-    
-    # Генерируем slug
-    slug = safe_slugify(name)
-    if not slug:
-        slug = f"category-{int(time.time())}"
-    
-    try:
-        # Создаем категорию через multipart/form-data
-        data = {
-            'name': name,
-            'slug': slug,
-            'description': '',
-            'parent_id': str(parent_id) if parent_id else ''
-        }
-        categories_url = normalize_url(api_url, 'categories/with-image')
-        response = requests.post(
-            categories_url,
-            data=data,
-            timeout=60
-        )
-        
-        if response.status_code == 201:
-            result = response.json()
-            category_id = result.get('id')
-            categories_cache[cache_key] = category_id
-            print(f"✓ Создана категория: {name} (ID: {category_id})")
-            
-            # Загружаем изображение, если есть
-            if image_url:
-                upload_category_image_from_url(category_id, image_url, api_url)
-            
-            return category_id
-        else:
-            print(f"✗ Ошибка создания категории {name}: {response.status_code} - {response.text}")
-            return None
-    except Exception as e:
-        print(f"✗ Ошибка при создании категории {name}: {e}")
-        return None
-
-
-def load_existing_products(api_url):
-    """Загружает все существующие товары в кеш порционно (по имени для проверки дубликатов)"""
-    global existing_products_loaded, products_cache
-    
-    # Двойная проверка с синхронизацией (double-checked locking pattern)
-    if existing_products_loaded:
-        return
-    
-    # Используем lock для синхронизации между потоками
-    with products_cache_lock:
-        # Проверяем еще раз внутри lock (на случай если другой поток уже начал загрузку)
-        if existing_products_loaded:
-            return
-        
-        # Устанавливаем флаг сразу, чтобы другие потоки ждали завершения загрузки
-        # Это предотвращает параллельную загрузку из нескольких потоков
-        existing_products_loaded = True
-        
-        # Инициализируем кеш только при первой загрузке
-        products_cache = {}  # {name: {'id': product_id, 'supplier_id': supplier_id}} для быстрого поиска
-    
-    products_url = normalize_url(api_url, 'products/')
-    print(f"  Загрузка существующих товаров с {products_url} (порционно, только supplier_id={DEFAULT_SUPPLIER_ID})...")
-    
-    per_page = 200  # Максимальное количество товаров за запрос
-    page = 1
-    total_loaded = 0
-    
-    try:
-        while True:
-            params = {
-                'per_page': per_page,
-                'page': page
-            }
-            
-            response = requests.get(
-                products_url, 
-                params=params,
-                headers=get_auth_headers(),
-                timeout=120
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Проверяем формат ответа
-                if isinstance(data, list):
-                    # Без пагинации - возвращается список
-                    existing_products = data
-                    has_more = len(existing_products) == per_page
-                elif isinstance(data, dict) and 'products' in data:
-                    # С пагинацией - возвращается объект с полем products
-                    existing_products = data.get('products', [])
-                    total_pages = data.get('total_pages', 1)
-                    has_more = page < total_pages
-                else:
-                    print(f"  ⚠ Неожиданный формат ответа API")
-                    break
-                
-                # Добавляем товары в кеш (с синхронизацией) - только с supplier_id = 2
-                with products_cache_lock:
-                    for product in existing_products:
-                        supplier_id = product.get('supplier_id')
-                        # Загружаем только товары с поставщиком 2 (проверяем на None и на значение)
-                        if supplier_id is not None and supplier_id == DEFAULT_SUPPLIER_ID:
-                            name = product.get('name', '').strip()
-                            if name:
-                                products_cache[name] = {
-                                    'id': product['id'],
-                                    'supplier_id': supplier_id
-                                }
-                
-                loaded_count = len(existing_products)
-                total_loaded += loaded_count
-                
-                print(f"  Загружено страница {page}: {loaded_count} товаров (всего в кеше: {len(products_cache)})")
-                
-                # Если товаров меньше чем per_page, значит это последняя страница
-                if not has_more or loaded_count < per_page:
-                    break
-                
-                page += 1
-                time.sleep(0.2)  # Небольшая задержка между запросами
-            else:
-                print(f"  ⚠ Ошибка загрузки товаров: {response.status_code}")
-                break
-                
-        # Флаг уже установлен в начале функции
-        print(f"  ✓ Загружено {total_loaded} товаров с сервера, из них {len(products_cache)} с supplier_id={DEFAULT_SUPPLIER_ID} добавлено в кеш")
-        
-    except requests.exceptions.Timeout:
-        print(f"  ⚠ Таймаут при загрузке товаров (сервер может быть в режиме сна)")
-    except Exception as e:
-        print(f"  ✗ Ошибка при загрузке существующих товаров: {e}")
-        import traceback
-        traceback.print_exc()
+            items, has_more = data.get('products', []), page < data.get('total_pages', 1)
+        for product in items:
+            if product.get('supplier_id') == DEFAULT_SUPPLIER_ID and (product.get('name') or '').strip():
+                names[product['name'].strip().lower()] = product['name'].strip()
+        if not has_more or not items:
+            return names
+        page += 1
 
 
-def deactivate_missing_products(local_product_names, api_url):
+def deactivate_missing_products(api_url, local_names, batch_size):
     """
-    Деактивирует товары на сервере, которых нет в локальной базе.
-    Устанавливает is_visible=False и quantity=0 для таких товаров.
-    
-    Args:
-        local_product_names: множество нормализованных имен товаров из локальной базы (lowercase, stripped)
-        api_url: URL API сервера
+    Товары поставщика, которых нет в products.db: is_visible=False,
+    quantity=0 — тем же пакетным импортом (сопоставление по имени и
+    поставщику).
     """
-    if not local_product_names:
-        print("  ⚠ Список локальных товаров пуст, пропускаем деактивацию")
-        return
-    
     print("\n" + "="*60)
     print(f"ДЕАКТИВАЦИЯ ОТСУТСТВУЮЩИХ ТОВАРОВ (только supplier_id={DEFAULT_SUPPLIER_ID})")
     print("="*60)
-    
-    # Убеждаемся, что кеш товаров загружен
-    if not existing_products_loaded:
-        load_existing_products(api_url)
-    
-    # Находим товары на сервере, которых нет в локальной базе (только с supplier_id = 2)
-    products_to_deactivate = []
-    
-    with products_cache_lock:
-        for server_name, product_info in products_cache.items():
-            # Проверяем, что товар с поставщиком 2
-            if product_info.get('supplier_id') == DEFAULT_SUPPLIER_ID:
-                # Нормализуем имя для сравнения (lowercase, strip)
-                normalized_name = server_name.strip().lower()
-                if normalized_name not in local_product_names:
-                    products_to_deactivate.append((product_info['id'], server_name))
-    
-    if not products_to_deactivate:
-        print(f"  ✓ Все товары с supplier_id={DEFAULT_SUPPLIER_ID} на сервере присутствуют в локальной базе, деактивация не требуется")
-        return
-    
-    print(f"  Найдено товаров с supplier_id={DEFAULT_SUPPLIER_ID} для деактивации: {len(products_to_deactivate)}")
-    print(f"  Начинаем деактивацию...")
-    
-    deactivated_count = 0
-    error_count = 0
-    
-    for product_id, product_name in products_to_deactivate:
-        try:
-            products_url = normalize_url(api_url, f'products/{product_id}')
-            update_data = {
-                'is_visible': False,
-                'quantity': 0
-            }
-            
-            response = requests.put(
-                products_url,
-                json=update_data,
-                headers=get_auth_headers(),
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                deactivated_count += 1
-                if deactivated_count % 50 == 0:
-                    print(f"    Обработано: {deactivated_count}/{len(products_to_deactivate)}")
-            else:
-                error_count += 1
-                print(f"    ⚠ Ошибка деактивации товара '{product_name}' (ID: {product_id}): {response.status_code} - {response.text[:200]}")
-            
-            time.sleep(0.05)  # Небольшая задержка между запросами
-            
-        except Exception as e:
-            error_count += 1
-            print(f"    ✗ Ошибка при деактивации товара '{product_name}' (ID: {product_id}): {e}")
-    
-    print(f"\n  ✓ Деактивация завершена:")
-    print(f"    - Деактивировано: {deactivated_count}")
-    print(f"    - Ошибок: {error_count}")
-
 
-def is_external_url(url):
-    """Проверяет, является ли URL внешним (начинается с http:// или https://)"""
-    if not url or not isinstance(url, str):
-        return False
-    url = url.strip()
-    return url.startswith('http://') or url.startswith('https://')
-
-
-def is_local_url(url):
-    """Проверяет, является ли URL локальным (начинается с /uploads/products/)"""
-    if not url or not isinstance(url, str):
-        return False
-    url = url.strip()
-    return url.startswith('/uploads/products/')
-
-
-def sanitize_filename(filename):
-    """Очищает имя файла от опасных символов"""
-    if not filename:
-        return 'image.jpg'
-    
-    # Получаем имя файла из URL
-    parsed = urlparse(filename)
-    filename = os.path.basename(parsed.path) or 'image.jpg'
-    
-    # Убираем query параметры если есть
-    if '?' in filename:
-        filename = filename.split('?')[0]
-    if '#' in filename:
-        filename = filename.split('#')[0]
-    
-    # Заменяем пробелы на подчеркивания
-    filename = filename.replace(' ', '_')
-    
-    # Убираем опасные символы, но оставляем кириллицу и латиницу
-    filename = re.sub(r'[<>:"/\\|?*]', '', filename)
-    
-    # Если имя файла пустое или нет расширения, добавляем .jpg
-    if not filename or '.' not in filename:
-        # Генерируем уникальное имя на основе timestamp
-        timestamp = int(time.time() * 1000) % 1000000
-        filename = f'image_{timestamp}.jpg'
-    else:
-        # Проверяем расширение - должно быть изображение
-        ext = filename.lower().split('.')[-1]
-        allowed_extensions = ['jpg', 'jpeg', 'png', 'gif', 'webp']
-        if ext not in allowed_extensions:
-            # Если расширение не подходит, заменяем на .jpg
-            base_name = filename.rsplit('.', 1)[0] if '.' in filename else filename
-            # Очищаем базовое имя от опасных символов еще раз
-            base_name = re.sub(r'[<>:"/\\|?*]', '', base_name)
-            if not base_name:
-                base_name = 'image'
-            filename = f'{base_name}.jpg'
-    
-    return filename
-
-
-def is_valid_image(content):
-    """Проверяет что содержимое является валидным изображением по сигнатуре"""
-    if not content or len(content) < 4:
-        return False
-    
-    # Проверяем сигнатуры популярных форматов изображений
-    signatures = {
-        b'\xFF\xD8\xFF': 'jpg',  # JPEG
-        b'\x89\x50\x4E\x47': 'png',  # PNG
-        b'GIF87a': 'gif',  # GIF87a
-        b'GIF89a': 'gif',  # GIF89a
-        b'RIFF': 'webp',  # WebP (нужна дополнительная проверка)
-    }
-    
-    # Проверяем первые байты
-    for sig, fmt in signatures.items():
-        if content.startswith(sig):
-            return True
-    
-    # Для WebP проверяем что после RIFF идет WEBP
-    if content.startswith(b'RIFF') and b'WEBP' in content[:12]:
-        return True
-    
-    return False
-
-
-def download_image(image_url):
-    """Скачивает изображение по URL и возвращает содержимое и имя файла"""
-    try:
-        print(f"    Скачивание изображения: {image_url}")
-        response = requests.get(image_url, timeout=30, stream=True)
-        
-        if response.status_code != 200:
-            print(f"    ⚠ Не удалось скачать изображение: {response.status_code}")
-            return None, None
-        
-        # Читаем содержимое
-        content = response.content
-        
-        # Проверяем размер (максимум 20MB)
-        if len(content) > 20 * 1024 * 1024:
-            print(f"    ⚠ Изображение слишком большое: {len(content)} bytes")
-            return None, None
-        
-        # Проверяем что это действительно изображение
-        if not is_valid_image(content):
-            print(f"    ⚠ Скачанный файл не является валидным изображением")
-            return None, None
-        
-        # Определяем имя файла
-        content_disposition = response.headers.get('Content-Disposition', '')
-        if 'filename=' in content_disposition:
-            filename = content_disposition.split('filename=')[1].strip('"\'')
-        else:
-            filename = sanitize_filename(image_url)
-        
-        print(f"    ✓ Изображение скачано: {len(content)} bytes, имя: {filename}")
-        return content, filename
-        
-    except requests.exceptions.Timeout:
-        print(f"    ⚠ Таймаут при скачивании изображения")
-        return None, None
-    except Exception as e:
-        print(f"    ⚠ Ошибка при скачивании изображения: {e}")
-        return None, None
-
-
-def get_content_type_from_filename(filename):
-    """Определяет Content-Type на основе расширения файла"""
-    ext = filename.lower().split('.')[-1] if '.' in filename else ''
-    content_types = {
-        'jpg': 'image/jpeg',
-        'jpeg': 'image/jpeg',
-        'png': 'image/png',
-        'gif': 'image/gif',
-        'webp': 'image/webp'
-    }
-    return content_types.get(ext, 'image/jpeg')
-
-
-def upload_product_image_file(product_id, image_content, filename, api_url):
-    """Загружает изображение товара на сервер через API как файл"""
-    try:
-        upload_url = normalize_url(api_url, 'upload/upload_product')
-        
-        # Определяем Content-Type на основе расширения
-        content_type = get_content_type_from_filename(filename)
-        
-        # Подготавливаем multipart/form-data
-        files = {
-            'file': (filename, image_content, content_type)
-        }
-        data = {
-            'product_id': str(product_id)
-        }
-        
-        headers = {}
-        if JWT_TOKEN:
-            headers['Authorization'] = f'Bearer {JWT_TOKEN}'
-        
-        response = requests.post(
-            upload_url,
-            files=files,
-            data=data,
-            headers=headers,
-            timeout=120  # Увеличенный таймаут для больших файлов
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            new_url = result.get('url')
-            media_id = result.get('id')
-            print(f"  ✓ Изображение загружено на сервер: {new_url}")
-            return True
-        else:
-            print(f"  ✗ Ошибка загрузки изображения: {response.status_code} - {response.text}")
-            return False
-            
-    except Exception as e:
-        print(f"  ✗ Ошибка при загрузке изображения: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
+    server = load_supplier_products(api_url)
+    if server is None:
+        return
+    missing = [name for key, name in server.items() if key not in local_names]
+    if not missing:
+        print(f"  ✓ Все товары с supplier_id={DEFAULT_SUPPLIER_ID} на сервере присутствуют в локальной базе")
+        return
 
+    print(f"  Найдено товаров для деактивации: {len(missing)}")
+    deactivated = errors = 0
+    for start in range(0, len(missing), batch_size):
+        records = [
+            {'name': name, 'supplier_id': DEFAULT_SUPPLIER_ID, 'is_visible': False, 'quantity': 0}
+            for name in missing[start:start + batch_size]
+        ]
+        report = import_batch(api_url, records, update='is_visible,quantity')
+        deactivated += report['summary'].get('updated', 0)
+        errors += report['summary'].get('error', 0)
+    print(f"  ✓ Деактивировано: {deactivated}, ошибок: {errors}")
 
-def get_product_media(product_id, api_url):
-    """Получает все медиафайлы товара через API"""
-    try:
-        media_url = normalize_url(api_url, f'upload/media/{product_id}')
-        
-        response = requests.get(
-            media_url,
-            headers=get_auth_headers(),
-            timeout=60
-        )
-        
-        if response.status_code == 200:
-            media_list = response.json()
-            if isinstance(media_list, list):
-                return media_list
-            else:
-                return []
-        else:
-            return []
-            
-    except Exception as e:
-        print(f"  ⚠ Ошибка при получении медиа товара {product_id}: {e}")
-        return []
 
+def migrate_data(api_base_url=None, db_path=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Основная функция миграции
 
-def get_product_characteristics(product_id, api_url):
-    """Получает все характеристики товара через API"""
-    try:
-        characteristics_url = normalize_url(api_url, f'characteristics/{product_id}')
-        
-        response = requests.get(
-            characteristics_url,
-            headers=get_auth_headers(),
-            timeout=60
-        )
-        
-        if response.status_code == 200:
-            characteristics_list = response.json()
-            if isinstance(characteristics_list, list):
-                # Возвращаем множество ID характеристик для быстрой проверки
-                return {char.get('characteristic_id') for char in characteristics_list if char.get('characteristic_id')}
-            else:
-                return set()
-        else:
-            return set()
-            
-    except Exception as e:
-        print(f"  ⚠ Ошибка при получении характеристик товара {product_id}: {e}")
-        return set()
-
+    Args:
+        api_base_url: URL API сервера
+        db_path: Путь к файлу products.db
+        batch_size: Сколько товаров отправлять в одном запросе импорта
+    """
+    api_url = api_base_url or API_BASE_URL
+    db_path_local = db_path or OLD_DB_PATH
 
-def add_product_image(product_id, image_url, api_url):
-    """Добавляет изображение товара по URL. Если URL внешний - скачивает и загружает на сервер.
-    Примечание: проверка на наличие локального изображения уже выполнена в основном цикле миграции."""
-    if not image_url or not product_id:
-        return False
-    
-    image_url = str(image_url).strip()
-    
-    # Проверяем тип URL
-    if is_local_url(image_url):
-        # Локальное изображение - просто добавляем URL в БД
-        print(f"  ℹ Локальное изображение, добавляем URL: {image_url}")
-        try:
-            upload_url = normalize_url(api_url, f'upload/media/{product_id}')
-            data = {
-                'url': image_url,
-                'media_type': 'image'
-            }
-            response = requests.post(
-                upload_url,
-                json=data,
-                headers=get_auth_headers(),
-                timeout=60
-            )
-            
-            if response.status_code == 201:
-                print(f"  ✓ Добавлено локальное изображение для товара {product_id}")
-                return True
-            elif response.status_code == 409 or "already exists" in response.text.lower():
-                print(f"  ℹ Локальное изображение {image_url} уже существует для товара {product_id}")
-                return True
-            else:
-                print(f"  ⚠ Ошибка добавления локального изображения: {response.status_code} - {response.text}")
-                return False
-        except Exception as e:
-            print(f"  ⚠ Ошибка при добавлении локального изображения: {e}")
-            return False
-    
-    elif is_external_url(image_url):
-        # Внешнее изображение - скачиваем и загружаем на сервер
-        # (В старой БД всегда будут внешние URL)
-        print(f"  🔄 Внешнее изображение, скачиваем и загружаем: {image_url}")
-        
-        # Скачиваем изображение
-        image_content, filename = download_image(image_url)
-        
-        if not image_content or not filename:
-            print(f"  ✗ Не удалось скачать изображение")
-            return False
-        
-        # Загружаем на сервер
-        success = upload_product_image_file(product_id, image_content, filename, api_url)
-        return success
-    
-    else:
-        # Неизвестный формат URL
-        print(f"  ⚠ Неизвестный формат URL изображения: {image_url}")
-        return False
+    if not os.path.exists(db_path_local):
+        print(f"✗ Файл базы данных не найден: {db_path_local}")
+        return
 
+    print("\n" + "="*60)
+    print("АВТОРИЗАЦИЯ")
+    print("="*60)
+    if not login(api_url):
+        print("✗ Не удалось авторизоваться. Миграция прервана.")
+        return
 
-def add_product_characteristic(product_id, characteristic_id, value, api_url):
-    """Добавляет характеристику товару"""
-    if not product_id or not characteristic_id:
-        return False
-    
-    try:
-        characteristics_url = normalize_url(api_url, f'characteristics/{product_id}')
-        data = {
-            'characteristic_id': characteristic_id,
-            'value': str(value) if value else ''
-        }
-        response = requests.post(
-            characteristics_url,
-            json=data,
-            headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {JWT_TOKEN}'} if JWT_TOKEN else {'Content-Type': 'application/json'},
-            timeout=60
-        )
-        
-        if response.status_code == 201:
-            return True
-        elif response.status_code == 400 or response.status_code == 409:
-            # Характеристика уже существует или другая ошибка валидации
-            # Не выводим предупреждение, так как это нормальная ситуация при повторной миграции
-            return False
-        else:
-            # Другие ошибки - выводим предупреждение
-            print(f"  ⚠ Ошибка добавления характеристики: {response.status_code} - {response.text[:200]}")
-            return False
-    except Exception as e:
-        print(f"  ⚠ Ошибка при добавлении характеристики товара: {e}")
-        return False
+    print(f"Подключение к базе данных: {db_path_local}")
+    conn = sqlite3.connect(db_path_local)
+    print("\n" + "="*60)
+    print("ПРОВЕРКА СТРУКТУРЫ БАЗЫ ДАННЫХ")
+    print("="*60)
+    structure = check_db_structure(conn)
+    tables = find_tables(structure)
+
+    categories = read_rows(conn, structure, tables['categories'])
+    brands = read_rows(conn, structure, tables['brands'])
+    properties = read_rows(conn, structure, tables['properties'])
+    products = read_rows(conn, structure, tables['products'])
+    conn.close()
+    print(f"\nКатегорий: {len(categories)}, брендов: {len(brands)}, "
+          f"характеристик товаров: {len(properties)}, товаров: {len(products)}")
+    if not tables['products']:
+        print("  ⚠ Таблица products не найдена")
+        return
 
+    paths = category_paths(categories)
+    records = build_records(products, brands, paths, properties)
+    local_names = {r['name'].lower() for r in records}
 
-def create_product(product_data, old_brand_id, old_category_id, api_url=None):
-    """Создает товар через API с проверкой на дубликаты"""
-    if api_url is None:
-        api_url = globals().get('API_BASE_URL', 'https://pospro-new-server.onrender.com/api')
-    
-    # Кеш товаров уже должен быть загружен до запуска потоков
-    # Если по какой-то причине не загружен - загружаем (fallback)
-    if not existing_products_loaded:
-        load_existing_products(api_url)
-    
-    # Получаем данные товара
-    name = product_data.get('name') or product_data.get('fullName', '').strip()
-    if not name:
-        print(f"  ⚠ Товар без имени, пропускаем")
-        return None
-    
-    # Получаем остальные данные для обновления
-    in_stock = product_data.get('inStock', 0)
-    # Обрабатываем inStock - может быть число или строка
-    try:
-        quantity = int(in_stock) if in_stock else 0
-    except (ValueError, TypeError):
-        quantity = 0
-    
-    description = product_data.get('description', '') or ''
-    price = product_data.get('price', 0) or 0
-    
-    # Проверяем на дубликат по имени (только для товаров с supplier_id = 2)
-    if name in products_cache:
-        product_info = products_cache[name]
-        # Проверяем, что это товар с поставщиком 2
-        if product_info.get('supplier_id') == DEFAULT_SUPPLIER_ID:
-            existing_id = product_info['id']
-            print(f"  ✓ Товар '{name}' уже существует (ID: {existing_id}), обновляем цену и остатки")
-        else:
-            # Товар с другим поставщиком - создаем новый
-            existing_id = None
-    else:
-        existing_id = None
-    
-    if existing_id:
-        
-        # Обновляем цену, остатки и поставщика для существующего товара
+    print("\n" + "="*60)
+    print(f"ИМПОРТ ТОВАРОВ ({len(records)} записей, по {batch_size} за запрос)")
+    print("="*60)
+    totals = {'created': 0, 'updated': 0, 'error': 0}
+    to_fetch = []
+    started = time.time()
+    for start in range(0, len(records), batch_size):
+        batch = records[start:start + batch_size]
         try:
-            update_data = {
-                'price': float(price) if price else 0,
-                'quantity': quantity,
-                'supplier_id': DEFAULT_SUPPLIER_ID
-            }
-            products_url = normalize_url(api_url, f'products/{existing_id}')
-            response = requests.put(
-                products_url,
-                json=update_data,
-                headers=get_auth_headers(),
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                print(f"  ✓ Обновлены цена, остатки и поставщик для товара '{name}' (ID: {existing_id})")
-            else:
-                print(f"  ⚠ Не удалось обновить товар '{name}': {response.status_code} - {response.text[:200]}")
+            report = import_batch(api_url, batch, update=UPDATE_EXISTING)
         except Exception as e:
-            print(f"  ⚠ Ошибка при обновлении товара '{name}': {e}")
-        
-        # Изображение будет обработано в основном цикле миграции
-        return existing_id
-    
-    # Товар не найден или с другим поставщиком - создаем новый
-    # Получаем новый brand_id по старому ID
-    new_brand_id = None
-    if old_brand_id and old_brand_id in brands_map:
-        new_brand_id = brands_map[old_brand_id]
-    
-    # Получаем новый category_id по старому ID
-    new_category_id = None
-    if old_category_id and old_category_id in categories_map:
-        new_category_id = categories_map[old_category_id]
-    
-    # Генерируем артикул на основе имени
-    import hashlib
-    name_hash = hashlib.md5(name.encode('utf-8')).hexdigest()[:8].upper()
-    timestamp = int(time.time() * 1000) % 1000000
-    article = f"MIGR-{name_hash}-{timestamp}"
-    
-    try:
-        data = {
-            'name': name,
-            'article': article,
-            'price': float(price) if price else 0,
-            'wholesale_price': 0,
-            'quantity': quantity,
-            'status': None,
-            'is_visible': True,
-            'country': '',
-            'brand_id': new_brand_id,  # Используем только brand_id
-            'description': description,
-            'category_id': new_category_id,
-            'supplier_id': DEFAULT_SUPPLIER_ID
-        }
-        products_url = normalize_url(api_url, 'products/')
-        response = requests.post(
-            products_url,
-            json=data,
-            headers=get_auth_headers(),
-            timeout=60
-        )
-        
-        if response.status_code == 201:
-            result = response.json()
-            product_id = result.get('id')
-            with products_cache_lock:
-                products_cache[name] = {
-                    'id': product_id,
-                    'supplier_id': DEFAULT_SUPPLIER_ID
-                }
-            print(f"✓ Создан товар: {name} (ID: {product_id})")
-            return product_id
-        else:
-            error_text = response.text
-            if 'UniqueViolation' in error_text or 'product_article_key' in error_text or 'duplicate key' in error_text.lower():
-                print(f"  ⚠ Товар '{name}' уже существует (ошибка уникальности), пропускаем")
-                return None
-            print(f"✗ Ошибка создания товара {name}: {response.status_code} - {error_text[:200]}")
-            return None
-    except Exception as e:
-        print(f"✗ Ошибка при создании товара {name}: {e}")
-        return None
-
-
-def add_media(product_id, image_url, api_url=None):
-    """Добавляет медиа (изображение) для товара"""
-    if not image_url:
-        return False
-    
-    # Используем переданный API URL или глобальный
-    if api_url is None:
-        api_url = globals().get('API_BASE_URL', 'https://pospro-new-server.onrender.com/api')
-    
-    try:
-        data = {
-            'url': image_url,
-            'media_type': 'image'
-        }
-        upload_url = normalize_url(api_url, f'upload/media/{product_id}')
-        response = requests.post(
-            upload_url,
-            json=data,
-            headers={'Content-Type': 'application/json'},
-            timeout=60  # Увеличенный таймаут для Render
-        )
-        
-        if response.status_code == 201:
-            print(f"  ✓ Добавлено изображение: {image_url}")
-            return True
-        else:
-            print(f"  ✗ Ошибка добавления изображения {image_url}: {response.status_code} - {response.text}")
-            return False
-    except Exception as e:
-        print(f"  ✗ Ошибка при добавлении изображения {image_url}: {e}")
-        return False
-
-
-def migrate_data(api_base_url=None, db_path=None):
-    """
-    Основная функция миграции
-    
-    Порядок выполнения:
-    1. Авторизация
-    2. Создание характеристик из справочника (из таблицы product_properties)
-    3. Создание категорий с учетом иерархии и установкой изображений
-    4. Создание брендов
-    5. Создание товаров с изображениями и характеристиками
-    
-    Args:
-        api_base_url: URL API сервера
-        db_path: Путь к файлу products.db
-    """
-    try:
-        # Используем переданные параметры или глобальные
-        api_url = api_base_url or API_BASE_URL
-        db_path_local = db_path or OLD_DB_PATH
-        
-        if not os.path.exists(db_path_local):
-            print(f"✗ Файл базы данных не найден: {db_path_local}")
-            return
-        
-        # Авторизация
-        print("\n" + "="*60)
-        print("АВТОРИЗАЦИЯ")
-        print("="*60)
-        if not login(api_url):
-            print("✗ Не удалось авторизоваться. Миграция прервана.")
-            return
-        
-        print(f"Подключение к базе данных: {db_path_local}")
-        conn = sqlite3.connect(db_path_local)
-        cursor = conn.cursor()
-        
-        # Проверяем структуру базы
-        print("\n" + "="*60)
-        print("ПРОВЕРКА СТРУКТУРЫ БАЗЫ ДАННЫХ")
-        print("="*60)
-        structure = check_db_structure(conn)
-        
-        # Определяем имена таблиц
-        brands_table = None
-        categories_table = None
-        product_properties_table = None
-        
-        for table in structure.keys():
-            table_lower = table.lower()
-            if 'brand' in table_lower:
-                brands_table = table
-            elif 'categor' in table_lower:
-                categories_table = table
-            elif 'product_propert' in table_lower or 'property' in table_lower:
-                product_properties_table = table
-        
+            print(f"  ✗ Пачка {start}-{start + len(batch)}: {e}")
+            totals['error'] += len(batch)
+            continue
+        for key in totals:
+            totals[key] += report['summary'].get(key, 0)
+        for result in report['results']:
+            if result['status'] == 'error':
+                print(f"  ✗ Товар ref={result.get('ref')} (строка {result['line']}): {result['error']}")
+            elif result.get('media_to_fetch'):
+                to_fetch.append((result['id'], result['media_to_fetch']))
+        print(f"  Обработано {min(start + batch_size, len(records))}/{len(records)} "
+              f"за {time.time() - started:.0f}с: создано {totals['created']}, "
+              f"обновлено {totals['updated']}, ошибок {totals['error']}")
+
+    if to_fetch:
         print("\n" + "="*60)
-        print("НАЧАЛО МИГРАЦИИ")
+        print(f"ЗАГРУЗКА ИЗОБРАЖЕНИЙ ({len(to_fetch)} товаров)")
         print("="*60)
-        
-        # ШАГ 1: Создание характеристик из справочника
-        print("\n[ШАГ 1] Создание характеристик из справочника...")
-        if product_properties_table:
-            properties_columns = structure[product_properties_table]
-            # Получаем уникальные имена характеристик
-            if 'property_name' in properties_columns:
-                cursor.execute(f"SELECT DISTINCT property_name FROM {product_properties_table} WHERE property_name IS NOT NULL AND property_name != ''")
-                unique_properties = [row[0] for row in cursor.fetchall()]
-                print(f"Найдено уникальных характеристик: {len(unique_properties)}")
-                
-                for prop_name in unique_properties:
-                    if prop_name and prop_name.strip():
-                        create_characteristic(prop_name.strip(), api_url)
-                        time.sleep(0.2)  # Небольшая задержка между запросами
-            else:
-                print(f"  ⚠ В таблице {product_properties_table} не найдено поле property_name")
-        else:
-            print(f"  ⚠ Таблица product_properties не найдена")
-        
-        # ШАГ 2: Создание категорий с учетом иерархии
-        print("\n[ШАГ 2] Создание категорий с учетом иерархии...")
-        if categories_table:
-            category_columns = structure[categories_table]
-            
-            # Сначала получаем все категории
-            cursor.execute(f"SELECT * FROM {categories_table} ORDER BY id")
-            all_categories = cursor.fetchall()
-            
-            print(f"Найдено категорий в старой БД: {len(all_categories)}")
-            
-            # Создаем словарь категорий по ID
-            categories_dict = {}
-            for cat_row in all_categories:
-                cat_dict = dict(zip(category_columns, cat_row))
-                old_id = cat_dict.get('id')
-                categories_dict[old_id] = cat_dict
-            
-            # Функция для рекурсивного создания категорий
-            processed_count = [0]  # Используем список для изменения в замыкании
-            
-            def create_category_recursive(old_cat_id, parent_new_id=None):
-                if old_cat_id not in categories_dict:
-                    return None
-                
-                cat_dict = categories_dict[old_cat_id]
-                name = cat_dict.get('name', '').strip()
-                if not name:
-                    return None
-                
-                # Проверяем, не обработана ли уже категория с этим old_id
-                if old_cat_id in categories_map:
-                    # Категория уже была обработана, используем сохраненный ID
-                    new_category_id = categories_map[old_cat_id]
-                    # Не выводим сообщение для уже обработанных, чтобы не засорять лог
-                else:
-                    processed_count[0] += 1
-                    # Получаем изображение
-                    image_url = cat_dict.get('img') or cat_dict.get('image') or cat_dict.get('image_url')
-                    
-                    # Создаем категорию (функция create_category сама проверяет кеш и выводит сообщения)
-                    new_category_id = create_category(name, parent_new_id, image_url, api_url)
-                    if new_category_id:
-                        categories_map[old_cat_id] = new_category_id
-                        time.sleep(0.2)
-                    else:
-                        # Если категория уже существовала в кеше, create_category вернет её ID
-                        # Но нужно сохранить маппинг для old_id
-                        cache_key = (name, parent_new_id)
-                        if cache_key in categories_cache:
-                            new_category_id = categories_cache[cache_key]
-                            categories_map[old_cat_id] = new_category_id
-                
-                # Рекурсивно создаем дочерние категории (даже если категория уже существовала)
-                if new_category_id:
-                    for child_old_id, child_dict in categories_dict.items():
-                        if child_dict.get('parent_id') == old_cat_id:
-                            create_category_recursive(child_old_id, new_category_id)
-                
-                return new_category_id
-            
-            # Создаем категории без родителя (основные)
-            root_categories_count = 0
-            for old_id, cat_dict in categories_dict.items():
-                if not cat_dict.get('parent_id'):
-                    root_categories_count += 1
-                    create_category_recursive(old_id, None)
-            
-            print(f"Обработано корневых категорий: {root_categories_count}")
-            print(f"Всего обработано категорий: {processed_count[0]}")
-            print(f"Создано/найдено категорий: {len(categories_map)}")
-        else:
-            print(f"  ⚠ Таблица categories не найдена")
-        
-        # ШАГ 3: Создание брендов
-        print("\n[ШАГ 3] Создание брендов...")
-        if brands_table:
-            brand_columns = structure[brands_table]
-            cursor.execute(f"SELECT * FROM {brands_table}")
-            brands = cursor.fetchall()
-            
-            for brand_row in brands:
-                brand_dict = dict(zip(brand_columns, brand_row))
-                name = brand_dict.get('brand') or brand_dict.get('name') or ''
-                country = brand_dict.get('country') or ''
-                
-                if name and name.strip():
-                    old_id = brand_dict.get('id')
-                    new_id = create_brand(name.strip(), country, api_url)
-                    if new_id and old_id:
-                        brands_map[old_id] = new_id
-                    time.sleep(0.2)
-        else:
-            print(f"  ⚠ Таблица brands не найдена")
-        
-        # ШАГ 4: Создание товаров (параллельная обработка в 5 потоков)
-        print("\n[ШАГ 4] Создание товаров с изображениями...")
-        products_table = None
-        local_product_names = set()  # Множество имен товаров из локальной БД для деактивации отсутствующих
-        for table in structure.keys():
-            table_lower = table.lower()
-            if 'product' in table_lower and 'property' not in table_lower:
-                products_table = table
-                break
-        
-        if products_table:
-            products_columns = structure[products_table]
-            
-            # Выгружаем все товары в список
-            print(f"Загрузка товаров из старой БД в память...")
-            cursor.execute(f"SELECT * FROM {products_table}")
-            all_products = cursor.fetchall()
-            print(f"Найдено товаров для миграции: {len(all_products)}")
-            
-            # Собираем множество имен товаров из локальной базы для последующей деактивации отсутствующих
-            for product_row in all_products:
-                product_dict = dict(zip(products_columns, product_row))
-                name = product_dict.get('name') or product_dict.get('fullName', '').strip()
-                if name:
-                    # Нормализуем имя для сравнения (lowercase, strip)
-                    local_product_names.add(name.strip().lower())
-            print(f"Собрано уникальных имен товаров из локальной БД: {len(local_product_names)}")
-            
-            # Выгружаем все характеристики товаров в словарь
-            products_properties_dict = {}
-            if product_properties_table:
-                print(f"Загрузка характеристик товаров в память...")
-                properties_columns = structure[product_properties_table]
-                cursor.execute(f"SELECT * FROM {product_properties_table}")
-                all_properties = cursor.fetchall()
-                
-                for prop_row in all_properties:
-                    prop_dict = dict(zip(properties_columns, prop_row))
-                    product_id_old = prop_dict.get('product_id')
-                    if product_id_old:
-                        if product_id_old not in products_properties_dict:
-                            products_properties_dict[product_id_old] = []
-                        products_properties_dict[product_id_old].append(prop_dict)
-                print(f"Загружено характеристик для {len(products_properties_dict)} товаров")
-            
-            # Закрываем соединение с SQLite - больше не нужно
-            conn.close()
-            print(f"Соединение с SQLite закрыто...")
-            
-            # Загружаем существующие товары ДО запуска потоков (один раз)
-            print(f"Загрузка существующих товаров с сервера...")
-            load_existing_products(api_url)
-            print(f"Загрузка завершена, запускаем параллельную обработку...")
-            
-            # Функция для обработки одного товара
-            def process_single_product(product_row, products_columns, products_properties_dict, product_properties_table, api_url):
-                """Обрабатывает один товар"""
+        created = failed = 0
+        with ThreadPoolExecutor(max_workers=MEDIA_WORKERS) as executor:
+            futures = [executor.submit(fetch_media, api_url, pid, urls) for pid, urls in to_fetch]
+            for i, future in enumerate(as_completed(futures), 1):
                 try:
-                    product_dict = dict(zip(products_columns, product_row))
-                    
-                    # Получаем старые ID
-                    old_brand_id = product_dict.get('brand_id')
-                    old_category_id = product_dict.get('category_id')
-                    old_product_id = product_dict.get('id')
-                    
-                    # Создаем товар
-                    product_id = create_product(product_dict, old_brand_id, old_category_id, api_url)
-                    
-                    if product_id:
-                        product_name = product_dict.get('name') or product_dict.get('fullName', '').strip()
-                        
-                        # Обрабатываем изображение на основе медиа с сервера
-                        image_url = product_dict.get('img') or product_dict.get('image') or product_dict.get('image_url')
-                        if image_url:
-                            # Получаем существующие медиа товара с сервера
-                            existing_media = get_product_media(product_id, api_url)
-                            
-                            # Проверяем, есть ли уже локальное изображение
-                            has_local_image = False
-                            local_image_url = None
-                            for media in existing_media:
-                                if media.get('media_type') == 'image':
-                                    url = media.get('url', '').strip()
-                                    if url.startswith('/uploads/products/'):
-                                        has_local_image = True
-                                        local_image_url = url
-                                        break
-                            
-                            # Если есть локальное изображение - пропускаем загрузку
-                            if has_local_image:
-                                print(f"  ℹ Товар '{product_name}' (ID: {product_id}) уже имеет локальное изображение: {local_image_url}, пропускаем загрузку")
-                            else:
-                                # Если нет локального изображения - загружаем из старой БД
-                                if existing_media:
-                                    external_urls = [m.get('url', '') for m in existing_media if m.get('media_type') == 'image' and m.get('url', '').startswith('http')]
-                                    if external_urls:
-                                        print(f"  🔄 Товар '{product_name}' (ID: {product_id}) имеет внешнее изображение на сервере, заменяем локальным из старой БД")
-                                    else:
-                                        print(f"  🔄 Товар '{product_name}' (ID: {product_id}) имеет изображение на сервере, но не локальное, загружаем из старой БД")
-                                else:
-                                    print(f"  🔄 Товар '{product_name}' (ID: {product_id}) не имеет изображения на сервере, загружаем из старой БД")
-                                
-                                # В старой БД всегда будет внешний URL (http)
-                                # Скачиваем и загружаем на сервер
-                                add_product_image(product_id, str(image_url), api_url)
-                                time.sleep(0.1)
-                        else:
-                            # Товар не имеет изображения в старой БД
-                            print(f"  ℹ Товар '{product_name}' (ID: {product_id}) не имеет изображения в старой БД, пропускаем")
-                        
-                        # Добавляем характеристики из словаря с проверкой на дубликаты
-                        if old_product_id and old_product_id in products_properties_dict:
-                            # Получаем существующие характеристики товара
-                            existing_characteristics = get_product_characteristics(product_id, api_url)
-                            
-                            added_count = 0
-                            skipped_count = 0
-                            
-                            for prop_dict in products_properties_dict[old_product_id]:
-                                property_name = prop_dict.get('property_name', '').strip()
-                                property_value = prop_dict.get('property_value', '')
-                                
-                                if property_name and property_name in characteristics_cache:
-                                    characteristic_id = characteristics_cache[property_name]
-                                    
-                                    # Проверяем, есть ли уже такая характеристика у товара
-                                    if characteristic_id in existing_characteristics:
-                                        skipped_count += 1
-                                        # Не выводим сообщение для каждой пропущенной характеристики, чтобы не засорять лог
-                                    else:
-                                        # Добавляем только если характеристики еще нет
-                                        if add_product_characteristic(product_id, characteristic_id, property_value, api_url):
-                                            added_count += 1
-                                    time.sleep(0.1)
-                            
-                            if added_count > 0 or skipped_count > 0:
-                                print(f"  ✓ Характеристики для товара '{product_name}' (ID: {product_id}): добавлено {added_count}, пропущено {skipped_count} (уже существуют)")
-                    
-                    return product_id
+                    n, error = future.result()
                 except Exception as e:
-                    print(f"  ✗ Ошибка обработки товара: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    return None
-            
-            # Параллельная обработка в 5 потоков
-            print(f"Запуск параллельной обработки в 5 потоков...")
-            print(f"Для остановки нажмите Ctrl+C")
-            processed_count = 0
-            total_count = len(all_products)
-            
-            try:
-                with ThreadPoolExecutor(max_workers=5) as executor:
-                    # Запускаем все задачи
-                    futures = {
-                        executor.submit(
-                            process_single_product,
-                            product_row,
-                            products_columns,
-                            products_properties_dict,
-                            product_properties_table,
-                            api_url
-                        ): product_row for product_row in all_products
-                    }
-                    
-                    # Обрабатываем результаты по мере завершения
-                    try:
-                        for future in as_completed(futures):
-                            try:
-                                result = future.result()
-                                processed_count += 1
-                                if processed_count % 100 == 0:
-                                    print(f"  Обработано товаров: {processed_count}/{total_count}")
-                            except Exception as e:
-                                print(f"  ✗ Ошибка в потоке: {e}")
-                                processed_count += 1
-                    except KeyboardInterrupt:
-                        print(f"\n\n⚠ Прерывание миграции по запросу пользователя (Ctrl+C)")
-                        print(f"Обработано товаров до остановки: {processed_count}/{total_count}")
-                        print(f"Отмена оставшихся задач...")
-                        
-                        # Отменяем все незавершенные задачи
-                        for future in futures:
-                            future.cancel()
-                        
-                        # Ждем завершения уже запущенных задач (с таймаутом)
-                        import concurrent.futures
-                        for future in concurrent.futures.as_completed(list(futures.keys()), timeout=10):
-                            try:
-                                future.result(timeout=1)
-                            except:
-                                pass
-                        
-                        print(f"Миграция остановлена пользователем")
-                        raise  # Пробрасываем KeyboardInterrupt дальше
-            
-            except KeyboardInterrupt:
-                print(f"\n⚠ Миграция прервана пользователем")
-                print(f"Обработано товаров: {processed_count}/{total_count}")
-                raise
-            
-            print(f"Обработка товаров завершена: {processed_count}/{total_count}")
-            
-            # ШАГ 5: Деактивация товаров, отсутствующих в локальной базе
-            if local_product_names:
-                deactivate_missing_products(local_product_names, api_url)
-        else:
-            print(f"  ⚠ Таблица products не найдена")
-            conn.close()
-        
-        # Финальная статистика при успешном завершении
-        print("\n" + "="*60)
-        print("МИГРАЦИЯ ЗАВЕРШЕНА")
-        print("="*60)
-        print(f"Характеристики: {len(characteristics_cache)}")
-        print(f"Категории: {len(categories_map)}")
-        print(f"Бренды: {len(brands_map)}")
-        print(f"Обработано товаров: {len(products_cache)}")
-        
-    except KeyboardInterrupt:
-        print("\n\n" + "="*60)
-        print("МИГРАЦИЯ ПРЕРВАНА ПОЛЬЗОВАТЕЛЕМ (Ctrl+C)")
-        print("="*60)
-        print(f"Характеристики: {len(characteristics_cache)}")
-        print(f"Категории: {len(categories_map)}")
-        print(f"Бренды: {len(brands_map)}")
-        print(f"Обработано товаров: {len(products_cache)}")
-        raise  # Пробрасываем исключение для корректного выхода
+                    n, error = 0, str(e)
+                created += n
+                if error:
+                    failed += 1
+                    print(f"  ⚠ {error}")
+                if i % 100 == 0:
+                    print(f"  Обработано товаров: {i}/{len(to_fetch)}")
+        print(f"  ✓ Загружено изображений: {created}, ошибок: {failed}")
+
+    print("\n" + "="*60)
+    print("ИЗОБРАЖЕНИЯ КАТЕГОРИЙ")
+    print("="*60)
+    upload_category_images(api_url, categories, paths)
+
+    if local_names:
+        deactivate_missing_products(api_url, local_names, batch_size)
+
+    print("\n" + "="*60)
+    print("МИГРАЦИЯ ЗАВЕРШЕНА")
+    print("="*60)
+    print(f"Создано товаров: {totals['created']}")
+    print(f"Обновлено товаров: {totals['updated']}")
+    print(f"Ошибок: {totals['error']}")
 
 
 if __name__ == '__main__':
     print("="*60)
     print("СКРИПТ МИГРАЦИИ ДАННЫХ ИЗ products.db")
     print("="*60)
-    
-    # Сохраняем значения по умолчанию в локальные переменные
-    # По умолчанию используем Render сервер
+
     default_api_url = os.getenv('API_BASE_URL', 'https://pospro-new-server.onrender.com/api')
     default_db_path = os.path.join(os.path.dirname(__file__), 'products.db')
-    
-    # Обработка аргументов командной строки
+
     import argparse
-    parser = argparse.ArgumentParser(description='Миграция характеристик, категорий и брендов из products.db в новую базу через API')
+    parser = argparse.ArgumentParser(description='Миграция каталога из products.db в новую базу через пакетный импорт')
     parser.add_argument('--api-url', type=str, default=default_api_url,
                         help=f'URL API сервера (по умолчанию: {default_api_url})')
     parser.add_argument('--db-path', type=str, default=default_db_path,
                         help=f'Путь к файлу products.db (по умолчанию: {default_db_path})')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f'Товаров в одном запросе импорта (по умолчанию: {DEFAULT_BATCH_SIZE})')
     parser.add_argument('--yes', action='store_true',
                         help='Запустить миграцию без подтверждения')
     parser.add_argument('--check-only', action='store_true',
                         help='Только проверить структуру базы данных, не выполнять миграцию')
-    
+
     args = parser.parse_args()
-    
-    # Обновляем глобальные настройки
+
     globals()['API_BASE_URL'] = args.api_url
     globals()['OLD_DB_PATH'] = args.db_path
-    
+
     print(f"API URL: {API_BASE_URL}")
     print(f"База данных: {OLD_DB_PATH}")
-    
+
     if args.check_only:
-        # Только проверка структуры
         if not os.path.exists(OLD_DB_PATH):
             print(f"✗ Файл базы данных не найден: {OLD_DB_PATH}")
             sys.exit(1)
-        
         conn = sqlite3.connect(OLD_DB_PATH)
         check_db_structure(conn)
         conn.close()
         sys.exit(0)
-    
-    # Запуск миграции
+
     try:
         if args.yes:
-            migrate_data(API_BASE_URL, OLD_DB_PATH)
+            migrate_data(API_BASE_URL, OLD_DB_PATH, args.batch_size)
         else:
             response = input("\nНачать миграцию? (yes/no): ")
             if response.lower() in ['yes', 'y', 'да', 'д']:
-                migrate_data(API_BASE_URL, OLD_DB_PATH)
+                migrate_data(API_BASE_URL, OLD_DB_PATH, args.batch_size)
             else:
                 print("Миграция отменена.")
     except KeyboardInterrupt:
         print("\n\n⚠ Миграция прервана пользователем (Ctrl+C)")
         print("Процесс остановлен корректно.")
-        sys.exit(0)  # Выход с кодом 0, так как это ожидаемое прерывание
+        sys.exit(0)
     except Exception as e:
         print(f"\n\n✗ Ошибка миграции: {e}")
         import traceback
         traceback.print_exc()
         sys.exit(1)
-
@@ -0,0 +1,138 @@
+"""
+Разовая миграция: создать media_blobs и перенести файлы товаров из
+UPLOAD_FOLDER/products/<id>/ в content-addressed хранилище
+(см. `services/blob_store.py`).
+
+Порядок:
+  1. DDL из create_media_blobs.sql;
+  2. сверка индекса media_files с диском — sha256 всех файлов товаров;
+  3. пачками: файл → блоб (hardlink, при невозможности — копия), строки
+     ProductMedia/ProductDocument переписываются на URL блоба, коммит;
+     только после коммита удаляются исходные файлы — упавшая на середине
+     миграция не оставляет строк без файлов;
+  4. пересчёт ref_count.
+
+Идемпотентна: перенесённые файлы из products/ удалены, их строки уже с
+blob_sha256. Драйверы из мастер-списка (driver_id) не трогаются.
+
+Запуск (Render Shell или локально):
+    cd pospro_new_server
+    python -u -m migrations.apply_blob_store
+"""
+
+import mimetypes
+import os
+import re
+import shutil
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from extensions import db
+from sqlalchemy import text
+
+from services import blob_store
+from services.media_index import reconcile
+
+
+SQL_PATH = os.path.join(os.path.dirname(__file__), 'create_media_blobs.sql')
+BATCH = 200
+
+
+def _link_to_tmp(src):
+    tmp = blob_store.new_tmp_path()
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    return tmp
+
+
+def _migrate_batch(rows, upload_root):
+    moved = []
+    for path, sha256 in rows:
+        src = os.path.join(upload_root, path)
+        if not os.path.isfile(src):
+            continue
+        ext = path.rsplit('.', 1)[1].lower() if '.' in os.path.basename(path) else ''
+        mime_type, _ = mimetypes.guess_type(path)
+        sha256, ext = blob_store.put_file(_link_to_tmp(src), sha256, ext, mime_type)
+
+        old_url = f'/uploads/{path}'
+        db.session.execute(
+            text('UPDATE product_media SET url = :url, blob_sha256 = :sha WHERE url = :old'),
+            {'url': blob_store.blob_url(sha256, ext), 'sha': sha256, 'old': old_url},
+        )
+        docs = db.session.execute(
+            text('SELECT id, filename FROM product_document WHERE url = :old AND driver_id IS NULL'),
+            {'old': old_url},
+        ).all()
+        for doc_id, filename in docs:
+            db.session.execute(
+                text('UPDATE product_document SET url = :url, blob_sha256 = :sha WHERE id = :id'),
+                {
+                    'url': blob_store.blob_url(sha256, ext, download_name=filename or os.path.basename(path)),
+                    'sha': sha256,
+                    'id': doc_id,
+                },
+            )
+        db.session.execute(text('DELETE FROM media_files WHERE path = :p'), {'p': path})
+        moved.append(src)
+    db.session.commit()
+
+    for src in moved:
+        try:
+            os.remove(src)
+        except OSError as e:
+            print(f'  ⚠️ не удалось удалить {src}: {e}', flush=True)
+    return len(moved)
+
+
+def apply():
+    with open(SQL_PATH, encoding='utf-8') as f:
+        sql = re.sub(r'--[^\n]*', '', f.read())
+
+    statements = [s.strip() for s in sql.split(';') if s.strip()]
+    print(f'Statements to execute: {len(statements)}', flush=True)
+    for i, stmt in enumerate(statements, 1):
+        first_line = stmt.splitlines()[0][:80]
+        print(f'  [{i:>2}/{len(statements)}] {first_line}...', flush=True)
+        db.session.execute(text(stmt))
+    db.session.commit()
+
+    if reconcile() is None:
+        print('  reconcile уже идёт в другом процессе — повторите позже', flush=True)
+        return
+
+    upload_root = app.config['UPLOAD_FOLDER']
+    total = 0
+    while True:
+        # Перенесённые строки удаляются из media_files — следующая пачка
+        # выбирается тем же запросом.
+        rows = db.session.execute(text("""
+            SELECT mf.path, mf.sha256
+            FROM media_files mf
+            WHERE mf.sha256 IS NOT NULL
+              AND (EXISTS (SELECT 1 FROM product_media pm WHERE pm.url = '/uploads/' || mf.path)
+                   OR EXISTS (SELECT 1 FROM product_document pd
+                              WHERE pd.url = '/uploads/' || mf.path AND pd.driver_id IS NULL))
+            ORDER BY mf.path
+            LIMIT :n
+        """), {'n': BATCH}).all()
+        if not rows:
+            break
+        migrated = _migrate_batch(rows, upload_root)
+        total += migrated
+        print(f'  перенесено файлов: {total}', flush=True)
+        if migrated == 0:
+            break
+
+    blob_store.recount()
+    db.session.commit()
+    print('OK', flush=True)
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        apply()
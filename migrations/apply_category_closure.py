@@ -0,0 +1,50 @@
+"""
+Разовая миграция: создать таблицу category_closure и заполнить её из
+текущего `category.parent_id` (см. `services/category_closure.py`).
+
+Идемпотентна: CREATE ... IF NOT EXISTS + полная пересборка содержимого.
+На старте приложения то же самое делает `ensure_consistent()`, скрипт
+нужен для ручного прогона (например после правок дерева прямо в БД).
+
+Запуск (Render Shell или локально):
+    cd pospro_new_server
+    python -u -m migrations.apply_category_closure
+"""
+
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from extensions import db
+from sqlalchemy import text
+
+from services.category_closure import rebuild
+
+
+SQL_PATH = os.path.join(os.path.dirname(__file__), 'create_category_closure.sql')
+
+
+def apply():
+    with open(SQL_PATH, encoding='utf-8') as f:
+        sql = re.sub(r'--[^\n]*', '', f.read())
+
+    statements = [s.strip() for s in sql.split(';') if s.strip()]
+    print(f'Statements to execute: {len(statements)}', flush=True)
+    for i, stmt in enumerate(statements, 1):
+        first_line = stmt.splitlines()[0][:80]
+        print(f'  [{i:>2}/{len(statements)}] {first_line}...', flush=True)
+        db.session.execute(text(stmt))
+    db.session.commit()
+
+    rows = rebuild()
+    db.session.commit()
+    print(f'  category_closure: {rows} rows', flush=True)
+    print('OK', flush=True)
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        apply()
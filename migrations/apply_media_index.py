@@ -0,0 +1,53 @@
+"""
+Разовая миграция: создать таблицу media_files и заполнить её полной
+сверкой UPLOAD_FOLDER/products (см. `services/media_index.py`).
+
+Идемпотентна: CREATE ... IF NOT EXISTS + reconcile(). На работающем
+сервере то же самое делает фоновый цикл; скрипт нужен для первого
+наполнения (с подсчётом sha256 всех файлов) и ручного прогона.
+
+Запуск (Render Shell или локально):
+    cd pospro_new_server
+    python -u -m migrations.apply_media_index
+"""
+
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from extensions import db
+from sqlalchemy import text
+
+from services.media_index import reconcile
+
+
+SQL_PATH = os.path.join(os.path.dirname(__file__), 'create_media_files.sql')
+
+
+def apply():
+    with open(SQL_PATH, encoding='utf-8') as f:
+        sql = re.sub(r'--[^\n]*', '', f.read())
+
+    statements = [s.strip() for s in sql.split(';') if s.strip()]
+    print(f'Statements to execute: {len(statements)}', flush=True)
+    for i, stmt in enumerate(statements, 1):
+        first_line = stmt.splitlines()[0][:80]
+        print(f'  [{i:>2}/{len(statements)}] {first_line}...', flush=True)
+        db.session.execute(text(stmt))
+    db.session.commit()
+
+    stats = reconcile()
+    if stats is None:
+        print('  reconcile уже идёт в другом процессе — пропуск', flush=True)
+    else:
+        for key, value in stats.items():
+            print(f'  {key}: {value}', flush=True)
+    print('OK', flush=True)
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        apply()
@@ -0,0 +1,15 @@
+-- Closure-таблица дерева категорий: (предок, потомок, глубина).
+-- См. models/category_closure.py и services/category_closure.py.
+--
+-- Строка depth=0 есть у каждой категории (она сама себе предок), поэтому
+-- фильтр «ветка категории X» — это просто ancestor_id = X без OR.
+-- Бэкфилл делает apply_category_closure.py через services.category_closure.rebuild().
+
+CREATE TABLE IF NOT EXISTS category_closure (
+    ancestor_id     INTEGER NOT NULL REFERENCES category(id) ON DELETE CASCADE,
+    descendant_id   INTEGER NOT NULL REFERENCES category(id) ON DELETE CASCADE,
+    depth           INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (ancestor_id, descendant_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_category_closure_descendant ON category_closure (descendant_id, ancestor_id);
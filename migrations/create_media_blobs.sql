@@ -0,0 +1,25 @@
+-- Content-addressed хранилище файлов товаров (UPLOAD_FOLDER/blobs/...).
+-- См. models/media_blob.py и services/blob_store.py.
+--
+-- Файл блоба: blobs/<sha256[0:2]>/<sha256[2:4]>/<sha256>.<ext>.
+-- ref_count поддерживается attach/release и пересчитывается сборщиком мусора.
+
+CREATE TABLE IF NOT EXISTS media_blobs (
+    sha256      VARCHAR(64) PRIMARY KEY,
+    ext         VARCHAR(16) NOT NULL DEFAULT '',
+    size        BIGINT NOT NULL,
+    mime_type   VARCHAR(100),
+    ref_count   INTEGER NOT NULL DEFAULT 0,
+    source_url  TEXT,
+    created_at  TIMESTAMP NOT NULL DEFAULT NOW(),
+    updated_at  TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_media_blobs_source_url ON media_blobs USING hash (source_url);
+CREATE INDEX IF NOT EXISTS idx_media_blobs_unreferenced ON media_blobs (updated_at) WHERE ref_count <= 0;
+
+ALTER TABLE product_media ADD COLUMN IF NOT EXISTS blob_sha256 VARCHAR(64) REFERENCES media_blobs(sha256);
+ALTER TABLE product_document ADD COLUMN IF NOT EXISTS blob_sha256 VARCHAR(64) REFERENCES media_blobs(sha256);
+
+CREATE INDEX IF NOT EXISTS ix_product_media_blob_sha256 ON product_media (blob_sha256);
+CREATE INDEX IF NOT EXISTS ix_product_document_blob_sha256 ON product_document (blob_sha256);
@@ -0,0 +1,18 @@
+-- Индекс файлов товаров на диске (UPLOAD_FOLDER/products/...).
+-- См. models/media_file.py и services/media_index.py.
+--
+-- path — относительно UPLOAD_FOLDER, URL файла = '/uploads/' || path.
+-- sha256 NULL — хэш ещё не посчитан (досчитывает reconcile).
+
+CREATE TABLE IF NOT EXISTS media_files (
+    path        VARCHAR(500) PRIMARY KEY,
+    product_id  INTEGER NOT NULL,
+    kind        VARCHAR(10) NOT NULL,
+    size        BIGINT NOT NULL,
+    mtime_ns    BIGINT NOT NULL,
+    sha256      VARCHAR(64),
+    indexed_at  TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_media_files_product ON media_files (product_id, kind);
+CREATE INDEX IF NOT EXISTS idx_media_files_sha256 ON media_files (sha256);
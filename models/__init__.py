@@ -31,3 +31,10 @@ from .collector import CollectorTask, CollectorFile, CollectorCommand, Collector
 from .category_alias import CategoryAlias
 from .section_card import SectionCard, SectionCardCategory
 from .customer_activity import CustomerActivity
+from .category_closure import CategoryClosure
+from .response_cache_version import ResponseCacheVersion
+from .ai_auto_fill_job import AIAutoFillJob
+from .media_file import MediaFile
+from .media_blob import MediaBlob
+from .catalog_tombstone import CatalogTombstone
+from .product_attribute import ProductAttribute
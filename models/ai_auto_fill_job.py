@@ -0,0 +1,66 @@
+"""
+AIAutoFillJob — фоновая задача «PosPro AI помощника» (импорт товара по URL).
+
+POST /api/admin/products/auto-fill/jobs создаёт строку и сразу отвечает
+job_id; скачивание страницы и вызов Claude идут в пуле потоков процесса
+(см. routes/product_auto_fill.py). Статус живёт в БД, а не в памяти —
+опрос /jobs/<id> может попасть в любой gunicorn-воркер.
+
+Жизненный цикл: queued → running → done | error.
+
+normalized_url — ключ кэша: успешный результат для той же страницы
+(после нормализации URL) переиспользуется без похода к донору и в LLM.
+"""
+
+from datetime import datetime
+
+from extensions import db
+
+
+JOB_STATUS_QUEUED = 'queued'
+JOB_STATUS_RUNNING = 'running'
+JOB_STATUS_DONE = 'done'
+JOB_STATUS_ERROR = 'error'
+
+
+class AIAutoFillJob(db.Model):
+    __tablename__ = 'ai_auto_fill_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    user_id = db.Column(db.Integer, db.ForeignKey('system_users.id', ondelete='SET NULL'), nullable=True, index=True)
+
+    source_url = db.Column(db.Text, nullable=False)
+    normalized_url = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=JOB_STATUS_QUEUED)
+
+    # Результат в том же виде, что отдаёт синхронный auto-fill:
+    # {name, description, image_urls, characteristics}.
+    result = db.Column(db.JSON, nullable=True)
+    error_message = db.Column(db.Text, nullable=True)
+    # HTTP-код, который вернул бы синхронный эндпоинт (400 / 502) — фронт
+    # различает «плохая ссылка» и «упал LLM».
+    error_status = db.Column(db.Integer, nullable=True)
+    cached = db.Column(db.Boolean, nullable=False, default=False)
+    import_log_id = db.Column(db.Integer, db.ForeignKey('ai_import_logs.id', ondelete='SET NULL'), nullable=True)
+
+    __table_args__ = (
+        db.Index('idx_ai_auto_fill_jobs_cache', 'normalized_url', 'status', 'created_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'user_id': self.user_id,
+            'source_url': self.source_url,
+            'status': self.status,
+            'data': self.result,
+            'error': self.error_message,
+            'error_status': self.error_status,
+            'cached': bool(self.cached),
+            'import_log_id': self.import_log_id,
+        }
@@ -0,0 +1,32 @@
+"""
+CatalogTombstone — след удалённого товара / складской себестоимости для
+ленты изменений /products/changes (services/change_feed.py).
+
+Строку пишет AFTER DELETE триггер, change_seq — из той же
+последовательности catalog_change_seq, что и product.change_seq /
+product_warehouse_cost.change_seq, так что удаление встаёт в ленту в
+своём месте относительно изменений.
+"""
+
+from datetime import datetime
+
+from extensions import db
+
+
+class CatalogTombstone(db.Model):
+    __tablename__ = 'catalog_tombstone'
+
+    change_seq = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    entity = db.Column(db.String(30), nullable=False)  # 'product' | 'warehouse_cost'
+    entity_id = db.Column(db.Integer, nullable=False)
+    product_id = db.Column(db.Integer, nullable=True)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'change_seq': self.change_seq,
+            'entity': self.entity,
+            'entity_id': self.entity_id,
+            'product_id': self.product_id,
+            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None,
+        }
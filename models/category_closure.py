@@ -0,0 +1,44 @@
+"""
+CategoryClosure — closure-таблица дерева категорий: для каждой пары
+«предок → потомок» одна строка с глубиной (0 = сама категория).
+
+Зачем: фильтр «товары ветки категории» раньше делал WITH RECURSIVE на
+каждом запросе, а подсчёт товаров по поддеревьям — обход в Python.
+С closure это один индексированный JOIN:
+
+    SELECT p.* FROM product p
+    JOIN category_closure cc ON cc.descendant_id = p.category_id
+    WHERE cc.ancestor_id = :root
+
+Таблицу поддерживает `services/category_closure.py` — вызывается из
+create/update/delete/merge категорий и из резолвера поставщиков.
+Строки удаляются каскадом вместе с категорией (ON DELETE CASCADE).
+"""
+
+from sqlalchemy import Index
+from extensions import db
+
+
+class CategoryClosure(db.Model):
+    __tablename__ = 'category_closure'
+
+    ancestor_id = db.Column(
+        db.Integer, db.ForeignKey('category.id', ondelete='CASCADE'), primary_key=True
+    )
+    descendant_id = db.Column(
+        db.Integer, db.ForeignKey('category.id', ondelete='CASCADE'), primary_key=True
+    )
+    depth = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # PK (ancestor_id, descendant_id) покрывает «все потомки X».
+        # Обратный индекс — «все предки X» (перенос поддерева, хлебные крошки).
+        Index('idx_category_closure_descendant', 'descendant_id', 'ancestor_id'),
+    )
+
+    def to_dict(self):
+        return {
+            'ancestor_id': self.ancestor_id,
+            'descendant_id': self.descendant_id,
+            'depth': self.depth,
+        }
@@ -11,3 +11,7 @@ class ProductDocument(db.Model):
     # Ссылка на драйвер из мастер-списка (если драйвер выбран из /admin/drivers)
     # Для "ручных" документов и драйверов остаётся NULL.
     driver_id = db.Column(db.Integer, db.ForeignKey('drivers.id', ondelete='SET NULL'), nullable=True)
+    # Файл в content-addressed хранилище (models/media_blob.py). NULL —
+    # старые файлы в uploads/products/<id>/documents|drivers и привязки к
+    # мастер-списку драйверов.
+    blob_sha256 = db.Column(db.String(64), db.ForeignKey('media_blobs.sha256'), nullable=True, index=True)
@@ -8,6 +8,9 @@ class ProductMedia(db.Model):
     url = db.Column(db.String(500), nullable=False)
     media_type = db.Column(db.String(10), nullable=False)  # "image" или "video"
     order = db.Column(db.Integer, default=0)
+    # Файл в content-addressed хранилище (models/media_blob.py). NULL —
+    # старые файлы в uploads/products/<id>/ и внешние URL.
+    blob_sha256 = db.Column(db.String(64), db.ForeignKey('media_blobs.sha256'), nullable=True, index=True)
 
     # ✅ Индекс для оптимизации запросов изображений
     __table_args__ = (
@@ -0,0 +1,60 @@
+"""
+MediaBlob — файл в content-addressed хранилище UPLOAD_FOLDER/blobs.
+
+Один файл на уникальное содержимое: путь `blobs/ab/cd/<sha256>.<ext>`,
+URL `/uploads/blobs/ab/cd/<sha256>.<ext>`. ProductMedia / ProductDocument
+ссылаются на блоб через `blob_sha256`, так что одна и та же фотография
+бренда у сотни товаров лежит на диске (и в бэкапе) один раз, а повторный
+импорт той же картинки — поиск по хэшу (или по source_url — без
+скачивания).
+
+ref_count — сколько строк ProductMedia/ProductDocument ссылаются на блоб.
+Поддерживается services/blob_store.py (attach/release) и периодически
+пересчитывается из факта; блобы с ref_count = 0 удаляет сборщик мусора
+после грейс-периода.
+"""
+
+from datetime import datetime
+
+from extensions import db
+
+
+class MediaBlob(db.Model):
+    __tablename__ = 'media_blobs'
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    ext = db.Column(db.String(16), nullable=False, default='')
+    size = db.Column(db.BigInteger, nullable=False)
+    mime_type = db.Column(db.String(100), nullable=True)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    # Откуда блоб впервые скачан (импорт по URL) — повторный импорт той же
+    # ссылки не качает файл заново.
+    source_url = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('idx_media_blobs_source_url', 'source_url', postgresql_using='hash'),
+        db.Index('idx_media_blobs_unreferenced', 'updated_at', postgresql_where=db.text('ref_count <= 0')),
+    )
+
+    @property
+    def rel_path(self):
+        name = f'{self.sha256}.{self.ext}' if self.ext else self.sha256
+        return f'blobs/{self.sha256[:2]}/{self.sha256[2:4]}/{name}'
+
+    @property
+    def url(self):
+        return f'/uploads/{self.rel_path}'
+
+    def to_dict(self):
+        return {
+            'sha256': self.sha256,
+            'url': self.url,
+            'ext': self.ext,
+            'size': self.size,
+            'mime_type': self.mime_type,
+            'ref_count': self.ref_count,
+            'source_url': self.source_url,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
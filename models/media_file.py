@@ -0,0 +1,60 @@
+"""
+MediaFile — индекс файлов товаров на диске (UPLOAD_FOLDER/products/...).
+
+Одна строка на файл: путь относительно UPLOAD_FOLDER, размер, mtime и
+sha256 содержимого. Раньше каждый GET /upload/media|documents|drivers/<id>
+листал папку товара, делал os.path.exists на каждую строку БД и SELECT на
+каждый файл. Теперь индекс строит `services/media_index.reconcile()` —
+один проход os.scandir по всему каталогу и set-based INSERT/DELETE, — а
+удаление через API сразу убирает свои строки. Новые загрузки в это дерево
+не пишутся (они в хранилище блобов, индекс — media_blobs), так что
+media_files — индекс только старых файлов товаров.
+
+product_id — не FK: файлы удалённого товара остаются на диске, индекс
+должен их видеть.
+"""
+
+from datetime import datetime
+
+from extensions import db
+
+
+MEDIA_KIND_MEDIA = 'media'
+MEDIA_KIND_DOC = 'doc'
+MEDIA_KIND_DRIVER = 'driver'
+
+
+class MediaFile(db.Model):
+    __tablename__ = 'media_files'
+
+    # Путь относительно UPLOAD_FOLDER: products/12/photo.jpg,
+    # products/12/documents/manual.pdf. URL = '/uploads/' + path.
+    path = db.Column(db.String(500), primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(10), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    mtime_ns = db.Column(db.BigInteger, nullable=False)
+    # NULL — ещё не посчитан (reconcile досчитывает пачками).
+    sha256 = db.Column(db.String(64), nullable=True)
+    indexed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('idx_media_files_product', 'product_id', 'kind'),
+        db.Index('idx_media_files_sha256', 'sha256'),
+    )
+
+    @property
+    def url(self):
+        return f'/uploads/{self.path}'
+
+    def to_dict(self):
+        return {
+            'path': self.path,
+            'url': self.url,
+            'product_id': self.product_id,
+            'kind': self.kind,
+            'size': self.size,
+            'mtime_ns': self.mtime_ns,
+            'sha256': self.sha256,
+            'indexed_at': self.indexed_at.isoformat() if self.indexed_at else None,
+        }
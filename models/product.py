@@ -23,6 +23,12 @@ class Product(db.Model):
     status = db.Column(db.Integer, db.ForeignKey('status.id'))
     status_info = db.relationship('Status', backref='products', lazy='joined')
     is_draft = db.Column(db.Boolean, default=True)
+    # UTC. Ставит триггер trg_product_updated_at на любой UPDATE строки —
+    # включая пакетные UPDATE мимо ORM (см. app.py, services/catalog_export.py).
+    updated_at = db.Column(db.DateTime, server_default=db.text("timezone('utc', now())"), nullable=True)
+    # Номер изменения из catalog_change_seq — ставит триггер на INSERT/UPDATE
+    # (services/change_feed.py), лента /products/changes?since=<seq>.
+    change_seq = db.Column(db.BigInteger, nullable=True)
 
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True)
     category = db.relationship('Category')
@@ -36,6 +42,8 @@ class Product(db.Model):
         Index('idx_product_brand_visible', 'brand_id', 'is_visible', 'is_draft'),
         Index('idx_product_category_visible', 'category_id', 'is_visible', 'is_draft'),
         Index('idx_product_slug', 'slug'),
+        Index('idx_product_updated_at', 'updated_at'),
+        Index('idx_product_change_seq', 'change_seq'),
     )
 
     def get_main_image_url(self):
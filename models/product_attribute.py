@@ -0,0 +1,53 @@
+"""
+ProductAttribute — типизированный индекс характеристик товара для
+фильтров и facets в /products/search.
+
+product_characteristic хранит значение свободным текстом, а id из
+characteristics_list — строкой в key; отфильтровать «мощность от 1 до
+2 кВт» по нему можно только перебором с разбором каждой строки. Здесь
+одна строка на строку product_characteristic (тот же id):
+
+  - num_value / unit — число, приведённое к базовой единице (мм, г, Вт,
+    мл, Гц, ...), если значение числовое («1,5 кВт» → 1500, 'Вт');
+  - value_key — нормализованное значение (lower, пробелы схлопнуты) для
+    фильтра по списку значений; value_label — как его показать.
+
+Таблицу поддерживают триггеры на product_characteristic и
+characteristics_list (services/attribute_index.py) — в т.ч. при пакетной
+записи характеристик сырым SQL в импорте.
+"""
+
+from sqlalchemy import Index
+from extensions import db
+
+
+class ProductAttribute(db.Model):
+    __tablename__ = 'product_attribute'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # = product_characteristic.id
+    product_id = db.Column(db.Integer, nullable=False)
+    characteristic_id = db.Column(db.Integer, nullable=False)
+    num_value = db.Column(db.Float, nullable=True)
+    unit = db.Column(db.String(20), nullable=True)
+    value_key = db.Column(db.String(255), nullable=False)
+    value_label = db.Column(db.String(255), nullable=False)
+
+    __table_args__ = (
+        # Фильтры: EXISTS по (characteristic_id, диапазон / значение),
+        # product_id в конце — index-only без обращения к таблице.
+        Index('idx_product_attribute_num', 'characteristic_id', 'num_value', 'product_id'),
+        Index('idx_product_attribute_value', 'characteristic_id', 'value_key', 'product_id'),
+        # Facets: все атрибуты набора товаров.
+        Index('idx_product_attribute_product', 'product_id', 'characteristic_id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'product_id': self.product_id,
+            'characteristic_id': self.characteristic_id,
+            'num_value': self.num_value,
+            'unit': self.unit,
+            'value_key': self.value_key,
+            'value_label': self.value_label,
+        }
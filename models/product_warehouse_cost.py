@@ -23,6 +23,8 @@ class ProductWarehouseCost(db.Model):
     note = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    # Номер изменения для ленты /products/changes (services/change_feed.py).
+    change_seq = db.Column(db.BigInteger, nullable=True, index=True)
 
     product = db.relationship('Product', backref='warehouse_costs', lazy='joined')
 
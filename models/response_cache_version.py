@@ -0,0 +1,28 @@
+"""
+ResponseCacheVersion — счётчик поколений для кэша публичных ответов
+(см. `utils/response_cache.py`).
+
+Одна строка на «область» данных (homepage, categories, header, ...).
+Админский blueprint после успешной записи бампает version своей
+области; каждый gunicorn-воркер раз в секунду перечитывает таблицу и
+выбрасывает закэшированные ответы, собранные на старом поколении.
+Так инвалидация работает между процессами без внешнего Redis.
+"""
+
+from datetime import datetime
+from extensions import db
+
+
+class ResponseCacheVersion(db.Model):
+    __tablename__ = 'response_cache_version'
+
+    scope = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'scope': self.scope,
+            'version': self.version,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
@@ -3,8 +3,10 @@ import os
 from flask import Blueprint, request, jsonify, current_app
 from extensions import db
 from models.banner import Banner
+from utils.response_cache import invalidate_on_write
 
 banners_bp = Blueprint('banners', __name__)
+invalidate_on_write(banners_bp, 'homepage')
 
 
 # 🔹 Получить все баннеры
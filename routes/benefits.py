@@ -3,8 +3,10 @@
 from flask import Blueprint, request, jsonify
 from extensions import db
 from models.benefit import Benefit
+from utils.response_cache import invalidate_on_write
 
 benefits_bp = Blueprint('benefits', __name__)
+invalidate_on_write(benefits_bp, 'homepage')
 
 
 # 🔹 Получить список преимуществ
@@ -7,8 +7,10 @@ from models.status import Status
 import os
 from werkzeug.utils import secure_filename
 from sqlalchemy import func
+from utils.response_cache import invalidate_on_write
 
 bp = Blueprint('brands_statuses', __name__)
+invalidate_on_write(bp, 'brands_statuses')
 
 
 def _is_system_user():
@@ -0,0 +1,100 @@
+"""
+Пакетные операции с каталогом для миграций и выгрузок поставщиков.
+
+Все endpoints требуют JWT с ролью admin/system.
+
+- POST /api/admin/catalog/import — NDJSON товаров (по записи на строку),
+  см. формат записи в `services/catalog_import.py`.
+  Query: chunk_size (по умолчанию 500), media=link|fetch,
+  update=price,quantity,... (что менять у существующих товаров; по
+  умолчанию всё переданное), results=all|errors (errors — только ошибки,
+  для больших выгрузок).
+- GET /api/admin/catalog/export — потоковая выгрузка всего каталога,
+  см. `services/catalog_export.py`.
+  Query: format=ndjson|csv, fields=id,article,name,... (по умолчанию
+  основные плоские поля), updated_since=ISO-8601, visible_only=1.
+"""
+
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt
+
+from extensions import db
+from services import catalog_export, catalog_import
+from utils.response_cache import invalidate_on_write
+
+
+catalog_bulk_bp = Blueprint('catalog_bulk', __name__)
+invalidate_on_write(catalog_bulk_bp, 'products', 'categories', 'homepage')
+
+
+def _check_admin():
+    jwt_data = get_jwt()
+    return jwt_data.get('role') in ('admin', 'system')
+
+
+@catalog_bulk_bp.route('/catalog/import', methods=['POST'])
+@jwt_required()
+def import_catalog():
+    if not _check_admin():
+        return jsonify({'success': False, 'message': 'Доступ запрещён'}), 403
+
+    chunk_size = request.args.get('chunk_size', catalog_import.DEFAULT_CHUNK_SIZE, type=int)
+    media_mode = request.args.get('media', catalog_import.MEDIA_LINK)
+    if media_mode not in (catalog_import.MEDIA_LINK, catalog_import.MEDIA_FETCH):
+        return jsonify({'success': False, 'message': 'media должен быть link или fetch'}), 400
+
+    update_fields = request.args.get('update')
+    if update_fields is not None:
+        update_fields = {f.strip() for f in update_fields.split(',') if f.strip()}
+
+    # Тело читается построчно из потока — весь файл в памяти не держим.
+    try:
+        report = catalog_import.run_import(
+            catalog_import.parse_ndjson(request.stream),
+            chunk_size=chunk_size,
+            media_mode=media_mode,
+            update_fields=update_fields,
+        )
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Импорт прерван: {e}'}), 500
+
+    if request.args.get('results') == 'errors':
+        report['results'] = [r for r in report['results'] if r['status'] == 'error']
+    return jsonify({'success': True, 'data': report}), 200
+
+
+@catalog_bulk_bp.route('/catalog/export', methods=['GET'])
+@jwt_required()
+def export_catalog():
+    if not _check_admin():
+        return jsonify({'success': False, 'message': 'Доступ запрещён'}), 403
+
+    fmt = request.args.get('format', catalog_export.FORMAT_NDJSON)
+    if fmt not in (catalog_export.FORMAT_NDJSON, catalog_export.FORMAT_CSV):
+        return jsonify({'success': False, 'message': 'format должен быть ndjson или csv'}), 400
+    try:
+        fields = catalog_export.parse_fields(request.args.get('fields'))
+        updated_since = catalog_export.parse_since(request.args.get('updated_since'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    visible_only = request.args.get('visible_only') in ('1', 'true')
+
+    batches = catalog_export.iter_records(fields, updated_since, include_hidden=not visible_only)
+    if fmt == catalog_export.FORMAT_CSV:
+        body, mimetype = catalog_export.csv_lines(batches, fields), 'text/csv; charset=utf-8'
+    else:
+        body, mimetype = catalog_export.ndjson_lines(batches), 'application/x-ndjson; charset=utf-8'
+
+    # Момент начала выгрузки: клиент передаст его как updated_since в
+    # следующий раз (с запасом на транзакции, закоммиченные во время выгрузки).
+    started = datetime.utcnow()
+    headers = {
+        'Content-Disposition': f'attachment; filename=catalog-{started:%Y%m%dT%H%M%SZ}.{fmt}',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no',
+        'X-Export-Started-At': started.isoformat() + 'Z',
+    }
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
@@ -2,8 +2,10 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt
 from models.catalog_visibility import CatalogVisibility
 from extensions import db
+from utils.response_cache import cached_response, invalidate_on_write
 
 catalog_visibility_bp = Blueprint('catalog_visibility', __name__)
+invalidate_on_write(catalog_visibility_bp, 'catalog_visibility')
 
 VALID_TYPES = ('sidebar', 'main', 'slide')
 
@@ -21,6 +23,7 @@ def _get_all_visibility():
 # --- Публичный эндпоинт (без авторизации, для Header) ---
 
 @catalog_visibility_bp.route('/catalog-visibility', methods=['GET'])
+@cached_response('catalog_visibility')
 def get_public_catalog_visibility():
     """Получить видимость каталогов (публично, без авторизации)"""
     try:
@@ -6,8 +6,11 @@ from werkzeug.utils import secure_filename
 
 from extensions import db
 from models.category import Category
+from services import category_closure
+from utils.response_cache import invalidate_on_write
 
 categories_bp = Blueprint('categories', __name__)
+invalidate_on_write(categories_bp, 'categories')
 
 
 def ensure_unique_category_slug(desired, exclude_id=None):
@@ -48,6 +51,8 @@ def get_categories():
         db.session.query(Product.category_id, _f.count(Product.id))
         .group_by(Product.category_id).all()
     )
+    # И сколько во всей ветке (категория + потомки) — один GROUP BY по closure.
+    subtree_counts = category_closure.subtree_product_counts()
 
     return jsonify([{
         'id': c.id,
@@ -59,6 +64,7 @@ def get_categories():
         'order': c.order,
         'show_in_menu': c.show_in_menu,
         'products_count': counts.get(c.id, 0),
+        'subtree_products_count': subtree_counts.get(c.id, 0),
     } for c in categories])
 
 
@@ -96,6 +102,7 @@ def create_category_with_image():
     )
     db.session.add(category)
     db.session.flush()  # Получаем ID до коммита
+    category_closure.insert_node(category.id, category.parent_id)
 
     if file:
         filename = secure_filename(file.filename)
@@ -129,6 +136,18 @@ def update_category(category_id):
     category = Category.query.get_or_404(category_id)
     data = request.json
 
+    # Фронт может прислать id строкой ("5") или пустой строкой вместо
+    # null — без приведения "5" != 5 и категория «переезжала» на место.
+    # Проверяем до любых изменений (картинка ниже скачивается сразу).
+    new_parent_id = data.get('parent_id')
+    if new_parent_id == '':
+        new_parent_id = None
+    if new_parent_id is not None:
+        try:
+            new_parent_id = int(new_parent_id)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Некорректный parent_id'}), 400
+
     # Если slug меняется и оказывается занят другой категорией — тихо
     # добавим суффикс. Юзер при следующем открытии увидит финальный slug.
     new_slug = data.get('slug')
@@ -161,20 +180,24 @@ def update_category(category_id):
                 remove_local_upload(old_url)
             category.image_url = new_url
 
-    category.parent_id = data.get('parent_id')
+    if new_parent_id != category.parent_id:
+        # Нельзя повесить категорию под саму себя или под своего потомка —
+        # получился бы цикл в дереве (и в closure-таблице).
+        if new_parent_id is not None and category_closure.is_in_subtree(category_id, new_parent_id):
+            return jsonify({'error': 'Нельзя переместить категорию внутрь её собственной ветки'}), 400
+        category.parent_id = new_parent_id
+        db.session.flush()
+        category_closure.move_subtree(category_id, new_parent_id)
     
     if 'show_in_menu' in data:
         new_show_in_menu = bool(data['show_in_menu'])
         category.show_in_menu = new_show_in_menu
         
-        # Если категория отключается, отключаем все дочерние категории рекурсивно
+        # Если категория отключается, отключаем всю ветку одним UPDATE
         if not new_show_in_menu:
-            def disable_children(parent_id):
-                children = Category.query.filter_by(parent_id=parent_id).all()
-                for child in children:
-                    child.show_in_menu = False
-                    disable_children(child.id)
-            disable_children(category_id)
+            Category.query.filter(
+                Category.id.in_(category_closure.subtree_ids_query([category_id]))
+            ).update({Category.show_in_menu: False}, synchronize_session=False)
     
     db.session.commit()
     return jsonify(category.to_dict())
@@ -188,16 +211,9 @@ def delete_category(category_id):
         
         category = Category.query.get_or_404(category_id)
         
-        # Шаг 1: Собираем все ID категорий, которые будут удалены (включая дочерние)
-        categories_to_delete = [category_id]
-        
-        def collect_children_recursive(parent_id):
-            children = Category.query.filter_by(parent_id=parent_id).all()
-            for child in children:
-                categories_to_delete.append(child.id)
-                collect_children_recursive(child.id)
-        
-        collect_children_recursive(category_id)
+        # Шаг 1: Собираем все ID категорий, которые будут удалены (включая
+        # дочерние) — одним запросом по closure-таблице.
+        categories_to_delete = category_closure.subtree_ids([category_id]) or [category_id]
         
         # Шаг 2: Обрабатываем товары - устанавливаем category_id в NULL для всех товаров
         # в удаляемых категориях (включая родительскую и все дочерние)
@@ -215,36 +231,15 @@ def delete_category(category_id):
         if categories_to_delete:
             HomepageCategory.query.filter(HomepageCategory.category_id.in_(categories_to_delete)).delete(synchronize_session=False)
         
-        # Шаг 4: Рекурсивно удаляем все дочерние категории (снизу вверх)
-        # Сначала удаляем самые глубокие (листья), потом поднимаемся вверх к родителю
-        
-        def delete_children_recursive(parent_id):
-            # Получаем прямых детей этой категории
-            children = Category.query.filter_by(parent_id=parent_id).all()
-            for child in children:
-                # Сначала рекурсивно удаляем всех внуков и т.д. (уходим вглубь)
-                delete_children_recursive(child.id)
-                # После удаления всех потомков удаляем саму дочернюю категорию
-                # Обновляем parent_id у любых оставшихся дочерних (на всякий случай)
-                Category.query.filter(Category.parent_id == child.id).update(
-                    {Category.parent_id: None},
-                    synchronize_session=False
-                )
-                # Удаляем саму дочернюю категорию
-                Category.query.filter(Category.id == child.id).delete(synchronize_session=False)
-                db.session.flush()  # Применяем удаление сразу
-        
-        # Удаляем все дочерние категории рекурсивно
-        delete_children_recursive(category_id)
-        
-        # Шаг 5: Удаляем саму родительскую категорию
-        # Обновляем parent_id у любых оставшихся дочерних (на всякий случай)
-        Category.query.filter(Category.parent_id == category_id).update(
+        # Шаг 4: Удаляем всю ветку. Сначала рвём parent_id внутри ветки,
+        # чтобы порядок удаления строк не упирался в FK category.parent_id,
+        # потом удаляем все категории одним DELETE. Строки closure и
+        # алиасы уходят каскадом.
+        Category.query.filter(Category.id.in_(categories_to_delete)).update(
             {Category.parent_id: None},
             synchronize_session=False
         )
-        # Удаляем саму категорию
-        Category.query.filter(Category.id == category_id).delete(synchronize_session=False)
+        Category.query.filter(Category.id.in_(categories_to_delete)).delete(synchronize_session=False)
         
         # Коммитим все изменения
         db.session.commit()
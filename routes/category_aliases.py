@@ -12,8 +12,6 @@ Admin API для управления системой алиасов катег
 - GET    /api/admin/categories/find-similar              — pair-wise fuzzy предложения
 """
 
-from difflib import SequenceMatcher
-
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt
 from sqlalchemy import func, text
@@ -22,9 +20,13 @@ from extensions import db
 from models.category import Category
 from models.category_alias import CategoryAlias
 from models.product import Product
+from services import category_closure
+from utils.fuzzy_index import TrigramIndex, default_gram_floor
+from utils.response_cache import invalidate_on_write
 
 
 category_aliases_bp = Blueprint('category_aliases', __name__)
+invalidate_on_write(category_aliases_bp, 'categories')
 
 
 def _check_admin():
@@ -172,10 +174,126 @@ def delete_alias(alias_id):
 
 # ============ Merge категорий ============
 
+# До стольких пар merge переносит в closure только ветки детей source;
+# больше — дешевле пересобрать closure целиком.
+_CLOSURE_MOVE_MAX_PAIRS = 10
+
+def _apply_merges(mapping):
+    """
+    Set-based merge набора категорий {source_id: target_id} (target — не
+    source): несколько UPDATE/DELETE на весь набор вместо цепочки запросов
+    на каждую пару. Перепривязывает товары, алиасы (category_id и
+    parent_id), детей, пункты шапки, главную, страницу поиска и карточки
+    разделов; картинку target берёт у первого source, если своей нет.
+    Source-категории удаляются. Closure: для нескольких пар (одиночный
+    /categories/merge) переносятся только ветки детей source
+    (`move_subtree`), для больших наборов — пересборка одним запросом.
+    См. `scripts/normalize_categories._merge_pair` — та же логика для пары.
+    Не коммитит. Возвращает {products_moved, aliases_relinked}.
+    """
+    if not mapping:
+        return {'products_moved': 0, 'aliases_relinked': 0}
+    params = {'src': list(mapping), 'tgt': list(mapping.values())}
+    m = 'unnest(CAST(:src AS INTEGER[]), CAST(:tgt AS INTEGER[])) AS m(s, t)'
+
+    def run(sql):
+        return db.session.execute(text(sql.replace('{m}', m)), params).rowcount or 0
+
+    # Картинка — до удаления source
+    run("""
+        UPDATE category c SET image_url = src.image_url
+        FROM (
+            SELECT DISTINCT ON (m.t) m.t, sc.image_url
+            FROM {m} JOIN category sc ON sc.id = m.s
+            WHERE COALESCE(sc.image_url, '') <> ''
+            ORDER BY m.t, sc.id
+        ) src
+        WHERE c.id = src.t AND COALESCE(c.image_url, '') = ''
+    """)
+
+    products_moved = run('UPDATE product p SET category_id = m.t FROM {m} WHERE p.category_id = m.s')
+    aliases_relinked = run('UPDATE category_alias a SET category_id = m.t FROM {m} WHERE a.category_id = m.s')
+
+    # Алиасы, у которых parent = source, переезжают под target. UNIQUE
+    # (source, parent_id, alias_name): если под target уже есть такой же
+    # алиас (дубли-родители обычно приходят от одного поставщика с теми
+    # же подкатегориями) — лишний удаляем, свой алиас target'а в приоритете.
+    run("""
+        DELETE FROM category_alias WHERE id IN (
+            SELECT id FROM (
+                SELECT a.id, ROW_NUMBER() OVER (
+                    PARTITION BY a.source, COALESCE(m.t, a.parent_id), a.alias_name
+                    ORDER BY (m.s IS NOT NULL), a.id
+                ) AS rn
+                FROM category_alias a
+                LEFT JOIN {m} ON m.s = a.parent_id
+                WHERE a.source IS NOT NULL AND a.parent_id IS NOT NULL
+            ) ranked
+            WHERE rn > 1
+        )
+    """)
+    run('UPDATE category_alias a SET parent_id = m.t FROM {m} WHERE a.parent_id = m.s')
+
+    # Дети source становятся детьми target
+    targeted_closure = len(mapping) <= _CLOSURE_MOVE_MAX_PAIRS
+    if targeted_closure:
+        moved_children = db.session.execute(
+            text('SELECT id, parent_id FROM category WHERE parent_id = ANY(CAST(:src AS INTEGER[]))'),
+            params,
+        ).all()
+    run('UPDATE category c SET parent_id = m.t FROM {m} WHERE c.parent_id = m.s')
+
+    # header_menu_items.category_id (перенос, не потеря)
+    run('UPDATE header_menu_items h SET category_id = m.t FROM {m} WHERE h.category_id = m.s')
+    # homepage_categories.category_id (без FK-constraint)
+    run('UPDATE homepage_categories h SET category_id = m.t FROM {m} WHERE h.category_id = m.s')
+
+    # search_page_categories — UNIQUE(category_id), section_card_categories —
+    # UNIQUE(section_card_id, category_id): строки, которые после
+    # перепривязки совпали бы с уже существующими, удаляем.
+    run("""
+        DELETE FROM search_page_categories WHERE id IN (
+            SELECT id FROM (
+                SELECT sp.id, ROW_NUMBER() OVER (
+                    PARTITION BY COALESCE(m.t, sp.category_id)
+                    ORDER BY (m.s IS NOT NULL), sp.id
+                ) AS rn
+                FROM search_page_categories sp LEFT JOIN {m} ON m.s = sp.category_id
+            ) ranked
+            WHERE rn > 1
+        )
+    """)
+    run('UPDATE search_page_categories sp SET category_id = m.t FROM {m} WHERE sp.category_id = m.s')
+    run("""
+        DELETE FROM section_card_categories WHERE id IN (
+            SELECT id FROM (
+                SELECT sc.id, ROW_NUMBER() OVER (
+                    PARTITION BY sc.section_card_id, COALESCE(m.t, sc.category_id)
+                    ORDER BY (m.s IS NOT NULL), sc.id
+                ) AS rn
+                FROM section_card_categories sc LEFT JOIN {m} ON m.s = sc.category_id
+            ) ranked
+            WHERE rn > 1
+        )
+    """)
+    run('UPDATE section_card_categories sc SET category_id = m.t FROM {m} WHERE sc.category_id = m.s')
+
+    if targeted_closure:
+        for child_id, source_id in moved_children:
+            category_closure.move_subtree(child_id, mapping[source_id])
+        run('DELETE FROM category_closure WHERE ancestor_id = ANY(CAST(:src AS INTEGER[])) '
+            'OR descendant_id = ANY(CAST(:src AS INTEGER[]))')
+    run('DELETE FROM category WHERE id = ANY(CAST(:src AS INTEGER[]))')
+    if not targeted_closure:
+        category_closure.rebuild()
+    # Объекты Category в сессии могли устареть после UPDATE мимо ORM.
+    db.session.expire_all()
+    return {'products_moved': products_moved, 'aliases_relinked': aliases_relinked}
+
+
 def _merge_categories_impl(source_id, target_id):
     """
     Транзакционный merge категории source → target.
-    См. `scripts/normalize_categories._merge_pair` — та же логика.
     Возвращает {products_moved, aliases_relinked}.
     """
     src = Category.query.get(source_id)
@@ -184,65 +302,57 @@ def _merge_categories_impl(source_id, target_id):
         raise ValueError('Категория не найдена')
     if src.id == tgt.id:
         raise ValueError('Нельзя смерджить категорию саму в себя')
+    if category_closure.is_in_subtree(source_id, target_id):
+        # Дети source переедут под target, который сам лежит в ветке
+        # source — получился бы цикл в дереве.
+        raise ValueError('Нельзя смерджить категорию в её собственную подкатегорию')
+    return _apply_merges({src.id: tgt.id})
 
-    # Картинка — до перепривязки
-    if not tgt.image_url and src.image_url:
-        tgt.image_url = src.image_url
-        src.image_url = None
-
-    products_moved = db.session.execute(
-        text('UPDATE product SET category_id = :t WHERE category_id = :s'),
-        {'t': target_id, 's': source_id},
-    ).rowcount or 0
-
-    aliases_relinked = db.session.execute(
-        text('UPDATE category_alias SET category_id = :t WHERE category_id = :s'),
-        {'t': target_id, 's': source_id},
-    ).rowcount or 0
-
-    # Алиасы, у которых parent = source, теперь parent = target
-    db.session.execute(
-        text('UPDATE category_alias SET parent_id = :t WHERE parent_id = :s'),
-        {'t': target_id, 's': source_id},
-    )
 
-    # Дети source становятся детьми target
-    db.session.execute(
-        text('UPDATE category SET parent_id = :t WHERE parent_id = :s'),
-        {'t': target_id, 's': source_id},
-    )
+def _plan_exact_duplicate_merges():
+    """
+    Полное замыкание дублей `(parent_id, LOWER(name))` в памяти: после
+    слияния родителей их дети оказываются сиблингами и могут стать новыми
+    дублями — следующий проход по тем же данным это учитывает, без
+    повторного чтения БД. target группы — max(товаров с учётом уже
+    влитых), при равенстве min(id).
 
-    # header_menu_items.category_id (перенос, не потеря)
-    db.session.execute(
-        text('UPDATE header_menu_items SET category_id = :t WHERE category_id = :s'),
-        {'t': target_id, 's': source_id},
-    )
+    Возвращает (mapping {source_id: итоговый target_id}, групп, проходов).
+    """
+    rows = db.session.execute(text('SELECT id, parent_id, name FROM category')).all()
+    counts = dict(db.session.execute(
+        text('SELECT category_id, COUNT(*) FROM product WHERE category_id IS NOT NULL GROUP BY category_id')
+    ).all())
 
-    # homepage_categories.category_id (без FK-constraint)
-    db.session.execute(
-        text('UPDATE homepage_categories SET category_id = :t WHERE category_id = :s'),
-        {'t': target_id, 's': source_id},
-    )
+    merged_into = {}
 
-    # search_page_categories имеет UNIQUE(category_id) — если target уже там,
-    # source-запись удаляем; иначе перепривязываем.
-    tgt_has_sp = db.session.execute(
-        text('SELECT 1 FROM search_page_categories WHERE category_id = :t LIMIT 1'),
-        {'t': target_id},
-    ).first()
-    if tgt_has_sp:
-        db.session.execute(
-            text('DELETE FROM search_page_categories WHERE category_id = :s'),
-            {'s': source_id},
-        )
-    else:
-        db.session.execute(
-            text('UPDATE search_page_categories SET category_id = :t WHERE category_id = :s'),
-            {'t': target_id, 's': source_id},
-        )
+    def final(cid):
+        while cid in merged_into:
+            cid = merged_into[cid]
+        return cid
 
-    db.session.delete(src)
-    return {'products_moved': products_moved, 'aliases_relinked': aliases_relinked}
+    groups_merged = 0
+    passes = 0
+    while True:
+        groups = {}
+        for cid, parent_id, name in rows:
+            if cid in merged_into:
+                continue
+            key = (final(parent_id) if parent_id is not None else None, (name or '').strip().lower())
+            groups.setdefault(key, []).append(cid)
+        duplicate_groups = [g for g in groups.values() if len(g) >= 2]
+        if not duplicate_groups:
+            break
+        passes += 1
+        for group in duplicate_groups:
+            group.sort(key=lambda c: (-counts.get(c, 0), c))
+            target = group[0]
+            for src in group[1:]:
+                merged_into[src] = target
+                counts[target] = counts.get(target, 0) + counts.pop(src, 0)
+            groups_merged += 1
+
+    return {src: final(src) for src in merged_into}, groups_merged, passes
 
 
 @category_aliases_bp.route('/categories/merge-exact-duplicates', methods=['POST'])
@@ -254,9 +364,11 @@ def merge_exact_duplicates():
     target'а: **max(products_count), при равенстве min(id)** — товары
     сохраняются на месте, идентификатор остаётся стабильным.
 
-    Всё в одной транзакции. Возвращает статистику: сколько групп
-    смерджилось, сколько категорий удалено, сколько товаров / алиасов
-    перепривязано.
+    Замыкание дублей (включая появившиеся после слияния родителей)
+    считается в памяти (`_plan_exact_duplicate_merges`), затем всё
+    переносится одним набором UPDATE/DELETE (`_apply_merges`) в одной
+    транзакции. Возвращает статистику: сколько групп смерджилось,
+    сколько категорий удалено, сколько товаров / алиасов перепривязано.
 
     Использовать когда админ хочет быстро схлопнуть очевидные дубли
     после нормализации имён (например «ОБОРУДОВАНИЕ КОНДИТЕРСКОЕ» и
@@ -267,65 +379,9 @@ def merge_exact_duplicates():
     if not _check_admin():
         return jsonify({'error': 'Доступ запрещён'}), 403
 
-    from collections import defaultdict
-    from sqlalchemy import func as _f
-
-    def find_groups():
-        cats = Category.query.all()
-        groups = defaultdict(list)
-        for c in cats:
-            key = (c.parent_id, (c.name or '').strip().lower())
-            groups[key].append(c)
-        return [(k, g) for k, g in groups.items() if len(g) >= 2]
-
-    total_removed = 0
-    total_products = 0
-    total_aliases = 0
-    total_groups = 0
-    passes = 0
-    MAX_PASSES = 20  # защита от бесконечного цикла (в реальности хватит 2–3)
-
     try:
-        while True:
-            duplicate_groups = find_groups()
-            if not duplicate_groups:
-                break
-            passes += 1
-            if passes > MAX_PASSES:
-                # На всякий случай — не должно случиться, но лучше вернуть частичный
-                # результат чем бесконечно крутиться.
-                db.session.commit()
-                return jsonify({
-                    'success': False,
-                    'error': f'Merge не сошёлся за {MAX_PASSES} проходов — возможно цикл в parent_id',
-                    'groups_merged': total_groups,
-                    'categories_removed': total_removed,
-                    'products_moved': total_products,
-                    'aliases_relinked': total_aliases,
-                }), 500
-
-            # Пересчитываем количество товаров на КАЖДОМ проходе — после
-            # merge target вбирает товары source, при следующей итерации
-            # это важно для выбора target'а.
-            counts_rows = db.session.query(Product.category_id, _f.count(Product.id)).group_by(Product.category_id).all()
-            counts = {cid: cnt for cid, cnt in counts_rows}
-
-            for _key, group in duplicate_groups:
-                group_sorted = sorted(group, key=lambda c: (-counts.get(c.id, 0), c.id))
-                target = group_sorted[0]
-                sources = group_sorted[1:]
-                for src in sources:
-                    result = _merge_categories_impl(src.id, target.id)
-                    total_products += result['products_moved']
-                    total_aliases += result['aliases_relinked']
-                    total_removed += 1
-                total_groups += 1
-
-            # Flush между проходами, чтобы следующая итерация видела актуальную
-            # иерархию (дети смердженных родителей теперь могут стать новыми
-            # дубликатами под общим parent'ом).
-            db.session.flush()
-
+        mapping, groups_merged, passes = _plan_exact_duplicate_merges()
+        result = _apply_merges(mapping)
         db.session.commit()
     except Exception as e:  # noqa: BLE001
         db.session.rollback()
@@ -333,10 +389,10 @@ def merge_exact_duplicates():
 
     return jsonify({
         'success': True,
-        'groups_merged': total_groups,
-        'categories_removed': total_removed,
-        'products_moved': total_products,
-        'aliases_relinked': total_aliases,
+        'groups_merged': groups_merged,
+        'categories_removed': len(mapping),
+        'products_moved': result['products_moved'],
+        'aliases_relinked': result['aliases_relinked'],
         'passes': passes,
     })
 
@@ -377,7 +433,10 @@ def find_similar():
     сиблингов, чтобы не предлагать мерджить категории из разных веток
     дерева. `threshold` регулируется параметром запроса.
 
-    Пары в результате — по одной (a.id < b.id).
+    Пары в результате — по одной, `a` — раньше `b` в порядке (parent_id,
+    name). Кандидаты ищутся триграммным индексом на каждого родителя
+    (`utils/fuzzy_index.py`) вместо перебора всех пар сиблингов; мера и
+    порог — прежний SequenceMatcher.ratio().
     """
     if not _check_admin():
         return jsonify({'error': 'Доступ запрещён'}), 403
@@ -394,19 +453,20 @@ def find_similar():
     for c in cats:
         by_parent.setdefault(c.parent_id, []).append(c)
 
+    gram_floor = default_gram_floor(threshold)
     pairs = []
     for parent_id, siblings in by_parent.items():
-        for i in range(len(siblings)):
-            for j in range(i + 1, len(siblings)):
-                a, b = siblings[i], siblings[j]
-                ratio = SequenceMatcher(None, a.name.lower(), b.name.lower()).ratio()
-                if ratio >= threshold:
-                    pairs.append({
-                        'a': {**_category_dict(a), 'products_count': counts.get(a.id, 0)},
-                        'b': {**_category_dict(b), 'products_count': counts.get(b.id, 0)},
-                        'ratio': round(ratio, 3),
-                        'parent_id': parent_id,
-                    })
+        if len(siblings) < 2:
+            continue
+        index = TrigramIndex(((i, c.name) for i, c in enumerate(siblings)), gram_floor=gram_floor)
+        for i, j, ratio in index.pairs(threshold):
+            a, b = siblings[i], siblings[j]
+            pairs.append({
+                'a': {**_category_dict(a), 'products_count': counts.get(a.id, 0)},
+                'b': {**_category_dict(b), 'products_count': counts.get(b.id, 0)},
+                'ratio': round(ratio, 3),
+                'parent_id': parent_id,
+            })
 
     pairs.sort(key=lambda p: p['ratio'], reverse=True)
     return jsonify({'items': pairs, 'total': len(pairs), 'threshold': threshold})
@@ -2,8 +2,10 @@ from flask import Blueprint, request, jsonify
 from extensions import db
 from models.characteristic import ProductCharacteristic
 from models.characteristics_list import CharacteristicsList
+from utils.response_cache import invalidate_on_write
 
 characteristics_bp = Blueprint('characteristics', __name__)
+invalidate_on_write(characteristics_bp, 'products')
 
 
 @characteristics_bp.route('/<int:product_id>', methods=['GET'])
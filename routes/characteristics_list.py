@@ -3,8 +3,11 @@ from extensions import db
 from models.characteristics_list import CharacteristicsList
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from sqlalchemy.exc import IntegrityError
+from utils.response_cache import invalidate_on_write
 
 characteristics_list_bp = Blueprint('characteristics_list', __name__)
+# Название / единица характеристики видны в карточке товара.
+invalidate_on_write(characteristics_list_bp, 'products')
 
 @characteristics_list_bp.route('/', methods=['GET'])
 @jwt_required()
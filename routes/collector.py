@@ -14,7 +14,7 @@ Endpoints для сервиса сбора данных 2GIS.
 
 Internal (X-Integration-Key) — для локального воркера:
 - POST /internal/collector/heartbeat
-- GET  /internal/collector/next-task            берёт queued → running
+- GET  /internal/collector/next-task            берёт queued → running (?wait=N — long-poll)
 - POST /internal/collector/tasks/<id>/progress  live-прогресс
 - POST /internal/collector/tasks/<id>/log       строка лога
 - POST /internal/collector/tasks/<id>/files     регистрирует собранный файл
@@ -41,6 +41,8 @@ from models.collector import (
     TASK_STATUSES, TASK_COMMANDS, FILE_FORMATS,
 )
 from models.systemuser import SystemUser
+from services import command_channel, presence
+from utils import json_provider
 
 
 collector_bp = Blueprint('collector', __name__)
@@ -111,11 +113,26 @@ def _worker():
     return w
 
 
+# Ключ воркера в services/presence.py. collector_worker.last_heartbeat_at
+# обновляется только раз в presence.PERSIST_SECONDS.
+PRESENCE_KEY = 'collector'
+
+# hostname воркера, каким его последний раз видел в БД этот процесс.
+# Смена хоста (рестарт воркера на другой машине) пишется сразу, а не на
+# медленном пути раз в PERSIST_SECONDS; там же значение сверяется с БД.
+_known_hostname = None
+
+
 def _worker_online():
-    w = _worker()
-    if not w.last_heartbeat_at:
-        return False
-    return (datetime.utcnow() - w.last_heartbeat_at).total_seconds() < HEARTBEAT_TIMEOUT_SEC
+    return presence.is_online(PRESENCE_KEY, HEARTBEAT_TIMEOUT_SEC)
+
+
+def _worker_dict(w):
+    d = w.to_dict()
+    seen = presence.last_seen(PRESENCE_KEY)
+    if seen is not None and (w.last_heartbeat_at is None or seen > w.last_heartbeat_at):
+        d['last_heartbeat_at'] = seen.isoformat() + 'Z'
+    return d
 
 
 def _parse_custom_url(url):
@@ -457,11 +474,12 @@ def stream_task(task_id):
                     break
                 snap = _enrich_task_dict(t.to_dict(include_files=True))
                 snap['online'] = _worker_online()
-                snap_json = json.dumps(snap, ensure_ascii=False, default=str)
                 event_type = 'initial' if last_snap is None else 'update'
-                if snap_json != last_snap:
+                # Сравниваем dict'ы, JSON собираем только когда есть что слать.
+                if snap != last_snap:
+                    snap_json = json_provider.dumps(snap, default=str).decode()
                     yield f'event: {event_type}\ndata: {snap_json}\n\n'
-                    last_snap = snap_json
+                    last_snap = snap
                     last_ping = time.time()
                 if time.time() - last_ping > 25:
                     yield f': ping {int(time.time())}\n\n'
@@ -527,7 +545,7 @@ def worker_status():
     return jsonify({
         'success': True,
         'online': _worker_online(),
-        'data': w.to_dict(),
+        'data': _worker_dict(w),
     }), 200
 
 
@@ -644,12 +662,19 @@ def columns_available():
 def internal_heartbeat():
     if not _check_integration_key():
         return jsonify({'error': 'forbidden'}), 403
+    global _known_hostname
     data = request.get_json(silent=True) or {}
-    w = _worker()
-    w.last_heartbeat_at = datetime.utcnow()
-    if data.get('hostname'):
-        w.hostname = str(data['hostname'])[:200]
-    db.session.commit()
+    hostname = str(data['hostname'])[:200] if data.get('hostname') else None
+    persist = presence.beat(PRESENCE_KEY)
+    if persist or (hostname is not None and hostname != _known_hostname):
+        w = _worker()
+        if persist:
+            w.last_heartbeat_at = datetime.utcnow()
+        if hostname is not None:
+            w.hostname = hostname
+        stored = w.hostname
+        db.session.commit()
+        _known_hostname = stored
     return jsonify({'ok': True}), 200
 
 
@@ -663,34 +688,44 @@ def internal_next_task():
          (и повторяем поиск), возвращаем следующую.
       3. Если ок — переводим task.status queued→running, started_at=now.
       4. Возвращаем {task: {...}} для воркера.
+
+    С ?wait=N при пустой очереди запрос ждёт новую run_now-команду до N
+    секунд (services/command_channel.py) вместо того, чтобы воркер
+    крутил ручку в цикле.
     """
     if not _check_integration_key():
         return jsonify({'error': 'forbidden'}), 403
 
-    # Достаём команды по очереди пока не найдём валидную задачу.
-    while True:
-        cmd = (
-            CollectorCommand.query
-            .filter_by(command='run_now', consumed_at=None)
-            .order_by(CollectorCommand.created_at)
-            .first()
-        )
-        if cmd is None:
-            return jsonify({'task': None}), 200
-
-        cmd.consumed_at = datetime.utcnow()
-        task = db.session.get(CollectorTask, cmd.task_id)
-
-        if task is None or task.status in ('cancelled', 'success', 'failed'):
-            # Задача уже недействительна, коммитим consume и берём следующую.
+    def take_task():
+        # Достаём команды по очереди пока не найдём валидную задачу.
+        while True:
+            cmd = (
+                CollectorCommand.query
+                .filter_by(command='run_now', consumed_at=None)
+                .order_by(CollectorCommand.created_at)
+                .with_for_update(skip_locked=True)
+                .first()
+            )
+            if cmd is None:
+                return None
+
+            cmd.consumed_at = datetime.utcnow()
+            task = db.session.get(CollectorTask, cmd.task_id)
+
+            if task is None or task.status in ('cancelled', 'success', 'failed'):
+                # Задача уже недействительна, коммитим consume и берём следующую.
+                db.session.commit()
+                continue
+
+            task.status = 'running'
+            task.started_at = datetime.utcnow()
+            task.phase = 'starting'
             db.session.commit()
-            continue
+            return task.to_dict()
 
-        task.status = 'running'
-        task.started_at = datetime.utcnow()
-        task.phase = 'starting'
-        db.session.commit()
-        return jsonify({'task': task.to_dict()}), 200
+    wait = command_channel.parse_wait(request.args.get('wait'))
+    task = command_channel.long_poll(f'{command_channel.COLLECTOR_CHANNEL}:run_now', wait, take_task)
+    return jsonify({'task': task}), 200
 
 
 @collector_bp.route('/internal/tasks/<int:task_id>/progress', methods=['POST'])
@@ -9,8 +9,11 @@ from flask_jwt_extended import jwt_required, get_jwt
 
 from extensions import db
 from models import Driver, ProductDocument, Product
+from utils.response_cache import cached_response, invalidate_on_write
 
 drivers_bp = Blueprint('drivers', __name__)
+# Драйверы привязаны к документам товаров — они в карточке товара.
+invalidate_on_write(drivers_bp, 'drivers', 'products')
 
 IMAGE_EXTS = {'jpg', 'jpeg', 'png', 'gif', 'webp', 'svg'}
 
@@ -50,6 +53,7 @@ def list_drivers():
 
 
 @drivers_bp.route('/public', methods=['GET'])
+@cached_response('drivers')
 def list_public_drivers():
     """Публичный список активных драйверов — без JWT, для каталога на сайте."""
     drivers = (
@@ -40,8 +40,10 @@ from models.header_settings import (
 from models.category import Category
 from models.product import Product
 from routes.products import safe_slugify
+from utils.response_cache import cached_response, invalidate_on_write
 
 header_settings_bp = Blueprint('header_settings', __name__)
+invalidate_on_write(header_settings_bp, 'header')
 
 
 def _check_admin_role():
@@ -158,6 +160,7 @@ def _serialize_menu_item(
 # ─── Публичный эндпоинт ──────────────────────────────────────────────────
 
 @header_settings_bp.route('/public/header', methods=['GET'])
+@cached_response('header', 'categories')
 def get_public_header():
     settings = _get_or_create_settings()
 
@@ -3,8 +3,10 @@
 from flask import Blueprint, jsonify, request
 from extensions import db
 from models.homepage_block import HomepageBlock
+from utils.response_cache import invalidate_on_write
 
 homepage_block_titles_bp = Blueprint('homepage_block_titles', __name__)
+invalidate_on_write(homepage_block_titles_bp, 'homepage')
 
 
 # 🔹 Получить все названия блоков
@@ -2,8 +2,10 @@ from flask import Blueprint, request, jsonify
 from extensions import db
 from models.homepage_block import HomepageBlock
 from models.homepage_block_title import HomepageBlockItem
+from utils.response_cache import invalidate_on_write
 
 homepage_blocks_bp = Blueprint('homepage_blocks', __name__)
+invalidate_on_write(homepage_blocks_bp, 'homepage')
 
 
 @homepage_blocks_bp.route('/homepage-blocks', methods=['GET'])
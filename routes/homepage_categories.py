@@ -2,8 +2,10 @@ from flask import Blueprint, request, jsonify
 from extensions import db
 from models.homepage_categories import HomepageCategory
 from models.category import Category
+from utils.response_cache import invalidate_on_write
 
 homepage_categories_bp = Blueprint('homepage_categories', __name__)
+invalidate_on_write(homepage_categories_bp, 'homepage')
 
 
 # 🔹 Получить список выбранных категорий для главной
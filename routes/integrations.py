@@ -13,12 +13,12 @@ Internal часть (X-Integration-Key header) — для локального 
 - GET  /internal/integrations/<type>/settings          — воркер читает расписание
 - POST /internal/integrations/<type>/heartbeat         — воркер шлёт статус
 - GET  /internal/integrations/<type>/pending-command   — воркер проверяет, есть ли команда
+                                                        (?wait=N — long-poll, см. services/command_channel.py)
 - POST /internal/integrations/<type>/run/<run_id>      — обновить прогресс run'а
 - POST /internal/integrations/<type>/run               — создать новый run
 """
 
 import os
-import json
 import time
 from datetime import datetime, timedelta
 
@@ -32,6 +32,8 @@ from models.integration import (
     INTEGRATION_TYPES, SCHEDULE_MODES, RUN_STATUSES,
 )
 from models.systemuser import SystemUser
+from services import command_channel, presence
+from utils import json_provider
 
 
 integrations_bp = Blueprint('integrations', __name__)
@@ -42,7 +44,11 @@ integrations_bp = Blueprint('integrations', __name__)
 INTEGRATION_KEY = os.getenv('INTEGRATION_KEY', 'CHANGE_ME_IN_ENV')
 # Воркер шлёт heartbeat каждые 5 сек. 20 сек = 4 пропущенных подряд —
 # упал (сетевая моргалка на секунду не роняет статус). Плюс polling
-# админки 5 сек → макс задержка до обновления UI ~25 сек.
+# админки 5 сек → макс задержка до обновления UI ~25 сек. Отметка,
+# видимая другим gunicorn-воркерам, отстаёт от последнего удара меньше
+# чем на presence.FLUSH_SECONDS (5 сек): её возраст не больше 5 + 5
+# (интервал ударов) + 1 (presence.READ_POLL_SECONDS) ≈ 11 сек — с запасом
+# меньше порога.
 HEARTBEAT_TIMEOUT_SEC = 20
 
 
@@ -96,10 +102,22 @@ def _get_or_create_settings(type_):
     return s
 
 
+def _presence_key(type_):
+    return f'integration:{type_}'
+
+
 def _is_online(settings):
-    if not settings.last_heartbeat_at:
-        return False
-    return (datetime.utcnow() - settings.last_heartbeat_at).total_seconds() < HEARTBEAT_TIMEOUT_SEC
+    # Heartbeat'ы — в services/presence.py; settings.last_heartbeat_at
+    # обновляется только раз в presence.PERSIST_SECONDS.
+    return presence.is_online(_presence_key(settings.type), HEARTBEAT_TIMEOUT_SEC)
+
+
+def _settings_dict(settings):
+    d = settings.to_dict()
+    seen = presence.last_seen(_presence_key(settings.type))
+    if seen is not None and (settings.last_heartbeat_at is None or seen > settings.last_heartbeat_at):
+        d['last_heartbeat_at'] = seen.isoformat() + 'Z'
+    return d
 
 
 # ============ ADMIN endpoints ============
@@ -126,7 +144,7 @@ def list_integrations():
         result.append({
             'type': t,
             'online': _is_online(settings),
-            'settings': settings.to_dict(),
+            'settings': _settings_dict(settings),
             'last_run': last_run.to_dict() if last_run else None,
             'active_run': active_run.to_dict() if active_run else None,
             'queued_run': queued_run.to_dict() if queued_run else None,
@@ -161,7 +179,7 @@ def get_integration_detail(type_):
         'data': {
             'type': type_,
             'online': _is_online(settings),
-            'settings': settings.to_dict(),
+            'settings': _settings_dict(settings),
             'active_run': active_run.to_dict() if active_run else None,
             'queued_run': queued_run.to_dict() if queued_run else None,
             'history': [r.to_dict() for r in history],
@@ -360,15 +378,16 @@ def stream_integration(type_):
 
     def event_gen():
         with app.app_context():
-            last_snap_json = None
+            last_snap = None
             last_ping = time.time()
             while True:
                 snap = _make_snapshot(type_)
-                snap_json = json.dumps(snap, ensure_ascii=False, default=str)
-                event_type = 'initial' if last_snap_json is None else 'update'
-                if snap_json != last_snap_json:
+                event_type = 'initial' if last_snap is None else 'update'
+                # Сравниваем dict'ы, JSON собираем только когда есть что слать.
+                if snap != last_snap:
+                    snap_json = json_provider.dumps(snap, default=str).decode()
                     yield f'event: {event_type}\ndata: {snap_json}\n\n'
-                    last_snap_json = snap_json
+                    last_snap = snap
                     last_ping = time.time()
                 # Ping для keep-alive (Render / Cloudflare могут закрыть idle 60s)
                 if time.time() - last_ping > 25:
@@ -425,7 +444,7 @@ def _make_snapshot(type_):
     return {
         'type': type_,
         'online': _is_online(settings),
-        'settings': settings.to_dict(),
+        'settings': _settings_dict(settings),
         'active_run': active_run.to_dict() if active_run else None,
         'queued_run': queued_run.to_dict() if queued_run else None,
         'last_run': last_run.to_dict() if last_run else None,
@@ -537,39 +556,56 @@ def internal_get_settings(type_):
 
 @integrations_bp.route('/internal/<type_>/heartbeat', methods=['POST'])
 def internal_heartbeat(type_):
-    """Воркер шлёт heartbeat каждые ~5 сек. Обновляем last_heartbeat_at."""
+    """
+    Воркер шлёт heartbeat каждые ~5 сек. Отметка — в presence, строка
+    settings обновляется только раз в presence.PERSIST_SECONDS.
+    """
     if not _check_integration_key():
         return jsonify({'error': 'forbidden'}), 403
     if not _valid_type(type_):
         return jsonify({'error': 'unknown_type'}), 404
 
-    settings = _get_or_create_settings(type_)
-    settings.last_heartbeat_at = datetime.utcnow()
-    db.session.commit()
+    if presence.beat(_presence_key(type_)):
+        settings = _get_or_create_settings(type_)
+        settings.last_heartbeat_at = datetime.utcnow()
+        db.session.commit()
     return jsonify({'ok': True}), 200
 
 
 @integrations_bp.route('/internal/<type_>/pending-command', methods=['GET'])
 def internal_pending_command(type_):
     """
-    Воркер каждые ~10 сек проверяет очередь команд.
     Отдаёт самую старую неисполненную команду и помечает её consumed_at.
+
+    Без параметров отвечает сразу (старые воркеры опрашивают раз в ~10
+    сек). С ?wait=N (до command_channel.LONG_POLL_MAX_SEC) при пустой
+    очереди держит запрос, пока админка не поставит команду, —
+    воркер получает её за доли секунды и сразу переподключается.
     """
     if not _check_integration_key():
         return jsonify({'error': 'forbidden'}), 403
     if not _valid_type(type_):
         return jsonify({'error': 'unknown_type'}), 404
 
-    cmd = (
-        IntegrationCommand.query.filter_by(type=type_, consumed_at=None)
-        .order_by(IntegrationCommand.created_at)
-        .first()
+    def take_command():
+        # SKIP LOCKED — два одновременных long-poll'а не получат одну команду.
+        cmd = (
+            IntegrationCommand.query.filter_by(type=type_, consumed_at=None)
+            .order_by(IntegrationCommand.created_at)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if cmd is None:
+            return None
+        cmd.consumed_at = datetime.utcnow()
+        db.session.commit()
+        return cmd.to_dict()
+
+    wait = command_channel.parse_wait(request.args.get('wait'))
+    command = command_channel.long_poll(
+        f'{command_channel.INTEGRATION_CHANNEL}:{type_}', wait, take_command,
     )
-    if cmd is None:
-        return jsonify({'command': None}), 200
-    cmd.consumed_at = datetime.utcnow()
-    db.session.commit()
-    return jsonify({'command': cmd.to_dict()}), 200
+    return jsonify({'command': command}), 200
 
 
 @integrations_bp.route('/internal/<type_>/run', methods=['POST'])
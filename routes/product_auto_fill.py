@@ -2,7 +2,8 @@
 AI-driven product page parser.
 
 POST /api/admin/products/auto-fill {url}
-  → fetches the source page, hands the cleaned HTML to Claude with a
+  → fetches the source page, cleans it in one streaming pass
+    (utils/product_page_parser.py), hands the cleaned HTML to Claude with a
     structured-output tool, and returns extracted product data:
     name, description (translated to Russian), image_urls (up to 10),
     characteristics ([{key, value, unit}]).
@@ -10,22 +11,52 @@ POST /api/admin/products/auto-fill {url}
 Used by the admin product create form when the operator pastes a URL
 to a competitor / supplier product page.
 
+POST /api/admin/products/auto-fill/jobs {url, refresh?}
+  → same extraction as a background job: returns {job_id} immediately,
+    the fetch + LLM call run in a small per-process thread pool.
+GET  /api/admin/products/auto-fill/jobs/<id>         — poll status/result
+GET  /api/admin/products/auto-fill/jobs/<id>/stream  — SSE, ?token=<jwt>
+
+If the page's JSON-LD already describes the product completely and in
+Russian, that data is returned without calling the LLM at all.
+
+Successful extractions are cached by normalized source URL (see
+models/ai_auto_fill_job.py), so re-importing the same page skips the
+donor fetch and the LLM call entirely.
+
+The LLM client can be injected through app.config['AUTO_FILL_LLM_CLIENT']
+(any object with an anthropic-compatible `messages.create`), which lets
+tests run against a local stub.
+
 Access is gated through ai_consultant_access.allowed_product_import_user_ids.
 """
 
 from __future__ import annotations
 
+import codecs
+import json
 import os
-import re
-from urllib.parse import urlparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 
 import requests
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context, current_app
 
 from routes.ai_consultant_access import _resolve_viewer, _has_product_import_access
 from extensions import db
 from models.ai_logs import AIImportLog, IMPORT_STATUS_ERROR, IMPORT_STATUS_IMPORTED
 from models.ai_consultant_access import AIConsultantAccess
+from models.ai_auto_fill_job import (
+    AIAutoFillJob,
+    JOB_STATUS_QUEUED,
+    JOB_STATUS_RUNNING,
+    JOB_STATUS_DONE,
+    JOB_STATUS_ERROR,
+)
+from utils.product_page_parser import ProductPageParser, is_complete_russian_product
 
 product_auto_fill_bp = Blueprint('product_auto_fill', __name__)
 
@@ -34,7 +65,7 @@ MODEL_ID = 'claude-haiku-4-5'
 
 # Page-fetch limits — keep the operator from accidentally pointing the
 # server at a 50MB binary.
-MAX_HTML_BYTES = 1_500_000  # ~1.5MB raw HTML; we strip/trim before sending to Claude
+MAX_HTML_BYTES = 1_500_000  # ~1.5MB raw HTML; cleaned while streaming, see _fetch_page
 HTML_FETCH_TIMEOUT = 15
 USER_AGENT = (
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
@@ -68,6 +99,23 @@ MAX_CLAUDE_INPUT_CHARS = 100_000
 
 MAX_IMAGE_URLS = 10
 
+# Background jobs. Each gunicorn worker owns a small pool for the slow
+# outbound work (donor fetch + LLM call), so a burst of imports queues up
+# here instead of pinning the 16 request threads. MAX_PENDING bounds the
+# queue per process; beyond it the submit endpoint answers 429.
+AUTO_FILL_MAX_WORKERS = int(os.getenv('AUTO_FILL_MAX_WORKERS', '2'))
+AUTO_FILL_MAX_PENDING = int(os.getenv('AUTO_FILL_MAX_PENDING', '8'))
+# How long a successful extraction is reused for the same normalized URL.
+AUTO_FILL_CACHE_TTL = timedelta(hours=int(os.getenv('AUTO_FILL_CACHE_TTL_HOURS', '168')))
+# A queued/running job that has not been touched for this long belongs to a
+# worker process that died (deploy, OOM) — report it as failed. Must cover
+# a full queue: MAX_PENDING / MAX_WORKERS jobs × (fetch + LLM timeouts).
+JOB_STALE_AFTER = timedelta(minutes=10)
+
+# Query parameters that never change the page content — dropped from the
+# cache key so links shared from ads / messengers still hit the cache.
+_TRACKING_PARAMS = {'gclid', 'fbclid', 'yclid', 'ysclid', '_openstat', 'from', 'ref'}
+
 
 SYSTEM_PROMPT = """Ты помогаешь админу магазина оборудования заполнить карточку товара.
 Тебе дают HTML страницы товара с любого сайта-донора. Твоя задача — извлечь:
@@ -92,21 +140,6 @@ SYSTEM_PROMPT = """Ты помогаешь админу магазина обо
 массив, не выдумывай."""
 
 
-def _clean_html(html: str) -> str:
-    """Strip noise and trim to a Claude-friendly size."""
-    # Remove scripts/styles/svg/iframe/noscript with their content
-    html = re.sub(r'<script\b[^>]*>.*?</script>', '', html, flags=re.IGNORECASE | re.DOTALL)
-    html = re.sub(r'<style\b[^>]*>.*?</style>', '', html, flags=re.IGNORECASE | re.DOTALL)
-    html = re.sub(r'<noscript\b[^>]*>.*?</noscript>', '', html, flags=re.IGNORECASE | re.DOTALL)
-    html = re.sub(r'<svg\b[^>]*>.*?</svg>', '', html, flags=re.IGNORECASE | re.DOTALL)
-    html = re.sub(r'<iframe\b[^>]*>.*?</iframe>', '', html, flags=re.IGNORECASE | re.DOTALL)
-    # Strip HTML comments (often huge with templating frameworks)
-    html = re.sub(r'<!--.*?-->', '', html, flags=re.DOTALL)
-    # Collapse whitespace runs
-    html = re.sub(r'\s+', ' ', html)
-    return html[:MAX_CLAUDE_INPUT_CHARS]
-
-
 def _validate_url(url: str) -> tuple[bool, str]:
     """Return (ok, error_message). Accept http/https only."""
     try:
@@ -120,8 +153,14 @@ def _validate_url(url: str) -> tuple[bool, str]:
     return True, ''
 
 
-def _fetch_html(url: str) -> tuple[str | None, str | None]:
-    """Returns (html, error). On success error is None."""
+def _fetch_page(url: str) -> tuple[ProductPageParser | None, str | None]:
+    """
+    Returns (parsed_page, error). On success error is None.
+
+    The body is decoded and fed to the streaming cleaner chunk by chunk;
+    reading stops at MAX_HTML_BYTES or as soon as the cleaner has produced
+    MAX_CLAUDE_INPUT_CHARS of output, whichever comes first.
+    """
     # Send a Referer that matches the page's own host — some anti-bot
     # rules treat "no referer" as suspicious. Using the page's own origin
     # mimics the user clicking from a search result on the same site.
@@ -143,41 +182,57 @@ def _fetch_html(url: str) -> tuple[str | None, str | None]:
     except requests.exceptions.RequestException as e:
         return None, f'Ошибка загрузки страницы: {e}'
 
-    if resp.status_code != 200:
-        # Provide a more useful hint for the common 403 case
-        if resp.status_code == 403:
-            return None, (
-                'Сайт-донор отклонил запрос (HTTP 403). У него стоит '
-                'защита от ботов или он рендерит контент через JavaScript. '
-                'Попробуйте другой источник.'
-            )
-        return None, f'Сайт-донор вернул HTTP {resp.status_code}'
-
-    content_type = (resp.headers.get('Content-Type') or '').lower()
-    if 'html' not in content_type and 'xml' not in content_type:
-        return None, f'URL не является HTML-страницей (Content-Type: {content_type})'
-
-    # Read with size cap to avoid downloading huge files
-    chunks = []
-    total = 0
-    for chunk in resp.iter_content(chunk_size=64_000):
-        if not chunk:
-            continue
-        chunks.append(chunk)
-        total += len(chunk)
-        if total >= MAX_HTML_BYTES:
-            break
-    raw = b''.join(chunks)
-    # Best-effort decode
-    encoding = resp.encoding or 'utf-8'
-    try:
-        return raw.decode(encoding, errors='replace'), None
-    except LookupError:
-        return raw.decode('utf-8', errors='replace'), None
-
+    with resp:
+        if resp.status_code != 200:
+            # Provide a more useful hint for the common 403 case
+            if resp.status_code == 403:
+                return None, (
+                    'Сайт-донор отклонил запрос (HTTP 403). У него стоит '
+                    'защита от ботов или он рендерит контент через JavaScript. '
+                    'Попробуйте другой источник.'
+                )
+            return None, f'Сайт-донор вернул HTTP {resp.status_code}'
+
+        content_type = (resp.headers.get('Content-Type') or '').lower()
+        if 'html' not in content_type and 'xml' not in content_type:
+            return None, f'URL не является HTML-страницей (Content-Type: {content_type})'
+
+        # Best-effort incremental decode — multi-byte characters split
+        # across chunk boundaries are stitched by the decoder.
+        try:
+            decoder = codecs.getincrementaldecoder(resp.encoding or 'utf-8')(errors='replace')
+        except LookupError:
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+        page = ProductPageParser(MAX_CLAUDE_INPUT_CHARS)
+        total = 0
+        try:
+            for chunk in resp.iter_content(chunk_size=64_000):
+                if not chunk:
+                    continue
+                page.feed(decoder.decode(chunk))
+                total += len(chunk)
+                if total >= MAX_HTML_BYTES or page.full:
+                    break
+            else:
+                page.feed(decoder.decode(b'', final=True))
+            page.close()
+        except requests.exceptions.RequestException as e:
+            return None, f'Ошибка загрузки страницы: {e}'
+
+    return page, None
+
+
+def _get_llm_client():
+    """
+    Returns (client, error). An injected client from
+    app.config['AUTO_FILL_LLM_CLIENT'] wins; otherwise a real Anthropic
+    client is built from ANTHROPIC_API_KEY.
+    """
+    injected = current_app.config.get('AUTO_FILL_LLM_CLIENT')
+    if injected is not None:
+        return injected, None
 
-def _call_claude(html: str, source_url: str) -> tuple[dict | None, str | None]:
-    """Call Anthropic Claude with structured tool-use output."""
     if not ANTHROPIC_API_KEY:
         return None, 'ANTHROPIC_API_KEY не настроен на сервере'
 
@@ -186,7 +241,18 @@ def _call_claude(html: str, source_url: str) -> tuple[dict | None, str | None]:
     except ImportError:
         return None, 'Библиотека anthropic не установлена'
 
-    client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+    return anthropic.Anthropic(api_key=ANTHROPIC_API_KEY), None
+
+
+def _call_claude(html: str, source_url: str, hints: dict | None = None) -> tuple[dict | None, str | None]:
+    """
+    Call Anthropic Claude with structured tool-use output. `hints` is the
+    page's own JSON-LD / OpenGraph product data, passed along so the model
+    does not have to dig the same fields out of the markup.
+    """
+    client, err = _get_llm_client()
+    if err:
+        return None, err
 
     tool_schema = {
         'name': 'submit_product_data',
@@ -219,8 +285,13 @@ def _call_claude(html: str, source_url: str) -> tuple[dict | None, str | None]:
         },
     }
 
-    user_content = (
-        f'Источник: {source_url}\n\n'
+    user_content = f'Источник: {source_url}\n\n'
+    if hints:
+        user_content += (
+            f'Структурированные данные страницы (JSON-LD / OpenGraph):\n'
+            f'{json.dumps(hints, ensure_ascii=False)}\n\n'
+        )
+    user_content += (
         f'HTML страницы (отчищен от script/style):\n\n'
         f'{html}'
     )
@@ -333,13 +404,179 @@ def _summarize_for_log(data: dict) -> dict:
     }
 
 
-@product_auto_fill_bp.route('/admin/products/auto-fill', methods=['POST'])
-def auto_fill():
-    # Access check — same gate as the UI button
+def _normalize_source_url(url: str) -> str:
+    """
+    Cache key for a donor page: lower-case scheme/host, no default port,
+    no fragment, no tracking params, sorted query, no trailing slash.
+    """
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or '').lower()
+    if parsed.port and not ((scheme == 'http' and parsed.port == 80) or
+                            (scheme == 'https' and parsed.port == 443)):
+        host = f'{host}:{parsed.port}'
+    path = parsed.path or '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+        if not k.lower().startswith('utm_') and k.lower() not in _TRACKING_PARAMS
+    )
+    return urlunparse((scheme, host, path, '', urlencode(query), ''))
+
+
+def _extract_product(url: str) -> tuple[dict | None, str | None, int]:
+    """
+    The whole slow pipeline: fetch + clean (one streaming pass) → LLM →
+    normalize. When the page's JSON-LD already carries a complete product
+    in Russian, the LLM call is skipped.
+    Returns (data, error, http_status_for_error).
+    """
+    page, err = _fetch_page(url)
+    if err:
+        return None, err, 400
+
+    structured = page.structured_product(url)
+    if is_complete_russian_product(structured):
+        return _normalize_extracted(structured, url), None, 200
+
+    cleaned = page.text()
+    if len(cleaned) < 100:
+        return None, 'Страница пустая или не содержит распознаваемого HTML', 400
+
+    hints = {k: v for k, v in structured.items() if v} or None
+    extracted, err = _call_claude(cleaned, url, hints)
+    if err:
+        return None, err, 502
+
+    return _normalize_extracted(extracted or {}, url), None, 200
+
+
+def _find_cached_result(normalized_url: str) -> dict | None:
+    """Latest successful extraction for the page, if still fresh."""
+    job = (
+        AIAutoFillJob.query
+        .filter(
+            AIAutoFillJob.normalized_url == normalized_url,
+            AIAutoFillJob.status == JOB_STATUS_DONE,
+            AIAutoFillJob.created_at >= datetime.utcnow() - AUTO_FILL_CACHE_TTL,
+        )
+        .order_by(AIAutoFillJob.created_at.desc())
+        .first()
+    )
+    return job.result if job is not None else None
+
+
+# ─── Background execution ────────────────────────────────────────────────
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_pending = 0
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=AUTO_FILL_MAX_WORKERS,
+                thread_name_prefix='auto-fill',
+            )
+        return _executor
+
+
+def _try_reserve_slot() -> bool:
+    global _pending
+    with _executor_lock:
+        if _pending >= AUTO_FILL_MAX_PENDING:
+            return False
+        _pending += 1
+        return True
+
+
+def _release_slot() -> None:
+    global _pending
+    with _executor_lock:
+        _pending = max(0, _pending - 1)
+
+
+def _run_job(app, job_id: int, viewer: dict) -> None:
+    """Pool worker: runs the pipeline for one job and stores the outcome."""
+    try:
+        with app.app_context():
+            job = db.session.get(AIAutoFillJob, job_id)
+            if job is None:
+                return
+            job.status = JOB_STATUS_RUNNING
+            db.session.commit()
+
+            try:
+                data, err, err_status = _extract_product(job.source_url)
+            except Exception as e:  # noqa: BLE001 — the job must always finish
+                data, err, err_status = None, f'Внутренняя ошибка импорта: {e}', 500
+
+            job = db.session.get(AIAutoFillJob, job_id)
+            if job is None:
+                return
+            if err:
+                job.status = JOB_STATUS_ERROR
+                job.error_message = err
+                job.error_status = err_status
+                db.session.commit()
+                _log_import_attempt(viewer, job.source_url, IMPORT_STATUS_ERROR, error_message=err)
+                return
+
+            job.import_log_id = _log_import_attempt(
+                viewer, job.source_url, IMPORT_STATUS_IMPORTED,
+                imported_data=_summarize_for_log(data),
+            )
+            job.result = data
+            job.status = JOB_STATUS_DONE
+            db.session.commit()
+    except Exception as e:  # noqa: BLE001
+        print(f"[auto-fill] job {job_id} failed: {type(e).__name__}: {e}", flush=True)
+    finally:
+        _release_slot()
+
+
+def _job_view(job: AIAutoFillJob) -> dict:
+    """to_dict() with stale queued/running jobs reported as failed."""
+    out = job.to_dict()
+    if job.status in (JOB_STATUS_QUEUED, JOB_STATUS_RUNNING) and \
+            job.updated_at and datetime.utcnow() - job.updated_at > JOB_STALE_AFTER:
+        out['status'] = JOB_STATUS_ERROR
+        out['error'] = 'Задача прервана (перезапуск сервера). Запустите импорт ещё раз.'
+        out['error_status'] = 500
+    return out
+
+
+def _check_access():
+    """Returns (viewer, error_response)."""
     viewer = _resolve_viewer()
     settings = AIConsultantAccess.get_or_create()
     if not _has_product_import_access(viewer, settings):
-        return jsonify({'error': 'Доступ к импорту товаров не выдан'}), 403
+        return viewer, (jsonify({'error': 'Доступ к импорту товаров не выдан'}), 403)
+    return viewer, None
+
+
+def _load_own_job(job_id: int, viewer: dict):
+    """Returns (job, error_response). Owner sees every job, others only theirs."""
+    job = db.session.get(AIAutoFillJob, job_id)
+    if job is None:
+        return None, (jsonify({'error': 'Задача не найдена'}), 404)
+    if viewer['kind'] != 'admin' and job.user_id != viewer.get('user_id'):
+        return None, (jsonify({'error': 'Нет доступа к задаче'}), 403)
+    return job, None
+
+
+# ─── Endpoints ───────────────────────────────────────────────────────────
+
+@product_auto_fill_bp.route('/admin/products/auto-fill', methods=['POST'])
+def auto_fill():
+    """Synchronous variant, kept for older admin builds. Uses the URL cache too."""
+    viewer, denied = _check_access()
+    if denied:
+        return denied
 
     body = request.get_json(silent=True) or {}
     url = (body.get('url') or '').strip()
@@ -351,23 +588,23 @@ def auto_fill():
         _log_import_attempt(viewer, url, IMPORT_STATUS_ERROR, error_message=err)
         return jsonify({'error': err}), 400
 
-    html, err = _fetch_html(url)
-    if err:
-        _log_import_attempt(viewer, url, IMPORT_STATUS_ERROR, error_message=err)
-        return jsonify({'error': err}), 400
-
-    cleaned = _clean_html(html or '')
-    if len(cleaned) < 100:
-        msg = 'Страница пустая или не содержит распознаваемого HTML'
-        _log_import_attempt(viewer, url, IMPORT_STATUS_ERROR, error_message=msg)
-        return jsonify({'error': msg}), 400
-
-    extracted, err = _call_claude(cleaned, url)
-    if err:
-        _log_import_attempt(viewer, url, IMPORT_STATUS_ERROR, error_message=err)
-        return jsonify({'error': err}), 502
+    normalized = _normalize_source_url(url)
+    data = None if body.get('refresh') else _find_cached_result(normalized)
+    if data is None:
+        data, err, err_status = _extract_product(url)
+        if err:
+            _log_import_attempt(viewer, url, IMPORT_STATUS_ERROR, error_message=err)
+            return jsonify({'error': err}), err_status
+        # Store as a finished job so later imports of the page hit the cache.
+        db.session.add(AIAutoFillJob(
+            user_id=viewer.get('user_id'),
+            source_url=url,
+            normalized_url=normalized,
+            status=JOB_STATUS_DONE,
+            result=data,
+        ))
+        db.session.commit()
 
-    data = _normalize_extracted(extracted or {}, url)
     log_id = _log_import_attempt(
         viewer, url, IMPORT_STATUS_IMPORTED,
         imported_data=_summarize_for_log(data),
@@ -375,3 +612,122 @@ def auto_fill():
     # import_log_id передаётся клиенту, чтобы он PATCH-ом обновил его на
     # IMPORT_STATUS_SAVED после реального сохранения товара.
     return jsonify({'success': True, 'data': data, 'import_log_id': log_id}), 200
+
+
+@product_auto_fill_bp.route('/admin/products/auto-fill/jobs', methods=['POST'])
+def submit_auto_fill_job():
+    """
+    Queue an extraction and return right away. A cache hit (same page,
+    extracted within AUTO_FILL_CACHE_TTL) is answered with a finished job.
+    Pass {"refresh": true} to bypass the cache.
+    """
+    viewer, denied = _check_access()
+    if denied:
+        return denied
+
+    body = request.get_json(silent=True) or {}
+    url = (body.get('url') or '').strip()
+    if not url:
+        return jsonify({'error': 'Поле url обязательно'}), 400
+
+    ok, err = _validate_url(url)
+    if not ok:
+        _log_import_attempt(viewer, url, IMPORT_STATUS_ERROR, error_message=err)
+        return jsonify({'error': err}), 400
+
+    normalized = _normalize_source_url(url)
+    job = AIAutoFillJob(
+        user_id=viewer.get('user_id'),
+        source_url=url,
+        normalized_url=normalized,
+        status=JOB_STATUS_QUEUED,
+    )
+
+    cached = None if body.get('refresh') else _find_cached_result(normalized)
+    if cached is not None:
+        job.status = JOB_STATUS_DONE
+        job.result = cached
+        job.cached = True
+        job.import_log_id = _log_import_attempt(
+            viewer, url, IMPORT_STATUS_IMPORTED,
+            imported_data=_summarize_for_log(cached),
+        )
+        db.session.add(job)
+        db.session.commit()
+        return jsonify({'success': True, 'job_id': job.id, 'job': _job_view(job)}), 200
+
+    if not _try_reserve_slot():
+        return jsonify({'error': 'Слишком много импортов в очереди, попробуйте через минуту'}), 429
+
+    try:
+        db.session.add(job)
+        db.session.commit()
+        app = current_app._get_current_object()
+        _get_executor().submit(_run_job, app, job.id, dict(viewer))
+    except Exception:
+        _release_slot()
+        raise
+
+    return jsonify({'success': True, 'job_id': job.id, 'job': _job_view(job)}), 202
+
+
+@product_auto_fill_bp.route('/admin/products/auto-fill/jobs/<int:job_id>', methods=['GET'])
+def get_auto_fill_job(job_id):
+    viewer, denied = _check_access()
+    if denied:
+        return denied
+    job, err = _load_own_job(job_id, viewer)
+    if err:
+        return err
+    return jsonify({'success': True, 'job': _job_view(job)}), 200
+
+
+@product_auto_fill_bp.route('/admin/products/auto-fill/jobs/<int:job_id>/stream', methods=['GET'])
+def stream_auto_fill_job(job_id):
+    """
+    SSE: `update` on every status change, `finished` once done/error.
+    JWT comes from ?token= (EventSource cannot set headers), same as the
+    collector and integrations streams.
+    """
+    token = request.args.get('token')
+    if token:
+        request.environ['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    viewer, denied = _check_access()
+    if denied:
+        return denied
+    job, err = _load_own_job(job_id, viewer)
+    if err:
+        return err
+
+    app = current_app._get_current_object()
+
+    def event_gen():
+        with app.app_context():
+            last_status = None
+            last_ping = time.time()
+            while True:
+                db.session.expire_all()
+                j = db.session.get(AIAutoFillJob, job_id)
+                if j is None:
+                    yield 'event: gone\ndata: {}\n\n'
+                    break
+                view = _job_view(j)
+                if view['status'] != last_status:
+                    yield f"event: update\ndata: {json.dumps(view, ensure_ascii=False, default=str)}\n\n"
+                    last_status = view['status']
+                    last_ping = time.time()
+                if view['status'] in (JOB_STATUS_DONE, JOB_STATUS_ERROR):
+                    yield 'event: finished\ndata: {}\n\n'
+                    break
+                if time.time() - last_ping > 25:
+                    yield f': ping {int(time.time())}\n\n'
+                    last_ping = time.time()
+                time.sleep(1)
+
+    headers = {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache, no-transform',
+        'Connection': 'keep-alive',
+        'X-Accel-Buffering': 'no',
+    }
+    return Response(stream_with_context(event_gen()), headers=headers)
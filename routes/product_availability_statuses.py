@@ -2,8 +2,10 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt
 from extensions import db
 from models.product_availability_status import ProductAvailabilityStatus
+from utils.response_cache import invalidate_on_write
 
 product_availability_statuses_bp = Blueprint('product_availability_statuses', __name__)
+invalidate_on_write(product_availability_statuses_bp, 'brands_statuses')
 
 
 # 🔹 Получить список статусов наличия
@@ -11,8 +11,10 @@ from utils.formula_engine import (
 from utils.pricing_presets import MARGIN_VAR_NAME
 from datetime import datetime
 import re
+from utils.response_cache import invalidate_on_write
 
 product_costs_bp = Blueprint('product_costs', __name__)
+invalidate_on_write(product_costs_bp, 'products')
 
 
 # Имена «физических» переменных товара. Если хоть одна из формул склада
@@ -473,11 +475,37 @@ def _try_calculate(pwc: ProductWarehouseCost):
         if not warehouse or not warehouse.formula:
             return
 
-        currency_rate = warehouse.currency.rate_to_tenge if warehouse.currency else 1.0
         product_chars = extract_product_characteristics(pwc.product_id)
-
         variables = WarehouseVariable.query.filter_by(warehouse_id=pwc.warehouse_id) \
             .order_by(WarehouseVariable.sort_order).all()
+    except Exception:
+        values = dict(_FAILED_CALCULATION)
+    else:
+        values = calculate_cost_values(warehouse, variables, product_chars, pwc.cost_price)
+    for field, value in values.items():
+        setattr(pwc, field, value)
+
+
+# Расчёт не удался — calculated_* сбрасываются, цена «не посчитана».
+_FAILED_CALCULATION = {
+    'calculated_price': None,
+    'calculated_delivery': None,
+    'calculated_cost_no_margin': None,
+    'calculated_at': None,
+}
+
+
+def calculate_cost_values(warehouse, variables, product_chars, cost_price) -> dict:
+    """
+    calculated_* закупки по формулам склада — без запросов в БД, чтобы
+    пакетный код (services/catalog_import.py) грузил склады, переменные и
+    характеристики один раз на пачку. `warehouse.formula` должна быть.
+
+    Ключа calculated_cost_no_margin нет, если у склада не задана
+    cost_formula — старое значение не трогаем (см. bulk recalc).
+    """
+    try:
+        currency_rate = warehouse.currency.rate_to_tenge if warehouse.currency else 1.0
 
         # Умная защита: если хоть одна формула склада (цена/доставка/себестоимость/
         # переменные) использует физические переменные товара (вес, габариты),
@@ -487,43 +515,45 @@ def _try_calculate(pwc: ProductWarehouseCost):
         # и расчёт идёт как обычно.
         if _warehouse_uses_physical_vars(warehouse.formula, variables) \
                 and not _product_has_dimensions(product_chars):
-            pwc.calculated_price = 0
-            pwc.calculated_delivery = None
-            pwc.calculated_cost_no_margin = None
-            pwc.calculated_at = datetime.now()
-            return
+            return {
+                'calculated_price': 0,
+                'calculated_delivery': None,
+                'calculated_cost_no_margin': None,
+                'calculated_at': datetime.now(),
+            }
         var_list = [{'name': v.name, 'formula': v.formula} for v in variables]
+        values = {}
 
         # Сначала считаем delivery_formula — только для того чтобы записать
-        # `pwc.calculated_delivery` (отображается в UI как «Доставка за ед.»).
+        # `calculated_delivery` (отображается в UI как «Доставка за ед.»).
         # В саму розничную формулу `Доставка` НЕ подставляется — юзер сам
         # заводит на складе переменную `Доставка` со своей логикой (у BIO это
         # диапазоны по расчётному весу, у Equip — что-то другое).
         if warehouse.formula.delivery_formula:
             try:
                 delivery_value, _ = calculate_product_price(
-                    cost_price=pwc.cost_price,
+                    cost_price=cost_price,
                     currency_rate=currency_rate,
                     product_characteristics=product_chars,
                     warehouse_variables=var_list,
                     final_formula=warehouse.formula.delivery_formula
                 )
-                pwc.calculated_delivery = round(delivery_value, 2)
+                values['calculated_delivery'] = round(delivery_value, 2)
             except (FormulaError, Exception):
-                pwc.calculated_delivery = None
+                values['calculated_delivery'] = None
         else:
-            pwc.calculated_delivery = None
+            values['calculated_delivery'] = None
 
         price, all_vars = calculate_product_price(
-            cost_price=pwc.cost_price,
+            cost_price=cost_price,
             currency_rate=currency_rate,
             product_characteristics=product_chars,
             warehouse_variables=var_list,
             final_formula=warehouse.formula.formula
         )
 
-        pwc.calculated_price = round(price, 2)
-        pwc.calculated_at = datetime.now()
+        values['calculated_price'] = round(price, 2)
+        values['calculated_at'] = datetime.now()
 
         # Себестоимость без маржи — третья формула склада. Считаем тут же,
         # чтобы upsert закупки сразу перегонял все три значения и не нужно
@@ -532,59 +562,64 @@ def _try_calculate(pwc: ProductWarehouseCost):
         if warehouse.formula.cost_formula:
             try:
                 cost_no_margin, _ = calculate_product_price(
-                    cost_price=pwc.cost_price,
+                    cost_price=cost_price,
                     currency_rate=currency_rate,
                     product_characteristics=product_chars,
                     warehouse_variables=var_list,
                     final_formula=warehouse.formula.cost_formula
                 )
-                pwc.calculated_cost_no_margin = round(cost_no_margin, 2)
+                values['calculated_cost_no_margin'] = round(cost_no_margin, 2)
             except (FormulaError, Exception):
-                pwc.calculated_cost_no_margin = None
+                values['calculated_cost_no_margin'] = None
+        return values
 
     except (FormulaError, Exception):
         # If calculation fails, leave calculated_price as None
-        pwc.calculated_price = None
-        pwc.calculated_delivery = None
-        pwc.calculated_cost_no_margin = None
-        pwc.calculated_at = None
+        return dict(_FAILED_CALCULATION)
 
 
-def _apply_min_price(product_id: int):
+def apply_min_prices(product_ids) -> None:
     """
-    Найти минимальную calculated_price среди складов и записать в product.
+    Найти минимальную calculated_price среди складов и записать в product —
+    одним UPDATE на весь набор товаров.
 
     Приоритет: сначала ищем склад с минимумом среди тех, где quantity > 0
     (товар реально доступен) — оттуда берём цену, поставщика И остаток.
     Если в наличии нигде нет — берём минимум без учёта остатка
     (как «теоретическая» цена при поступлении), а quantity ставим 0.
-    """
-    from models.product import Product
-
-    all_costs = ProductWarehouseCost.query.filter_by(product_id=product_id).all()
-
-    in_stock = [c for c in all_costs if c.calculated_price and c.calculated_price > 0 and (c.quantity or 0) > 0]
-    fallback = [c for c in all_costs if c.calculated_price and c.calculated_price > 0]
-
-    best_cost = None
-    use_quantity = False
+    При равной цене побеждает закупка с меньшим id. Склада нет —
+    поставщик товара остаётся прежним.
 
-    if in_stock:
-        best_cost = min(in_stock, key=lambda c: c.calculated_price)
-        use_quantity = True
-    elif fallback:
-        best_cost = min(fallback, key=lambda c: c.calculated_price)
-
-    if not best_cost:
+    Не коммитит; несохранённые изменения закупок в сессии flush'ятся.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
         return
+    db.session.flush()
+    db.session.execute(
+        db.text("""
+            UPDATE product p
+            SET price = b.calculated_price,
+                supplier_id = COALESCE(w.supplier_id, p.supplier_id),
+                quantity = CASE WHEN b.in_stock THEN b.quantity ELSE 0 END
+            FROM (
+                SELECT DISTINCT ON (c.product_id)
+                       c.product_id, c.warehouse_id, c.calculated_price,
+                       COALESCE(c.quantity, 0) AS quantity,
+                       COALESCE(c.quantity, 0) > 0 AS in_stock
+                FROM product_warehouse_cost c
+                WHERE c.product_id = ANY(CAST(:ids AS INTEGER[]))
+                  AND c.calculated_price > 0
+                ORDER BY c.product_id, (COALESCE(c.quantity, 0) > 0) DESC, c.calculated_price, c.id
+            ) b
+            LEFT JOIN warehouse w ON w.id = b.warehouse_id
+            WHERE p.id = b.product_id
+        """),
+        {'ids': product_ids},
+    )
 
-    product = Product.query.get(product_id)
-    if not product:
-        return
 
-    product.price = best_cost.calculated_price
-    warehouse = Warehouse.query.get(best_cost.warehouse_id)
-    if warehouse:
-        product.supplier_id = warehouse.supplier_id
-    product.quantity = (best_cost.quantity or 0) if use_quantity else 0
+def _apply_min_price(product_id: int):
+    """Минимальная цена по складам → product (см. `apply_min_prices`) и commit."""
+    apply_min_prices([product_id])
     db.session.commit()
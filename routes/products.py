@@ -3,7 +3,7 @@ import shutil
 import re
 import unicodedata
 import math
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, abort
 from flask_jwt_extended import verify_jwt_in_request, get_jwt
 import logging
 from sqlalchemy.orm import joinedload
@@ -21,8 +21,15 @@ from models.cart import Cart
 from models.order import OrderItem
 from models.product_warehouse_cost import ProductWarehouseCost
 from models.warehouse import Warehouse
+from services import attribute_index, blob_store, category_closure, change_feed, media_index
+from utils import json_provider
+from utils.compression import compress_level
+from utils.image_variants import card_image_url
+from utils.query_budget import query_budget
+from utils.response_cache import cached_response, invalidate_on_write
 
 products_bp = Blueprint('products', __name__)
+invalidate_on_write(products_bp, 'products')
 logger = logging.getLogger(__name__)
 
 
@@ -198,12 +205,15 @@ def delete_draft(product_id):
         # Удаляем связанные записи
         print(f"Удаление связанных записей для товара ID: {product_id}")
         
+        # Ссылки на общие файлы хранилища снимаем до удаления строк
+        blob_store.release_for_product(product_id)
         media_deleted = ProductMedia.query.filter_by(product_id=product_id).delete()
         documents_deleted = ProductDocument.query.filter_by(product_id=product_id).delete()
         characteristics_deleted = ProductCharacteristic.query.filter_by(product_id=product_id).delete()
         print(f"Удалено медиа: {media_deleted}, документов: {documents_deleted}, характеристик: {characteristics_deleted}")
 
         # Удаляем папку с файлами
+        media_index.forget_product(product_id)
         folder_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'products', str(product_id))
         try:
             if os.path.exists(folder_path):
@@ -499,6 +509,7 @@ def serialize_product(product, availability_status=None, product_images=None, su
         'category_id': product.category_id,
         'category': product.category.name if product.category else None,
         'image': first_image.url if first_image else None,
+        'thumbnail_url': card_image_url(first_image.url) if first_image else None,
         'availability_status': availability_status
     }
 
@@ -506,6 +517,7 @@ def serialize_product(product, availability_status=None, product_images=None, su
 
 
 @products_bp.route('/bulk', methods=['GET'])
+@query_budget(8)  # 6: товары, медиа, статусы, поставщики ×2, склад
 def get_products_bulk():
     ids_param = request.args.get('ids', '')
     if not ids_param:
@@ -563,7 +575,34 @@ def get_products_bulk():
     return jsonify([item[1] for item in serialized_items])
 
 
+@products_bp.route('/changes', methods=['GET'])
+@query_budget(6)  # 4: горизонт, страница, товары, себестоимости (попытки lock — exempt)
+def get_product_changes():
+    """
+    Лента изменений каталога после ?since=<seq> (см. services/change_feed.py).
+
+    Клиент сохраняет `next` из ответа и передаёт его следующим since;
+    has_more=True — сразу запросить ещё страницу. Первичная синхронизация:
+    запомнить `horizon` из любого ответа, выгрузить каталог целиком
+    (/api/admin/catalog/export) и дальше идти по ленте с since=horizon.
+    admin/system видят ещё складские себестоимости, оптовую цену и
+    скрытые товары целиком.
+    """
+    since = request.args.get('since', 0, type=int)
+    limit = request.args.get('limit', change_feed.DEFAULT_LIMIT, type=int)
+    if since < 0:
+        return jsonify({'success': False, 'message': 'since должен быть >= 0'}), 400
+    try:
+        data = change_feed.changes(since, limit, full=_is_system_user())
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"[changes] since={since}: {e}")
+        return jsonify({'success': False, 'message': 'Ошибка ленты изменений'}), 500
+    return jsonify({'success': True, 'data': data})
+
+
 @products_bp.route('/articles-map', methods=['GET'])
+@compress_level(gzip=1, br=1)
 def get_articles_map():
     """
     Лёгкий эндпоинт {article: id} для всех товаров.
@@ -572,17 +611,22 @@ def get_articles_map():
     при старте миграции мы хотим понять, какой equip-товар какому
     pospro-товару соответствует, не таская через сеть полные карточки.
 
-    Один SQL `SELECT id, article` + JSON-сериализация — для 50 тыс
-    товаров это ~2 MB ответа и доли секунды. Зову раз за миграцию.
+    Один SQL `SELECT id, article` — для 50 тыс товаров это ~2 MB ответа.
+    Строки читаются курсором пачками и сразу пишутся в ответ
+    (json_provider.stream_object), без dict'а и строки целиком в памяти.
+    Зову раз за миграцию.
 
     Артикулы дедуплицированы (article unique в БД), но на всякий случай
     последний выигрывает (не должно быть кейса).
     """
-    rows = db.session.query(Product.id, Product.article).all()
-    return jsonify({article: pid for pid, article in rows if article})
+    rows = (db.session.query(Product.article, Product.id)
+            .filter(Product.article.isnot(None), Product.article != '')
+            .yield_per(5000))
+    return json_provider.stream_object(rows)
 
 
 @products_bp.route('/', methods=['GET'])
+@query_budget(11)  # 9: поиск-проба, бренд по имени, COUNT, страница, медиа, статусы, поставщики ×2, склад
 def get_products():
     try:
         page = request.args.get('page', type=int)
@@ -631,23 +675,12 @@ def get_products():
             else:
                 try:
                     category_id_int = int(category_param)
-                    # Recursive CTE: включаем товары самой категории и
-                    # всех её потомков — иначе выбор родительской без
+                    # Товары самой категории и всех её потомков — через
+                    # closure-таблицу, иначе выбор родительской без
                     # подкатегорий фильтрует почти пусто.
-                    from sqlalchemy import text
-                    rows = db.session.execute(text("""
-                        WITH RECURSIVE cat_tree AS (
-                            SELECT id FROM category WHERE id = :root
-                            UNION
-                            SELECT c.id FROM category c JOIN cat_tree t ON c.parent_id = t.id
-                        )
-                        SELECT id FROM cat_tree
-                    """), {"root": category_id_int}).all()
-                    descendant_ids = [r[0] for r in rows]
-                    if descendant_ids:
-                        query = query.filter(Product.category_id.in_(descendant_ids))
-                    else:
-                        query = query.filter(Product.category_id == category_id_int)
+                    query = query.filter(Product.category_id.in_(
+                        category_closure.subtree_ids_query([category_id_int])
+                    ))
                 except (TypeError, ValueError):
                     pass
 
@@ -818,10 +851,22 @@ def get_products():
             if media.product_id not in product_images:
                 product_images[media.product_id] = media
 
+        # Статусы наличия одним запросом: без кэша serialize_product
+        # перечитывал их на каждый товар.
+        availability_statuses = ProductAvailabilityStatus.query.filter_by(active=True).order_by(ProductAvailabilityStatus.order).all()
         suppliers_map = load_suppliers_for_products(product_ids)
         winning_warehouse_map = load_winning_warehouse_for_products(product_ids)
-        result = [serialize_product(product, product_images=product_images, suppliers_map=suppliers_map, winning_warehouse_map=winning_warehouse_map) for product in products]
-        return jsonify(result)
+        # Весь каталог без пагинации — массив пишется в ответ пачками по
+        # мере сериализации, а не одной строкой на десятки мегабайт.
+        return json_provider.stream_array(
+            serialize_product(
+                product,
+                availability_status=get_availability_status_for_quantity(product.quantity or 0, availability_statuses, supplier_id=product.supplier_id),
+                product_images=product_images,
+                suppliers_map=suppliers_map,
+                winning_warehouse_map=winning_warehouse_map,
+            ) for product in products
+        )
 
     except Exception as e:
         logger.error(f"Error getting products list: {str(e)}")
@@ -829,146 +874,105 @@ def get_products():
 
 
 # 🔹 Получить товар по slug
-@products_bp.route('/<string:slug>', methods=['GET'])
-def get_product_by_slug(slug):
-    product = Product.query.options(
-        joinedload(Product.brand_info),
-        joinedload(Product.status_info),
-        joinedload(Product.category),
-        joinedload(Product.supplier)
-    ).filter_by(slug=slug).first_or_404()
+# Карточка товара целиком одним запросом: вложенные списки собираются
+# json_agg в коррелированных подзапросах (каждый — по индексу product_id),
+# вместо отдельного SELECT на картинку, характеристики, справочник, медиа,
+# документы, драйверы, поставщиков и склад. Логика поставщиков и склада —
+# та же, что в load_suppliers_for_products / load_winning_warehouse_for_products.
+_PRODUCT_DETAIL_SQL = db.text("""
+    SELECT p.id, p.name, p.slug, p.article, p.price, p.wholesale_price, p.quantity,
+           p.status, p.is_visible, p.country, p.brand_id, p.supplier_id,
+           p.description, p.category_id,
+           (SELECT json_build_object('id', b.id, 'name', b.name, 'country', b.country,
+                                     'description', b.description, 'image_url', b.image_url)
+            FROM brand b WHERE b.id = p.brand_id) AS brand_info,
+           (SELECT json_build_object('id', s.id, 'name', s.name)
+            FROM supplier s WHERE s.id = p.supplier_id) AS supplier,
+           (SELECT coalesce(json_agg(json_build_object('id', s.id, 'name', s.name)
+                                     ORDER BY lower(coalesce(s.name, '')), s.id), '[]'::json)
+            FROM supplier s
+            WHERE s.id = p.supplier_id
+               OR s.id IN (SELECT w.supplier_id FROM product_warehouse_cost pwc
+                           JOIN warehouse w ON w.id = pwc.warehouse_id
+                           WHERE pwc.product_id = p.id)) AS suppliers,
+           (SELECT json_build_object('id', w.id, 'name', w.name, 'city', w.city)
+            FROM product_warehouse_cost pwc
+            JOIN warehouse w ON w.id = pwc.warehouse_id
+            WHERE pwc.product_id = p.id
+              AND pwc.quantity > 0
+              AND pwc.calculated_price IS NOT NULL
+              AND pwc.calculated_price = p.price
+            ORDER BY w.id LIMIT 1) AS winning_warehouse,
+           (SELECT coalesce(json_agg(json_build_object(
+                        'id', pc.id, 'key', cl.characteristic_key, 'value', pc.value,
+                        'sort_order', pc.sort_order,
+                        'unit_of_measurement', coalesce(cl.unit_of_measurement, ''))
+                    ORDER BY pc.sort_order, pc.id), '[]'::json)
+            FROM product_characteristic pc
+            JOIN characteristics_list cl ON cl.id::text = btrim(pc.key)
+            WHERE pc.product_id = p.id) AS characteristics,
+           (SELECT coalesce(json_agg(json_build_object(
+                        'id', m.id, 'media_type', m.media_type, 'url', m.url, 'order', m."order")
+                    ORDER BY m."order", m.id), '[]'::json)
+            FROM product_media m WHERE m.product_id = p.id) AS media,
+           (SELECT coalesce(json_agg(json_build_object(
+                        'id', d.id, 'filename', d.filename, 'url', d.url,
+                        'file_type', d.file_type, 'mime_type', d.mime_type)
+                    ORDER BY d.id), '[]'::json)
+            FROM product_document d WHERE d.product_id = p.id AND d.file_type = 'doc') AS documents,
+           (SELECT coalesce(json_agg(json_build_object(
+                        'id', d.id, 'filename', d.filename, 'url', d.url,
+                        'file_type', d.file_type, 'mime_type', d.mime_type)
+                    ORDER BY d.id), '[]'::json)
+            FROM product_document d WHERE d.product_id = p.id AND d.file_type = 'driver') AS drivers
+    FROM product p
+    WHERE p.slug = :slug
+""")
 
-    first_image = ProductMedia.query.filter_by(product_id=product.id, media_type='image') \
-        .order_by(ProductMedia.order).first()
 
-    # ✅ ОПТИМИЗАЦИЯ: Загружаем все характеристики одним запросом
-    characteristics = ProductCharacteristic.query.filter_by(product_id=product.id).all()
-    
-    # Собираем все ID характеристик из справочника
-    characteristic_ids = []
-    for c in characteristics:
-        try:
-            characteristic_id = int(c.key) if c.key else None
-            if characteristic_id:
-                characteristic_ids.append(characteristic_id)
-        except (ValueError, TypeError):
-            pass
-    
-    # ✅ ОПТИМИЗАЦИЯ: Загружаем все характеристики из справочника одним запросом
-    characteristics_map = {}
-    if characteristic_ids:
-        from models.characteristics_list import CharacteristicsList
-        characteristics_list = CharacteristicsList.query.filter(CharacteristicsList.id.in_(characteristic_ids)).all()
-        characteristics_map = {ch.id: ch for ch in characteristics_list}
-    
-    characteristics_data = []
-    for c in characteristics:
-        # Получаем данные из справочника характеристик по ID из поля key
-        try:
-            characteristic_id = int(c.key) if c.key else None
-        except (ValueError, TypeError):
-            characteristic_id = None
-            
-        if characteristic_id:
-            characteristic_info = characteristics_map.get(characteristic_id)
-            if characteristic_info:
-                characteristics_data.append({
-                    'id': c.id,
-                    'key': characteristic_info.characteristic_key,
-                    'value': c.value,
-                    'sort_order': c.sort_order,
-                    'unit_of_measurement': characteristic_info.unit_of_measurement or ''
-                })
-
-    # 🖼️ Все медиафайлы
-    media = ProductMedia.query.filter_by(product_id=product.id).order_by(ProductMedia.order).all()
-    media_data = [{
-        'id': m.id,
-        'media_type': m.media_type,
-        'url': m.url,
-        'order': m.order
-    } for m in media]
-
-    # 📄 Документы
-    documents = ProductDocument.query.filter_by(product_id=product.id, file_type='doc').all()
-    documents_data = [{
-        'id': d.id,
-        'filename': d.filename,
-        'url': d.url,
-        'file_type': d.file_type,
-        'mime_type': d.mime_type
-    } for d in documents]
-
-    # ⚙️ Драйверы
-    drivers = ProductDocument.query.filter_by(product_id=product.id, file_type='driver').all()
-    drivers_data = [{
-        'id': d.id,
-        'filename': d.filename,
-        'url': d.url,
-        'file_type': d.file_type,
-        'mime_type': d.mime_type
-    } for d in drivers]
-
-    # Получаем информацию о бренде
-    brand_info = None
-    if product.brand_id and product.brand_info:
-        brand_info = {
-            'id': product.brand_info.id,
-            'name': product.brand_info.name,
-            'country': product.brand_info.country,
-            'description': product.brand_info.description,
-            'image_url': product.brand_info.image_url
-        }
-
-    # Получаем информацию о поставщике
-    supplier_info = None
-    # Проверяем supplier_id и наличие объекта supplier
-    if product.supplier_id:
-        try:
-            # Пытаемся получить supplier через relationship
-            supplier_obj = getattr(product, 'supplier', None)
-            if supplier_obj:
-                supplier_info = {
-                    'id': supplier_obj.id,
-                    'name': supplier_obj.name
-                }
-        except Exception:
-            # Если relationship не загружен, просто не добавляем supplier_info
-            # но supplier_id всё равно будет в результате
-            pass
+@products_bp.route('/<string:slug>', methods=['GET'])
+@query_budget(4)  # 2: поколения кэша ответов, _PRODUCT_DETAIL_SQL
+@cached_response('products')
+def get_product_by_slug(slug):
+    """
+    Карточка товара. Один SQL (_PRODUCT_DETAIL_SQL) и кэш ответа по slug +
+    классу зрителя: область 'products' бампают записи товаров, медиа,
+    характеристик, документов и себестоимостей (invalidate_on_write на их
+    blueprint'ах), фоновые пересчёты склада догоняет TTL.
+    """
+    row = db.session.execute(_PRODUCT_DETAIL_SQL, {'slug': slug}).mappings().first()
+    if row is None:
+        abort(404)
 
-    # Все поставщики у которых товар физически числится (через
-    # product_warehouse_cost.warehouse.supplier) + legacy fallback.
-    # Используем для отображения "BIO, Equip" на карточке.
-    suppliers_list = load_suppliers_for_products([product.id]).get(product.id, [])
-    winning_warehouse = load_winning_warehouse_for_products([product.id]).get(product.id)
+    media_data = row['media']
+    first_image = next((m['url'] for m in media_data if m['media_type'] == 'image'), None)
 
     result = {
-        'id': product.id,
-        'name': product.name,
-        'slug': product.slug,
-        'article': product.article,
-        'price': product.price,
-        'wholesale_price': product.wholesale_price,
-        'quantity': product.quantity,
-        'status': 'no' if product.status is None else str(product.status),
-        'is_visible': product.is_visible,
-        'country': product.country,
-        'brand_id': product.brand_id,
-        'brand_info': brand_info,  # Полная информация о бренде
-        'supplier_id': product.supplier_id,  # ID поставщика
-        'supplier': supplier_info,  # Полная информация о поставщике
-        'suppliers': suppliers_list,  # Все поставщики у которых товар на складах
-        'winning_warehouse': winning_warehouse,  # Склад с минимальной ценой и остатком
-        'description': product.description,
-        'category_id': product.category_id,
-        'image': first_image.url if first_image else None,
+        'id': row['id'],
+        'name': row['name'],
+        'slug': row['slug'],
+        'article': row['article'],
+        'price': row['price'],
+        'wholesale_price': row['wholesale_price'],
+        'quantity': row['quantity'],
+        'status': 'no' if row['status'] is None else str(row['status']),
+        'is_visible': row['is_visible'],
+        'country': row['country'],
+        'brand_id': row['brand_id'],
+        'brand_info': row['brand_info'],  # Полная информация о бренде
+        'supplier_id': row['supplier_id'],  # ID поставщика
+        'supplier': row['supplier'],  # Полная информация о поставщике
+        'suppliers': row['suppliers'],  # Все поставщики у которых товар на складах
+        'winning_warehouse': row['winning_warehouse'],  # Склад с минимальной ценой и остатком
+        'description': row['description'],
+        'category_id': row['category_id'],
+        'image': first_image,
 
         # Новые поля:
-        'characteristics': characteristics_data,
+        'characteristics': row['characteristics'],
         'media': media_data,
-        'documents': documents_data,
-        'drivers': drivers_data,
+        'documents': row['documents'],
+        'drivers': row['drivers'],
     }
 
     return jsonify(result)
@@ -1154,6 +1158,8 @@ def delete_product(product_id):
         # Удаляем связанные записи
         print(f"Удаление связанных записей для товара ID: {product_id}")
         
+        # Ссылки на общие файлы хранилища снимаем до удаления строк
+        blob_store.release_for_product(product_id)
         media_deleted = ProductMedia.query.filter_by(product_id=product_id).delete(synchronize_session=False)
         documents_deleted = ProductDocument.query.filter_by(product_id=product_id).delete(synchronize_session=False)
         characteristics_deleted = ProductCharacteristic.query.filter_by(product_id=product_id).delete(synchronize_session=False)
@@ -1171,6 +1177,7 @@ def delete_product(product_id):
         print(f"Удалено медиа: {media_deleted}, документов: {documents_deleted}, характеристик: {characteristics_deleted}, избранного: {favorites_deleted}, корзины: {cart_deleted}, складов: {warehouse_costs_deleted}, обновлено заказов: {order_items_updated}")
 
         # Удаляем папку с файлами
+        media_index.forget_product(product_id)
         folder_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'products', str(product_id))
         try:
             if os.path.exists(folder_path):
@@ -1197,6 +1204,9 @@ def delete_product(product_id):
         return jsonify({'error': f'Error deleting product: {str(e)}'}), 500
 
 @products_bp.route('/search', methods=['GET'])
+# 13 + 2 на attr-фильтр: поиск-проба, ветка категорий, COUNT, facets (категории,
+# бренды, цена, attr ×3), товары, медиа, статусы; бюджет — до 7 attr-фильтров.
+@query_budget(29)
 def search_products():
     """
     Поиск товаров с фильтрами.
@@ -1207,7 +1217,10 @@ def search_products():
       2. Если 0 результатов и токенов >1 — разбиваем на токены и ищем
          AND по каждому в имени (находит «Polair 110» в «Шкаф Polair CV110-G»)
       ускорено через GIN trigram-индекс на product.name
-    - Фильтры: category_id, brand_id, pmin/pmax (по цене)
+    - Фильтры: category_id, brand_id, pmin/pmax (по цене),
+      attr[<id>]=min..max / attr[<id>]=v1,v2 — по характеристикам
+      (id из characteristics_list; границы — в базовой единице, которую
+      отдаёт facet, см. services/attribute_index.py)
     - Можно комбинировать (q + category_id, q + brand_id и т.п.)
     - Если ни одного из (q, category_id, brand_id) не передано — пустой
       ответ (нечего искать).
@@ -1221,6 +1234,8 @@ def search_products():
       выбрав бренд X, в категориях увидишь «сколько товаров бренда X
       в каждой категории», но в брендах список считается БЕЗ фильтра
       бренда — иначе там был бы виден только X.
+      facets.attributes — по характеристикам: type='range' (min/max/unit)
+      или type='values' (значения с counts), тоже без своего фильтра.
     - ?with_count=1 — короткий вариант: возвращает только total_count
       без facets (для случаев когда фильтры не нужны).
 
@@ -1259,6 +1274,10 @@ def search_products():
     pmax = request.args.get('pmax', type=float)
     with_count = request.args.get('with_count', '').strip() in ('1', 'true', 'yes')
     with_facets = request.args.get('with_facets', '').strip() in ('1', 'true', 'yes')
+    try:
+        attr_filters = attribute_index.parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     # При page/per_page включается «пагинированный» режим — ответ всегда объектом.
     paginated = page is not None or per_page is not None
@@ -1273,14 +1292,14 @@ def search_products():
             return jsonify({
                 'items': [],
                 'total_count': 0,
-                **({'facets': {'categories': [], 'brands': [], 'price_min': 0, 'price_max': 0}} if with_facets else {}),
+                **({'facets': {'categories': [], 'brands': [], 'price_min': 0, 'price_max': 0, 'attributes': []}} if with_facets else {}),
                 **({'page': page, 'per_page': per_page} if paginated else {}),
             })
         return jsonify([])
 
     # Должен быть хотя бы один критерий — иначе возвращать всё
     # бессмысленно (это не каталог), отдадим пустой массив.
-    if not query and not category_id and not brand_id and not category_ids and not brand_ids:
+    if not query and not category_id and not brand_id and not category_ids and not brand_ids and not attr_filters:
         return empty_response()
 
     show_hidden = _is_system_user()
@@ -1317,16 +1336,7 @@ def search_products():
     effective_category_ids = list(category_ids) if category_ids else ([category_id] if category_id else [])
     descendant_ids = None
     if effective_category_ids:
-        descendant_ids_q = db.session.execute(db.text("""
-            WITH RECURSIVE cat_tree AS (
-                SELECT id FROM category WHERE id = ANY(:roots)
-                UNION ALL
-                SELECT c.id FROM category c
-                JOIN cat_tree t ON c.parent_id = t.id
-            )
-            SELECT id FROM cat_tree
-        """), {"roots": effective_category_ids})
-        descendant_ids = [row[0] for row in descendant_ids_q]
+        descendant_ids = category_closure.subtree_ids(effective_category_ids)
         if not descendant_ids:
             descendant_ids = effective_category_ids  # категории не существуют — фильтр даст пусто
 
@@ -1350,10 +1360,13 @@ def search_products():
             q_obj = q_obj.filter(Product.price <= pmax)
         return q_obj
 
+    def apply_attrs(q_obj):
+        return attribute_index.apply_filters(q_obj, attr_filters, Product.id)
+
     # Финальный query — все фильтры применены. Используется и для total_count,
     # и для постраничной выгрузки items. Total считаем ДО joinedload — иначе
     # left join'ы могут раздуть count.
-    search_query = apply_price(apply_brand(apply_category(base_query)))
+    search_query = apply_attrs(apply_price(apply_brand(apply_category(base_query))))
 
     total_count = None
     if with_count or with_facets or paginated:
@@ -1364,6 +1377,7 @@ def search_products():
         joinedload(Product.brand_info),
         joinedload(Product.status_info),
         joinedload(Product.category),
+        joinedload(Product.supplier),
     )
 
     # Facets. Каждый считается БЕЗ своего фильтра, но с учётом остальных —
@@ -1372,7 +1386,7 @@ def search_products():
     facets = None
     if with_facets:
         # categories facet — без category-фильтра
-        cat_q = apply_price(apply_brand(base_query))
+        cat_q = apply_attrs(apply_price(apply_brand(base_query)))
         cat_rows = (cat_q
             .join(Category, Category.id == Product.category_id)
             .with_entities(Category.id, Category.name, func.count(Product.id))
@@ -1380,7 +1394,7 @@ def search_products():
             .order_by(Category.name)
             .all())
         # brands facet — без brand-фильтра
-        brand_q = apply_price(apply_category(base_query))
+        brand_q = apply_attrs(apply_price(apply_category(base_query)))
         brand_rows = (brand_q
             .join(Brand, Brand.id == Product.brand_id)
             .with_entities(Brand.id, Brand.name, func.count(Product.id))
@@ -1388,7 +1402,7 @@ def search_products():
             .order_by(Brand.name)
             .all())
         # price min/max — без price-фильтра
-        price_q = apply_brand(apply_category(base_query))
+        price_q = apply_attrs(apply_brand(apply_category(base_query)))
         price_row = price_q.with_entities(
             func.min(Product.price), func.max(Product.price)
         ).first()
@@ -1397,6 +1411,10 @@ def search_products():
             'brands': [{'id': r[0], 'name': r[1], 'count': r[2]} for r in brand_rows],
             'price_min': float(price_row[0]) if price_row and price_row[0] is not None else 0,
             'price_max': float(price_row[1]) if price_row and price_row[1] is not None else 0,
+            # attributes — attr-фильтры вычитает сам attribute_index (каждый свой)
+            'attributes': attribute_index.facets(
+                apply_price(apply_brand(apply_category(base_query))), attr_filters, Product.id
+            ),
         }
 
     # Пагинация / limit для items.
@@ -1483,6 +1501,7 @@ def search_products():
             'category_id': p.category_id,
             'category': category_info,
             'image': first_image.url if first_image else None,
+            'thumbnail_url': card_image_url(first_image.url) if first_image else None,
             'availability_status': compute_availability_status(p.quantity or 0, supplier_id=p.supplier_id)
         })
 
@@ -1590,7 +1609,8 @@ def get_products_by_brand(brand_name):
                 'supplier_name': p.supplier.name if p.supplier else None,
                 'description': p.description,
                 'category_id': p.category_id,
-                'image': first_image.url if first_image else None
+                'image': first_image.url if first_image else None,
+                'thumbnail_url': card_image_url(first_image.url) if first_image else None
             })
 
         return jsonify({
@@ -1736,6 +1756,7 @@ def get_products_by_brand_detailed(brand_name):
                 'description': p.description,
                 'category_id': p.category_id,
                 'image_url': first_image.url if first_image else None,
+                'thumbnail_url': card_image_url(first_image.url) if first_image else None,
                 'status': status_info,
                 'brand_id': p.brand_id,
                 'brand_info': brand_info,
@@ -1976,6 +1997,7 @@ def get_products_by_brand_and_category(brand_name):
                 'description': p.description,
                 'category_id': p.category_id,
                 'image': first_image.url if first_image else None,
+                'thumbnail_url': card_image_url(first_image.url) if first_image else None,
                 'availability_status': availability_status
             })
         
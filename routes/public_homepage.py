@@ -16,6 +16,11 @@ from models.homepage_block import HomepageBlock
 from models.small_banner_card import SmallBanner
 from models.header_settings import HeaderMenuItem, HeaderMenuItemProduct
 from models.section_card import SectionCard
+from services import category_closure
+from utils.compression import compress_level
+from utils.image_variants import card_image_url
+from utils.query_budget import query_budget
+from utils.response_cache import cached_response
 
 public_homepage_bp = Blueprint('public_homepage', __name__)
 
@@ -57,6 +62,11 @@ def get_sitemap_slugs():
 
 
 @public_homepage_bp.route('/public/homepage', methods=['GET'])
+# 11: поколения кэша, баннеры, блоки, элементы блоков и по запросу на каждый
+# тип элементов (категории, бренды, преимущества, товары, медиа, баннеры, разделы).
+@query_budget(13)
+@compress_level(gzip=9, br=9)
+@cached_response('homepage', 'categories', 'products', 'brands_statuses')
 def get_homepage_data():
     banners = Banner.query.filter_by(active=True).order_by(Banner.order).all()
     banners_data = [{
@@ -143,7 +153,8 @@ def get_homepage_data():
             p.id: p for p in Product.query.options(
                 joinedload(Product.brand_info),
                 joinedload(Product.status_info),
-                joinedload(Product.category)
+                joinedload(Product.category),
+                joinedload(Product.supplier)
             ).filter(Product.id.in_(product_ids)).all()
         }
 
@@ -264,7 +275,8 @@ def get_homepage_data():
                         'quantity': pr.quantity,
                         'supplier_id': pr.supplier_id,
                         'supplier_name': pr.supplier.name if pr.supplier else None,
-                        'image_url': first_image.url if first_image else None
+                        'image_url': first_image.url if first_image else None,
+                        'thumbnail_url': card_image_url(first_image.url) if first_image else None
                     })
             elif block.type in ['section_card', 'section_cards']:
                 sc = section_cards_all.get(item.item_id)
@@ -323,6 +335,9 @@ def get_homepage_data():
 
 
 @public_homepage_bp.route('/public/catalog/categories', methods=['GET'])
+@query_budget(6)  # 4: поколения кэша, категории (+повтор без фильтра), счётчики
+@compress_level(gzip=9, br=9)
+@cached_response('categories', 'products')
 def get_catalog_categories():
     """Получить категории для каталожных панелей (с иерархией, изображениями и количеством товаров)"""
     show_hidden = _is_system_user()
@@ -404,26 +419,10 @@ def get_catalog_categories():
 
 def _collect_descendant_category_ids(root_ids: list[int]) -> list[int]:
     """
-    Собрать все id категорий-потомков (включая сами root_ids) BFS.
-    Без рекурсивных SQL — простой обход по parent_id за N пачек.
+    Собрать все id категорий-потомков (включая сами root_ids) — один
+    запрос к closure-таблице (services/category_closure.py).
     """
-    if not root_ids:
-        return []
-    seen: set[int] = set(root_ids)
-    frontier: list[int] = list(root_ids)
-    while frontier:
-        rows = (
-            db.session.query(Category.id)
-            .filter(Category.parent_id.in_(frontier))
-            .all()
-        )
-        next_frontier = []
-        for (cid,) in rows:
-            if cid not in seen:
-                seen.add(cid)
-                next_frontier.append(cid)
-        frontier = next_frontier
-    return list(seen)
+    return category_closure.subtree_ids(root_ids)
 
 
 @public_homepage_bp.route('/public/section/<string:slug>', methods=['GET'])
@@ -569,6 +568,7 @@ def get_section_card_page(slug: str):
             'supplier_id': p.supplier_id,
             'supplier_name': p.supplier.name if p.supplier else None,
             'image_url': first_image.url if first_image else None,
+            'thumbnail_url': card_image_url(first_image.url) if first_image else None,
             'category_id': p.category_id,
             'category': {
                 'id': p.category.id,
@@ -739,6 +739,7 @@ def _render_custom_section_response(custom: HeaderMenuItem, show_hidden: bool):
             'supplier_id': p.supplier_id,
             'supplier_name': p.supplier.name if p.supplier else None,
             'image_url': first_image.url if first_image else None,
+            'thumbnail_url': card_image_url(first_image.url) if first_image else None,
             # Категория товара — для compare-context (сравнение только
             # внутри одной категории). В кастомном разделе товары могут
             # быть из разных категорий — отдаём оригинальный category_id
@@ -931,6 +932,7 @@ def get_category_with_children_and_products(slug):
             'supplier_id': p.supplier_id,
             'supplier_name': p.supplier.name if p.supplier else None,
             'image_url': first_image.url if first_image else None,
+            'thumbnail_url': card_image_url(first_image.url) if first_image else None,
             # Категория товара — для сравнения (compare-context на фронте
             # проверяет одну ли категорию у выбранных). Без этих полей
             # cross-category защита давала false-positive.
@@ -24,8 +24,10 @@ from models.search_page import (
 )
 from models.category import Category
 from models.brand import Brand
+from utils.response_cache import cached_response, invalidate_on_write
 
 search_page_bp = Blueprint('search_page', __name__)
+invalidate_on_write(search_page_bp, 'search_page')
 
 
 def _check_admin_role():
@@ -48,6 +50,7 @@ def _get_or_create_settings() -> SearchPageSettings:
 # ─── Публичный эндпоинт ──────────────────────────────────────────────────
 
 @search_page_bp.route('/public/search-page', methods=['GET'])
+@cached_response('search_page', 'categories', 'brands_statuses')
 def get_public_search_page():
     """
     Всё что нужно фронту для отрисовки панели на /search:
@@ -20,6 +20,7 @@ from werkzeug.utils import secure_filename
 from extensions import db
 from models.section_card import SectionCard, SectionCardCategory
 from routes.products import safe_slugify
+from utils.response_cache import invalidate_on_write
 
 
 # Разрешённые расширения изображений (используются при загрузке по URL,
@@ -29,6 +30,7 @@ _MAX_URL_IMAGE_BYTES = 10 * 1024 * 1024  # 10 МБ
 
 
 section_cards_bp = Blueprint('section_cards', __name__)
+invalidate_on_write(section_cards_bp, 'homepage')
 
 
 # ── helpers ─────────────────────────────────────────────────────────
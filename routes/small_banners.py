@@ -4,8 +4,10 @@ from models.small_banner_card import SmallBanner
 import os
 import uuid
 from werkzeug.utils import secure_filename
+from utils.response_cache import invalidate_on_write
 
 small_banner_bp = Blueprint('small_banner_bp', __name__)
+invalidate_on_write(small_banner_bp, 'homepage')
 
 
 @small_banner_bp.route('/small-banners', methods=['GET'])
@@ -2,8 +2,10 @@ from flask import Blueprint, request, jsonify
 from extensions import db
 from models.system_brand import SystemBrand
 from models.brand import Brand  # предполагаем, что есть таблица с брендами
+from utils.response_cache import invalidate_on_write
 
 system_brands_bp = Blueprint('system_brands', __name__)
+invalidate_on_write(system_brands_bp, 'homepage')
 
 
 # 🔹 Получить список выбранных брендов
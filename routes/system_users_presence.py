@@ -4,7 +4,9 @@ Presence-трекинг системных пользователей.
 Поток:
   - Фронт из `pospro_new_ui/app/admin/layout.tsx` каждые 60 сек шлёт
     POST /auth/heartbeat пока вкладка с админкой открыта.
-  - Бэк обновляет `system_users.last_seen = now()`.
+  - Бэк отмечает юзера в presence (services/presence.py — память процесса
+    + UNLOGGED-таблица), а `system_users.last_seen` обновляет только раз
+    в presence.PERSIST_SECONDS — как «был в последний раз» надолго.
   - Owner (single user, `system_users.is_owner = TRUE`) видит таблицу
     /admin/user-activity где для каждого системного юзера показано:
     email, full_name, роль (owner / admin / system), is_online (был
@@ -23,6 +25,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from extensions import db
 from models.systemuser import SystemUser
 from routes.auth import is_owner_user
+from services import presence
 
 presence_bp = Blueprint('presence', __name__)
 
@@ -33,7 +36,7 @@ ONLINE_THRESHOLD_SECONDS = 120
 @jwt_required()
 def heartbeat():
     """
-    Обновить last_seen для текущего системного пользователя. Клиентов
+    Отметить текущего системного пользователя онлайн. Клиентов
     (роль `client`) тихо игнорируем — их в `system_users` нет.
     """
     role = (get_jwt() or {}).get('role')
@@ -45,15 +48,19 @@ def heartbeat():
     except (TypeError, ValueError):
         return jsonify({'success': False}), 200
 
-    su = SystemUser.query.get(uid)
-    if not su:
-        return jsonify({'success': False}), 200
-
-    su.last_seen = datetime.now(timezone.utc)
-    db.session.commit()
+    if presence.beat(_presence_key(uid)):
+        updated = (SystemUser.query.filter_by(id=uid)
+                   .update({'last_seen': datetime.now(timezone.utc)}, synchronize_session=False))
+        db.session.commit()
+        if not updated:
+            return jsonify({'success': False}), 200
     return jsonify({'success': True, 'tracked': True}), 200
 
 
+def _presence_key(uid):
+    return f'user:{uid}'
+
+
 @presence_bp.route('/api/admin/system-users/presence', methods=['GET'])
 @jwt_required()
 def list_presence():
@@ -74,6 +81,9 @@ def list_presence():
     threshold = now - timedelta(seconds=ONLINE_THRESHOLD_SECONDS)
 
     users = SystemUser.query.order_by(SystemUser.full_name).all()
+    # Свежие отметки — из presence (naive UTC), долговечная колонка
+    # отстаёт до presence.PERSIST_SECONDS.
+    seen = presence.last_seen_prefix('user:')
     rows = []
     for u in users:
         last_seen_aware = u.last_seen
@@ -81,6 +91,11 @@ def list_presence():
         # naive (например после ALTER на старой колонке) — считаем UTC.
         if last_seen_aware and last_seen_aware.tzinfo is None:
             last_seen_aware = last_seen_aware.replace(tzinfo=timezone.utc)
+        recent = seen.get(_presence_key(u.id))
+        if recent is not None:
+            recent = recent.replace(tzinfo=timezone.utc)
+            if last_seen_aware is None or recent > last_seen_aware:
+                last_seen_aware = recent
         is_online = bool(last_seen_aware and last_seen_aware >= threshold)
         rows.append({
             'id': u.id,
@@ -3,6 +3,7 @@ from extensions import db
 from models.media import ProductMedia
 from models.documents import ProductDocument
 from models.category import Category
+from models.product import Product
 from datetime import datetime
 from urllib.parse import urlparse, unquote
 import os
@@ -10,10 +11,19 @@ import re
 import unicodedata
 import mimetypes
 import uuid
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import requests
+from flask_jwt_extended import jwt_required, get_jwt
+from services import blob_store, media_index
+from utils import file_delivery
+from utils.response_cache import invalidate_on_write
 
 upload_bp = Blueprint('upload', __name__)
+invalidate_on_write(upload_bp, 'products', 'categories', 'homepage')
 
 
 def sanitize_filename(filename):
@@ -55,254 +65,6 @@ def get_media_type_from_filename(filename):
     return 'image'
 
 
-def sync_media_from_filesystem(product_id):
-    """
-    Синхронизирует медиафайлы из файловой системы с базой данных.
-    Создает записи в БД для файлов, которые существуют на диске, но отсутствуют в БД.
-    Удаляет записи из БД ТОЛЬКО для файлов, которые физически отсутствуют на диске.
-    """
-    print(f"Syncing media files from filesystem for product {product_id}")
-    media_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'products', str(product_id))
-    print(f"Media folder path: {media_folder}")
-    
-    # Получаем все записи медиа для этого товара из БД СНАЧАЛА
-    db_media = ProductMedia.query.filter_by(product_id=product_id).all()
-    print(f"Media records in DB: {len(db_media)}")
-    
-    # Если папка не существует, НЕ удаляем записи - возможно файлы еще не загружены
-    # или находятся в другом месте (например внешние URL)
-    if not os.path.exists(media_folder):
-        print(f"Media folder does not exist: {media_folder}")
-        print("Keeping existing DB records - files may not be uploaded yet or stored elsewhere")
-        # Не удаляем записи, просто возвращаемся
-        # Это позволяет сохранить записи с внешними URL или файлами которые еще не загружены
-        return
-    
-    # Получаем список файлов в папке (исключаем папки documents и drivers)
-    try:
-        all_files = os.listdir(media_folder)
-        print(f"All files in media folder: {all_files}")
-        
-        files = [f for f in all_files 
-                if os.path.isfile(os.path.join(media_folder, f)) 
-                and f not in ['documents', 'drivers']]
-        print(f"Media files found: {files}")
-    except Exception as e:
-        print(f"Ошибка при чтении папки медиа: {e}")
-        return
-    
-    # Создаем множество URL файлов на диске
-    disk_urls = {f'/uploads/products/{product_id}/{filename}' for filename in files}
-    print(f"Disk URLs: {disk_urls}")
-    
-    # Удаляем записи из БД ТОЛЬКО для локальных файлов, которых физически нет на диске
-    # НЕ удаляем записи с внешними URL (http/https) - они не хранятся локально
-    # ВАЖНО: Проверяем физическое существование файла перед удалением записи
-    media_to_delete = []
-    for media in db_media:
-        # Пропускаем внешние URL - они не хранятся локально
-        if media.url.startswith(('http://', 'https://')):
-            print(f"Keeping external URL (not stored locally): {media.url}")
-            continue
-        
-        # Проверяем что это локальный URL правильного формата
-        if not media.url.startswith('/uploads/products/'):
-            print(f"Keeping non-standard URL: {media.url}")
-            continue
-        
-        # Если URL не в списке файлов на диске, проверяем физическое существование
-        if media.url not in disk_urls:
-            # Извлекаем путь к файлу из URL
-            # URL формат: /uploads/products/{product_id}/{filename}
-            try:
-                # Убираем /uploads/ префикс и получаем относительный путь
-                relative_path = media.url[9:]  # Remove '/uploads/' prefix
-                file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], relative_path)
-                
-                # Проверяем физическое существование файла
-                if os.path.exists(file_path) and os.path.isfile(file_path):
-                    print(f"File exists but not in list (may be in subfolder): {media.url}")
-                    continue
-                else:
-                    print(f"Removing DB record for missing local file: {media.url} (file not found at {file_path})")
-                    media_to_delete.append(media)
-            except Exception as e:
-                print(f"Error checking file existence for {media.url}: {e}")
-                # В случае ошибки не удаляем запись - лучше сохранить
-                continue
-    
-    # Удаляем записи которые точно отсутствуют на диске
-    deleted_count = 0
-    for media in media_to_delete:
-        try:
-            db.session.delete(media)
-            deleted_count += 1
-        except Exception as e:
-            print(f"Error deleting media record {media.id}: {e}")
-    
-    if deleted_count > 0:
-        print(f"Deleted {deleted_count} media records for missing files")
-    
-    # Создаем записи в БД для файлов, которых нет в БД
-    created_count = 0
-    for filename in files:
-        file_url = f'/uploads/products/{product_id}/{filename}'
-        
-        # Проверяем, существует ли уже запись в БД
-        existing_media = ProductMedia.query.filter_by(
-            product_id=product_id, 
-            url=file_url
-        ).first()
-        
-        if not existing_media:
-            # Определяем тип медиа
-            media_type = get_media_type_from_filename(filename)
-            
-            # Создаем новую запись в БД
-            new_media = ProductMedia(
-                product_id=product_id,
-                url=file_url,
-                media_type=media_type
-            )
-            
-            try:
-                db.session.add(new_media)
-                created_count += 1
-                print(f"Создана запись в БД для медиафайла: {filename}")
-            except Exception as e:
-                print(f"Ошибка при создании записи для медиафайла {filename}: {e}")
-                db.session.rollback()
-    
-    if created_count > 0:
-        print(f"Created {created_count} new media records")
-    
-    # Сохраняем все изменения
-    try:
-        db.session.commit()
-        print("Media sync completed successfully")
-    except Exception as e:
-        print(f"Ошибка при сохранении изменений синхронизации: {e}")
-        db.session.rollback()
-
-
-def sync_documents_from_filesystem(product_id):
-    """
-    Синхронизирует документы из файловой системы с базой данных.
-    Создает записи в БД для файлов, которые существуют на диске, но отсутствуют в БД.
-    """
-    print(f"Syncing documents from filesystem for product {product_id}")
-    documents_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'products', str(product_id), 'documents')
-    print(f"Documents folder path: {documents_folder}")
-    
-    if not os.path.exists(documents_folder):
-        print(f"Documents folder does not exist: {documents_folder}")
-        return
-    
-    # Получаем список файлов в папке
-    try:
-        all_files = os.listdir(documents_folder)
-        print(f"All files in documents folder: {all_files}")
-        
-        files = [f for f in all_files if os.path.isfile(os.path.join(documents_folder, f))]
-        print(f"Document files found: {files}")
-    except Exception as e:
-        print(f"Ошибка при чтении папки документов: {e}")
-        return
-    
-    # Для каждого файла проверяем, есть ли запись в БД
-    for filename in files:
-        file_url = f'/uploads/products/{product_id}/documents/{filename}'
-        
-        # Проверяем, существует ли уже запись в БД
-        existing_doc = ProductDocument.query.filter_by(
-            product_id=product_id, 
-            url=file_url, 
-            file_type='doc'
-        ).first()
-        
-        if not existing_doc:
-            # Определяем MIME-тип файла
-            mime_type, _ = mimetypes.guess_type(filename)
-            if not mime_type:
-                mime_type = 'application/octet-stream'
-            
-            # Создаем новую запись в БД
-            new_doc = ProductDocument(
-                product_id=product_id,
-                filename=filename,
-                url=file_url,
-                file_type='doc',
-                mime_type=mime_type
-            )
-            
-            try:
-                db.session.add(new_doc)
-                db.session.commit()
-                print(f"Создана запись в БД для документа: {filename}")
-            except Exception as e:
-                print(f"Ошибка при создании записи для документа {filename}: {e}")
-                db.session.rollback()
-
-
-def sync_drivers_from_filesystem(product_id):
-    """
-    Синхронизирует драйверы из файловой системы с базой данных.
-    Создает записи в БД для файлов, которые существуют на диске, но отсутствуют в БД.
-    """
-    print(f"Syncing drivers from filesystem for product {product_id}")
-    drivers_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'products', str(product_id), 'drivers')
-    print(f"Drivers folder path: {drivers_folder}")
-    
-    if not os.path.exists(drivers_folder):
-        print(f"Drivers folder does not exist: {drivers_folder}")
-        return
-    
-    # Получаем список файлов в папке
-    try:
-        all_files = os.listdir(drivers_folder)
-        print(f"All files in drivers folder: {all_files}")
-        
-        files = [f for f in all_files if os.path.isfile(os.path.join(drivers_folder, f))]
-        print(f"Driver files found: {files}")
-    except Exception as e:
-        print(f"Ошибка при чтении папки драйверов: {e}")
-        return
-    
-    # Для каждого файла проверяем, есть ли запись в БД
-    for filename in files:
-        file_url = f'/uploads/products/{product_id}/drivers/{filename}'
-        
-        # Проверяем, существует ли уже запись в БД
-        existing_doc = ProductDocument.query.filter_by(
-            product_id=product_id, 
-            url=file_url, 
-            file_type='driver'
-        ).first()
-        
-        if not existing_doc:
-            # Определяем MIME-тип файла
-            mime_type, _ = mimetypes.guess_type(filename)
-            if not mime_type:
-                mime_type = 'application/octet-stream'
-            
-            # Создаем новую запись в БД
-            new_doc = ProductDocument(
-                product_id=product_id,
-                filename=filename,
-                url=file_url,
-                file_type='driver',
-                mime_type=mime_type
-            )
-            
-            try:
-                db.session.add(new_doc)
-                db.session.commit()
-                print(f"Создана запись в БД для драйвера: {filename}")
-            except Exception as e:
-                print(f"Ошибка при создании записи для драйвера {filename}: {e}")
-                db.session.rollback()
-
-
 # 🔹 Загрузка изображения для существующей категории
 @upload_bp.route('/category/<int:category_id>', methods=['POST'])
 def upload_category_image(category_id):
@@ -421,22 +183,19 @@ def upload_product_file():
         print(f"ERROR: File type not allowed: {filename}")
         return jsonify({'error': 'File type not allowed'}), 400
 
-    folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'products', str(product_id))
-    print(f"Upload folder: {folder}")
-    os.makedirs(folder, exist_ok=True)
-
-    filepath = os.path.join(folder, filename)
-    print(f"Full file path: {filepath}")
-    
+    # Файл ложится в content-addressed хранилище: одинаковое содержимое
+    # у разных товаров — один файл на диске (services/blob_store.py).
+    ext = filename.rsplit('.', 1)[1].lower()
     try:
-        file.save(filepath)
-        print(f"File saved successfully to: {filepath}")
+        sha256, ext, size = blob_store.put_stream(file.stream, ext, file.mimetype)
+        print(f"File stored as blob {sha256} ({size} bytes)")
     except Exception as e:
         print(f"ERROR saving file: {e}")
+        db.session.rollback()
         return jsonify({'error': f'Failed to save file: {str(e)}'}), 500
 
     # ✅ Создаем URL и записываем в БД
-    file_url = f'/uploads/products/{product_id}/{filename}'
+    file_url = blob_store.blob_url(sha256, ext)
     print(f"File URL: {file_url}")
     
     try:
@@ -445,9 +204,11 @@ def upload_product_file():
         media = ProductMedia(
             product_id=product_id,
             url=file_url,
-            media_type=media_type
+            media_type=media_type,
+            blob_sha256=sha256,
         )
         db.session.add(media)
+        blob_store.attach(sha256)
         db.session.commit()
         
         print(f"SUCCESS: Product file uploaded successfully with ID: {media.id}")
@@ -464,15 +225,8 @@ def upload_product_file():
         print(f"Ошибка при создании записи в БД: {str(e)}")
         import traceback
         traceback.print_exc()
+        # Файл блоба без строки media_blobs подберёт blob_store.collect_garbage().
         db.session.rollback()
-        
-        # Удаляем загруженный файл, если не удалось создать запись в БД
-        try:
-            if os.path.exists(filepath):
-                os.remove(filepath)
-        except Exception as del_e:
-            print(f"Ошибка при удалении файла после неудачной записи в БД: {del_e}")
-        
         return jsonify({'error': f'Failed to save file information to database: {str(e)}'}), 500
 
 
@@ -491,23 +245,17 @@ def upload_product_video():
 # 🔹 Получить медиафайлы по товару
 @upload_bp.route('/media/<int:product_id>', methods=['GET'])
 def get_media(product_id):
-    print(f"Getting media for product {product_id}")
-    # Сначала синхронизируем файлы с базой данных
-    sync_media_from_filesystem(product_id)
-    
+    # Файлы, положенные на диск в обход API, подхватывает фоновая сверка
+    # services/media_index.reconcile() — здесь папку больше не листаем.
     media = ProductMedia.query.filter_by(product_id=product_id).order_by(ProductMedia.order).all()
-    print(f"Found {len(media)} media items")
-    for m in media:
-        print(f"  - ID: {m.id}, URL: {m.url}, Type: {m.media_type}, Order: {m.order}")
-    
+
     result = [{
         'id': m.id,
         'url': m.url,
         'media_type': m.media_type,
         'order': m.order
     } for m in media]
-    
-    print(f"Returning media data: {result}")
+
     return jsonify(result)
 
 
@@ -542,12 +290,17 @@ def add_media(product_id):
             media_type_value = media_type_value['media_type']
             print(f"Extracted media_type from nested object: {media_type_value}")
             
+        # Ссылка на уже загруженный блоб — считаем её, иначе GC удалит файл.
+        blob_sha256 = blob_store.ref_from_url(url_value)
         media = ProductMedia(
             product_id=product_id,
             url=url_value,
-            media_type=media_type_value
+            media_type=media_type_value,
+            blob_sha256=blob_sha256,
         )
         db.session.add(media)
+        if blob_sha256 is not None:
+            blob_store.attach(blob_sha256)
         db.session.commit()
         
         print(f"Media added successfully with ID: {media.id}")
@@ -567,7 +320,11 @@ def delete_media(media_id):
     
     print(f"Media found: ID={media.id}, URL={media.url}, Type={media.media_type}")
 
-    if media.url.startswith('/uploads/'):
+    blob_sha256 = media.blob_sha256 or blob_store.sha_from_url(media.url)
+    if blob_sha256:
+        # Файл общий для всех ссылок — удалит сборщик мусора, когда их не останется.
+        blob_store.release(blob_sha256)
+    elif media.url.startswith('/uploads/'):
         try:
             filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], media.url[9:])  # Remove '/uploads/' prefix
             print(f"Attempting to delete file: {filepath}")
@@ -582,6 +339,7 @@ def delete_media(media_id):
             print(f"Ошибка удаления файла: {e}")
             import traceback
             traceback.print_exc()
+        media_index.forget_url(media.url)
     else:
         print(f"Media URL does not start with /uploads/: {media.url}")
 
@@ -647,15 +405,8 @@ def reorder_media(product_id):
 # 🔹 Получить документы и драйвера
 @upload_bp.route('/documents/<int:product_id>', methods=['GET'])
 def get_documents(product_id):
-    print(f"Getting documents for product {product_id}")
-    # Сначала синхронизируем файлы с базой данных
-    sync_documents_from_filesystem(product_id)
-    
     docs = ProductDocument.query.filter_by(product_id=product_id, file_type='doc').all()
-    print(f"Found {len(docs)} documents")
-    for d in docs:
-        print(f"  - ID: {d.id}, Filename: {d.filename}, URL: {d.url}, Type: {d.file_type}")
-    
+
     result = [{
         'id': d.id,
         'filename': d.filename,
@@ -663,22 +414,14 @@ def get_documents(product_id):
         'file_type': d.file_type,
         'mime_type': d.mime_type
     } for d in docs]
-    
-    print(f"Returning documents data: {result}")
+
     return jsonify(result)
 
 
 @upload_bp.route('/drivers/<int:product_id>', methods=['GET'])
 def get_drivers(product_id):
-    print(f"Getting drivers for product {product_id}")
-    # Сначала синхронизируем файлы с базой данных
-    sync_drivers_from_filesystem(product_id)
-    
     drivers = ProductDocument.query.filter_by(product_id=product_id, file_type='driver').all()
-    print(f"Found {len(drivers)} drivers")
-    for d in drivers:
-        print(f"  - ID: {d.id}, Filename: {d.filename}, URL: {d.url}, Type: {d.file_type}")
-    
+
     result = [{
         'id': d.id,
         'filename': d.filename,
@@ -688,10 +431,35 @@ def get_drivers(product_id):
         'driver_id': d.driver_id,
     } for d in drivers]
 
-    print(f"Returning drivers data: {result}")
     return jsonify(result)
 
 
+@upload_bp.route('/media-index/reconcile', methods=['POST'])
+@jwt_required()
+def reconcile_media_index():
+    """
+    Ручной запуск сверки индекса файлов с диском (обычно её делает фоновый
+    цикл раз в MEDIA_RECONCILE_INTERVAL). Body: {product_ids?: [int]}.
+    """
+    if (get_jwt() or {}).get('role') not in ('admin', 'system'):
+        return jsonify({'error': 'Доступ запрещён'}), 403
+    data = request.get_json(silent=True) or {}
+    product_ids = data.get('product_ids')
+    if product_ids is not None:
+        try:
+            product_ids = [int(x) for x in product_ids]
+        except (TypeError, ValueError):
+            return jsonify({'error': 'product_ids должен быть списком чисел'}), 400
+    try:
+        stats = media_index.reconcile(product_ids)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Сверка не удалась: {e}'}), 500
+    if stats is None:
+        return jsonify({'error': 'Сверка уже идёт'}), 409
+    return jsonify({'success': True, 'data': stats})
+
+
 # 🔹 Добавить документы
 @upload_bp.route('/documents/<int:product_id>', methods=['POST'])
 def add_document(product_id):
@@ -707,14 +475,18 @@ def add_document(product_id):
             print(f"Missing required fields. Required: filename, url. Provided: {list(data.keys())}")
             return jsonify({'error': 'filename and url are required'}), 400
         
+        blob_sha256 = blob_store.ref_from_url(data['url'])
         doc = ProductDocument(
             product_id=product_id,
             filename=data['filename'],
             url=data['url'],
             file_type='doc',
-            mime_type=data.get('mime_type')
+            mime_type=data.get('mime_type'),
+            blob_sha256=blob_sha256,
         )
         db.session.add(doc)
+        if blob_sha256 is not None:
+            blob_store.attach(blob_sha256)
         db.session.commit()
         
         print(f"Документ добавлен в БД с ID: {doc.id}, URL: {doc.url}")
@@ -740,14 +512,18 @@ def add_driver(product_id):
             print(f"Missing required fields. Required: filename, url. Provided: {list(data.keys())}")
             return jsonify({'error': 'filename and url are required'}), 400
         
+        blob_sha256 = blob_store.ref_from_url(data['url'])
         doc = ProductDocument(
             product_id=product_id,
             filename=data['filename'],
             url=data['url'],
             file_type='driver',
-            mime_type=data.get('mime_type')
+            mime_type=data.get('mime_type'),
+            blob_sha256=blob_sha256,
         )
         db.session.add(doc)
+        if blob_sha256 is not None:
+            blob_store.attach(blob_sha256)
         db.session.commit()
         
         print(f"Драйвер добавлен в БД с ID: {doc.id}, URL: {doc.url}")
@@ -799,23 +575,27 @@ def _handle_file_upload(req, folder_type):
 
     filename = sanitize_filename(file.filename)
 
-    folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'products', str(product_id), folder_type)
-    os.makedirs(folder, exist_ok=True)
-
-    filepath = os.path.join(folder, filename)
-    file.save(filepath)
-
-    # Создаем URL для файла
-    file_url = f'/uploads/products/{product_id}/{folder_type}/{filename}'
-    
     # Определяем MIME-тип файла
     mime_type, _ = mimetypes.guess_type(filename)
     if not mime_type:
         mime_type = 'application/octet-stream'
+
+    # Один и тот же PDF/дистрибутив у нескольких товаров — один блоб;
+    # исходное имя файла уходит в ?download= для Content-Disposition.
+    ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    try:
+        sha256, ext, _ = blob_store.put_stream(file.stream, ext, mime_type)
+    except Exception as e:
+        print(f"Ошибка сохранения файла: {e}")
+        db.session.rollback()
+        return jsonify({'error': f'Failed to save file: {str(e)}'}), 500
+
+    # Создаем URL для файла
+    file_url = blob_store.blob_url(sha256, ext, download_name=filename)
     
     # Создаем запись в базе данных
     try:
-        file_type = folder_type.rstrip('s')  # 'documents' -> 'doc', 'drivers' -> 'driver'
+        file_type = 'doc' if folder_type == 'documents' else 'driver'
         print(f"Creating database record: product_id={product_id}, filename={filename}, url={file_url}, file_type={file_type}, mime_type={mime_type}")
         
         doc = ProductDocument(
@@ -823,9 +603,11 @@ def _handle_file_upload(req, folder_type):
             filename=filename,
             url=file_url,
             file_type=file_type,
-            mime_type=mime_type
+            mime_type=mime_type,
+            blob_sha256=sha256,
         )
         db.session.add(doc)
+        blob_store.attach(sha256)
         db.session.commit()
         
         print(f"Файл {filename} загружен и запись создана в БД с ID: {doc.id}")
@@ -842,15 +624,8 @@ def _handle_file_upload(req, folder_type):
         print(f"Ошибка при создании записи в БД: {str(e)}")
         import traceback
         traceback.print_exc()
+        # Файл блоба без строки media_blobs подберёт blob_store.collect_garbage().
         db.session.rollback()
-        
-        # Удаляем загруженный файл, если не удалось создать запись в БД
-        try:
-            if os.path.exists(filepath):
-                os.remove(filepath)
-        except Exception as del_e:
-            print(f"Ошибка при удалении файла после неудачной записи в БД: {del_e}")
-        
         return jsonify({'error': f'Failed to save file information to database: {str(e)}'}), 500
 
 
@@ -876,7 +651,10 @@ def _delete_document_or_driver(doc_id, file_type):
     # сам файл остаётся в /uploads/drivers/{driver_id}/ — он общий для нескольких товаров.
     is_linked = doc.driver_id is not None
 
-    if not is_linked and doc.url.startswith('/uploads/'):
+    blob_sha256 = doc.blob_sha256 or blob_store.sha_from_url(doc.url)
+    if not is_linked and blob_sha256:
+        blob_store.release(blob_sha256)
+    elif not is_linked and doc.url.startswith('/uploads/'):
         try:
             filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], doc.url[9:])  # Remove '/uploads/' prefix
             print(f"Full file path: {filepath}")
@@ -897,6 +675,8 @@ def _delete_document_or_driver(doc_id, file_type):
             import traceback
             traceback.print_exc()
 
+    if not is_linked and not doc.blob_sha256:
+        media_index.forget_url(doc.url)
     db.session.delete(doc)
     db.session.commit()
     msg = f'{file_type.capitalize()} {"unlinked" if is_linked else "deleted"}'
@@ -954,6 +734,245 @@ _MIME_TO_EXT = {
 _EXT_TO_MIME = {v: k for k, v in _MIME_TO_EXT.items()} | {'jpeg': 'image/jpeg'}
 
 
+# Batch ingest (AI Product Import кидает сразу все найденные картинки).
+# Пул общий на процесс, поверх него — лимит одновременных скачиваний с
+# одного хоста, чтобы донор не забанил нас за десяток параллельных GET.
+# Лимит соблюдается ДО пула: сверх него ссылки ждут в очереди своего
+# хоста и не занимают потоки, так что медленный донор не блокирует
+# скачивания с других хостов. Запись хоста живёт, пока у него есть
+# активные или ждущие загрузки.
+_INGEST_MAX_WORKERS = int(os.getenv('IMAGE_INGEST_MAX_WORKERS', '8'))
+_INGEST_PER_HOST = int(os.getenv('IMAGE_INGEST_PER_HOST', '3'))
+_INGEST_MAX_URLS = 30
+
+_ingest_executor = None
+_ingest_lock = threading.Lock()
+
+
+class _HostQueue:
+    __slots__ = ('active', 'pending')
+
+    def __init__(self):
+        self.active = 0
+        self.pending = deque()
+
+
+_host_queues: dict[str, _HostQueue] = {}
+
+
+def _get_ingest_executor() -> ThreadPoolExecutor:
+    global _ingest_executor
+    with _ingest_lock:
+        if _ingest_executor is None:
+            _ingest_executor = ThreadPoolExecutor(
+                max_workers=_INGEST_MAX_WORKERS,
+                thread_name_prefix='image-ingest',
+            )
+        return _ingest_executor
+
+
+def _submit_ingest(url, staging_dir, allowed_extensions) -> Future:
+    """
+    _fetch_image_to_staging в общем пуле с лимитом _INGEST_PER_HOST на
+    хост. Возвращает Future с тем же dict'ом.
+    """
+    host = urlparse(url).netloc.lower()
+    job = (url, staging_dir, allowed_extensions, Future())
+    with _ingest_lock:
+        queue = _host_queues.get(host)
+        if queue is None:
+            queue = _host_queues[host] = _HostQueue()
+        start = queue.active < _INGEST_PER_HOST
+        if start:
+            queue.active += 1
+        else:
+            queue.pending.append(job)
+    if start:
+        _start_ingest(host, job)
+    return job[3]
+
+
+def _start_ingest(host, job):
+    if not job[3].set_running_or_notify_cancel():
+        _finish_ingest(host)
+        return
+    _get_ingest_executor().submit(_run_ingest, host, job)
+
+
+def _run_ingest(host, job):
+    url, staging_dir, allowed_extensions, future = job
+    try:
+        result = _fetch_image_to_staging(url, staging_dir, allowed_extensions)
+    except Exception as e:
+        future.set_exception(e)
+    else:
+        future.set_result(result)
+    finally:
+        _finish_ingest(host)
+
+
+def _finish_ingest(host):
+    """Слот хоста освободился: отдать его следующей ссылке или забыть хост."""
+    with _ingest_lock:
+        queue = _host_queues[host]
+        if queue.pending:
+            job = queue.pending.popleft()
+        else:
+            job = None
+            queue.active -= 1
+            if queue.active == 0:
+                del _host_queues[host]
+    if job is not None:
+        _start_ingest(host, job)
+
+
+def _fetch_image_to_staging(url, staging_dir, allowed_extensions):
+    """
+    Скачивает картинку потоком прямо во временный файл staging_dir, по
+    дороге считая sha256 — в памяти держится один чанк. Не трогает
+    current_app и сессию БД, поэтому безопасно вызывается из потоков пула.
+
+    Возвращает dict: path, sha256, filename, ext, mime — или error + status
+    (HTTP-код для однофайлового эндпоинта). Лимит на хост — у вызывающего
+    (_submit_ingest).
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+        return {'error': 'URL должен быть http(s) с указанным доменом', 'status': 400}
+
+    try:
+        resp = requests.get(
+            url,
+            headers={'User-Agent': 'Mozilla/5.0 PosProBot/1.0'},
+            timeout=_IMAGE_FETCH_TIMEOUT,
+            stream=True,
+            allow_redirects=True,
+        )
+    except requests.exceptions.RequestException as e:
+        return {'error': f'Не удалось скачать: {e}', 'status': 502}
+
+    with resp:
+        if resp.status_code != 200:
+            return {'error': f'Источник вернул HTTP {resp.status_code}', 'status': 502}
+
+        content_type = (resp.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+
+        # Yandex Cloud Storage (и некоторые CDN) отдают часть файлов с
+        # generic Content-Type (application/octet-stream / binary / пусто).
+        # Если в URL валидное image-расширение — доверяем ему, та же логика
+        # что в utils/external_image.py для картинок брендов/категорий.
+        if not content_type.startswith('image/'):
+            url_ext = (os.path.splitext(parsed.path)[1] or '').lower().lstrip('.')
+            guessed = _EXT_TO_MIME.get(url_ext)
+            if guessed:
+                content_type = guessed
+            else:
+                return {
+                    'error': f'URL не является изображением (Content-Type: {content_type or "none"})',
+                    'status': 400,
+                }
+
+        # Determine filename: prefer URL path, fall back to UUID + extension from mimetype
+        url_filename = os.path.basename(unquote(parsed.path)) or ''
+        url_filename = sanitize_filename(url_filename) if url_filename else ''
+        has_ext = '.' in url_filename and url_filename.rsplit('.', 1)[1].lower() in allowed_extensions
+        if not has_ext:
+            ext = _MIME_TO_EXT.get(content_type, 'jpg')
+            base = url_filename.rsplit('.', 1)[0] if '.' in url_filename else url_filename
+            if not base:
+                base = uuid.uuid4().hex[:12]
+            url_filename = f'{base}.{ext}'
+        ext = url_filename.rsplit('.', 1)[1].lower()
+        if ext not in allowed_extensions:
+            return {'error': f'Тип файла не разрешён: {url_filename}', 'status': 400}
+
+        tmp_path = os.path.join(staging_dir, f'{uuid.uuid4().hex}.part')
+        digest = hashlib.sha256()
+        total = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in resp.iter_content(chunk_size=64_000):
+                    if not chunk:
+                        continue
+                    total += len(chunk)
+                    if total > _MAX_IMAGE_BYTES:
+                        raise _ImageTooLarge()
+                    digest.update(chunk)
+                    f.write(chunk)
+        except _ImageTooLarge:
+            _remove_quietly(tmp_path)
+            return {'error': f'Файл слишком большой (>{_MAX_IMAGE_BYTES // (1024 * 1024)}МБ)', 'status': 400}
+        except requests.exceptions.RequestException as e:
+            _remove_quietly(tmp_path)
+            return {'error': f'Не удалось скачать: {e}', 'status': 502}
+        except OSError as e:
+            _remove_quietly(tmp_path)
+            return {'error': f'Не удалось сохранить файл: {e}', 'status': 500}
+
+    return {
+        'path': tmp_path,
+        'sha256': digest.hexdigest(),
+        'filename': url_filename,
+        'ext': ext,
+        'mime': content_type,
+    }
+
+
+class _ImageTooLarge(Exception):
+    pass
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _existing_media_hashes(product_id):
+    """
+    sha256 → url для файлов, уже привязанных к товару: блобы — по
+    blob_sha256, старые файлы в uploads/products/<id>/ — по индексу
+    media_files (не досчитанный хэш считается на месте).
+    """
+    rows = db.session.execute(
+        db.text("""
+            SELECT pm.url, COALESCE(pm.blob_sha256, mf.sha256)
+            FROM product_media pm
+            LEFT JOIN media_files mf ON '/uploads/' || mf.path = pm.url
+            WHERE pm.product_id = :pid AND pm.url LIKE '/uploads/%'
+        """),
+        {'pid': product_id},
+    ).all()
+    root = current_app.config['UPLOAD_FOLDER']
+    hashes = {}
+    for url, sha in rows:
+        if sha is None:
+            try:
+                sha = file_delivery.content_sha256(os.path.join(root, url[len('/uploads/'):]))
+            except OSError:
+                continue
+        hashes.setdefault(sha, url)
+    return hashes
+
+
+def _store_staged(staged, source_url):
+    """Скачанный файл → блоб. Возвращает (sha256, ext)."""
+    return blob_store.put_file(
+        staged['path'], staged['sha256'], staged['ext'],
+        mime_type=staged['mime'], source_url=source_url,
+    )
+
+
+def _known_blob(url):
+    """Блоб, уже скачанный по этой ссылке, — повторный импорт без скачивания."""
+    known = blob_store.find_by_source_url(url)
+    if known is None:
+        return None
+    sha256, ext = known
+    return {'sha256': sha256, 'ext': ext, 'filename': f'{sha256[:12]}.{ext}', 'reused': True}
+
+
 @upload_bp.route('/upload_product_from_url', methods=['POST'])
 def upload_product_from_url():
     """
@@ -981,83 +1000,22 @@ def upload_product_from_url():
     except (TypeError, ValueError):
         media_order = 0
 
-    parsed = urlparse(url)
-    if parsed.scheme not in ('http', 'https') or not parsed.netloc:
-        return jsonify({'error': 'URL должен быть http(s) с указанным доменом'}), 400
-
-    # Download
+    allowed = current_app.config['ALLOWED_EXTENSIONS']
+    staged = _known_blob(url)
     try:
-        resp = requests.get(
-            url,
-            headers={'User-Agent': 'Mozilla/5.0 PosProBot/1.0'},
-            timeout=_IMAGE_FETCH_TIMEOUT,
-            stream=True,
-            allow_redirects=True,
-        )
-    except requests.exceptions.RequestException as e:
-        return jsonify({'error': f'Не удалось скачать: {e}'}), 502
-
-    if resp.status_code != 200:
-        return jsonify({'error': f'Источник вернул HTTP {resp.status_code}'}), 502
-
-    content_type = (resp.headers.get('Content-Type') or '').split(';')[0].strip().lower()
-
-    # Yandex Cloud Storage (и некоторые CDN) отдают часть файлов с
-    # generic Content-Type (application/octet-stream / binary / пусто).
-    # Если в URL валидное image-расширение — доверяем ему, та же логика
-    # что в utils/external_image.py для картинок брендов/категорий.
-    if not content_type.startswith('image/'):
-        url_ext = (os.path.splitext(parsed.path)[1] or '').lower().lstrip('.')
-        guessed = _EXT_TO_MIME.get(url_ext)
-        if guessed:
-            content_type = guessed
+        if staged is None:
+            staged = _submit_ingest(url, blob_store.tmp_dir(), allowed).result()
+            if 'error' in staged:
+                return jsonify({'error': staged['error']}), staged['status']
+            sha256, ext = _store_staged(staged, url)
         else:
-            return jsonify({'error': f'URL не является изображением (Content-Type: {content_type or "none"})'}), 400
-
-    # Read with size cap
-    chunks = []
-    total = 0
-    for chunk in resp.iter_content(chunk_size=64_000):
-        if not chunk:
-            continue
-        chunks.append(chunk)
-        total += len(chunk)
-        if total > _MAX_IMAGE_BYTES:
-            return jsonify({'error': f'Файл слишком большой (>{_MAX_IMAGE_BYTES // (1024 * 1024)}МБ)'}), 400
-    blob = b''.join(chunks)
-
-    # Determine filename: prefer URL path, fall back to UUID + extension from mimetype
-    url_filename = os.path.basename(unquote(parsed.path)) or ''
-    url_filename = sanitize_filename(url_filename) if url_filename else ''
-    has_ext = '.' in url_filename and url_filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
-    if not has_ext:
-        ext = _MIME_TO_EXT.get(content_type, 'jpg')
-        base = url_filename.rsplit('.', 1)[0] if '.' in url_filename else url_filename
-        if not base:
-            base = uuid.uuid4().hex[:12]
-        url_filename = f'{base}.{ext}'
-
-    if not allowed_file(url_filename):
-        return jsonify({'error': f'Тип файла не разрешён: {url_filename}'}), 400
-
-    folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'products', str(product_id))
-    os.makedirs(folder, exist_ok=True)
-
-    # Avoid overwriting an existing file with same name — append uuid suffix
-    filepath = os.path.join(folder, url_filename)
-    if os.path.exists(filepath):
-        stem, ext = os.path.splitext(url_filename)
-        url_filename = f'{stem}-{uuid.uuid4().hex[:6]}{ext}'
-        filepath = os.path.join(folder, url_filename)
-
-    try:
-        with open(filepath, 'wb') as f:
-            f.write(blob)
-    except Exception as e:
+            sha256, ext = staged['sha256'], staged['ext']
+    except OSError as e:
+        db.session.rollback()
         return jsonify({'error': f'Не удалось сохранить файл: {e}'}), 500
 
-    file_url = f'/uploads/products/{product_id}/{url_filename}'
-    media_type = get_media_type_from_filename(url_filename)
+    file_url = blob_store.blob_url(sha256, ext)
+    media_type = get_media_type_from_filename(file_url)
 
     try:
         media = ProductMedia(
@@ -1065,8 +1023,10 @@ def upload_product_from_url():
             url=file_url,
             media_type=media_type,
             order=media_order,
+            blob_sha256=sha256,
         )
         db.session.add(media)
+        blob_store.attach(sha256)
         db.session.commit()
     except Exception as e:
         db.session.rollback()
@@ -1077,5 +1037,123 @@ def upload_product_from_url():
         'id': media.id,
         'url': file_url,
         'media_type': media_type,
-        'filename': url_filename,
+        'filename': staged['filename'],
+    }), 200
+
+
+@upload_bp.route('/upload_product_from_urls', methods=['POST'])
+def upload_product_from_urls():
+    """
+    Batch-вариант upload_product_from_url: все картинки товара одним
+    запросом. Ссылки, уже импортированные раньше, берутся из хранилища
+    без скачивания; остальные качаются параллельно (общий пул + лимит на
+    хост) потоком на диск. Дубликаты по sha256 (внутри батча и с уже
+    привязанными к товару файлами) пропускаются, все ProductMedia
+    создаются одним коммитом.
+
+    Body: { product_id: int, urls: [str], start_order?: int }
+    Ответ: results[] в порядке urls — status created / duplicate / error.
+    """
+    data = request.get_json(silent=True) or {}
+
+    try:
+        product_id = int(data.get('product_id'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'product_id обязателен и должен быть числом'}), 400
+
+    urls = data.get('urls')
+    if not isinstance(urls, list) or not urls:
+        return jsonify({'error': 'urls должен быть непустым списком'}), 400
+    urls = [u.strip() for u in urls if isinstance(u, str) and u.strip()]
+    if len(urls) > _INGEST_MAX_URLS:
+        return jsonify({'error': f'Не больше {_INGEST_MAX_URLS} ссылок за раз'}), 400
+
+    if not Product.query.get(product_id):
+        return jsonify({'error': 'Товар не найден'}), 404
+
+    raw_order = data.get('start_order')
+    try:
+        next_order = int(raw_order) if raw_order is not None else None
+    except (TypeError, ValueError):
+        next_order = None
+    if next_order is None:
+        max_order = db.session.query(db.func.max(ProductMedia.order)).filter(
+            ProductMedia.product_id == product_id
+        ).scalar()
+        next_order = (max_order + 1) if max_order is not None else 0
+
+    allowed = current_app.config['ALLOWED_EXTENSIONS']
+    staging_dir = blob_store.tmp_dir()
+
+    jobs = []
+    for u in urls:
+        reused = _known_blob(u)
+        jobs.append(reused if reused is not None else _submit_ingest(u, staging_dir, allowed))
+
+    known_hashes = _existing_media_hashes(product_id)
+    results = []
+    new_media = []
+    for u, job in zip(urls, jobs):
+        if isinstance(job, dict):
+            staged = job
+        else:
+            try:
+                staged = job.result()
+            except Exception as e:
+                results.append({'url': u, 'status': 'error', 'error': f'Не удалось скачать: {e}'})
+                continue
+        if 'error' in staged:
+            results.append({'url': u, 'status': 'error', 'error': staged['error']})
+            continue
+        if staged['sha256'] in known_hashes:
+            if 'path' in staged:
+                _remove_quietly(staged['path'])
+            results.append({'url': u, 'status': 'duplicate', 'existing_url': known_hashes[staged['sha256']]})
+            continue
+        if 'path' in staged:
+            try:
+                sha256, ext = _store_staged(staged, u)
+            except OSError as e:
+                _remove_quietly(staged['path'])
+                results.append({'url': u, 'status': 'error', 'error': f'Не удалось сохранить файл: {e}'})
+                continue
+        else:
+            sha256, ext = staged['sha256'], staged['ext']
+
+        file_url = blob_store.blob_url(sha256, ext)
+        known_hashes[sha256] = file_url
+        media = ProductMedia(
+            product_id=product_id,
+            url=file_url,
+            media_type=get_media_type_from_filename(file_url),
+            order=next_order,
+            blob_sha256=sha256,
+        )
+        next_order += 1
+        new_media.append(media)
+        results.append({
+            'url': u, 'status': 'created', 'media': media,
+            'filename': staged['filename'], 'reused': bool(staged.get('reused')),
+        })
+
+    try:
+        if new_media:
+            db.session.add_all(new_media)
+            for media in new_media:
+                blob_store.attach(media.blob_sha256)
+        db.session.commit()
+    except Exception as e:
+        # Блобы без ссылок подберёт blob_store.collect_garbage().
+        db.session.rollback()
+        return jsonify({'error': f'Ошибка записи в БД: {e}'}), 500
+
+    for r in results:
+        media = r.pop('media', None)
+        if media is not None:
+            r.update({'id': media.id, 'media_url': media.url, 'media_type': media.media_type})
+
+    return jsonify({
+        'success': True,
+        'created': len(new_media),
+        'results': results,
     }), 200
@@ -8,8 +8,10 @@ import unicodedata
 from datetime import datetime
 from extensions import db
 from models.banner import Banner
+from utils.response_cache import invalidate_on_write
 
 upload_admin_bp = Blueprint('upload_admin', __name__)
+invalidate_on_write(upload_admin_bp, 'homepage')
 
 
 def sanitize_filename(filename):
@@ -43,6 +43,7 @@ from extensions import db
 from models.category import Category
 from models.category_alias import CategoryAlias
 from models.product import Product
+from services import category_closure
 from utils.category_normalize import normalize_name
 
 
@@ -338,6 +339,10 @@ def main():
                 prod_moved, alias_moved = _apply_merges(duplicates)
                 print(f'  Товаров перенесено: {prod_moved}')
                 print(f'  Алиасов перепривязано: {alias_moved}')
+                # _merge_pair двигает детей сырым UPDATE — closure проще
+                # пересобрать целиком, чем поддерживать по каждому мерджу.
+                rows = category_closure.rebuild()
+                print(f'  category_closure пересобрана: {rows} строк')
             elif duplicates:
                 print(f'ВНИМАНИЕ: найдено {len(duplicates)} групп дубликатов — не смерджены (нет флага --merge-duplicates).')
                 print('  Смерджите через админ UI или запустите с --merge-duplicates.')
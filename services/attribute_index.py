@@ -0,0 +1,336 @@
+"""
+Типизированный индекс характеристик (product_attribute) и фильтры /
+facets по нему для /products/search.
+
+Индекс ведёт Postgres: statement-триггеры на product_characteristic
+(transition tables — пакетный INSERT импорта обрабатывается одним
+INSERT ... SELECT, а не по строке) и строчные на characteristics_list
+(сменилась единица измерения — перестроить её строки). Триггер, а не
+код в роутах: характеристики пишут и ORM, и сырой SQL импорта.
+
+Разбор значения — SQL-функция product_attribute_parse: число в начале
+(запятая как десятичный разделитель), после него — единица; если её нет
+в значении, берётся unit_of_measurement из справочника. Известные
+единицы (UNITS) приводятся к базовой: «1,5 кВт» и «1500 Вт» дают
+num_value = 1500, unit = 'Вт'. Диапазоны («220-240 В») и составные
+значения («60x60 см») числом не считаются — по ним работает только
+фильтр по списку значений.
+"""
+
+import re
+from typing import Optional
+
+from sqlalchemy import func, text
+
+from extensions import db
+from models.characteristics_list import CharacteristicsList
+from models.product_attribute import ProductAttribute
+
+
+# единица (lower, без точки на конце) → (базовая единица, множитель)
+UNITS = {
+    'мм': ('мм', 1), 'mm': ('мм', 1), 'см': ('мм', 10), 'cm': ('мм', 10),
+    'дм': ('мм', 100), 'м': ('мм', 1000), 'm': ('мм', 1000), 'км': ('мм', 1000000),
+    'мг': ('г', 0.001), 'г': ('г', 1), 'гр': ('г', 1), 'g': ('г', 1),
+    'кг': ('г', 1000), 'kg': ('г', 1000), 'т': ('г', 1000000),
+    'вт': ('Вт', 1), 'w': ('Вт', 1), 'квт': ('Вт', 1000), 'kw': ('Вт', 1000),
+    'мл': ('мл', 1), 'ml': ('мл', 1), 'л': ('мл', 1000), 'l': ('мл', 1000),
+    'м3': ('мл', 1000000), 'м³': ('мл', 1000000),
+    'гц': ('Гц', 1), 'hz': ('Гц', 1), 'кгц': ('Гц', 1000), 'мгц': ('Гц', 1000000),
+    'ггц': ('Гц', 1000000000),
+    'в': ('В', 1), 'v': ('В', 1), 'кв': ('В', 1000),
+    'а': ('А', 1), 'a': ('А', 1), 'ма': ('А', 0.001),
+    'с': ('с', 1), 'сек': ('с', 1), 'мин': ('с', 60), 'ч': ('с', 3600),
+}
+
+MAX_FACET_ATTRIBUTES = 30
+MAX_FACET_VALUES = 50
+# Атрибут показывается ползунком, если почти все значения числовые и их
+# много; иначе — списком значений.
+RANGE_MIN_DISTINCT = 10
+RANGE_NUMERIC_SHARE = 0.9
+
+_ATTR_PARAM = re.compile(r'^attr\[(\d+)\]$')
+
+_UNITS_VALUES = ',\n'.join(
+    f"('{name}', '{base}', {factor}::double precision)" for name, (base, factor) in UNITS.items()
+)
+
+_PARSE_FUNCTION = r"""
+CREATE OR REPLACE FUNCTION product_attribute_parse(
+    raw TEXT, list_unit TEXT, OUT num DOUBLE PRECISION, OUT unit TEXT
+) AS $$
+DECLARE
+    m TEXT[];
+    raw_unit TEXT;
+    base_unit TEXT;
+    mult DOUBLE PRECISION;
+BEGIN
+    m = regexp_match(replace(btrim(raw), ',', '.'), '^([-+]?\d+(?:\.\d+)?)\s*([^\d\s][^\d]*)?$');
+    IF m IS NULL THEN
+        RETURN;
+    END IF;
+    num = m[1]::double precision;
+    raw_unit = btrim(coalesce(nullif(btrim(m[2]), ''), list_unit, ''));
+    SELECT u.base, u.factor INTO base_unit, mult
+    FROM (VALUES %s) AS u(name, base, factor)
+    WHERE u.name = rtrim(lower(raw_unit), '.');
+    IF FOUND THEN
+        num = num * mult;
+        unit = base_unit;
+    ELSE
+        unit = nullif(left(raw_unit, 20), '');
+    END IF;
+END
+$$ LANGUAGE plpgsql IMMUTABLE
+""" % _UNITS_VALUES
+
+# Строки индекса из строк product_characteristic ({source} — таблица или
+# transition table триггера). key хранит id справочника строкой.
+_ROWS_SQL = r"""
+INSERT INTO product_attribute (id, product_id, characteristic_id, num_value, unit, value_key, value_label)
+SELECT pc.id, pc.product_id, cl.id, p.num, p.unit,
+       left(lower(regexp_replace(btrim(pc.value), '\s+', ' ', 'g')), 255),
+       left(btrim(pc.value), 255)
+FROM {source} pc
+JOIN characteristics_list cl ON cl.id::text = pc.key
+CROSS JOIN LATERAL product_attribute_parse(pc.value, cl.unit_of_measurement) p
+WHERE btrim(pc.value) <> '' {where}
+"""
+
+_SYNC_FUNCTIONS = [
+    f"""
+    CREATE OR REPLACE FUNCTION product_attribute_sync() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            DELETE FROM product_attribute pa USING old_rows o WHERE pa.id = o.id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            {_ROWS_SQL.format(source='new_rows', where='')};
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION product_attribute_characteristic_changed() RETURNS trigger AS $$
+    BEGIN
+        DELETE FROM product_attribute WHERE characteristic_id = OLD.id;
+        IF TG_OP = 'UPDATE' THEN
+            {_ROWS_SQL.format(source='product_characteristic', where='AND pc.key = NEW.id::text')};
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+]
+
+_TRIGGERS = [
+    """
+    CREATE TRIGGER trg_product_characteristic_attr_ins
+    AFTER INSERT ON product_characteristic
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION product_attribute_sync()
+    """,
+    """
+    CREATE TRIGGER trg_product_characteristic_attr_upd
+    AFTER UPDATE ON product_characteristic
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION product_attribute_sync()
+    """,
+    """
+    CREATE TRIGGER trg_product_characteristic_attr_del
+    AFTER DELETE ON product_characteristic
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION product_attribute_sync()
+    """,
+    """
+    CREATE TRIGGER trg_characteristics_list_attr_upd
+    AFTER UPDATE OF unit_of_measurement ON characteristics_list
+    FOR EACH ROW WHEN (OLD.unit_of_measurement IS DISTINCT FROM NEW.unit_of_measurement)
+    EXECUTE FUNCTION product_attribute_characteristic_changed()
+    """,
+    """
+    CREATE TRIGGER trg_characteristics_list_attr_del
+    AFTER DELETE ON characteristics_list
+    FOR EACH ROW EXECUTE FUNCTION product_attribute_characteristic_changed()
+    """,
+]
+
+
+def install() -> bool:
+    """
+    Функции разбора и триггеры; при первой установке — заполнение
+    индекса. Таблицу создаёт db.create_all(). Идемпотентно, зовётся на
+    старте из app.py. Возвращает True, если триггеры ставились впервые.
+    Не коммитит.
+    """
+    db.session.execute(text(_PARSE_FUNCTION))
+    for sql in _SYNC_FUNCTIONS:
+        db.session.execute(text(sql))
+
+    installed = db.session.execute(text(
+        "SELECT 1 FROM pg_trigger WHERE tgname = 'trg_product_characteristic_attr_ins'"
+    )).first()
+    if installed:
+        return False
+
+    rebuild()
+    for sql in _TRIGGERS:
+        db.session.execute(text(sql))
+    return True
+
+
+def rebuild() -> None:
+    """Перестроить индекс целиком (например, после правки UNITS). Не коммитит."""
+    db.session.execute(text('DELETE FROM product_attribute'))
+    db.session.execute(text(_ROWS_SQL.format(source='product_characteristic', where='')))
+
+
+def normalize_value(value: str) -> str:
+    """Та же нормализация, что у value_key в индексе."""
+    return ' '.join(value.split()).lower()[:255]
+
+
+def parse_filters(args) -> dict[int, tuple]:
+    """
+    attr[<id>]=min..max → {id: ('range', min, max)} (любая граница может
+    быть пустой), attr[<id>]=v1,v2 → {id: ('values', [v1, v2])}.
+    Границы — в базовой единице атрибута (ту же отдаёт facet).
+    Некорректный диапазон — ValueError.
+    """
+    filters = {}
+    for name in args:
+        m = _ATTR_PARAM.match(name)
+        if not m:
+            continue
+        raw = (args.get(name) or '').strip()
+        if not raw:
+            continue
+        cid = int(m.group(1))
+        if '..' in raw:
+            lo_raw, hi_raw = raw.split('..', 1)
+            try:
+                lo = float(lo_raw.replace(',', '.')) if lo_raw.strip() else None
+                hi = float(hi_raw.replace(',', '.')) if hi_raw.strip() else None
+            except ValueError:
+                raise ValueError(f'attr[{cid}]: диапазон должен быть вида min..max')
+            if lo is not None or hi is not None:
+                filters[cid] = ('range', lo, hi)
+        else:
+            values = [normalize_value(v) for v in raw.split(',') if v.strip()]
+            if values:
+                filters[cid] = ('values', values)
+    return filters
+
+
+def _matching_products(cid: int, condition: tuple):
+    q = db.session.query(ProductAttribute.product_id).filter(ProductAttribute.characteristic_id == cid)
+    if condition[0] == 'range':
+        _, lo, hi = condition
+        if lo is not None:
+            q = q.filter(ProductAttribute.num_value >= lo)
+        if hi is not None:
+            q = q.filter(ProductAttribute.num_value <= hi)
+    else:
+        q = q.filter(ProductAttribute.value_key.in_(condition[1]))
+    return q
+
+
+def apply_filters(query, filters: dict[int, tuple], product_id_column, skip: Optional[int] = None):
+    """Все attr-фильтры, кроме skip, — каждый отдельным IN (semi-join по индексу)."""
+    for cid, condition in filters.items():
+        if cid != skip:
+            query = query.filter(product_id_column.in_(_matching_products(cid, condition)))
+    return query
+
+
+def _stats(product_ids, characteristic_ids=None, limit=None) -> list:
+    q = (db.session.query(
+            ProductAttribute.characteristic_id,
+            func.count(func.distinct(ProductAttribute.product_id)),
+            func.count(ProductAttribute.num_value),
+            func.count(ProductAttribute.id),
+            func.count(func.distinct(ProductAttribute.value_key)),
+            func.min(ProductAttribute.num_value),
+            func.max(ProductAttribute.num_value),
+            func.min(ProductAttribute.unit),
+        )
+        .filter(ProductAttribute.product_id.in_(product_ids))
+        .group_by(ProductAttribute.characteristic_id))
+    if characteristic_ids is not None:
+        q = q.filter(ProductAttribute.characteristic_id.in_(characteristic_ids))
+    if limit is not None:
+        q = q.order_by(func.count(func.distinct(ProductAttribute.product_id)).desc()).limit(limit)
+    return q.all()
+
+
+def _values(product_ids, characteristic_ids) -> dict[int, list[dict]]:
+    rows = (db.session.query(
+                ProductAttribute.characteristic_id,
+                ProductAttribute.value_key,
+                func.min(ProductAttribute.value_label),
+                func.count(func.distinct(ProductAttribute.product_id)),
+            )
+            .filter(ProductAttribute.product_id.in_(product_ids),
+                    ProductAttribute.characteristic_id.in_(characteristic_ids))
+            .group_by(ProductAttribute.characteristic_id, ProductAttribute.value_key)
+            .all())
+    result: dict[int, list[dict]] = {}
+    for cid, key, label, count in rows:
+        result.setdefault(cid, []).append({'value': key, 'label': label, 'count': count})
+    for items in result.values():
+        items.sort(key=lambda v: (-v['count'], v['label']))
+        del items[MAX_FACET_VALUES:]
+    return result
+
+
+def _facet(row) -> dict:
+    cid, products, numeric, total, distinct, vmin, vmax, unit = row
+    is_range = numeric >= total * RANGE_NUMERIC_SHARE and distinct >= RANGE_MIN_DISTINCT
+    facet = {'id': cid, 'count': products, 'type': 'range' if is_range else 'values'}
+    if is_range:
+        facet.update({'min': vmin, 'max': vmax, 'unit': unit})
+    return facet
+
+
+def facets(product_query, filters: dict[int, tuple], product_id_column) -> list[dict]:
+    """
+    Facets по характеристикам для product_query (все фильтры, кроме
+    attr). Как и остальные facets поиска, каждый выбранный атрибут
+    считается без своего фильтра, но с остальными; невыбранные — по
+    полному отфильтрованному набору. Не более MAX_FACET_ATTRIBUTES
+    самых частых атрибутов плюс все выбранные.
+    """
+    def ids_for(skip=None):
+        q = apply_filters(product_query, filters, product_id_column, skip=skip)
+        return q.with_entities(product_id_column)
+
+    full_ids = ids_for()
+    result = {row[0]: _facet(row) for row in _stats(full_ids, limit=MAX_FACET_ATTRIBUTES)
+              if row[0] not in filters}
+    value_ids = [cid for cid, f in result.items() if f['type'] == 'values']
+    for cid, values in _values(full_ids, value_ids).items():
+        result[cid]['values'] = values
+
+    for cid in filters:
+        own_ids = ids_for(skip=cid)
+        rows = _stats(own_ids, characteristic_ids=[cid])
+        if not rows:
+            continue
+        result[cid] = _facet(rows[0])
+        if result[cid]['type'] == 'values':
+            result[cid]['values'] = _values(own_ids, [cid]).get(cid, [])
+
+    names = dict(
+        db.session.query(CharacteristicsList.id, CharacteristicsList.characteristic_key)
+        .filter(CharacteristicsList.id.in_(list(result)))
+        .all()
+    ) if result else {}
+    items = []
+    for cid, facet in result.items():
+        facet['name'] = names.get(cid)
+        facet['selected'] = cid in filters
+        items.append(facet)
+    items.sort(key=lambda f: (not f['selected'], -f['count'], f['name'] or ''))
+    return items
@@ -0,0 +1,291 @@
+"""
+Content-addressed хранилище файлов товаров (см. `models/media_blob.py`).
+
+Запись:
+  - `put_stream(fileobj, ext, mime_type)` — загрузка из формы: поток
+    пишется во временный файл с подсчётом sha256, затем `put_file`;
+  - `put_file(tmp_path, sha256, ext, ...)` — уже скачанный и посчитанный
+    файл (импорт по URL): если блоб с таким хэшем есть — временный файл
+    удаляется, иначе атомарно переносится в blobs/ab/cd/<sha256>.<ext>.
+    Строка media_blobs — upsert в транзакции вызывающего;
+  - `find_by_source_url(url)` — блоб, уже скачанный по этой ссылке.
+
+Счётчик ссылок:
+  - `attach(sha)` / `release(sha)` — при создании/удалении строки
+    ProductMedia/ProductDocument с blob_sha256; `ref_from_url(url)` —
+    blob_sha256 для строки, чей url пришёл в JSON и указывает на блоб;
+  - `release_for_product(product_id)` — перед массовым удалением строк
+    товара (query.delete() мимо ORM);
+  - `collect_garbage()` — пересчёт ref_count из факта одним UPDATE
+    (в т.ч. строки без blob_sha256 с url `/uploads/blobs/...`),
+    удаление блобов без ссылок старше GC_GRACE и осиротевших файлов
+    (файл лёг на диск, а транзакция со строкой откатилась).
+
+Как и остальные services, кроме collect_garbage ничего не коммитит.
+"""
+
+import hashlib
+import os
+import time
+import uuid
+from typing import Optional
+from urllib.parse import quote
+
+from flask import current_app
+from sqlalchemy import text
+
+from extensions import db
+
+
+BLOB_DIR = 'blobs'
+_TMP_DIR = '.tmp'
+# Блоб без ссылок живёт ещё столько — страховка от гонки «GC удалил, а
+# параллельная загрузка как раз на него сослалась».
+GC_GRACE_SECONDS = 3600
+_GC_LOCK_KEY = 0x626C6F62  # 'blob'
+_CHUNK = 1024 * 1024
+# sha256 из url строки без blob_sha256 — то же, что sha_from_url, в SQL.
+_URL_SHA_SQL = (
+    "COALESCE(blob_sha256, substring(url from '^/uploads/blobs/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})'))"
+)
+_URL_REF_FILTER = "(blob_sha256 IS NOT NULL OR url LIKE '/uploads/blobs/%')"
+
+
+def blob_root() -> str:
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], BLOB_DIR)
+
+
+def blob_rel_path(sha256: str, ext: str) -> str:
+    name = f'{sha256}.{ext}' if ext else sha256
+    return f'{BLOB_DIR}/{sha256[:2]}/{sha256[2:4]}/{name}'
+
+
+def blob_url(sha256: str, ext: str, download_name: Optional[str] = None) -> str:
+    url = f'/uploads/{blob_rel_path(sha256, ext)}'
+    if download_name:
+        url += f'?download={quote(download_name)}'
+    return url
+
+
+def sha_from_url(url: str) -> Optional[str]:
+    """
+    sha256 из URL блоба: строки, созданные до колонки blob_sha256, и
+    ссылки на уже загруженный блоб, пришедшие в JSON (upload/media и т.п.).
+    """
+    if not isinstance(url, str) or not url.startswith(f'/uploads/{BLOB_DIR}/'):
+        return None
+    name = url.split('?', 1)[0].rsplit('/', 1)[-1]
+    sha = name.split('.', 1)[0]
+    return sha if len(sha) == 64 else None
+
+
+def ref_from_url(url: str) -> Optional[str]:
+    """sha256 блоба по URL, если он есть в media_blobs (blob_sha256 — внешний ключ)."""
+    sha = sha_from_url(url)
+    if sha is None:
+        return None
+    exists = db.session.execute(
+        text('SELECT 1 FROM media_blobs WHERE sha256 = :sha'), {'sha': sha}
+    ).first()
+    return sha if exists else None
+
+
+def tmp_dir() -> str:
+    """Каталог временных файлов: та же ФС, что и блобы, — rename атомарный."""
+    path = os.path.join(blob_root(), _TMP_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def new_tmp_path() -> str:
+    return os.path.join(tmp_dir(), f'{uuid.uuid4().hex}.part')
+
+
+def put_file(tmp_path: str, sha256: str, ext: str, mime_type: Optional[str] = None,
+             source_url: Optional[str] = None) -> tuple[str, str]:
+    """
+    Кладёт посчитанный временный файл в хранилище. Возвращает (sha256, ext)
+    — ext существующего блоба, если то же содержимое уже лежит под другим
+    расширением (.jpeg vs .jpg).
+    """
+    ext = (ext or '').lower()
+    existing = db.session.execute(
+        text('SELECT ext FROM media_blobs WHERE sha256 = :sha'), {'sha': sha256}
+    ).first()
+    if existing is not None:
+        ext = existing[0]
+    dest = os.path.join(current_app.config['UPLOAD_FOLDER'], blob_rel_path(sha256, ext))
+    size = os.path.getsize(tmp_path)
+    if os.path.exists(dest):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(tmp_path, dest)
+
+    db.session.execute(
+        text("""
+            INSERT INTO media_blobs (sha256, ext, size, mime_type, ref_count, source_url, created_at, updated_at)
+            VALUES (:sha, :ext, :size, :mime, 0, :source_url, NOW(), NOW())
+            ON CONFLICT (sha256) DO UPDATE
+            SET updated_at = NOW(),
+                source_url = COALESCE(media_blobs.source_url, EXCLUDED.source_url)
+        """),
+        {'sha': sha256, 'ext': ext, 'size': size, 'mime': mime_type, 'source_url': source_url},
+    )
+    return sha256, ext
+
+
+def put_stream(fileobj, ext: str, mime_type: Optional[str] = None) -> tuple[str, str, int]:
+    """Поток (FileStorage.stream) → блоб. Возвращает (sha256, ext, size)."""
+    tmp_path = new_tmp_path()
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in iter(lambda: fileobj.read(_CHUNK), b''):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    sha256, ext = put_file(tmp_path, digest.hexdigest(), ext, mime_type)
+    return sha256, ext, size
+
+
+def find_by_source_url(source_url: str) -> Optional[tuple[str, str]]:
+    """(sha256, ext) блоба, уже скачанного по этой ссылке, если файл на месте."""
+    row = db.session.execute(
+        text('SELECT sha256, ext FROM media_blobs WHERE source_url = :u LIMIT 1'),
+        {'u': source_url},
+    ).first()
+    if row is None:
+        return None
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'], blob_rel_path(row[0], row[1]))
+    return (row[0], row[1]) if os.path.exists(path) else None
+
+
+def attach(sha256: str, n: int = 1) -> None:
+    db.session.execute(
+        text('UPDATE media_blobs SET ref_count = ref_count + :n, updated_at = NOW() WHERE sha256 = :sha'),
+        {'sha': sha256, 'n': n},
+    )
+
+
+def release(sha256: str, n: int = 1) -> None:
+    db.session.execute(
+        text('UPDATE media_blobs SET ref_count = ref_count - :n, updated_at = NOW() WHERE sha256 = :sha'),
+        {'sha': sha256, 'n': n},
+    )
+
+
+def release_for_product(product_id: int) -> None:
+    """Снимает ссылки всех медиа и документов товара одним UPDATE."""
+    db.session.execute(
+        text("""
+            UPDATE media_blobs b
+            SET ref_count = b.ref_count - r.n, updated_at = NOW()
+            FROM (
+                SELECT sha, COUNT(*) AS n FROM (
+                    SELECT {sha} AS sha FROM product_media
+                    WHERE product_id = :pid AND {refs}
+                    UNION ALL
+                    SELECT {sha} AS sha FROM product_document
+                    WHERE product_id = :pid AND {refs}
+                ) t WHERE sha IS NOT NULL GROUP BY sha
+            ) r
+            WHERE b.sha256 = r.sha
+        """.format(sha=_URL_SHA_SQL, refs=_URL_REF_FILTER)),
+        {'pid': product_id},
+    )
+
+
+def recount() -> int:
+    """
+    Пересчитывает ref_count из фактических ссылок — по blob_sha256, а у
+    строк без него по url `/uploads/blobs/...`. updated_at не трогает —
+    иначе свежий attach, потерянный из-за гонки с пересчётом, лишился бы
+    грейс-периода.
+    """
+    return db.session.execute(text("""
+        WITH refs AS (
+            SELECT sha, COUNT(*) AS n FROM (
+                SELECT {sha} AS sha FROM product_media WHERE {refs}
+                UNION ALL
+                SELECT {sha} AS sha FROM product_document WHERE {refs}
+            ) t WHERE sha IS NOT NULL GROUP BY sha
+        )
+        UPDATE media_blobs b
+        SET ref_count = COALESCE(r.n, 0)
+        FROM media_blobs b2
+        LEFT JOIN refs r ON r.sha = b2.sha256
+        WHERE b.sha256 = b2.sha256
+          AND b.ref_count <> COALESCE(r.n, 0)
+    """.format(sha=_URL_SHA_SQL, refs=_URL_REF_FILTER))).rowcount
+
+
+def collect_garbage() -> Optional[dict]:
+    """
+    Пересчёт счётчиков + удаление блобов без ссылок и осиротевших файлов.
+    Коммитит сам. None — уже идёт в другом процессе.
+    """
+    got_lock = db.session.execute(
+        text('SELECT pg_try_advisory_xact_lock(:k)'), {'k': _GC_LOCK_KEY}
+    ).scalar()
+    if not got_lock:
+        db.session.rollback()
+        return None
+
+    stats = {'recounted': recount()}
+    deleted = db.session.execute(
+        text("""
+            DELETE FROM media_blobs
+            WHERE ref_count <= 0
+              AND updated_at < NOW() - make_interval(secs => :grace)
+            RETURNING sha256, ext
+        """),
+        {'grace': GC_GRACE_SECONDS},
+    ).all()
+    db.session.commit()
+
+    upload_root = current_app.config['UPLOAD_FOLDER']
+    removed = 0
+    for sha256, ext in deleted:
+        # Блоб могли заново загрузить между DELETE и этой строкой.
+        if db.session.execute(
+            text('SELECT 1 FROM media_blobs WHERE sha256 = :sha'), {'sha': sha256}
+        ).first():
+            continue
+        try:
+            os.remove(os.path.join(upload_root, blob_rel_path(sha256, ext)))
+            removed += 1
+        except OSError:
+            pass
+    stats['blobs_removed'] = removed
+    stats['orphan_files_removed'] = _remove_orphan_files()
+    db.session.commit()
+    return stats
+
+
+def _remove_orphan_files() -> int:
+    """Файлы в blobs/ без строки в media_blobs (и брошенные .tmp) старше GC_GRACE."""
+    root = blob_root()
+    if not os.path.isdir(root):
+        return 0
+    known = {r[0] for r in db.session.execute(text('SELECT sha256 FROM media_blobs')).all()}
+    cutoff = time.time() - GC_GRACE_SECONDS
+    removed = 0
+    for dirpath, _, filenames in os.walk(root):
+        in_tmp = os.path.basename(dirpath) == _TMP_DIR
+        for name in filenames:
+            if not in_tmp and name.split('.', 1)[0] in known:
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+    return removed
@@ -0,0 +1,262 @@
+"""
+Потоковая выгрузка каталога (NDJSON / CSV).
+
+Раньше интеграции тянули каталог через /products/articles-map (весь
+словарь в памяти), /products/ без per_page (все товары + запросы
+наличия на каждый) и /public/sitemap-slugs. Здесь:
+
+  - товары читаются server-side курсором (`Query.yield_per`) — в памяти
+    одна пачка BATCH_SIZE строк независимо от размера каталога;
+  - вложенные поля (characteristics, media, image) догружаются одним
+    запросом на пачку, а не на товар;
+  - пути категорий считаются по словарю категорий, который грузится
+    один раз (категорий — сотни, товаров — десятки тысяч);
+  - результат отдаётся генератором строк, route пишет его chunked.
+
+NDJSON-запись совместима с форматом `services/catalog_import.py`
+(brand — {"name", "country"}, category_path — список имён,
+characteristics — [{"key", "value", "unit"}], media — список URL), так
+что выгрузку можно залить обратно импортом.
+
+updated_since — по product.updated_at: колонку ставит триггер на любой
+UPDATE строки product (в т.ч. пакетные UPDATE ... FROM unnest мимо ORM).
+Изменения только характеристик/медиа строку product не трогают.
+Поле change_seq — номер в ленте /products/changes (services/change_feed.py).
+"""
+
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+from extensions import db
+from models.brand import Brand
+from models.category import Category
+from models.characteristic import ProductCharacteristic
+from models.characteristics_list import CharacteristicsList
+from models.media import ProductMedia
+from models.product import Product
+
+
+BATCH_SIZE = 1000
+FORMAT_NDJSON = 'ndjson'
+FORMAT_CSV = 'csv'
+
+# Плоские колонки product: имя поля → колонка.
+_COLUMNS = {
+    'id': Product.id,
+    'article': Product.article,
+    'name': Product.name,
+    'slug': Product.slug,
+    'price': Product.price,
+    'wholesale_price': Product.wholesale_price,
+    'quantity': Product.quantity,
+    'is_visible': Product.is_visible,
+    'is_draft': Product.is_draft,
+    'country': Product.country,
+    'description': Product.description,
+    'supplier_id': Product.supplier_id,
+    'category_id': Product.category_id,
+    'updated_at': Product.updated_at,
+    'change_seq': Product.change_seq,
+}
+# Поля, которые считаются отдельно (по пачке или по словарю категорий).
+_DERIVED = ('brand', 'category_path', 'image', 'characteristics', 'media')
+
+ALL_FIELDS = tuple(_COLUMNS) + _DERIVED
+DEFAULT_FIELDS = (
+    'id', 'article', 'name', 'slug', 'price', 'wholesale_price', 'quantity',
+    'is_visible', 'is_draft', 'supplier_id', 'brand', 'category_id', 'updated_at',
+)
+
+
+def parse_fields(raw: Optional[str]) -> list[str]:
+    """'id,name,price' → список полей; неизвестное поле — ValueError."""
+    if not raw:
+        return list(DEFAULT_FIELDS)
+    fields = []
+    for name in raw.split(','):
+        name = name.strip()
+        if not name or name in fields:
+            continue
+        if name not in ALL_FIELDS:
+            raise ValueError(f'Неизвестное поле: {name}. Допустимые: {", ".join(ALL_FIELDS)}')
+        fields.append(name)
+    if not fields:
+        raise ValueError('Пустой список полей')
+    return fields
+
+
+def parse_since(raw: Optional[str]) -> Optional[datetime]:
+    """ISO-8601 → naive UTC (product.updated_at хранится в UTC без зоны)."""
+    if not raw:
+        return None
+    try:
+        value = datetime.fromisoformat(raw.strip().replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError('updated_since должен быть в формате ISO-8601')
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _category_paths() -> dict[int, list[str]]:
+    rows = db.session.query(Category.id, Category.name, Category.parent_id).all()
+    by_id = {cid: (name, parent_id) for cid, name, parent_id in rows}
+    paths: dict[int, list[str]] = {}
+
+    def path_for(cid, depth=0):
+        if cid in paths:
+            return paths[cid]
+        if cid not in by_id or depth > 50:  # защита от цикла в дереве
+            return []
+        name, parent_id = by_id[cid]
+        paths[cid] = (path_for(parent_id, depth + 1) if parent_id else []) + [name]
+        return paths[cid]
+
+    for cid in by_id:
+        path_for(cid)
+    return paths
+
+
+def _load_characteristics(ids: list[int]) -> dict[int, list[dict]]:
+    # key хранит id из characteristics_list строкой; старые строки могут
+    # хранить название — тогда отдаём его как есть.
+    rows = (
+        db.session.query(
+            ProductCharacteristic.product_id,
+            ProductCharacteristic.key,
+            ProductCharacteristic.value,
+            CharacteristicsList.characteristic_key,
+            CharacteristicsList.unit_of_measurement,
+        )
+        .outerjoin(
+            CharacteristicsList,
+            db.cast(CharacteristicsList.id, db.String) == ProductCharacteristic.key,
+        )
+        .filter(ProductCharacteristic.product_id.in_(ids))
+        .order_by(ProductCharacteristic.product_id, ProductCharacteristic.sort_order, ProductCharacteristic.id)
+        .all()
+    )
+    result: dict[int, list[dict]] = {}
+    for pid, key, value, name, unit in rows:
+        item = {'key': name or key, 'value': value}
+        if unit:
+            item['unit'] = unit
+        result.setdefault(pid, []).append(item)
+    return result
+
+
+def _load_media(ids: list[int]) -> dict[int, list[str]]:
+    rows = (
+        db.session.query(ProductMedia.product_id, ProductMedia.url)
+        .filter(ProductMedia.product_id.in_(ids), ProductMedia.media_type == 'image')
+        .order_by(ProductMedia.product_id, ProductMedia.order, ProductMedia.id)
+        .all()
+    )
+    result: dict[int, list[str]] = {}
+    for pid, url in rows:
+        result.setdefault(pid, []).append(url)
+    return result
+
+
+def iter_records(fields: list[str], updated_since: Optional[datetime] = None,
+                 include_hidden: bool = True) -> Iterator[list[dict]]:
+    """
+    Пачки записей-словарей (только запрошенные поля, в порядке fields).
+    Сортировка по id — выгрузку можно продолжить с места обрыва по
+    updated_since/последнему id на стороне клиента.
+    """
+    wanted = set(fields)
+    columns = [_COLUMNS[f] for f in _COLUMNS if f in wanted or f == 'id' or
+               (f == 'category_id' and 'category_path' in wanted)]
+    names = [c.key for c in columns]
+    if 'brand' in wanted:
+        columns += [Brand.name, Brand.country]
+
+    query = db.session.query(*columns)
+    if 'brand' in wanted:
+        query = query.outerjoin(Brand, Brand.id == Product.brand_id)
+    if updated_since is not None:
+        query = query.filter(Product.updated_at > updated_since)
+    if not include_hidden:
+        query = query.filter(Product.is_visible.is_(True), Product.is_draft.is_(False))
+    query = query.order_by(Product.id).yield_per(BATCH_SIZE)
+
+    paths = _category_paths() if 'category_path' in wanted else None
+    need_media = 'media' in wanted or 'image' in wanted
+
+    batch = []
+    for row in query:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            yield _build(batch, names, fields, wanted, paths, need_media)
+            batch = []
+    if batch:
+        yield _build(batch, names, fields, wanted, paths, need_media)
+
+
+def _build(rows, names, fields, wanted, paths, need_media) -> list[dict]:
+    ids = [row[0] for row in rows]
+    chars = _load_characteristics(ids) if 'characteristics' in wanted else {}
+    media = _load_media(ids) if need_media else {}
+
+    records = []
+    n = len(names)
+    for row in rows:
+        values = dict(zip(names, row[:n]))
+        pid = values['id']
+        derived = {}
+        if 'brand' in wanted:
+            brand_name, brand_country = row[n], row[n + 1]
+            derived['brand'] = {'name': brand_name, 'country': brand_country} if brand_name else None
+        if paths is not None:
+            derived['category_path'] = paths.get(values.get('category_id')) or None
+        if 'image' in wanted:
+            derived['image'] = (media.get(pid) or [None])[0]
+        if 'media' in wanted:
+            derived['media'] = media.get(pid, [])
+        if 'characteristics' in wanted:
+            derived['characteristics'] = chars.get(pid, [])
+        if values.get('updated_at') is not None:
+            values['updated_at'] = values['updated_at'].isoformat()
+        values.update(derived)
+        records.append({f: values.get(f) for f in fields})
+    return records
+
+
+def ndjson_lines(batches: Iterator[list[dict]]) -> Iterator[str]:
+    """Одна строка на пачку — меньше мелких write'ов в сокет."""
+    for records in batches:
+        yield ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records)
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, dict):
+        return value.get('name') or ''
+    if isinstance(value, list):
+        if value and all(isinstance(v, str) for v in value):
+            return ' / '.join(value)
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def csv_lines(batches: Iterator[list[dict]], fields: list[str]) -> Iterator[str]:
+    """
+    CSV с заголовком. brand — имя бренда, category_path — «A / B / C»,
+    characteristics — JSON-строкой, media — URL через « / ».
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(fields)
+    # BOM — чтобы Excel открыл кириллицу без мастера импорта.
+    yield '﻿' + buf.getvalue()
+    for records in batches:
+        buf.seek(0)
+        buf.truncate()
+        for record in records:
+            writer.writerow([_csv_value(record[f]) for f in fields])
+        yield buf.getvalue()
@@ -0,0 +1,830 @@
+"""
+Пакетный импорт каталога из NDJSON (одна JSON-запись товара на строку).
+
+Раньше миграции (migrate_from_products_db.py, выгрузки поставщиков) шли
+через публичное API по одному объекту: POST бренда, POST категории,
+POST товара, POST каждой характеристики, upload каждой картинки — тысячи
+HTTP-запросов и коммитов на каталог. Здесь то же самое делается пачками:
+
+  1. строки читаются потоком (`parse_ndjson`) и валидируются до записи в
+     БД — битая строка даёт ошибку только своей записи;
+  2. записи режутся на пачки по chunk_size, каждая пачка — одна
+     транзакция (`_import_chunk`);
+  3. внутри пачки ссылки резолвятся set-based: бренды по LOWER(name),
+     характеристики по characteristic_key (INSERT ... ON CONFLICT),
+     все новые пути категорий пачки — одним вызовом
+     `category_resolver.resolve_category_paths` (уже известные берутся
+     из кэша импорта), существующие товары — одним SELECT по article
+     (или по имени + поставщику, если article не передан);
+  4. новые товары — один INSERT ... SELECT FROM unnest(...) RETURNING,
+     изменения существующих — UPDATE ... FROM unnest(...) на каждый набор
+     переданных полей; характеристики, медиа и закупки — так же массивами;
+  5. упавшая пачка откатывается и повторяется по одной записи, чтобы
+     ошибка одной записи не теряла остальные.
+
+Формат записи:
+    {
+      "ref": "...",                      # любой id клиента, вернётся в результате
+      "article": "ABC-1",                # ключ сопоставления (иначе name + supplier_id)
+      "name": "...", "price": 0, "wholesale_price": 0, "quantity": 0,
+      "is_visible": true, "country": "", "description": "", "supplier_id": 2,
+      "brand": "Rational" | {"name": "Rational", "country": "Германия"},
+      "category_path": ["Оборудование", "Тепловое"], "category_source": "bio",
+      "category_id": 12,                 # вместо category_path
+      "characteristics": {"Вес": "10"} | [{"key": "Вес", "value": "10", "unit": "кг"}],
+      "media": ["https://.../1.jpg", ...],
+      "warehouse_costs": [{"warehouse_id": 1, "cost_price": 100.0, "quantity": 3}]
+    }
+Отсутствующий ключ — поле не трогаем; characteristics / media /
+warehouse_costs, если переданы, задают полный набор характеристик, а
+картинки и склады только добавляются/обновляются.
+
+Медиа: ссылка, уже скачанная в хранилище блобов (media_blobs.source_url),
+привязывается как локальный файл. Остальные при media_mode='link'
+сохраняются внешней ссылкой (как POST /upload/media/<id>), при
+media_mode='fetch' — не сохраняются, а возвращаются в `media_to_fetch`,
+чтобы клиент отдал их в POST /upload/upload_product_from_urls.
+
+Параллельные импорты сериализуются advisory lock'ом на время транзакции
+пачки — бренды не имеют UNIQUE, и два импорта иначе могли бы завести
+один бренд дважды.
+"""
+
+import hashlib
+import json
+from collections import defaultdict
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import joinedload
+
+from extensions import db
+from services import blob_store
+
+
+DEFAULT_CHUNK_SIZE = 500
+MAX_CHUNK_SIZE = 2000
+MEDIA_LINK = 'link'
+MEDIA_FETCH = 'fetch'
+_IMPORT_LOCK_KEY = 0x696D7074  # 'impt'
+
+# Колонки product, которые можно передать в записи: имя → (тип массива
+# для unnest, приведение значения).
+_PRODUCT_FIELDS = {
+    'name': ('VARCHAR', str),
+    'price': ('FLOAT8', float),
+    'wholesale_price': ('FLOAT8', float),
+    'quantity': ('INTEGER', int),
+    'is_visible': ('BOOLEAN', bool),
+    'country': ('VARCHAR', str),
+    'description': ('TEXT', str),
+    'supplier_id': ('INTEGER', int),
+}
+# Заполняются резолвингом ссылок, а не напрямую из записи.
+_RESOLVED_FIELDS = {
+    'brand_id': 'INTEGER',
+    'category_id': 'INTEGER',
+    'slug': 'VARCHAR',
+}
+_NAME_MAX = 255
+_ARTICLE_MAX = 100
+_CHAR_KEY_MAX = 100
+_CHAR_VALUE_MAX = 255
+_URL_MAX = 500
+
+
+class RecordError(ValueError):
+    """Запись не прошла валидацию — ошибка только этой записи."""
+
+
+def parse_ndjson(lines: Iterable) -> Iterator[tuple[int, Optional[dict], Optional[str]]]:
+    """(номер строки, запись | None, ошибка | None) для каждой непустой строки."""
+    for line_no, raw in enumerate(lines, 1):
+        if isinstance(raw, bytes):
+            try:
+                raw = raw.decode('utf-8')
+            except UnicodeDecodeError:
+                yield line_no, None, 'Строка не в UTF-8'
+                continue
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            record = json.loads(raw)
+        except ValueError as e:
+            yield line_no, None, f'Некорректный JSON: {e}'
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, 'Запись должна быть JSON-объектом'
+            continue
+        yield line_no, record, None
+
+
+def _clean_str(value, field, max_len=None):
+    if value is None:
+        return None
+    if not isinstance(value, (str, int, float)):
+        raise RecordError(f'{field}: ожидается строка')
+    value = str(value).strip()
+    if max_len and len(value) > max_len:
+        raise RecordError(f'{field}: длиннее {max_len} символов')
+    return value
+
+
+def _normalize(line_no: int, raw: dict) -> dict:
+    """Проверка и приведение одной записи. RecordError — запись отклоняется."""
+    rec = {'line': line_no, 'ref': raw.get('ref'), 'fields': {}}
+
+    for name, (_, cast) in _PRODUCT_FIELDS.items():
+        if name not in raw:
+            continue
+        value = raw[name]
+        if value is None and name not in ('name', 'price'):
+            rec['fields'][name] = None
+            continue
+        try:
+            if cast is bool:
+                value = value if isinstance(value, bool) else str(value).lower() in ('1', 'true', 'yes')
+            elif cast is str:
+                value = _clean_str(value, name, _NAME_MAX if name in ('name', 'country') else None)
+            else:
+                value = cast(value)
+        except (TypeError, ValueError):
+            raise RecordError(f'{name}: некорректное значение {value!r}')
+        rec['fields'][name] = value
+
+    if 'name' in rec['fields'] and not rec['fields']['name']:
+        raise RecordError('name не может быть пустым')
+    if rec['fields'].get('quantity') is not None and rec['fields']['quantity'] < 0:
+        rec['fields']['quantity'] = 0
+
+    rec['article'] = _clean_str(raw.get('article'), 'article', _ARTICLE_MAX) or None
+
+    if 'brand' in raw:
+        brand = raw['brand']
+        if isinstance(brand, dict):
+            name = _clean_str(brand.get('name'), 'brand.name', _NAME_MAX)
+            country = _clean_str(brand.get('country'), 'brand.country', _NAME_MAX) or ''
+        else:
+            name = _clean_str(brand, 'brand', _NAME_MAX)
+            country = ''
+        rec['brand'] = (name, country) if name else None
+
+    if raw.get('category_id') is not None:
+        try:
+            rec['category'] = ('id', int(raw['category_id']))
+        except (TypeError, ValueError):
+            raise RecordError('category_id должен быть числом')
+    elif 'category_path' in raw:
+        path = raw['category_path']
+        if path is None:
+            rec['category'] = None
+        else:
+            if not isinstance(path, list):
+                raise RecordError('category_path должен быть списком имён')
+            path = tuple(p for p in (_clean_str(x, 'category_path', _NAME_MAX) for x in path) if p)
+            if not path:
+                raise RecordError('category_path пуст')
+            source = _clean_str(raw.get('category_source'), 'category_source', 50) or None
+            rec['category'] = ('path', source, path)
+
+    if 'characteristics' in raw:
+        chars = raw['characteristics'] or []
+        if isinstance(chars, dict):
+            chars = [{'key': k, 'value': v} for k, v in chars.items()]
+        if not isinstance(chars, list):
+            raise RecordError('characteristics: ожидается объект или список')
+        seen = set()
+        items = []
+        for item in chars:
+            if not isinstance(item, dict):
+                raise RecordError('characteristics: элемент должен быть объектом')
+            key = _clean_str(item.get('key'), 'characteristics.key', _CHAR_KEY_MAX)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            value = _clean_str(item.get('value'), 'characteristics.value') or ''
+            unit = _clean_str(item.get('unit'), 'characteristics.unit', 50) or None
+            items.append((key, value[:_CHAR_VALUE_MAX], unit))
+        rec['characteristics'] = items
+
+    if 'media' in raw:
+        media = raw['media'] or []
+        if not isinstance(media, list):
+            raise RecordError('media должен быть списком ссылок')
+        urls = []
+        for url in media:
+            url = _clean_str(url, 'media', _URL_MAX)
+            if url and url not in urls:
+                urls.append(url)
+        rec['media'] = urls
+
+    if 'warehouse_costs' in raw:
+        costs = raw['warehouse_costs'] or []
+        if not isinstance(costs, list):
+            raise RecordError('warehouse_costs должен быть списком')
+        by_wh = {}
+        for item in costs:
+            try:
+                wh_id = int(item['warehouse_id'])
+                cost_price = float(item['cost_price'])
+                qty = max(0, int(item.get('quantity') or 0))
+            except (KeyError, TypeError, ValueError):
+                raise RecordError('warehouse_costs: нужны warehouse_id и cost_price')
+            by_wh[wh_id] = (cost_price, qty)
+        rec['costs'] = by_wh
+
+    if not rec['article'] and 'name' not in rec['fields']:
+        raise RecordError('нужен article или name')
+    rec['key'] = _match_key(rec)
+    return rec
+
+
+def _match_key(rec: dict):
+    if rec['article']:
+        return ('article', rec['article'])
+    return ('name', rec['fields']['name'].lower(), rec['fields'].get('supplier_id'))
+
+
+def _chunks(records: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    """
+    Пачки по size записей. Повтор того же товара внутри пачки уезжает в
+    следующую — иначе один INSERT создал бы его дважды.
+    """
+    pending = []
+    for rec in records:
+        pending.append(rec)
+        if len(pending) >= size:
+            chunk, pending = _split_chunk(pending, size)
+            yield chunk
+    while pending:
+        chunk, pending = _split_chunk(pending, size)
+        yield chunk
+
+
+def _split_chunk(pending, size):
+    chunk, rest, keys = [], [], set()
+    for rec in pending:
+        key = rec['key']
+        if key in keys or len(chunk) >= size:
+            rest.append(rec)
+        else:
+            keys.add(key)
+            chunk.append(rec)
+    return chunk, rest
+
+
+class _Caches:
+    """Id, резолвленные в уже закоммиченных пачках, — на весь импорт."""
+
+    def __init__(self):
+        self.brands: dict[str, int] = {}
+        self.characteristics: dict[str, int] = {}
+        self.categories: dict[tuple, int] = {}
+
+    def fork(self) -> '_Caches':
+        other = _Caches()
+        other.brands = dict(self.brands)
+        other.characteristics = dict(self.characteristics)
+        other.categories = dict(self.categories)
+        return other
+
+
+def _resolve_brands(chunk, caches):
+    wanted = {}
+    for rec in chunk:
+        brand = rec.get('brand')
+        if brand and brand[0].lower() not in caches.brands:
+            wanted.setdefault(brand[0].lower(), brand)
+    if not wanted:
+        return
+    rows = db.session.execute(
+        text("""
+            SELECT DISTINCT ON (LOWER(name)) LOWER(name), id
+            FROM brand
+            WHERE LOWER(name) = ANY(CAST(:names AS VARCHAR[]))
+            ORDER BY LOWER(name), id
+        """),
+        {'names': list(wanted)},
+    ).all()
+    caches.brands.update(dict(rows))
+    missing = [b for k, b in wanted.items() if k not in caches.brands]
+    if missing:
+        rows = db.session.execute(
+            text("""
+                INSERT INTO brand (name, country, description)
+                SELECT n, c, '' FROM unnest(CAST(:names AS VARCHAR[]), CAST(:countries AS VARCHAR[])) AS t(n, c)
+                RETURNING LOWER(name), id
+            """),
+            {'names': [b[0] for b in missing], 'countries': [b[1] for b in missing]},
+        ).all()
+        caches.brands.update(dict(rows))
+
+
+def _resolve_characteristics(chunk, caches):
+    wanted = {}
+    for rec in chunk:
+        for key, _, unit in rec.get('characteristics') or ():
+            if key not in caches.characteristics:
+                wanted.setdefault(key, unit)
+    if not wanted:
+        return
+    db.session.execute(
+        text("""
+            INSERT INTO characteristics_list (characteristic_key, unit_of_measurement)
+            SELECT k, u FROM unnest(CAST(:keys AS VARCHAR[]), CAST(:units AS VARCHAR[])) AS t(k, u)
+            ON CONFLICT (characteristic_key) DO NOTHING
+        """),
+        {'keys': list(wanted), 'units': list(wanted.values())},
+    )
+    rows = db.session.execute(
+        text('SELECT characteristic_key, id FROM characteristics_list '
+             'WHERE characteristic_key = ANY(CAST(:keys AS VARCHAR[]))'),
+        {'keys': list(wanted)},
+    ).all()
+    caches.characteristics.update(dict(rows))
+
+
+def _resolve_categories(chunk, caches, errors):
+    from services.category_resolver import resolve_category_paths
+
+    ids = {rec['category'][1] for rec in chunk if rec.get('category') and rec['category'][0] == 'id'}
+    existing = set()
+    if ids:
+        existing = {r[0] for r in db.session.execute(
+            text('SELECT id FROM category WHERE id = ANY(CAST(:ids AS INTEGER[]))'), {'ids': list(ids)},
+        ).all()}
+    paths = set()
+    for rec in chunk:
+        cat = rec.get('category')
+        if not cat:
+            continue
+        if cat[0] == 'id':
+            if cat[1] not in existing:
+                errors[rec['line']] = f'Категория {cat[1]} не найдена'
+            continue
+        if (cat[1], cat[2]) not in caches.categories:
+            paths.add((cat[1], cat[2]))
+    if paths:
+        caches.categories.update(resolve_category_paths(paths))
+
+
+def _category_id(rec, caches):
+    cat = rec['category']
+    if cat is None:
+        return None
+    return cat[1] if cat[0] == 'id' else caches.categories[(cat[1], cat[2])]
+
+
+def _find_existing(chunk):
+    """match key → (id, name) для товаров, которые уже есть в БД."""
+    found = {}
+    articles = [rec['key'][1] for rec in chunk if rec['key'][0] == 'article']
+    if articles:
+        for pid, article, name in db.session.execute(
+            text('SELECT id, article, name FROM product WHERE article = ANY(CAST(:a AS VARCHAR[]))'),
+            {'a': articles},
+        ).all():
+            found[('article', article)] = (pid, name)
+    names = [rec['key'][1] for rec in chunk if rec['key'][0] == 'name']
+    if names:
+        for pid, name, supplier_id in db.session.execute(
+            text("""
+                SELECT DISTINCT ON (LOWER(name), supplier_id) id, name, supplier_id
+                FROM product
+                WHERE LOWER(name) = ANY(CAST(:n AS VARCHAR[]))
+                ORDER BY LOWER(name), supplier_id, id
+            """),
+            {'n': names},
+        ).all():
+            found[('name', name.lower(), supplier_id)] = (pid, name)
+    return found
+
+
+def _allocate_slugs(names):
+    """Уникальные slug'и для списка имён одним запросом (как generate_unique_slug)."""
+    from routes.products import safe_slugify
+
+    bases = [safe_slugify(n) or 'product' for n in names]
+    taken = {r[0] for r in db.session.execute(
+        text("""
+            SELECT slug FROM product
+            WHERE slug = ANY(CAST(:bases AS VARCHAR[]))
+               OR slug LIKE ANY(CAST(:prefixes AS VARCHAR[]))
+        """),
+        {'bases': list(set(bases)), 'prefixes': [f'{b}-%' for b in set(bases)]},
+    ).all()}
+    slugs = []
+    for base in bases:
+        slug, counter = base, 1
+        while slug in taken:
+            slug = f'{base}-{counter}'
+            counter += 1
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def _generated_article(rec):
+    source = f"{rec['fields']['name']}|{rec['fields'].get('supplier_id') or ''}"
+    return f"IMP-{hashlib.md5(source.encode('utf-8')).hexdigest()[:12].upper()}"
+
+
+def _insert_products(new_recs):
+    """Один INSERT ... SELECT FROM unnest на все новые товары пачки. Возвращает id по порядку."""
+    if not new_recs:
+        return []
+    slugs = _allocate_slugs([r['fields']['name'] for r in new_recs])
+    params = {
+        'names': [r['fields']['name'] for r in new_recs],
+        'articles': [r['article'] for r in new_recs],
+        'slugs': slugs,
+        'prices': [r['fields'].get('price') or 0 for r in new_recs],
+        'wholesale': [r['fields'].get('wholesale_price') or 0 for r in new_recs],
+        'quantities': [r['fields'].get('quantity') or 0 for r in new_recs],
+        'visible': [r['fields'].get('is_visible', True) for r in new_recs],
+        'countries': [r['fields'].get('country') or '' for r in new_recs],
+        'descriptions': [r['fields'].get('description') or '' for r in new_recs],
+        'brands': [r['resolved'].get('brand_id') for r in new_recs],
+        'suppliers': [r['fields'].get('supplier_id') for r in new_recs],
+        'categories': [r['resolved'].get('category_id') for r in new_recs],
+    }
+    rows = db.session.execute(
+        text("""
+            INSERT INTO product (name, article, slug, price, wholesale_price, quantity,
+                                 is_visible, country, description, brand_id, supplier_id,
+                                 category_id, is_draft)
+            SELECT name, article, slug, price, wholesale_price, quantity,
+                   is_visible, country, description, brand_id, supplier_id,
+                   category_id, FALSE
+            FROM unnest(
+                CAST(:names AS VARCHAR[]), CAST(:articles AS VARCHAR[]), CAST(:slugs AS VARCHAR[]),
+                CAST(:prices AS FLOAT8[]), CAST(:wholesale AS FLOAT8[]), CAST(:quantities AS INTEGER[]),
+                CAST(:visible AS BOOLEAN[]), CAST(:countries AS VARCHAR[]), CAST(:descriptions AS TEXT[]),
+                CAST(:brands AS INTEGER[]), CAST(:suppliers AS INTEGER[]), CAST(:categories AS INTEGER[])
+            ) WITH ORDINALITY AS t(name, article, slug, price, wholesale_price, quantity,
+                                   is_visible, country, description, brand_id, supplier_id,
+                                   category_id, ord)
+            ORDER BY ord
+            RETURNING id, article
+        """),
+        params,
+    ).all()
+    by_article = {article: pid for pid, article in rows}
+    return [by_article[r['article']] for r in new_recs]
+
+
+def _update_products(updates):
+    """
+    UPDATE ... FROM unnest на каждый набор переданных полей (обычно он у
+    всех записей пачки один — значит, один запрос).
+    """
+    groups = defaultdict(list)
+    for pid, values in updates:
+        if values:
+            groups[tuple(sorted(values))].append((pid, values))
+    for columns, items in groups.items():
+        types = {**{k: v[0] for k, v in _PRODUCT_FIELDS.items()}, **_RESOLVED_FIELDS}
+        params = {'ids': [pid for pid, _ in items]}
+        arrays = ['CAST(:ids AS INTEGER[])']
+        for i, col in enumerate(columns):
+            params[f'c{i}'] = [values[col] for _, values in items]
+            arrays.append(f'CAST(:c{i} AS {types[col]}[])')
+        assignments = ', '.join(f'{col} = v.{col}' for col in columns)
+        db.session.execute(
+            text(f"""
+                UPDATE product p SET {assignments}
+                FROM unnest({', '.join(arrays)}) AS v(id, {', '.join(columns)})
+                WHERE p.id = v.id
+            """),
+            params,
+        )
+
+
+def _replace_characteristics(chunk, caches):
+    recs = [r for r in chunk if r.get('characteristics') is not None]
+    if not recs:
+        return
+    db.session.execute(
+        text('DELETE FROM product_characteristic WHERE product_id = ANY(CAST(:ids AS INTEGER[]))'),
+        {'ids': [r['product_id'] for r in recs]},
+    )
+    pids, keys, values, orders = [], [], [], []
+    for rec in recs:
+        for order, (key, value, _) in enumerate(rec['characteristics']):
+            pids.append(rec['product_id'])
+            keys.append(str(caches.characteristics[key]))
+            values.append(value)
+            orders.append(order)
+    if pids:
+        db.session.execute(
+            text("""
+                INSERT INTO product_characteristic (product_id, key, value, sort_order)
+                SELECT * FROM unnest(CAST(:pids AS INTEGER[]), CAST(:keys AS VARCHAR[]),
+                                     CAST(:vals AS VARCHAR[]), CAST(:orders AS INTEGER[]))
+            """),
+            {'pids': pids, 'keys': keys, 'vals': values, 'orders': orders},
+        )
+
+
+def _add_media(chunk, media_mode):
+    recs = [r for r in chunk if r.get('media')]
+    if not recs:
+        return
+    pids = [r['product_id'] for r in recs]
+    all_urls = list({u for r in recs for u in r['media']})
+
+    blobs = {
+        url: (sha, ext) for url, sha, ext in db.session.execute(
+            text('SELECT source_url, sha256, ext FROM media_blobs WHERE source_url = ANY(CAST(:u AS TEXT[]))'),
+            {'u': all_urls},
+        ).all()
+    }
+    present = defaultdict(set)
+    next_order = defaultdict(int)
+    for pid, url, sha, order in db.session.execute(
+        text('SELECT product_id, url, blob_sha256, "order" FROM product_media '
+             'WHERE product_id = ANY(CAST(:ids AS INTEGER[]))'),
+        {'ids': pids},
+    ).all():
+        present[pid].add(sha or url)
+        next_order[pid] = max(next_order[pid], (order or 0) + 1)
+
+    rows = {'pids': [], 'urls': [], 'types': [], 'orders': [], 'shas': []}
+    attached = defaultdict(int)
+    for rec in recs:
+        pid = rec['product_id']
+        for url in rec['media']:
+            blob = blobs.get(url)
+            if blob is not None:
+                sha, ext = blob
+                if sha in present[pid]:
+                    continue
+                media_url = blob_store.blob_url(sha, ext)
+                attached[sha] += 1
+            elif media_mode == MEDIA_FETCH:
+                rec['result'].setdefault('media_to_fetch', []).append(url)
+                continue
+            else:
+                if url in present[pid]:
+                    continue
+                sha, media_url = None, url
+            present[pid].add(sha or url)
+            rows['pids'].append(pid)
+            rows['urls'].append(media_url)
+            rows['types'].append(_media_type(media_url))
+            rows['orders'].append(next_order[pid])
+            rows['shas'].append(sha)
+            next_order[pid] += 1
+
+    if rows['pids']:
+        db.session.execute(
+            text("""
+                INSERT INTO product_media (product_id, url, media_type, "order", blob_sha256)
+                SELECT * FROM unnest(CAST(:pids AS INTEGER[]), CAST(:urls AS VARCHAR[]),
+                                     CAST(:types AS VARCHAR[]), CAST(:orders AS INTEGER[]),
+                                     CAST(:shas AS VARCHAR[]))
+            """),
+            rows,
+        )
+    for sha, n in attached.items():
+        blob_store.attach(sha, n)
+
+
+def _media_type(url):
+    from routes.upload import get_media_type_from_filename
+    return get_media_type_from_filename(url.split('?', 1)[0])
+
+
+def _upsert_costs(chunk):
+    """
+    Закупки/остатки одним INSERT ... ON CONFLICT, затем расчёт цен по
+    формулам складов (как /product-costs/upsert-many) и минимальная цена
+    в product одним UPDATE на всю пачку.
+
+    Склады с формулами и переменными и характеристики товаров грузятся
+    один раз на пачку (как `_do_recalculate` в routes/warehouses.py),
+    формулы считаются в памяти, calculated_* пишутся одним UPDATE.
+    """
+    from models.warehouse import Warehouse, WarehouseVariable
+    from routes.product_costs import apply_min_prices, calculate_cost_values
+    from utils.formula_engine import bulk_extract_product_characteristics
+
+    recs = [r for r in chunk if r.get('costs')]
+    if not recs:
+        return
+    pids, whs, prices, qtys = [], [], [], []
+    for rec in recs:
+        for wh_id, (cost_price, qty) in rec['costs'].items():
+            pids.append(rec['product_id'])
+            whs.append(wh_id)
+            prices.append(cost_price)
+            qtys.append(qty)
+    costs = db.session.execute(
+        text("""
+            INSERT INTO product_warehouse_cost (product_id, warehouse_id, cost_price, quantity, created_at, updated_at)
+            SELECT p, w, c, q, NOW(), NOW()
+            FROM unnest(CAST(:pids AS INTEGER[]), CAST(:whs AS INTEGER[]),
+                        CAST(:prices AS FLOAT8[]), CAST(:qtys AS INTEGER[])) AS t(p, w, c, q)
+            ON CONFLICT (product_id, warehouse_id) DO UPDATE
+            SET cost_price = EXCLUDED.cost_price, quantity = EXCLUDED.quantity, updated_at = NOW()
+            RETURNING id, product_id, warehouse_id, cost_price
+        """),
+        {'pids': pids, 'whs': whs, 'prices': prices, 'qtys': qtys},
+    ).all()
+
+    wh_ids = list(set(whs))
+    warehouses = {
+        w.id: w for w in Warehouse.query.options(joinedload(Warehouse.formula))
+        .filter(Warehouse.id.in_(wh_ids)).all()
+        if w.formula
+    }
+    variables = defaultdict(list)
+    for v in (WarehouseVariable.query.filter(WarehouseVariable.warehouse_id.in_(list(warehouses)))
+              .order_by(WarehouseVariable.warehouse_id, WarehouseVariable.sort_order).all()
+              if warehouses else ()):
+        variables[v.warehouse_id].append(v)
+    chars = bulk_extract_product_characteristics(list(set(pids))) if warehouses else {}
+
+    rows = {'ids': [], 'prices': [], 'deliveries': [], 'costs_nm': [], 'keep_nm': [], 'ats': []}
+    for cost_id, product_id, wh_id, cost_price in costs:
+        warehouse = warehouses.get(wh_id)
+        if warehouse is None:
+            continue
+        values = calculate_cost_values(warehouse, variables[wh_id], chars.get(product_id, {}), cost_price)
+        rows['ids'].append(cost_id)
+        rows['prices'].append(values['calculated_price'])
+        rows['deliveries'].append(values['calculated_delivery'])
+        rows['costs_nm'].append(values.get('calculated_cost_no_margin'))
+        rows['keep_nm'].append('calculated_cost_no_margin' not in values)
+        rows['ats'].append(values['calculated_at'])
+    if rows['ids']:
+        db.session.execute(
+            text("""
+                UPDATE product_warehouse_cost c
+                SET calculated_price = t.price,
+                    calculated_delivery = t.delivery,
+                    calculated_cost_no_margin = CASE WHEN t.keep_nm THEN c.calculated_cost_no_margin
+                                                     ELSE t.cost_nm END,
+                    calculated_at = t.at
+                FROM unnest(CAST(:ids AS INTEGER[]), CAST(:prices AS FLOAT8[]),
+                            CAST(:deliveries AS FLOAT8[]), CAST(:costs_nm AS FLOAT8[]),
+                            CAST(:keep_nm AS BOOLEAN[]), CAST(:ats AS TIMESTAMP[]))
+                     AS t(id, price, delivery, cost_nm, keep_nm, at)
+                WHERE c.id = t.id
+            """),
+            rows,
+        )
+
+    apply_min_prices({r['product_id'] for r in recs})
+
+
+def _check_warehouses(chunk, errors):
+    ids = {wh for r in chunk for wh in (r.get('costs') or {})}
+    if not ids:
+        return
+    existing = {r[0] for r in db.session.execute(
+        text('SELECT id FROM warehouse WHERE id = ANY(CAST(:ids AS INTEGER[]))'), {'ids': list(ids)},
+    ).all()}
+    for rec in chunk:
+        missing = [wh for wh in (rec.get('costs') or {}) if wh not in existing]
+        if missing:
+            errors[rec['line']] = f'Склады не найдены: {missing}'
+
+
+def _restrict_update(rec, update_fields):
+    """Для существующего товара оставляет только разрешённые поля и разделы."""
+    rec['fields'] = {k: v for k, v in rec['fields'].items() if k in update_fields}
+    for section, key in (('brand', 'brand'), ('category', 'category'), ('characteristics', 'characteristics'),
+                         ('media', 'media'), ('warehouse_costs', 'costs')):
+        if section not in update_fields:
+            rec.pop(key, None)
+
+
+def _import_chunk(chunk, caches, media_mode, update_fields=None):
+    """
+    Одна пачка — одна транзакция. Возвращает (results, caches пачки);
+    исключение — пачка откатывается целиком (см. `run_import`).
+    """
+    db.session.execute(text('SELECT pg_advisory_xact_lock(:k)'), {'k': _IMPORT_LOCK_KEY})
+    local = caches.fork()
+    errors = {}
+
+    existing = _find_existing(chunk)
+    if update_fields is not None:
+        for rec in chunk:
+            if rec['key'] in existing:
+                _restrict_update(rec, update_fields)
+
+    _check_warehouses(chunk, errors)
+    _resolve_categories([r for r in chunk if r['line'] not in errors], local, errors)
+    chunk_ok = [r for r in chunk if r['line'] not in errors]
+    _resolve_brands(chunk_ok, local)
+    _resolve_characteristics(chunk_ok, local)
+
+    new_recs, updates = [], []
+    for rec in chunk_ok:
+        rec['result'] = {'line': rec['line'], 'ref': rec['ref']}
+        resolved = {}
+        if 'brand' in rec:
+            resolved['brand_id'] = local.brands[rec['brand'][0].lower()] if rec['brand'] else None
+        if 'category' in rec:
+            resolved['category_id'] = _category_id(rec, local)
+        rec['resolved'] = resolved
+
+        found = existing.get(rec['key'])
+        if found is None:
+            if not rec['fields'].get('name'):
+                errors[rec['line']] = f"Товар с article {rec['article']} не найден, а name не передан"
+                continue
+            rec['article'] = rec['article'] or _generated_article(rec)
+            new_recs.append(rec)
+            continue
+        pid, current_name = found
+        rec['product_id'] = pid
+        rec['result'].update({'status': 'updated', 'id': pid})
+        values = {**rec['fields'], **resolved}
+        if values.get('name') is not None and values['name'] != current_name:
+            values['slug'] = None  # заполним ниже пачкой
+        updates.append((pid, values))
+
+    renamed = [(pid, values) for pid, values in updates if 'slug' in values]
+    if renamed:
+        for (pid, values), slug in zip(renamed, _allocate_slugs([v['name'] for _, v in renamed])):
+            values['slug'] = slug
+    _update_products(updates)
+
+    for rec, pid in zip(new_recs, _insert_products(new_recs)):
+        rec['product_id'] = pid
+        rec['result'].update({'status': 'created', 'id': pid, 'article': rec['article']})
+
+    done = [r for r in chunk_ok if 'product_id' in r]
+    _replace_characteristics(done, local)
+    _add_media(done, media_mode)
+    _upsert_costs(done)
+
+    results = []
+    for rec in chunk:
+        if rec['line'] in errors:
+            results.append({'line': rec['line'], 'ref': rec['ref'], 'status': 'error', 'error': errors[rec['line']]})
+        else:
+            results.append(rec['result'])
+    return results, local
+
+
+def run_import(rows: Iterable[tuple[int, Optional[dict], Optional[str]]],
+               chunk_size: int = DEFAULT_CHUNK_SIZE, media_mode: str = MEDIA_LINK,
+               update_fields: Optional[set] = None) -> dict:
+    """
+    Импорт записей из `parse_ndjson`. Коммитит каждую пачку. Возвращает
+    {'summary': {...}, 'results': [...]} — результаты в порядке строк.
+
+    update_fields — что менять у уже существующих товаров: имена колонок
+    (price, quantity, ...) и разделов (brand, category, characteristics,
+    media, warehouse_costs). None — всё, что передано в записи.
+    """
+    chunk_size = max(1, min(chunk_size, MAX_CHUNK_SIZE))
+    results = []
+    caches = _Caches()
+
+    def valid_records():
+        for line_no, raw, error in rows:
+            if error is not None:
+                results.append({'line': line_no, 'ref': None, 'status': 'error', 'error': error})
+                continue
+            try:
+                yield _normalize(line_no, raw)
+            except RecordError as e:
+                results.append({'line': line_no, 'ref': raw.get('ref'), 'status': 'error', 'error': str(e)})
+
+    for chunk in _chunks(valid_records(), chunk_size):
+        try:
+            chunk_results, caches = _import_chunk(chunk, caches, media_mode, update_fields)
+            db.session.commit()
+            results.extend(chunk_results)
+            continue
+        except Exception as e:
+            db.session.rollback()
+            if len(chunk) == 1:
+                results.append({'line': chunk[0]['line'], 'ref': chunk[0]['ref'],
+                                'status': 'error', 'error': str(e).split('\n', 1)[0]})
+                continue
+        # Пачка упала целиком — повторяем по одной записи, чтобы найти виновную.
+        for rec in chunk:
+            for key in ('result', 'resolved', 'product_id'):
+                rec.pop(key, None)
+            try:
+                single, caches = _import_chunk([rec], caches, media_mode, update_fields)
+                db.session.commit()
+                results.extend(single)
+            except Exception as e:
+                db.session.rollback()
+                results.append({'line': rec['line'], 'ref': rec['ref'],
+                                'status': 'error', 'error': str(e).split('\n', 1)[0]})
+
+    results.sort(key=lambda r: r['line'])
+    summary = defaultdict(int)
+    for r in results:
+        summary[r['status']] += 1
+    summary['total'] = len(results)
+    return {'summary': dict(summary), 'results': results}
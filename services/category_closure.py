@@ -0,0 +1,186 @@
+"""
+Поддержка closure-таблицы `category_closure` (см. `models/category_closure.py`).
+
+Точки входа для кода, меняющего дерево категорий:
+  - `insert_node(category_id, parent_id)` — после создания категории
+    (и flush, чтобы был id);
+  - `move_subtree(category_id, new_parent_id)` — после смены parent_id;
+  - `rebuild()` — полная пересборка из `category.parent_id` одним
+    INSERT ... SELECT (бэкфилл на старте, массовые merge'и).
+Удаление категорий отдельного вызова не требует — строки уходят
+каскадом по FK.
+
+Точки входа для чтения:
+  - `subtree_ids_query(root_ids)` — подзапрос id всех категорий веток
+    (включая сами root_ids) для `Product.category_id.in_(...)`;
+  - `subtree_ids(root_ids)` — то же, материализованное в список;
+  - `is_in_subtree(root_id, category_id)` — защита от циклов при переносе;
+  - `subtree_product_counts(...)` — число товаров по каждому поддереву
+    одним GROUP BY.
+
+Как и резолвер, ничего не коммитит — транзакцией управляет вызывающий.
+"""
+
+from typing import Iterable, Optional
+
+from sqlalchemy import func, select, text
+
+from extensions import db
+from models.category_closure import CategoryClosure
+from models.product import Product
+
+
+# Страховка от циклов в parent_id при полной пересборке: дерево глубже
+# нескольких уровней в каталоге не встречается, а цикл без лимита
+# превратил бы рекурсивный CTE в бесконечный.
+MAX_DEPTH = 64
+
+
+def insert_node(category_id: int, parent_id: Optional[int]) -> None:
+    """Добавляет строки для новой (листовой) категории: себя + всех предков родителя."""
+    db.session.execute(
+        text('INSERT INTO category_closure (ancestor_id, descendant_id, depth) '
+             'VALUES (:id, :id, 0) ON CONFLICT DO NOTHING'),
+        {'id': category_id},
+    )
+    if parent_id is not None:
+        db.session.execute(
+            text("""
+                INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+                SELECT ancestor_id, :id, depth + 1
+                FROM category_closure
+                WHERE descendant_id = :parent
+                ON CONFLICT DO NOTHING
+            """),
+            {'id': category_id, 'parent': parent_id},
+        )
+
+
+def move_subtree(category_id: int, new_parent_id: Optional[int]) -> None:
+    """
+    Переносит поддерево category_id под new_parent_id: рвёт связи всех
+    внешних предков с узлами поддерева и заново связывает поддерево с
+    предками нового родителя (декартово произведение). Внутренние связи
+    поддерева не трогаются.
+
+    Вызывающий обязан заранее проверить, что new_parent_id не лежит
+    внутри самого поддерева (`is_in_subtree`).
+    """
+    params = {'id': category_id, 'parent': new_parent_id}
+    db.session.execute(
+        text("""
+            DELETE FROM category_closure
+            WHERE descendant_id IN (
+                SELECT descendant_id FROM category_closure WHERE ancestor_id = :id
+            )
+              AND ancestor_id NOT IN (
+                SELECT descendant_id FROM category_closure WHERE ancestor_id = :id
+            )
+        """),
+        params,
+    )
+    if new_parent_id is not None:
+        db.session.execute(
+            text("""
+                INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+                SELECT sup.ancestor_id, sub.descendant_id, sup.depth + sub.depth + 1
+                FROM category_closure sup
+                CROSS JOIN category_closure sub
+                WHERE sup.descendant_id = :parent
+                  AND sub.ancestor_id = :id
+                ON CONFLICT DO NOTHING
+            """),
+            params,
+        )
+
+
+def rebuild() -> int:
+    """
+    Полная пересборка closure из `category.parent_id`. Один DELETE и один
+    INSERT ... SELECT с рекурсивным CTE — для каталога на тысячи категорий
+    это миллисекунды. Возвращает число строк в таблице.
+    """
+    db.session.execute(text('DELETE FROM category_closure'))
+    db.session.execute(
+        text("""
+            INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+            WITH RECURSIVE tree AS (
+                SELECT id AS ancestor_id, id AS descendant_id, 0 AS depth
+                FROM category
+                UNION ALL
+                SELECT t.ancestor_id, c.id, t.depth + 1
+                FROM category c
+                JOIN tree t ON c.parent_id = t.descendant_id
+                WHERE t.depth < :max_depth
+            )
+            SELECT ancestor_id, descendant_id, MIN(depth)
+            FROM tree
+            GROUP BY ancestor_id, descendant_id
+        """),
+        {'max_depth': MAX_DEPTH},
+    )
+    db.session.flush()
+    return db.session.execute(text('SELECT COUNT(*) FROM category_closure')).scalar() or 0
+
+
+def ensure_consistent() -> bool:
+    """
+    Дешёвая проверка на старте: у каждой категории должна быть строка
+    depth=0. Если нет (свежая таблица, категории правили в обход кода) —
+    пересобираем. Возвращает True если была пересборка.
+    """
+    cats = db.session.execute(text('SELECT COUNT(*) FROM category')).scalar() or 0
+    selfs = db.session.execute(
+        text('SELECT COUNT(*) FROM category_closure WHERE depth = 0')
+    ).scalar() or 0
+    if cats == selfs:
+        return False
+    rebuild()
+    return True
+
+
+def subtree_ids_query(root_ids: Iterable[int]):
+    """SELECT descendant_id для веток root_ids — для `.in_(...)` в фильтрах."""
+    return (
+        select(CategoryClosure.descendant_id)
+        .where(CategoryClosure.ancestor_id.in_(list(root_ids)))
+    )
+
+
+def subtree_ids(root_ids: Iterable[int]) -> list[int]:
+    """Все id категорий веток root_ids (включая сами root_ids) одним запросом."""
+    root_ids = list(root_ids)
+    if not root_ids:
+        return []
+    rows = db.session.execute(subtree_ids_query(root_ids).distinct()).all()
+    return [r[0] for r in rows]
+
+
+def is_in_subtree(root_id: int, category_id: int) -> bool:
+    """True если category_id — это root_id или его потомок."""
+    return db.session.execute(
+        select(CategoryClosure.depth).where(
+            CategoryClosure.ancestor_id == root_id,
+            CategoryClosure.descendant_id == category_id,
+        ).limit(1)
+    ).first() is not None
+
+
+def subtree_product_counts(ancestor_ids: Optional[Iterable[int]] = None,
+                           visible_only: bool = False) -> dict[int, int]:
+    """
+    {ancestor_id: число товаров во всей ветке}. Один GROUP BY по JOIN'у
+    closure × product. ancestor_ids=None — по всем категориям.
+    """
+    q = (
+        db.session.query(CategoryClosure.ancestor_id, func.count(Product.id))
+        .join(Product, Product.category_id == CategoryClosure.descendant_id)
+    )
+    if ancestor_ids is not None:
+        ancestor_ids = list(ancestor_ids)
+        if not ancestor_ids:
+            return {}
+        q = q.filter(CategoryClosure.ancestor_id.in_(ancestor_ids))
+    if visible_only:
+        q = q.filter(Product.is_visible.is_(True))
+    return dict(q.group_by(CategoryClosure.ancestor_id).all())
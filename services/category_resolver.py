@@ -1,41 +1,53 @@
 """
 Резолвинг категорий из внешних поставщиков в наши канонич. категории.
 
-Основная точка входа — `resolve_category_path(source, path)` — принимает
-список имён от корня до листа (как приходит из воркера BIO/Equip) и
-возвращает id листовой канонич. категории. Дерево создаётся при
+Точки входа:
+  - `resolve_category_paths([(source, path), ...])` — пакетный резолвинг
+    всех различных путей импорта разом, возвращает {(source, tuple(path)):
+    id листовой категории};
+  - `resolve_category_path(source, path)` — один путь (обёртка над
+    пакетным, создание товара из воркера BIO/Equip).
+
+path — список имён от корня до листа. Дерево создаётся при
 необходимости; повторные вызовы с тем же path идут через таблицу
-`category_alias` и мгновенно попадают в тот же id.
+`category_alias` и попадают в тот же id.
 
-Алгоритм для каждого уровня (`_resolve_one`):
+Алгоритм для каждого узла (source, parent_id, имя):
   1) `category_alias` (source, parent_id, LOWER(name)) → hit
+  1b) alias с любым source → hit + alias для этого source
   2) точное совпадение по `Category.name` (LOWER, тот же parent_id) →
      создаём alias `is_auto=true`, hit
   3) fuzzy-совпадение (SequenceMatcher ratio > 0.85) среди сиблингов
-     под тем же parent_id → alias с `is_auto=true, needs_review=true`,
-     hit (админ увидит в UI-фильтре «требует ревью» и подтвердит /
-     переназначит)
+     под тем же parent_id (кандидаты — через триграммный индекс
+     `utils.fuzzy_index`, без перебора всех сиблингов) → alias с
+     `is_auto=true, needs_review=true`, hit (админ увидит в UI-фильтре
+     «требует ревью» и подтвердит / переназначит)
   4) miss → создаём новую `Category` с нормализованным именем + alias
      `is_auto=true`
 
+Пакетно это идёт по уровням: все узлы глубины d резолвятся вместе.
+Алиасы и категории с нужными именами грузятся один раз на вызов, шаги
+1–2 — по словарям в памяти; сиблинги для fuzzy грузятся одним запросом
+на уровень и только для промахов. Новые категории уровня — один INSERT
+(slug'и — одним запросом), их строки closure и все новые алиасы — тоже
+по одному INSERT. Промахи одного уровня сверяются и между собой: два
+поставщика с «Пароконвектоматы» / «пароконвектомат» получат одну новую
+категорию, как и при последовательном резолвинге.
+
 Все имена нормализуются через `utils.category_normalize.normalize_name`
 (единая точка правды для регистра / аббревиатур).
 
-Резолвер идемпотентен и потокобезопасен на уровне транзакции: коммит
-делает вызывающий код (обычно endpoint создания товара). Внутри —
-только `db.session.add()` / `db.session.flush()`, чтобы получить id
-без коммита.
+Новые категории сразу регистрируются в closure-таблице, чтобы фильтр по
+ветке видел их ещё до коммита. Коммит делает вызывающий код.
 """
 
-from difflib import SequenceMatcher
 from typing import Iterable, Optional
 
-from sqlalchemy import func
+from sqlalchemy import text
 
 from extensions import db
-from models.category import Category
-from models.category_alias import CategoryAlias
 from utils.category_normalize import normalize_name
+from utils.fuzzy_index import TrigramIndex, default_gram_floor
 
 
 # Порог fuzzy-совпадения (0..1). Выше = строже. 0.85 подобрано эмпирически:
@@ -54,167 +66,252 @@ def _slug_for_category(name: str) -> str:
     зависимость через blueprint).
     """
     from routes.products import safe_slugify
-    return safe_slugify(name)
-
-
-def _ensure_unique_slug(base: str) -> str:
-    """Добавляет `-2`, `-3`, ... если base уже занят другой категорией."""
-    if not base:
-        return base
-    candidate = base
-    n = 2
-    while Category.query.filter_by(slug=candidate).first() is not None:
-        candidate = f'{base}-{n}'
-        n += 1
-    return candidate
-
-
-def _find_alias(source: Optional[str], parent_id: Optional[int], name: str) -> Optional[CategoryAlias]:
-    """Ищет alias case-insensitive по (source, parent_id, alias_name)."""
-    q = CategoryAlias.query.filter(
-        func.lower(CategoryAlias.alias_name) == name.lower()
+    return safe_slugify(name) or 'category'
+
+
+def _allocate_slugs(names: list[str]) -> list[str]:
+    """Уникальные slug'и (`-2`, `-3`, ...) для новых категорий одним запросом."""
+    bases = [_slug_for_category(n) for n in names]
+    unique_bases = list(set(bases))
+    taken = {r[0] for r in db.session.execute(
+        text("""
+            SELECT slug FROM category
+            WHERE slug = ANY(CAST(:bases AS VARCHAR[]))
+               OR slug LIKE ANY(CAST(:prefixes AS VARCHAR[]))
+        """),
+        {'bases': unique_bases, 'prefixes': [f'{b}-%' for b in unique_bases]},
+    ).all()}
+    slugs = []
+    for base in bases:
+        slug, n = base, 2
+        while slug in taken:
+            slug = f'{base}-{n}'
+            n += 1
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+class _State:
+    """Словари одного вызова: алиасы и категории с именами из путей."""
+
+    def __init__(self, raw_names: set[str], normalized_names: set[str]):
+        self.aliases: dict[tuple, int] = {}      # (source, parent_id, lower) → id
+        self.aliases_any: dict[tuple, int] = {}  # (parent_id, lower) → id
+        self.exact: dict[tuple, int] = {}        # (parent_id, lower) → id
+        rows = db.session.execute(
+            text("""
+                SELECT source, parent_id, LOWER(alias_name), category_id
+                FROM category_alias
+                WHERE LOWER(alias_name) = ANY(CAST(:names AS VARCHAR[]))
+                ORDER BY id
+            """),
+            {'names': list(raw_names)},
+        ).all()
+        for source, parent_id, name, category_id in rows:
+            self.aliases.setdefault((source, parent_id, name), category_id)
+            self.aliases_any.setdefault((parent_id, name), category_id)
+        rows = db.session.execute(
+            text("""
+                SELECT parent_id, LOWER(name), id FROM category
+                WHERE LOWER(name) = ANY(CAST(:names AS VARCHAR[]))
+                ORDER BY id
+            """),
+            {'names': list(normalized_names)},
+        ).all()
+        for parent_id, name, category_id in rows:
+            self.exact.setdefault((parent_id, name), category_id)
+
+
+def _load_siblings(parent_ids: set) -> dict:
+    """{parent_id: [(id, name)]} одним запросом (None — корневые)."""
+    ids = [p for p in parent_ids if p is not None]
+    rows = db.session.execute(
+        text("""
+            SELECT parent_id, id, name FROM category
+            WHERE parent_id = ANY(CAST(:ids AS INTEGER[]))
+               OR (:roots AND parent_id IS NULL)
+        """),
+        {'ids': ids, 'roots': None in parent_ids},
+    ).all()
+    siblings: dict = {}
+    for parent_id, category_id, name in rows:
+        siblings.setdefault(parent_id, []).append((category_id, name))
+    return siblings
+
+
+def _create_categories(groups: list[tuple]) -> list[int]:
+    """[(parent_id, normalized_name)] → id новых категорий по порядку + closure."""
+    slugs = _allocate_slugs([name for _, name in groups])
+    rows = db.session.execute(
+        text("""
+            INSERT INTO category (name, slug, parent_id, show_in_menu, "order")
+            SELECT n, s, p, TRUE, 0
+            FROM unnest(CAST(:names AS VARCHAR[]), CAST(:slugs AS VARCHAR[]),
+                        CAST(:parents AS INTEGER[])) WITH ORDINALITY AS t(n, s, p, ord)
+            ORDER BY ord
+            RETURNING id, slug
+        """),
+        {'names': [n for _, n in groups], 'slugs': slugs, 'parents': [p for p, _ in groups]},
+    ).all()
+    by_slug = {slug: cid for cid, slug in rows}
+    ids = [by_slug[s] for s in slugs]
+    db.session.execute(
+        text("""
+            INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+            SELECT id, id, 0 FROM unnest(CAST(:ids AS INTEGER[])) AS t(id)
+            UNION ALL
+            SELECT cc.ancestor_id, t.id, cc.depth + 1
+            FROM unnest(CAST(:ids AS INTEGER[]), CAST(:parents AS INTEGER[])) AS t(id, parent)
+            JOIN category_closure cc ON cc.descendant_id = t.parent
+            ON CONFLICT DO NOTHING
+        """),
+        {'ids': ids, 'parents': [p for p, _ in groups]},
     )
-    q = q.filter(CategoryAlias.source.is_(None) if source is None else CategoryAlias.source == source)
-    q = q.filter(CategoryAlias.parent_id.is_(None) if parent_id is None else CategoryAlias.parent_id == parent_id)
-    return q.first()
-
-
-def _find_alias_any_source(parent_id: Optional[int], name: str) -> Optional[CategoryAlias]:
-    """
-    Fallback-поиск alias БЕЗ учёта source — если один поставщик уже
-    завёл эту категорию, второй поставщик с таким же именем пусть тоже
-    попадает туда (не создаёт дубликат под другим source).
-    """
-    q = CategoryAlias.query.filter(
-        func.lower(CategoryAlias.alias_name) == name.lower()
+    return ids
+
+
+def _insert_aliases(aliases: list[tuple]) -> None:
+    """[(source, parent_id, alias_name, category_id, needs_review)] одним INSERT."""
+    if not aliases:
+        return
+    db.session.execute(
+        text("""
+            INSERT INTO category_alias (source, parent_id, alias_name, category_id,
+                                        is_auto, needs_review, created_at)
+            SELECT s, p, n, c, TRUE, r, timezone('utc', now())
+            FROM unnest(CAST(:sources AS VARCHAR[]), CAST(:parents AS INTEGER[]),
+                        CAST(:names AS VARCHAR[]), CAST(:cats AS INTEGER[]),
+                        CAST(:review AS BOOLEAN[])) AS t(s, p, n, c, r)
+            ON CONFLICT DO NOTHING
+        """),
+        {
+            'sources': [a[0] for a in aliases],
+            'parents': [a[1] for a in aliases],
+            'names': [a[2] for a in aliases],
+            'cats': [a[3] for a in aliases],
+            'review': [a[4] for a in aliases],
+        },
     )
-    q = q.filter(CategoryAlias.parent_id.is_(None) if parent_id is None else CategoryAlias.parent_id == parent_id)
-    return q.first()
-
-
-def _find_category_exact(parent_id: Optional[int], name: str) -> Optional[Category]:
-    """Точное совпадение по имени (case-insensitive) среди сиблингов."""
-    q = Category.query.filter(func.lower(Category.name) == name.lower())
-    q = q.filter(Category.parent_id.is_(None) if parent_id is None else Category.parent_id == parent_id)
-    return q.first()
 
 
-def _find_category_fuzzy(parent_id: Optional[int], name: str) -> Optional[Category]:
+def _resolve_level(nodes: dict, state: _State) -> dict:
     """
-    Fuzzy-поиск: SequenceMatcher.ratio() к каждой сиблинг-категории.
-    Возвращаем лучшее совпадение выше FUZZY_THRESHOLD, иначе None.
+    nodes: {(source, parent_id, lower_name): name} одного уровня.
+    Возвращает {node: category_id}.
     """
-    q = Category.query
-    q = q.filter(Category.parent_id.is_(None) if parent_id is None else Category.parent_id == parent_id)
-    siblings = q.all()
-    if not siblings:
-        return None
-    target = name.lower()
-    best: Optional[Category] = None
-    best_ratio = 0.0
-    for cat in siblings:
-        r = SequenceMatcher(None, cat.name.lower(), target).ratio()
-        if r > best_ratio:
-            best_ratio = r
-            best = cat
-    if best_ratio >= FUZZY_THRESHOLD:
-        return best
-    return None
-
-
-def _create_category(parent_id: Optional[int], normalized_name: str) -> Category:
+    resolved = {}
+    new_aliases = []
+    misses = []
+    for node, name in nodes.items():
+        source, parent_id, lname = node
+        cid = state.aliases.get(node)
+        if cid is None and source is not None:
+            # Алиас другого поставщика (или ручной) — регистрируем и этот
+            # source, в следующий раз найдём сразу на шаге 1.
+            cid = state.aliases_any.get((parent_id, lname))
+            if cid is not None:
+                new_aliases.append((source, parent_id, name, cid, False))
+        normalized = normalize_name(name)
+        if cid is None:
+            cid = state.exact.get((parent_id, normalized.lower()))
+            if cid is not None:
+                new_aliases.append((source, parent_id, name, cid, False))
+        if cid is None:
+            misses.append((node, name, normalized))
+        else:
+            resolved[node] = cid
+
+    if misses:
+        siblings = _load_siblings({node[1] for node, _, _ in misses})
+        gram_floor = default_gram_floor(FUZZY_THRESHOLD)
+        # По индексу на родителя: существующие сиблинги ('cat', id) и
+        # запланированные на этом уровне новые категории ('new', группа) —
+        # как при последовательном резолвинге, где созданная минуту назад
+        # категория уже сиблинг для следующего имени.
+        indexes: dict = {}
+        groups: list[tuple] = []          # (parent_id, normalized) новых категорий
+        planned: dict = {}                # (parent_id, lower normalized) → группа
+        pending = []                      # (node, name, группа, needs_review)
+        for node, name, normalized in misses:
+            parent_id, target = node[1], normalized.lower()
+            group = planned.get((parent_id, target))
+            needs_review = False
+            if group is None:
+                index = indexes.get(parent_id)
+                if index is None:
+                    index = indexes[parent_id] = TrigramIndex(
+                        ((('cat', cid), cname) for cid, cname in siblings.get(parent_id, [])),
+                        gram_floor=gram_floor,
+                    )
+                match = index.best(normalized, FUZZY_THRESHOLD)
+                if match is not None and match[0] == 'cat':
+                    new_aliases.append((node[0], parent_id, name, match[1], True))
+                    resolved[node] = match[1]
+                    continue
+                if match is not None:
+                    group, needs_review = match[1], True
+                else:
+                    group = len(groups)
+                    groups.append((parent_id, normalized))
+                    planned[(parent_id, target)] = group
+                    index.add(('new', group), normalized)
+            pending.append((node, name, group, needs_review))
+
+        if groups:
+            ids = _create_categories(groups)
+            for (parent_id, normalized), cid in zip(groups, ids):
+                state.exact[(parent_id, normalized.lower())] = cid
+            for node, name, group, needs_review in pending:
+                new_aliases.append((node[0], node[1], name, ids[group], needs_review))
+                resolved[node] = ids[group]
+
+    _insert_aliases(new_aliases)
+    for source, parent_id, name, cid, _ in new_aliases:
+        state.aliases[(source, parent_id, name.lower())] = cid
+        state.aliases_any.setdefault((parent_id, name.lower()), cid)
+    return resolved
+
+
+def resolve_category_paths(items: Iterable[tuple]) -> dict:
     """
-    Создаёт новую Category с уникальным slug'ом. Не коммитит — только
-    flush, чтобы получить id для дальнейшего создания alias'ов.
+    Резолвит набор путей [(source, path), ...] разом. Возвращает
+    {(source, tuple(path)): category_id листа}. Пустые элементы пути
+    пропускаются; полностью пустой путь — ValueError. Не коммитит.
     """
-    slug_base = _slug_for_category(normalized_name)
-    slug = _ensure_unique_slug(slug_base)
-    cat = Category(
-        name=normalized_name,
-        slug=slug,
-        parent_id=parent_id,
-        show_in_menu=True,
-    )
-    db.session.add(cat)
-    db.session.flush()
-    return cat
-
-
-def _create_alias(
-    source: Optional[str],
-    parent_id: Optional[int],
-    alias_name: str,
-    category_id: int,
-    is_auto: bool = True,
-    needs_review: bool = False,
-) -> CategoryAlias:
-    """
-    Создаёт alias-запись. При race-condition (второй параллельный
-    воркер уже создал такой же) db поймает UniqueConstraint и вызывающий
-    поймает IntegrityError — на practice race редкая, workers сериализованы.
-    """
-    alias = CategoryAlias(
-        source=source,
-        parent_id=parent_id,
-        alias_name=alias_name,
-        category_id=category_id,
-        is_auto=is_auto,
-        needs_review=needs_review,
-    )
-    db.session.add(alias)
-    db.session.flush()
-    return alias
-
-
-def _resolve_one(source: Optional[str], parent_id: Optional[int], raw_name: str) -> int:
-    """
-    Резолвит одно имя категории в id. См. docstring модуля — 4 шага
-    fallback'а. Возвращает category_id.
-    """
-    name = (raw_name or '').strip()
-    if not name:
-        raise ValueError('resolve_category: пустое имя категории')
-
-    # 1) alias с точным source
-    alias = _find_alias(source, parent_id, name)
-    if alias is not None:
-        return alias.category_id
-
-    # 1b) alias с любым source (в т.ч. вручную созданный админом или
-    # seed при миграции существующих категорий) — чтобы не плодить
-    # дубликаты для разных поставщиков.
-    if source is not None:
-        alias = _find_alias_any_source(parent_id, name)
-        if alias is not None:
-            # Регистрируем этот source тоже — в следующий раз найдём сразу
-            # на шаге 1.
-            _create_alias(source, parent_id, name, alias.category_id, is_auto=True)
-            return alias.category_id
-
-    # 2) точное совпадение по имени category (case-insensitive)
-    normalized = normalize_name(name)
-    cat = _find_category_exact(parent_id, normalized)
-    if cat is not None:
-        _create_alias(source, parent_id, name, cat.id, is_auto=True)
-        return cat.id
-
-    # 3) fuzzy среди сиблингов
-    cat = _find_category_fuzzy(parent_id, normalized)
-    if cat is not None:
-        _create_alias(source, parent_id, name, cat.id, is_auto=True, needs_review=True)
-        return cat.id
-
-    # 4) miss → создаём новую
-    new_cat = _create_category(parent_id, normalized)
-    _create_alias(source, parent_id, name, new_cat.id, is_auto=True)
-    return new_cat.id
+    requests = {}
+    for source, path in items:
+        key = (source, tuple(path))
+        if key in requests:
+            continue
+        names = [(n or '').strip() for n in path]
+        names = [n for n in names if n]
+        if not names:
+            raise ValueError('resolve_category_path: пустой путь категории')
+        requests[key] = (source, names)
+    if not requests:
+        return {}
+
+    raw_names = {n.lower() for _, names in requests.values() for n in names}
+    state = _State(raw_names, {normalize_name(n).lower() for n in raw_names})
+
+    current = {key: None for key in requests}
+    for depth in range(max(len(names) for _, names in requests.values())):
+        nodes = {}
+        for key, (source, names) in requests.items():
+            if depth < len(names):
+                nodes.setdefault((source, current[key], names[depth].lower()), names[depth])
+        resolved = _resolve_level(nodes, state)
+        for key, (source, names) in requests.items():
+            if depth < len(names):
+                current[key] = resolved[(source, current[key], names[depth].lower())]
+    return current
 
 
 def resolve_category_path(source: Optional[str], path: Iterable[str]) -> int:
     """
     Резолвит цепочку имён категорий от корня до листа в id листовой
-    категории. Каждый уровень идёт через `_resolve_one` с parent_id
-    предыдущего уровня. Пустые элементы пропускаются.
+    категории. Пустые элементы пропускаются.
 
     Пример:
         resolve_category_path('bio', ['Оборудование', 'Тепловое', 'Пароконвектоматы'])
@@ -222,14 +319,5 @@ def resolve_category_path(source: Optional[str], path: Iterable[str]) -> int:
     Возвращает category_id последнего уровня. Не коммитит — вызывающий
     код (обычно create_product) сам делает db.session.commit().
     """
-    parent_id: Optional[int] = None
-    last_id: Optional[int] = None
-    for raw_name in path:
-        name = (raw_name or '').strip()
-        if not name:
-            continue
-        last_id = _resolve_one(source, parent_id, name)
-        parent_id = last_id
-    if last_id is None:
-        raise ValueError('resolve_category_path: пустой путь категории')
-    return last_id
+    path = tuple(path)
+    return resolve_category_paths([(source, path)])[(source, path)]
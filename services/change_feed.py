@@ -0,0 +1,270 @@
+"""
+Лента изменений каталога: «что поменялось после seq N».
+
+BIO/Equip-воркеры и витрина раньше на каждом прогоне заново тянули
+articles-map или целые списки. Теперь у product и product_warehouse_cost
+есть change_seq — номер из общей последовательности catalog_change_seq,
+который ставят триггеры:
+
+  - BEFORE INSERT / UPDATE — новый номер строке (холостой UPDATE без
+    изменений номер не двигает). Триггер, а не код: цены и остатки
+    массово меняются сырым SQL (_apply_min_price, пакетный импорт,
+    пересчёт формул), ORM про это не знает;
+  - AFTER DELETE — строка в catalog_tombstone с новым номером.
+
+Клиент хранит последний полученный seq и спрашивает
+/products/changes?since=<seq>.
+
+Горизонт. Номера выдаются при записи, а видны после коммита: транзакция
+с номером 10 может закоммититься позже транзакции с номером 11, и
+клиент, получивший 11, номер 10 бы пропустил. Поэтому триггер берёт
+разделяемый advisory lock до конца транзакции, а лента — на мгновение
+исключительный (pg_try_, без ожидания): если взяли, пишущих транзакций
+нет и все номера ≤ текущего значения последовательности уже закоммичены
+— это горизонт, дальше него лента не отдаёт. Не взяли за несколько
+попыток (идёт длинная запись) — пустая страница с retry_after.
+"""
+
+import time
+from typing import Optional
+
+from sqlalchemy import text
+
+from extensions import db
+from utils import query_budget
+
+
+SEQUENCE = 'catalog_change_seq'
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+TOMBSTONE_RETENTION_DAYS = 90
+_HORIZON_LOCK_KEY = 0x63686E67  # 'chng'
+_HORIZON_ATTEMPTS = 10
+_HORIZON_PAUSE = 0.05
+
+_INSTALL_FUNCTIONS = [
+    f"""
+    CREATE OR REPLACE FUNCTION catalog_bump_change_seq() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_advisory_xact_lock_shared({_HORIZON_LOCK_KEY});
+        NEW.change_seq = nextval('{SEQUENCE}');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION catalog_write_tombstone() RETURNS trigger AS $$
+    DECLARE
+        pid INTEGER;
+    BEGIN
+        PERFORM pg_advisory_xact_lock_shared({_HORIZON_LOCK_KEY});
+        IF TG_ARGV[0] = 'product' THEN
+            pid = OLD.id;
+        ELSE
+            pid = OLD.product_id;
+        END IF;
+        INSERT INTO catalog_tombstone (change_seq, entity, entity_id, product_id, deleted_at)
+        VALUES (nextval('{SEQUENCE}'), TG_ARGV[0], OLD.id, pid, timezone('utc', now()));
+        RETURN OLD;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+]
+
+# (таблица, имя сущности в ленте)
+_TABLES = (('product', 'product'), ('product_warehouse_cost', 'warehouse_cost'))
+
+
+def install() -> bool:
+    """
+    Колонки, последовательность, триггеры; бэкфилл номеров для строк,
+    созданных до ленты. Идемпотентно, зовётся на старте из app.py.
+    Возвращает True, если триггеры ставились впервые. Не коммитит.
+    """
+    db.session.execute(text(f'CREATE SEQUENCE IF NOT EXISTS {SEQUENCE}'))
+    for table, _ in _TABLES:
+        db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS change_seq BIGINT'))
+        db.session.execute(text(
+            f'CREATE INDEX IF NOT EXISTS idx_{table}_change_seq ON {table}(change_seq)'
+        ))
+
+    installed = db.session.execute(text(
+        "SELECT 1 FROM pg_trigger WHERE tgname = 'trg_product_change_seq_upd'"
+    )).first()
+    if installed:
+        _prune_tombstones()
+        return False
+
+    # Бэкфилл до триггеров: сам UPDATE иначе прогнал бы их на каждой строке.
+    for table, _ in _TABLES:
+        db.session.execute(text(
+            f"UPDATE {table} SET change_seq = nextval('{SEQUENCE}') WHERE change_seq IS NULL"
+        ))
+    for sql in _INSTALL_FUNCTIONS:
+        db.session.execute(text(sql))
+    for table, entity in _TABLES:
+        db.session.execute(text(f"""
+            CREATE TRIGGER trg_{table}_change_seq_ins
+            BEFORE INSERT ON {table}
+            FOR EACH ROW EXECUTE FUNCTION catalog_bump_change_seq()
+        """))
+        db.session.execute(text(f"""
+            CREATE TRIGGER trg_{table}_change_seq_upd
+            BEFORE UPDATE ON {table}
+            FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*)
+            EXECUTE FUNCTION catalog_bump_change_seq()
+        """))
+        db.session.execute(text(f"""
+            CREATE TRIGGER trg_{table}_tombstone
+            AFTER DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION catalog_write_tombstone('{entity}')
+        """))
+    return True
+
+
+def _prune_tombstones() -> None:
+    db.session.execute(
+        text("DELETE FROM catalog_tombstone WHERE deleted_at < timezone('utc', now()) - make_interval(days => :d)"),
+        {'d': TOMBSTONE_RETENTION_DAYS},
+    )
+
+
+def horizon() -> Optional[int]:
+    """
+    Наибольший seq, все номера до которого закоммичены (см. docstring
+    модуля). None — пишущие транзакции не дали взять lock. Коммитит /
+    откатывает текущую транзакцию.
+    """
+    for attempt in range(_HORIZON_ATTEMPTS):
+        if attempt:
+            time.sleep(_HORIZON_PAUSE)
+        # Число попыток зависит от пишущих транзакций, а не от запроса —
+        # в бюджет SQL эндпоинта не входит.
+        with query_budget.exempt():
+            got_lock = db.session.execute(
+                text('SELECT pg_try_advisory_xact_lock(:k)'), {'k': _HORIZON_LOCK_KEY}
+            ).scalar()
+        if not got_lock:
+            db.session.rollback()
+            continue
+        value = db.session.execute(text(
+            f'SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM {SEQUENCE}'
+        )).scalar()
+        db.session.commit()
+        return int(value or 0)
+    return None
+
+
+def _page(since: int, upto: int, limit: int, with_costs: bool) -> list[tuple]:
+    # Каждая ветка — по своему индексу change_seq со своим LIMIT, общий
+    # ORDER BY ... LIMIT собирает из них страницу.
+    branches = [
+        """(SELECT change_seq, 'product', id, NULL::INTEGER, 'upsert' FROM product
+            WHERE change_seq > :since AND change_seq <= :upto
+            ORDER BY change_seq LIMIT :limit)""",
+        """(SELECT change_seq, entity, entity_id, product_id, 'delete' FROM catalog_tombstone
+            WHERE change_seq > :since AND change_seq <= :upto {entity_filter}
+            ORDER BY change_seq LIMIT :limit)""".format(
+            entity_filter='' if with_costs else "AND entity = 'product'"
+        ),
+    ]
+    if with_costs:
+        branches.append(
+            """(SELECT change_seq, 'warehouse_cost', id, product_id, 'upsert' FROM product_warehouse_cost
+                WHERE change_seq > :since AND change_seq <= :upto
+                ORDER BY change_seq LIMIT :limit)"""
+        )
+    sql = ' UNION ALL '.join(branches) + ' ORDER BY 1 LIMIT :limit'
+    return db.session.execute(text(sql), {'since': since, 'upto': upto, 'limit': limit}).all()
+
+
+def _load_products(ids: list[int], full: bool) -> dict[int, dict]:
+    if not ids:
+        return {}
+    rows = db.session.execute(
+        text("""
+            SELECT id, article, name, slug, price, wholesale_price, quantity,
+                   is_visible, is_draft, supplier_id, brand_id, category_id, updated_at
+            FROM product WHERE id = ANY(:ids)
+        """),
+        {'ids': ids},
+    ).mappings().all()
+    result = {}
+    for row in rows:
+        item = dict(row)
+        item['updated_at'] = item['updated_at'].isoformat() if item['updated_at'] else None
+        if not full:
+            item.pop('wholesale_price')
+            item.pop('supplier_id')
+        result[item['id']] = item
+    return result
+
+
+def _load_costs(ids: list[int]) -> dict[int, dict]:
+    if not ids:
+        return {}
+    rows = db.session.execute(
+        text("""
+            SELECT id, product_id, warehouse_id, cost_price, quantity,
+                   calculated_price, calculated_at
+            FROM product_warehouse_cost WHERE id = ANY(:ids)
+        """),
+        {'ids': ids},
+    ).mappings().all()
+    result = {}
+    for row in rows:
+        item = dict(row)
+        item['calculated_at'] = item['calculated_at'].isoformat() if item['calculated_at'] else None
+        result[item['id']] = item
+    return result
+
+
+def changes(since: int, limit: int = DEFAULT_LIMIT, full: bool = False) -> dict:
+    """
+    Страница ленты после since.
+
+    full=False (витрина): только товары; скрытые и черновики приходят как
+    op='hide' без данных, без оптовой цены и поставщика.
+    full=True (admin/system): плюс складские себестоимости и их удаления.
+
+    Каждая запись — {'seq', 'type', 'op', 'id', ...}; строка, изменённая
+    несколько раз, приходит один раз, с последним seq и текущими данными.
+    """
+    limit = max(1, min(limit, MAX_LIMIT))
+    upto = horizon()
+    if upto is None:
+        return {'changes': [], 'next': since, 'has_more': True, 'horizon': None, 'retry_after': 1}
+
+    rows = _page(since, upto, limit, with_costs=full)
+    products = _load_products([r[2] for r in rows if r[1] == 'product' and r[4] == 'upsert'], full)
+    costs = _load_costs([r[2] for r in rows if r[1] == 'warehouse_cost' and r[4] == 'upsert'])
+
+    items = []
+    for seq, kind, entity_id, product_id, op in rows:
+        item = {'seq': seq, 'type': kind, 'op': op, 'id': entity_id}
+        if op == 'delete':
+            item['product_id'] = product_id
+        elif kind == 'product':
+            data = products.get(entity_id)
+            if data is None:
+                # Удалён после выборки страницы — придёт tombstone.
+                continue
+            if not full and (not data['is_visible'] or data['is_draft']):
+                item['op'] = 'hide'
+            else:
+                item['data'] = data
+        else:
+            data = costs.get(entity_id)
+            if data is None:
+                continue
+            item['product_id'] = data['product_id']
+            item['data'] = data
+        items.append(item)
+
+    return {
+        'changes': items,
+        # Пустая страница — всё до горизонта уже отдано, можно сдвинуться к нему.
+        'next': rows[-1][0] if rows else max(since, upto),
+        'has_more': len(rows) == limit,
+        'horizon': upto,
+    }
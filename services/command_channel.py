@@ -0,0 +1,206 @@
+"""
+Long-poll канал команд для локальных воркеров (BIO/Equip, collector).
+
+Воркеры опрашивали /internal/integrations/<type>/pending-command раз в
+~10 сек и /internal/collector/next-task в цикле: задержка команды до 10
+сек и поток пустых запросов, каждый с чтением из БД. Теперь эти ручки
+принимают ?wait=N — держат запрос до N секунд и отвечают, как только
+команда появилась.
+
+Будит их PostgreSQL LISTEN/NOTIFY, а не память процесса: админка может
+попасть в один gunicorn-воркер, а long-poll висеть в другом.
+
+  - AFTER INSERT триггеры на integration_command / collector_command
+    делают pg_notify (доставляется после коммита вставки) — команду из
+    любого места (ORM, сырой SQL) видно сразу;
+  - в каждом процессе один поток-слушатель на отдельном соединении
+    (из пула оно изымается), он считает уведомления по ключам
+    '<канал>:<payload>' и будит ждущих через Condition;
+  - ручка берёт токен ДО проверки очереди, поэтому команда, вставленная
+    между проверкой и ожиданием, не теряется: токен уже не совпадёт.
+
+Слушатель упал / соединения нет — ожидание вырождается в опрос раз в
+FALLBACK_POLL_SEC, так что ручка остаётся рабочей.
+"""
+
+import select
+import threading
+import time
+
+from sqlalchemy import text
+
+from extensions import db
+
+
+INTEGRATION_CHANNEL = 'integration_command'
+COLLECTOR_CHANNEL = 'collector_command'
+CHANNELS = (INTEGRATION_CHANNEL, COLLECTOR_CHANNEL)
+
+LONG_POLL_MAX_SEC = 25
+FALLBACK_POLL_SEC = 2.0
+_RECONNECT_PAUSE = 5.0
+_IDLE_CHECK_SEC = 60.0
+
+_INSTALL = [
+    """
+    CREATE OR REPLACE FUNCTION command_channel_notify() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify(TG_ARGV[0], coalesce(to_jsonb(NEW) ->> TG_ARGV[1], ''));
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+]
+
+# (таблица, канал, колонка в payload — по ней ждущие фильтруют команды)
+_TABLES = (
+    ('integration_command', INTEGRATION_CHANNEL, 'type'),
+    ('collector_command', COLLECTOR_CHANNEL, 'command'),
+)
+
+
+def install() -> bool:
+    """
+    Функция и триггеры уведомлений. Идемпотентно, зовётся на старте из
+    app.py. Возвращает True, если триггеры ставились впервые. Не коммитит.
+    """
+    for sql in _INSTALL:
+        db.session.execute(text(sql))
+    created = False
+    for table, channel, column in _TABLES:
+        exists = db.session.execute(
+            text('SELECT 1 FROM pg_trigger WHERE tgname = :name'),
+            {'name': f'trg_{table}_notify'},
+        ).first()
+        if exists:
+            continue
+        db.session.execute(text(f"""
+            CREATE TRIGGER trg_{table}_notify
+            AFTER INSERT ON {table}
+            FOR EACH ROW EXECUTE FUNCTION command_channel_notify('{channel}', '{column}')
+        """))
+        created = True
+    return created
+
+
+class _Listener:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._counters: dict[str, int] = {}
+        # Растёт при каждом (пере)подключении: уведомления, пришедшие пока
+        # слушателя не было, потеряны — ждущие должны перепроверить БД.
+        self._epoch = 0
+        self._online = False
+        self._thread = None
+        self._engine = None
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._engine = db.engine
+            self._thread = threading.Thread(target=self._run, name='command-channel', daemon=True)
+            self._thread.start()
+
+    def token(self, key: str) -> tuple:
+        self._ensure_started()
+        with self._cond:
+            return self._epoch, self._counters.get(key, 0), self._online
+
+    def wait(self, key: str, token: tuple, timeout: float) -> None:
+        """Ждёт уведомления по key после token (или timeout)."""
+        epoch, counter, online = token
+        if not online:
+            time.sleep(min(timeout, FALLBACK_POLL_SEC))
+            return
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._epoch != epoch or self._counters.get(key, 0) != counter,
+                timeout,
+            )
+
+    def _bump(self, keys) -> None:
+        with self._cond:
+            for key in keys:
+                self._counters[key] = self._counters.get(key, 0) + 1
+            self._cond.notify_all()
+
+    def _set_online(self, online: bool) -> None:
+        with self._cond:
+            self._online = online
+            self._epoch += 1
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            pooled = None
+            try:
+                pooled = self._engine.raw_connection()
+                pooled.detach()  # соединение живёт всё время процесса — не из пула
+                conn = getattr(pooled, 'driver_connection', None) or pooled.connection
+                conn.rollback()  # pre_ping мог открыть транзакцию
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    for channel in CHANNELS:
+                        cur.execute(f'LISTEN {channel}')
+                self._set_online(True)
+                while True:
+                    ready, _, _ = select.select([conn], [], [], _IDLE_CHECK_SEC)
+                    if not ready:
+                        # Тишина — убеждаемся, что соединение живо.
+                        with conn.cursor() as cur:
+                            cur.execute('SELECT 1')
+                        continue
+                    conn.poll()
+                    keys = []
+                    while conn.notifies:
+                        note = conn.notifies.pop(0)
+                        keys.append(note.channel)
+                        if note.payload:
+                            keys.append(f'{note.channel}:{note.payload}')
+                    if keys:
+                        self._bump(keys)
+            except Exception as e:
+                print(f"⚠️ command_channel: слушатель NOTIFY остановлен: {e}")
+            finally:
+                if pooled is not None:
+                    try:
+                        pooled.close()
+                    except Exception:
+                        pass
+            self._set_online(False)
+            time.sleep(_RECONNECT_PAUSE)
+
+
+_listener = _Listener()
+
+
+def parse_wait(raw) -> float:
+    """?wait=N → секунды ожидания в [0, LONG_POLL_MAX_SEC]; мусор — 0."""
+    try:
+        value = float(raw or 0)
+    except (TypeError, ValueError):
+        return 0.0
+    return max(0.0, min(value, LONG_POLL_MAX_SEC))
+
+
+def long_poll(key: str, wait: float, fetch):
+    """
+    Зовёт fetch() пока он не вернёт не-None или не истечёт wait секунд.
+    Между попытками транзакция закрывается, чтобы ожидание не держало
+    соединение из пула. Возвращает результат fetch() или None.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        token = _listener.token(key) if wait > 0 else None
+        result = fetch()
+        if result is not None:
+            return result
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        db.session.commit()
+        db.session.close()
+        _listener.wait(key, token, remaining)
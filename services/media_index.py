@@ -0,0 +1,377 @@
+"""
+Поддержка индекса файлов товаров `media_files` (см. `models/media_file.py`).
+
+Индекс покрывает только старое дерево UPLOAD_FOLDER/products/<id>/...:
+новые загрузки туда больше не пишутся — они попадают в хранилище блобов,
+и их индекс — `media_blobs` (services/blob_store.py). Поэтому строки
+media_files появляются только из сверки с диском, а API их лишь убирает:
+  - `forget_url(url)` — после удаления файла товара;
+  - `forget_product(product_id)` — после удаления папки товара целиком.
+Как и closure, ничего не коммитят — транзакцией управляет вызывающий.
+
+Сверка с диском — `reconcile()`:
+  1. один проход os.scandir по UPLOAD_FOLDER/products (или по выбранным
+     товарам) — без os.path.exists и SELECT на каждый файл;
+  2. результат пачками через unnest() во временную таблицу;
+  3. set-based: удалить из индекса пропавшие файлы, upsert изменившихся
+     (size/mtime) со сбросом sha256. Удаляются только строки,
+     проиндексированные до начала скана и чьих файлов нет на диске и
+     сейчас, — файл, положенный во время скана, не теряется;
+  4. set-based: удалить ProductMedia/ProductDocument, чьих локальных файлов
+     больше нет, и создать строки для файлов, у которых строк нет — то, что
+     раньше делали sync_*_from_filesystem на каждый GET;
+  5. досчитать sha256 там, где он NULL.
+Параллельный запуск из нескольких gunicorn-воркеров отсекается
+сессионным pg_try_advisory_lock на отдельном соединении — он держится
+весь прогон, включая досчёт хэшей; второй просто пропускает прогон. Тот же
+фоновый цикл запускает сборку мусора блобов (`blob_store.collect_garbage`).
+"""
+
+import mimetypes
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Optional
+
+from flask import current_app
+from sqlalchemy import text
+
+from extensions import db
+from models.media_file import MEDIA_KIND_DOC, MEDIA_KIND_DRIVER, MEDIA_KIND_MEDIA
+from services import blob_store
+from utils import file_delivery
+
+
+_RECONCILE_LOCK_KEY = 0x6D656469  # 'medi'
+_SCAN_CHUNK = 2000
+_HASH_BATCH = 200
+_SUBDIR_KINDS = {'documents': MEDIA_KIND_DOC, 'drivers': MEDIA_KIND_DRIVER}
+_VIDEO_EXTENSIONS = ('mp4', 'mov', 'avi', 'mkv', 'wmv', 'flv', 'webm')
+
+
+def _upload_root() -> str:
+    return current_app.config['UPLOAD_FOLDER']
+
+
+def classify(rel_path: str):
+    """(product_id, kind) для пути относительно UPLOAD_FOLDER или None, если это не файл товара."""
+    parts = rel_path.replace(os.sep, '/').split('/')
+    if parts[0] != 'products' or not parts[1:] or not parts[1].isdigit():
+        return None
+    if parts[-1].startswith('.'):
+        return None
+    if len(parts) == 3:
+        return int(parts[1]), MEDIA_KIND_MEDIA
+    if len(parts) == 4 and parts[2] in _SUBDIR_KINDS:
+        return int(parts[1]), _SUBDIR_KINDS[parts[2]]
+    return None
+
+
+def url_to_path(url: str) -> Optional[str]:
+    if not url or not url.startswith('/uploads/'):
+        return None
+    return url[len('/uploads/'):]
+
+
+def forget_url(url: str) -> None:
+    rel = url_to_path(url)
+    if rel:
+        db.session.execute(text('DELETE FROM media_files WHERE path = :p'), {'p': rel})
+
+
+def forget_product(product_id: int) -> None:
+    db.session.execute(
+        text('DELETE FROM media_files WHERE product_id = :pid'), {'pid': product_id}
+    )
+
+
+# ── сверка с диском ─────────────────────────────────────────────────────
+
+def _scan(product_ids: Optional[set]):
+    """
+    Один проход по UPLOAD_FOLDER/products. Возвращает (files, dirs):
+    files — кортежи (path, product_id, kind, size, mtime_ns, mime_type),
+    dirs — id товаров, чьи папки существуют.
+    """
+    root = os.path.join(_upload_root(), 'products')
+    files, dirs = [], []
+    try:
+        product_dirs = os.scandir(root)
+    except FileNotFoundError:
+        return files, dirs
+
+    def add(entry, rel, pid, kind):
+        try:
+            st = entry.stat(follow_symlinks=False)
+        except OSError:
+            return
+        mime = mimetypes.guess_type(entry.name)[0] or 'application/octet-stream'
+        files.append((rel, pid, kind, st.st_size, st.st_mtime_ns, mime))
+
+    with product_dirs:
+        for pdir in product_dirs:
+            if not pdir.name.isdigit() or not pdir.is_dir(follow_symlinks=False):
+                continue
+            pid = int(pdir.name)
+            if product_ids is not None and pid not in product_ids:
+                continue
+            dirs.append(pid)
+            with os.scandir(pdir.path) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_file(follow_symlinks=False):
+                        add(entry, f'products/{pid}/{entry.name}', pid, MEDIA_KIND_MEDIA)
+                    elif entry.name in _SUBDIR_KINDS and entry.is_dir(follow_symlinks=False):
+                        kind = _SUBDIR_KINDS[entry.name]
+                        with os.scandir(entry.path) as sub:
+                            for f in sub:
+                                if not f.name.startswith('.') and f.is_file(follow_symlinks=False):
+                                    add(f, f'products/{pid}/{entry.name}/{f.name}', pid, kind)
+    return files, dirs
+
+
+def _load_scan(files, dirs) -> None:
+    db.session.execute(text("""
+        CREATE TEMP TABLE media_scan (
+            path VARCHAR(500) PRIMARY KEY,
+            product_id INTEGER NOT NULL,
+            kind VARCHAR(10) NOT NULL,
+            size BIGINT NOT NULL,
+            mtime_ns BIGINT NOT NULL,
+            mime_type VARCHAR(100) NOT NULL
+        ) ON COMMIT DROP
+    """))
+    db.session.execute(text(
+        'CREATE TEMP TABLE media_scan_dirs (product_id INTEGER PRIMARY KEY) ON COMMIT DROP'
+    ))
+    for i in range(0, len(files), _SCAN_CHUNK):
+        chunk = files[i:i + _SCAN_CHUNK]
+        cols = list(zip(*chunk))
+        db.session.execute(
+            text("""
+                INSERT INTO media_scan (path, product_id, kind, size, mtime_ns, mime_type)
+                SELECT * FROM unnest(
+                    CAST(:paths AS VARCHAR[]), CAST(:pids AS INTEGER[]),
+                    CAST(:kinds AS VARCHAR[]), CAST(:sizes AS BIGINT[]),
+                    CAST(:mtimes AS BIGINT[]), CAST(:mimes AS VARCHAR[])
+                )
+            """),
+            {
+                'paths': list(cols[0]), 'pids': list(cols[1]), 'kinds': list(cols[2]),
+                'sizes': list(cols[3]), 'mtimes': list(cols[4]), 'mimes': list(cols[5]),
+            },
+        )
+    if dirs:
+        db.session.execute(
+            text('INSERT INTO media_scan_dirs SELECT unnest(CAST(:ids AS INTEGER[]))'),
+            {'ids': dirs},
+        )
+
+
+@contextmanager
+def _run_lock():
+    """
+    Сессионный advisory lock на своём соединении: xact-lock отпустил бы
+    первый же commit, а сверка коммитит и дальше (досчёт хэшей пачками).
+    """
+    conn = db.engine.connect()
+    got_lock = False
+    try:
+        got_lock = conn.execute(
+            text('SELECT pg_try_advisory_lock(:k)'), {'k': _RECONCILE_LOCK_KEY}
+        ).scalar()
+        conn.commit()
+        yield got_lock
+    finally:
+        try:
+            if got_lock:
+                conn.execute(text('SELECT pg_advisory_unlock(:k)'), {'k': _RECONCILE_LOCK_KEY})
+                conn.commit()
+        finally:
+            # Закрытие соединения снимает сессионную блокировку и без unlock.
+            conn.close()
+
+
+def _vanished(paths) -> list:
+    root = _upload_root()
+    return [rel for rel in paths if not os.path.exists(os.path.join(root, rel))]
+
+
+def reconcile(product_ids: Optional[Iterable[int]] = None, compute_hashes: bool = True) -> Optional[dict]:
+    """
+    Сверяет индекс и строки ProductMedia/ProductDocument с диском.
+    product_ids=None — весь каталог. Коммитит сам (это фоновая задача).
+    Возвращает счётчики или None, если прогон уже идёт в другом процессе.
+    """
+    with _run_lock() as got_lock:
+        if not got_lock:
+            return None
+        stats = _reconcile(set(product_ids) if product_ids is not None else None)
+        if compute_hashes:
+            stats['hashed'] = backfill_hashes()
+    return stats
+
+
+def _reconcile(scope_ids: Optional[set]) -> dict:
+    # Часы БД в том же виде, что NOW() в indexed_at. Индекс пишет только
+    # сверка под _run_lock, но граница дешёвая: строку, записанную после
+    # этой точки, скан мог не увидеть — её не удаляем.
+    scan_start = db.session.execute(text('SELECT CAST(clock_timestamp() AS TIMESTAMP)')).scalar()
+    files, dirs = _scan(scope_ids)
+    _load_scan(files, dirs)
+
+    if scope_ids is None:
+        scope_sql, params = 'TRUE', {}
+    else:
+        scope_sql, params = 'mf.product_id = ANY(CAST(:scope AS INTEGER[]))', {'scope': list(scope_ids)}
+
+    stats = {'files': len(files), 'product_dirs': len(dirs)}
+    missing = [r[0] for r in db.session.execute(text(f"""
+        SELECT mf.path FROM media_files mf
+        WHERE {scope_sql}
+          AND mf.indexed_at < :scan_start
+          AND NOT EXISTS (SELECT 1 FROM media_scan s WHERE s.path = mf.path)
+    """), {**params, 'scan_start': scan_start}).all()]
+    # Файл мог появиться после того, как скан прошёл его папку.
+    gone = _vanished(missing)
+    stats['index_removed'] = db.session.execute(text("""
+        DELETE FROM media_files
+        WHERE path = ANY(CAST(:paths AS VARCHAR[]))
+          AND indexed_at < :scan_start
+    """), {'paths': gone, 'scan_start': scan_start}).rowcount if gone else 0
+    stats['index_upserted'] = db.session.execute(text("""
+        INSERT INTO media_files (path, product_id, kind, size, mtime_ns, sha256, indexed_at)
+        SELECT path, product_id, kind, size, mtime_ns, NULL, NOW() FROM media_scan
+        ON CONFLICT (path) DO UPDATE
+        SET product_id = EXCLUDED.product_id,
+            kind = EXCLUDED.kind,
+            size = EXCLUDED.size,
+            mtime_ns = EXCLUDED.mtime_ns,
+            sha256 = NULL,
+            indexed_at = NOW()
+        WHERE media_files.size <> EXCLUDED.size
+           OR media_files.mtime_ns <> EXCLUDED.mtime_ns
+    """)).rowcount
+
+    # Строки БД на локальные файлы, которых нет на диске. Как и старый
+    # sync: только для товаров, чья папка существует (нет папки — файлы
+    # могли ещё не доехать), внешние URL и файлы мастер-списка драйверов
+    # (driver_id) не трогаем.
+    stats['media_removed'] = db.session.execute(text("""
+        DELETE FROM product_media pm
+        USING media_scan_dirs d
+        WHERE pm.product_id = d.product_id
+          AND pm.url LIKE '/uploads/products/%'
+          AND NOT EXISTS (
+              SELECT 1 FROM media_files mf WHERE '/uploads/' || mf.path = pm.url
+          )
+    """)).rowcount
+    stats['documents_removed'] = db.session.execute(text("""
+        DELETE FROM product_document pd
+        USING media_scan_dirs d
+        WHERE pd.product_id = d.product_id
+          AND pd.driver_id IS NULL
+          AND pd.url LIKE '/uploads/products/%'
+          AND NOT EXISTS (
+              SELECT 1 FROM media_files mf WHERE '/uploads/' || mf.path = pd.url
+          )
+    """)).rowcount
+
+    # Файлы на диске без строк — создаём (товар должен существовать).
+    stats['media_created'] = db.session.execute(text("""
+        INSERT INTO product_media (product_id, url, media_type, "order")
+        SELECT s.product_id, '/uploads/' || s.path,
+               CASE WHEN lower(substring(s.path from '\\.([^./]+)$')) = ANY(CAST(:video AS VARCHAR[]))
+                    THEN 'video' ELSE 'image' END,
+               0
+        FROM media_scan s
+        JOIN product p ON p.id = s.product_id
+        WHERE s.kind = :media
+          AND NOT EXISTS (
+              SELECT 1 FROM product_media pm
+              WHERE pm.product_id = s.product_id AND pm.url = '/uploads/' || s.path
+          )
+    """), {'video': list(_VIDEO_EXTENSIONS), 'media': MEDIA_KIND_MEDIA}).rowcount
+    stats['documents_created'] = db.session.execute(text("""
+        INSERT INTO product_document (product_id, filename, url, file_type, mime_type)
+        SELECT s.product_id, substring(s.path from '[^/]+$'), '/uploads/' || s.path,
+               s.kind, s.mime_type
+        FROM media_scan s
+        JOIN product p ON p.id = s.product_id
+        WHERE s.kind IN (:doc, :driver)
+          AND NOT EXISTS (
+              SELECT 1 FROM product_document pd
+              WHERE pd.product_id = s.product_id AND pd.url = '/uploads/' || s.path
+          )
+    """), {'doc': MEDIA_KIND_DOC, 'driver': MEDIA_KIND_DRIVER}).rowcount
+    db.session.commit()
+    return stats
+
+
+def backfill_hashes(limit: Optional[int] = None) -> int:
+    """Досчитывает sha256 для строк индекса, где он NULL. Коммит на пачку."""
+    root = _upload_root()
+    done = 0
+    while limit is None or done < limit:
+        paths = [r[0] for r in db.session.execute(
+            text('SELECT path FROM media_files WHERE sha256 IS NULL ORDER BY path LIMIT :n'),
+            {'n': _HASH_BATCH},
+        ).all()]
+        if not paths:
+            break
+        hashed, missing = [], []
+        for rel in paths:
+            try:
+                hashed.append((rel, file_delivery.content_sha256(os.path.join(root, rel))))
+            except OSError:
+                missing.append(rel)
+        if hashed:
+            db.session.execute(
+                text("""
+                    UPDATE media_files mf SET sha256 = h.sha
+                    FROM unnest(CAST(:paths AS VARCHAR[]), CAST(:shas AS VARCHAR[])) AS h(path, sha)
+                    WHERE mf.path = h.path
+                """),
+                {'paths': [h[0] for h in hashed], 'shas': [h[1] for h in hashed]},
+            )
+        if missing:
+            db.session.execute(
+                text('DELETE FROM media_files WHERE path = ANY(CAST(:paths AS VARCHAR[]))'),
+                {'paths': missing},
+            )
+        db.session.commit()
+        done += len(paths)
+    return done
+
+
+def start_reconcile_loop(app, interval_seconds: int) -> None:
+    """
+    Фоновая периодическая сверка в каждом воркере. Старт со случайной
+    задержкой, чтобы воркеры не ломились одновременно; лишние прогоны
+    отсекает advisory lock.
+    """
+    if interval_seconds <= 0:
+        return
+
+    def loop():
+        time.sleep(30 + random.uniform(0, 60))
+        while True:
+            with app.app_context():
+                try:
+                    stats = reconcile()
+                    if stats:
+                        print(f"ℹ️ media_index reconcile: {stats}")
+                    gc_stats = blob_store.collect_garbage()
+                    if gc_stats:
+                        print(f"ℹ️ blob_store GC: {gc_stats}")
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"⚠️ media_index reconcile: {e}")
+                finally:
+                    db.session.remove()
+            time.sleep(interval_seconds)
+
+    threading.Thread(target=loop, name='media-index-reconcile', daemon=True).start()
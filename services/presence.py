@@ -0,0 +1,148 @@
+"""
+Presence: heartbeat'ы админских вкладок и локальных воркеров без записи
+в основные таблицы на каждый удар.
+
+Раньше /auth/heartbeat (каждая открытая вкладка админки),
+/internal/integrations/<type>/heartbeat и /internal/collector/heartbeat
+(каждые 5 сек) читали строку и коммитили UPDATE system_users /
+integration_settings / collector_worker — поток мелких пишущих транзакций
+и мёртвых версий строк в таблицах, которые больше ни для чего не
+меняются. Теперь:
+
+  - `beat(key)` кладёт отметку в память процесса и не чаще раза в
+    FLUSH_SECONDS (на ключ в процессе) пишет её в UNLOGGED-таблицу
+    presence_heartbeat — без WAL, одна узкая строка на ключ. UPSERT
+    с условием: если другой gunicorn-воркер записал ключ меньше
+    SKIP_SECONDS назад, строка не трогается, а процесс не считает ключ
+    записанным и пробует снова на следующем ударе. Так отметка в
+    таблице отстаёт от последнего удара не больше чем на FLUSH_SECONDS
+    при любом числе воркеров;
+  - читатели (`last_seen`, `is_online`) берут максимум из своей памяти и
+    снимка таблицы, который перечитывается не чаще READ_POLL_SECONDS;
+  - долговечные колонки (system_users.last_seen и т.п.) роут обновляет,
+    когда `beat()` вернул True, — раз в PERSIST_SECONDS на ключ в
+    процессе. Они нужны как «был в последний раз» после рестарта БД:
+    UNLOGGED-таблица после сбоя Postgres очищается.
+
+Отметки — naive UTC, как last_heartbeat_at в моделях.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import text
+
+from extensions import db
+
+
+FLUSH_SECONDS = 5
+SKIP_SECONDS = FLUSH_SECONDS // 2
+PERSIST_SECONDS = 300
+READ_POLL_SECONDS = 1.0
+
+_lock = threading.Lock()
+_local: dict[str, datetime] = {}
+_flushed_at: dict[str, float] = {}
+_persisted_at: dict[str, float] = {}
+_shared: dict[str, datetime] = {}
+_shared_fetched_at = 0.0
+
+
+def install() -> None:
+    """Таблица presence_heartbeat. Идемпотентно, зовётся на старте. Не коммитит."""
+    # fillfactor — место под HOT-обновления: строка переписывается на той
+    # же странице, индекс не трогается.
+    db.session.execute(text("""
+        CREATE UNLOGGED TABLE IF NOT EXISTS presence_heartbeat (
+            key VARCHAR(100) PRIMARY KEY,
+            seen_at TIMESTAMP NOT NULL
+        ) WITH (fillfactor = 50)
+    """))
+
+
+def beat(key: str) -> bool:
+    """
+    Отметить ключ живым. Возвращает True, если пора обновить долговечную
+    отметку (раз в PERSIST_SECONDS на ключ в процессе, первый удар — да).
+    Сама запись в presence_heartbeat коммитится здесь же.
+    """
+    now = datetime.utcnow()
+    mono = time.monotonic()
+    with _lock:
+        _local[key] = now
+        previous_flush = _flushed_at.get(key, float('-inf'))
+        flush = mono - previous_flush >= FLUSH_SECONDS
+        persist = mono - _persisted_at.get(key, float('-inf')) >= PERSIST_SECONDS
+        if flush:
+            _flushed_at[key] = mono
+        if persist:
+            _persisted_at[key] = mono
+
+    if flush:
+        written = False
+        try:
+            written = db.session.execute(
+                text("""
+                    INSERT INTO presence_heartbeat (key, seen_at) VALUES (:key, :now)
+                    ON CONFLICT (key) DO UPDATE SET seen_at = EXCLUDED.seen_at
+                    WHERE presence_heartbeat.seen_at < EXCLUDED.seen_at - make_interval(secs => :skip)
+                    RETURNING 1
+                """),
+                {'key': key, 'now': now, 'skip': SKIP_SECONDS},
+            ).first() is not None
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ presence: не удалось записать {key}: {e}")
+        if not written:
+            # Строку освежил другой воркер (или запись не удалась) — наша
+            # отметка в таблицу не попала, следующий удар попробует снова.
+            with _lock:
+                if _flushed_at.get(key) == mono:
+                    _flushed_at[key] = previous_flush
+    return persist
+
+
+def _refresh_shared() -> None:
+    global _shared_fetched_at
+    mono = time.monotonic()
+    if mono - _shared_fetched_at < READ_POLL_SECONDS:
+        return
+    try:
+        rows = db.session.execute(text('SELECT key, seen_at FROM presence_heartbeat')).all()
+    except Exception as e:
+        db.session.rollback()
+        print(f"⚠️ presence: не удалось прочитать presence_heartbeat: {e}")
+        rows = []
+    with _lock:
+        _shared.clear()
+        _shared.update(rows)
+        _shared_fetched_at = mono
+
+
+def _merged(key: str) -> Optional[datetime]:
+    local, shared = _local.get(key), _shared.get(key)
+    if local is None or shared is None:
+        return local or shared
+    return max(local, shared)
+
+
+def last_seen(key: str) -> Optional[datetime]:
+    _refresh_shared()
+    with _lock:
+        return _merged(key)
+
+
+def last_seen_prefix(prefix: str) -> dict[str, datetime]:
+    """Все ключи с префиксом ('user:' → {'user:5': ...})."""
+    _refresh_shared()
+    with _lock:
+        keys = {k for k in _local if k.startswith(prefix)} | {k for k in _shared if k.startswith(prefix)}
+        return {k: _merged(k) for k in keys}
+
+
+def is_online(key: str, timeout_sec: float) -> bool:
+    seen = last_seen(key)
+    return seen is not None and datetime.utcnow() - seen < timedelta(seconds=timeout_sec)
@@ -0,0 +1,93 @@
+"""Счётчик ссылок блобов: строки, созданные по url из JSON, держат блоб от GC."""
+
+import hashlib
+import os
+import uuid
+
+from sqlalchemy import text
+
+from extensions import db
+from services import blob_store
+
+
+def _old_blob(app) -> tuple[str, str, str]:
+    """Блоб без ссылок, старше GC_GRACE — ровно то, что GC удаляет."""
+    content = uuid.uuid4().bytes * 64
+    sha = hashlib.sha256(content).hexdigest()
+    path = os.path.join(app.config['UPLOAD_FOLDER'], blob_store.blob_rel_path(sha, 'jpg'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    db.session.execute(
+        text("""
+            INSERT INTO media_blobs (sha256, ext, size, mime_type, ref_count, created_at, updated_at)
+            VALUES (:sha, 'jpg', :size, 'image/jpeg', 0,
+                    NOW() - make_interval(secs => :age), NOW() - make_interval(secs => :age))
+        """),
+        {'sha': sha, 'size': len(content), 'age': blob_store.GC_GRACE_SECONDS * 2},
+    )
+    db.session.commit()
+    return sha, blob_store.blob_url(sha, 'jpg'), path
+
+
+def _age(sha: str) -> None:
+    db.session.execute(
+        text('UPDATE media_blobs SET updated_at = NOW() - make_interval(secs => :age) WHERE sha256 = :sha'),
+        {'sha': sha, 'age': blob_store.GC_GRACE_SECONDS * 2},
+    )
+    db.session.commit()
+
+
+def _ref_count(sha: str):
+    return db.session.execute(
+        text('SELECT ref_count FROM media_blobs WHERE sha256 = :sha'), {'sha': sha}
+    ).scalar()
+
+
+def test_json_url_media_row_survives_gc(app, client, product):
+    with app.app_context():
+        sha, url, path = _old_blob(app)
+
+    response = client.post(f'/upload/media/{product}', json={'url': url, 'media_type': 'image'})
+    assert response.status_code == 201
+
+    with app.app_context():
+        blob_sha256 = db.session.execute(
+            text('SELECT blob_sha256 FROM product_media WHERE id = :id'), {'id': response.get_json()['id']}
+        ).scalar()
+        assert blob_sha256 == sha
+        assert _ref_count(sha) == 1
+
+        _age(sha)
+        assert blob_store.collect_garbage() is not None
+        assert _ref_count(sha) == 1
+    assert os.path.exists(path)
+
+
+def test_json_url_document_row_survives_gc(app, client, product):
+    with app.app_context():
+        sha, url, path = _old_blob(app)
+
+    response = client.post(f'/upload/documents/{product}', json={'filename': 'manual.pdf', 'url': url})
+    assert response.status_code == 201
+
+    with app.app_context():
+        _age(sha)
+        assert blob_store.collect_garbage() is not None
+        assert _ref_count(sha) == 1
+    assert os.path.exists(path)
+
+
+def test_recount_counts_rows_without_blob_sha256(app, product):
+    # Строка из времён до колонки blob_sha256: ссылка только в url.
+    with app.app_context():
+        sha, url, path = _old_blob(app)
+        db.session.execute(
+            text("INSERT INTO product_media (product_id, url, media_type, \"order\") VALUES (:pid, :url, 'image', 0)"),
+            {'pid': product, 'url': url},
+        )
+        db.session.commit()
+
+        assert blob_store.collect_garbage() is not None
+        assert _ref_count(sha) == 1
+    assert os.path.exists(path)
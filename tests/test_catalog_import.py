@@ -0,0 +1,117 @@
+"""Пакетный импорт: цены закупок считаются на пачку, а не на строку."""
+
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+from extensions import db
+from services import catalog_import
+
+
+@pytest.fixture
+def warehouses(app):
+    """
+    (in_stock_wh, other_wh, in_stock_supplier): склад A — формула
+    `себестоимость * курс_валюты` при курсе 2, склад B — переменная
+    `наценка` = 3 и формула `себестоимость * наценка`.
+    """
+    from models.currency import Currency
+    from models.supplier import Supplier
+    from models.warehouse import Warehouse, WarehouseFormula, WarehouseVariable
+
+    suffix = uuid.uuid4().hex[:8]
+    with app.app_context():
+        currency = Currency(name=f'Тест {suffix}', code=f'T{suffix}'[:10], rate_to_tenge=2.0)
+        suppliers = [Supplier(name=f'Тест {suffix} A'), Supplier(name=f'Тест {suffix} B')]
+        db.session.add_all([currency, *suppliers])
+        db.session.flush()
+        wh_a = Warehouse(supplier_id=suppliers[0].id, name=f'Тест {suffix} A', currency_id=currency.id)
+        wh_b = Warehouse(supplier_id=suppliers[1].id, name=f'Тест {suffix} B', currency_id=currency.id)
+        db.session.add_all([wh_a, wh_b])
+        db.session.flush()
+        db.session.add_all([
+            WarehouseFormula(warehouse_id=wh_a.id, formula='себестоимость * курс_валюты'),
+            WarehouseFormula(warehouse_id=wh_b.id, formula='себестоимость * наценка'),
+            WarehouseVariable(warehouse_id=wh_b.id, name='наценка', formula='3', sort_order=0),
+        ])
+        db.session.commit()
+        ids = (wh_a.id, wh_b.id, suppliers[1].id)
+        cleanup = {'whs': [wh_a.id, wh_b.id], 'suppliers': [s.id for s in suppliers], 'currency': currency.id}
+
+    yield ids
+
+    with app.app_context():
+        for table in ('product_warehouse_cost', 'warehouse_variable', 'warehouse_formula'):
+            db.session.execute(text(f'DELETE FROM {table} WHERE warehouse_id = ANY(:whs)'), cleanup)
+        db.session.execute(text('DELETE FROM warehouse WHERE id = ANY(:whs)'), cleanup)
+        db.session.execute(text('DELETE FROM supplier WHERE id = ANY(:suppliers)'), cleanup)
+        db.session.execute(text('DELETE FROM currency WHERE id = :currency'), cleanup)
+        db.session.commit()
+
+
+@pytest.fixture
+def imported_articles(app):
+    """Список article, которые тест заводит импортом; товары удаляются после теста."""
+    articles = []
+    yield articles
+
+    with app.app_context():
+        params = {'articles': articles}
+        for table in ('product_warehouse_cost', 'product_characteristic', 'product_media'):
+            db.session.execute(
+                text(f'DELETE FROM {table} WHERE product_id IN (SELECT id FROM product WHERE article = ANY(:articles))'),
+                params,
+            )
+        db.session.execute(text('DELETE FROM product WHERE article = ANY(:articles)'), params)
+        db.session.commit()
+
+
+def _import(warehouses, imported_articles, n):
+    wh_a, wh_b, _ = warehouses
+    rows = []
+    for i in range(n):
+        article = f'TEST-{uuid.uuid4().hex[:12]}'
+        imported_articles.append(article)
+        rows.append((i + 1, {
+            'article': article,
+            'name': f'Тестовый товар {article}',
+            'warehouse_costs': [
+                {'warehouse_id': wh_a, 'cost_price': 100.0, 'quantity': 0},
+                {'warehouse_id': wh_b, 'cost_price': 100.0, 'quantity': 5},
+            ],
+        }, None))
+    report = catalog_import.run_import(rows, chunk_size=n)
+    assert all(r['status'] != 'error' for r in report['results']), report['results']
+    return rows[-1][1]['article']
+
+
+def _pricing_statements(statements):
+    return [s for s in statements
+            if 'warehouse_variable' in s or 'warehouse_formula' in s or 'product_characteristic' in s]
+
+
+def test_costs_priced_once_per_chunk(app, warehouses, imported_articles, sql_statements):
+    with app.app_context():
+        _import(warehouses, imported_articles, 2)
+        small = len(_pricing_statements(sql_statements))
+        sql_statements.clear()
+        _import(warehouses, imported_articles, 40)
+        large = len(_pricing_statements(sql_statements))
+    assert large == small
+
+
+def test_min_price_prefers_in_stock_warehouse(app, warehouses, imported_articles):
+    _, _, in_stock_supplier = warehouses
+    with app.app_context():
+        article = _import(warehouses, imported_articles, 1)
+        row = db.session.execute(
+            text('SELECT id, price, quantity, supplier_id FROM product WHERE article = :a'), {'a': article},
+        ).one()
+        prices = dict(db.session.execute(
+            text('SELECT warehouse_id, calculated_price FROM product_warehouse_cost WHERE product_id = :id'),
+            {'id': row.id},
+        ).all())
+    assert sorted(prices.values()) == [200.0, 300.0]
+    # Склад A дешевле, но без остатка — цена, остаток и поставщик со склада B.
+    assert (row.price, row.quantity, row.supplier_id) == (300.0, 5, in_stock_supplier)
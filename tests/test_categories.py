@@ -0,0 +1,120 @@
+"""Категории: PUT /categories/<id> (parent_id) и closure при merge."""
+
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+from extensions import db
+from models.category import Category
+from services import category_closure
+
+
+@pytest.fixture
+def category_pair(app):
+    """(parent_id, child_id) — две тестовые категории, удаляются после теста."""
+    suffix = uuid.uuid4().hex[:12]
+    with app.app_context():
+        parent = Category(name=f'Тест {suffix}', slug=f'test-{suffix}')
+        db.session.add(parent)
+        db.session.flush()
+        category_closure.insert_node(parent.id, None)
+        child = Category(name=f'Тест {suffix} дочерняя', slug=f'test-{suffix}-child', parent_id=parent.id)
+        db.session.add(child)
+        db.session.flush()
+        category_closure.insert_node(child.id, parent.id)
+        db.session.commit()
+        ids = (parent.id, child.id)
+
+    yield ids
+
+    with app.app_context():
+        params = {'ids': list(ids)}
+        db.session.execute(
+            text('DELETE FROM category_closure WHERE ancestor_id = ANY(:ids) OR descendant_id = ANY(:ids)'),
+            params,
+        )
+        db.session.execute(text('DELETE FROM category WHERE id = ANY(:ids) AND parent_id IS NOT NULL'), params)
+        db.session.execute(text('DELETE FROM category WHERE id = ANY(:ids)'), params)
+        db.session.commit()
+
+
+def _put(client, child_id, parent_id):
+    suffix = uuid.uuid4().hex[:12]
+    return client.put(f'/categories/{child_id}', json={
+        'name': f'Тест {suffix}', 'slug': f'test-{suffix}', 'parent_id': parent_id,
+    })
+
+
+def test_string_parent_id_is_not_a_move(client, category_pair, monkeypatch):
+    parent_id, child_id = category_pair
+
+    def fail(*args, **kwargs):
+        raise AssertionError('move_subtree вызван для того же родителя')
+
+    monkeypatch.setattr(category_closure, 'move_subtree', fail)
+    response = _put(client, child_id, str(parent_id))
+    assert response.status_code == 200
+    assert response.get_json()['parent_id'] == parent_id
+
+
+def test_invalid_parent_id_rejected(app, client, category_pair):
+    parent_id, child_id = category_pair
+    assert _put(client, child_id, 'abc').status_code == 400
+    with app.app_context():
+        assert db.session.get(Category, child_id).parent_id == parent_id
+
+
+@pytest.fixture
+def category_tree(app):
+    """(target, source, child, grandchild): два корня, у source — ветка из двух уровней."""
+    suffix = uuid.uuid4().hex[:12]
+    with app.app_context():
+        ids = []
+        for name, parent in (('target', None), ('source', None), ('child', 1), ('grandchild', 2)):
+            category = Category(
+                name=f'Тест {suffix} {name}', slug=f'test-{suffix}-{name}',
+                parent_id=ids[parent] if parent is not None else None,
+            )
+            db.session.add(category)
+            db.session.flush()
+            category_closure.insert_node(category.id, category.parent_id)
+            ids.append(category.id)
+        db.session.commit()
+
+    yield tuple(ids)
+
+    with app.app_context():
+        params = {'ids': ids}
+        db.session.execute(text('UPDATE category SET parent_id = NULL WHERE id = ANY(:ids)'), params)
+        db.session.execute(text('DELETE FROM category WHERE id = ANY(:ids)'), params)
+        db.session.commit()
+
+
+def _closure(ids):
+    return {tuple(row) for row in db.session.execute(
+        text('SELECT ancestor_id, descendant_id, depth FROM category_closure '
+             'WHERE ancestor_id = ANY(:ids) OR descendant_id = ANY(:ids)'),
+        {'ids': list(ids)},
+    )}
+
+
+def test_single_merge_moves_closure_without_rebuild(app, client, admin_headers, category_tree, monkeypatch):
+    target, source, child, grandchild = category_tree
+
+    def fail():
+        raise AssertionError('merge одной пары пересобрал closure целиком')
+
+    monkeypatch.setattr(category_closure, 'rebuild', fail)
+    response = client.post('/api/admin/categories/merge',
+                           json={'source_id': source, 'target_id': target}, headers=admin_headers)
+    assert response.status_code == 200, response.get_json()
+    monkeypatch.undo()
+
+    with app.app_context():
+        after = _closure(category_tree)
+        category_closure.rebuild()
+        expected = _closure(category_tree)
+        db.session.rollback()
+    assert after == expected
+    assert (target, grandchild, 2) in after
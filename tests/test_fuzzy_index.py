@@ -0,0 +1,89 @@
+"""
+TrigramIndex против полного перебора SequenceMatcher — без БД.
+
+Набор: типичные имена категорий и их «опечатки» (обрезанный хвост,
+пропущенная и переставленная буква, регистр, лишняя буква).
+"""
+
+from itertools import combinations
+
+import pytest
+
+from utils.fuzzy_index import TrigramIndex, default_gram_floor, ratio
+
+
+# services/category_resolver.FUZZY_THRESHOLD и значение по умолчанию в
+# /api/admin/categories/find-similar.
+PRODUCTION_THRESHOLD = 0.85
+
+BASE_NAMES = (
+    'Ноутбуки', 'Мониторы', 'Клавиатуры', 'Мыши компьютерные', 'Принтеры лазерные',
+    'Принтеры струйные', 'Сканеры', 'Источники бесперебойного питания', 'Сетевые фильтры',
+    'Кабели HDMI', 'Кабели USB', 'Жёсткие диски', 'Твердотельные накопители',
+    'Оперативная память', 'Видеокарты', 'Процессоры', 'Материнские платы', 'Блоки питания',
+    'Корпуса', 'Кулеры для процессоров', 'Маршрутизаторы', 'Коммутаторы', 'Точки доступа Wi-Fi',
+    'IP-камеры', 'Видеорегистраторы', 'Кассовые аппараты', 'Сканеры штрихкода',
+    'Принтеры этикеток', 'Денежные ящики', 'POS-терминалы', 'Весы торговые', 'Термоленты',
+    'Чековая лента', 'Фискальные накопители', 'Дисплеи покупателя',
+)
+
+
+def _variants(name):
+    return [
+        name,
+        name[:-1],
+        name[:3] + name[4:],
+        name[:2] + name[3] + name[2] + name[4:],
+        name.lower(),
+        name + 'и',
+    ]
+
+
+NAMES = [variant for name in BASE_NAMES for variant in _variants(name)]
+
+
+def _brute_force(threshold):
+    return {
+        (i, j) for i, j in combinations(range(len(NAMES)), 2)
+        if ratio(NAMES[i], NAMES[j]) >= threshold
+    }
+
+
+def _indexed(threshold):
+    index = TrigramIndex(enumerate(NAMES), gram_floor=default_gram_floor(threshold))
+    return {(min(a, b), max(a, b)) for a, b, _ in index.pairs(threshold)}
+
+
+def test_pairs_match_brute_force_at_production_threshold():
+    expected = _brute_force(PRODUCTION_THRESHOLD)
+    assert expected
+    assert _indexed(PRODUCTION_THRESHOLD) == expected
+
+
+@pytest.mark.parametrize('threshold', [0.85, 0.75, 0.6, 0.5])
+def test_no_extra_pairs(threshold):
+    # ratio кандидатов считается тем же SequenceMatcher — индекс может
+    # только пропустить пару, но не добавить лишнюю.
+    assert _indexed(threshold) <= _brute_force(threshold)
+
+
+def test_recall_below_production_threshold():
+    # Известное ограничение (см. docstring utils/fuzzy_index.py): при 0.5
+    # gram_floor упирается в MIN_GRAM_FLOOR и теряется ~16% пар. Тест
+    # фиксирует нижнюю границу, чтобы деградация не прошла незаметно.
+    expected = _brute_force(0.5)
+    recall = len(_indexed(0.5) & expected) / len(expected)
+    assert recall >= 0.8
+
+
+def test_best_matches_brute_force():
+    index = TrigramIndex(enumerate(BASE_NAMES))
+    for name in NAMES:
+        scored = [(ratio(base, name), i) for i, base in enumerate(BASE_NAMES)]
+        top_ratio, _ = max(scored)
+        best = index.best(name, PRODUCTION_THRESHOLD)
+        if top_ratio >= PRODUCTION_THRESHOLD:
+            assert best is not None
+            assert ratio(BASE_NAMES[best], name) == top_ratio
+        else:
+            assert best is None
@@ -0,0 +1,37 @@
+"""Карточка товара по slug: один SQL на промах кэша, ноль — на попадание."""
+
+import uuid
+
+
+def _detail_queries(statements):
+    # Опрос поколений кэша ответов (раз в VERSION_POLL_SECONDS) — не в счёт.
+    return [s for s in statements if 'response_cache_version' not in s]
+
+
+def test_product_by_slug_is_one_query(client, product, product_slug, sql_statements):
+    sql_statements.clear()
+    # Свой query string — свой ключ кэша, гарантированный промах.
+    response = client.get(f'/products/{product_slug}?t={uuid.uuid4().hex}')
+
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['id'] == product
+    assert len(_detail_queries(sql_statements)) == 1
+
+
+def test_product_by_slug_cache_hit_skips_detail_query(client, product_slug, sql_statements):
+    path = f'/products/{product_slug}?t={uuid.uuid4().hex}'
+    assert client.get(path).status_code == 200
+
+    sql_statements.clear()
+    response = client.get(path)
+
+    assert response.status_code == 200
+    assert _detail_queries(sql_statements) == []
+
+
+def test_missing_slug_is_404_in_one_query(client, sql_statements):
+    sql_statements.clear()
+    response = client.get(f'/products/no-such-{uuid.uuid4().hex}')
+
+    assert response.status_code == 404
+    assert len(_detail_queries(sql_statements)) == 1
@@ -0,0 +1,104 @@
+"""
+Бюджеты SQL (`@query_budget`) на самых «дорогих» ветках эндпоинтов.
+
+Приложение в режиме QUERY_BUDGET_MODE=raise (tests/conftest.py):
+превышение бюджета превращает ответ в 500 с отчётом query_budget_exceeded.
+"""
+
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+from extensions import db
+from services import change_feed
+
+
+def _assert_within_budget(response):
+    body = response.get_json(silent=True)
+    assert response.status_code == 200, body
+    assert 'X-Query-Count' in response.headers
+
+
+def test_products_bulk(client, product):
+    _assert_within_budget(client.get(f'/products/bulk?ids={product},0'))
+
+
+@pytest.mark.parametrize('admin', [False, True])
+def test_product_changes(client, admin_headers, admin):
+    headers = admin_headers if admin else {}
+    _assert_within_budget(client.get('/products/changes?since=0&limit=500', headers=headers))
+
+
+def test_product_changes_under_write_contention(app, client, admin_headers):
+    # Пишущая транзакция держит разделяемый lock горизонта — все попытки
+    # pg_try_advisory_xact_lock проваливаются, лента отвечает retry_after.
+    with app.app_context():
+        with db.engine.connect() as writer:
+            writer.execute(text('SELECT pg_advisory_lock_shared(:k)'), {'k': change_feed._HORIZON_LOCK_KEY})
+            try:
+                response = client.get('/products/changes?since=0', headers=admin_headers)
+            finally:
+                writer.execute(text('SELECT pg_advisory_unlock_shared(:k)'), {'k': change_feed._HORIZON_LOCK_KEY})
+    _assert_within_budget(response)
+    assert response.get_json()['data']['horizon'] is None
+
+
+def test_products_admin_list(client, admin_headers, product):
+    # Все ветки с запросами: поиск-проба, бренд по имени, пагинация.
+    response = client.get(
+        '/products/?page=1&per_page=50&search=Тестовый&brand=no-such-brand',
+        headers=admin_headers,
+    )
+    _assert_within_budget(response)
+
+
+def test_product_by_slug(client, product_slug):
+    _assert_within_budget(client.get(f'/products/{product_slug}?t={uuid.uuid4().hex}'))
+
+
+def test_product_search_with_facets_and_attr_filters(client, product):
+    # Бюджет рассчитан на 7 attr-фильтров — каждый добавляет 2 SQL в facets.
+    attrs = '&'.join(f'attr[{900000 + i}]=0..1000' for i in range(7))
+    response = client.get(
+        f'/products/search?q=Тестовый&category_ids=1,2&with_facets=1&page=1&per_page=100&{attrs}'
+    )
+    _assert_within_budget(response)
+
+
+@pytest.fixture
+def homepage_blocks(app, product):
+    """По активному блоку каждого типа — все выборки главной срабатывают."""
+    from models.homepage_block import HomepageBlock
+    from models.homepage_block_title import HomepageBlockItem
+
+    types = ('categories', 'brands', 'benefits', 'products', 'small_banners', 'section_cards')
+    with app.app_context():
+        blocks = [HomepageBlock(title=f'test {t}', type=t, order=10000 + i, active=True)
+                  for i, t in enumerate(types)]
+        db.session.add_all(blocks)
+        db.session.flush()
+        db.session.add_all(
+            HomepageBlockItem(block_id=b.id, item_id=product if b.type == 'products' else 1, order=0)
+            for b in blocks
+        )
+        db.session.commit()
+        block_ids = [b.id for b in blocks]
+
+    yield block_ids
+
+    with app.app_context():
+        params = {'ids': block_ids}
+        db.session.execute(text('DELETE FROM homepage_block_items WHERE block_id = ANY(:ids)'), params)
+        db.session.execute(text('DELETE FROM homepage_blocks WHERE id = ANY(:ids)'), params)
+        db.session.commit()
+
+
+def test_public_homepage(client, homepage_blocks):
+    _assert_within_budget(client.get(f'/api/public/homepage?t={uuid.uuid4().hex}'))
+
+
+@pytest.mark.parametrize('admin', [False, True])
+def test_public_catalog_categories(client, admin_headers, admin):
+    headers = admin_headers if admin else {}
+    _assert_within_budget(client.get(f'/api/public/catalog/categories?t={uuid.uuid4().hex}', headers=headers))
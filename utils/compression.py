@@ -0,0 +1,173 @@
+"""
+Сжатие ответов gzip / brotli по Accept-Encoding.
+
+Каталожный JSON (/api/public/catalog/categories, /products/search,
+/products/articles-map) и SVG/JSON из uploads хорошо жмутся в 5–10 раз,
+а без сжатия уходят из Flask как есть. Здесь:
+
+  - after_request-хук: ответ 200/201 текстового типа (JSON, text/*, SVG,
+    XML, JS) от COMPRESS_MIN_BYTES и больше сжимается выбранной клиентом
+    кодировкой (br, если установлен brotli, иначе gzip). Потоковые ответы
+    (json_provider.stream_array/stream_object) сжимаются на лету по
+    пачкам — первые байты по-прежнему уходят сразу. text/event-stream,
+    send_file (direct_passthrough) и ответы с уже заданным
+    Content-Encoding не трогаются;
+  - choose() / encode() — для кода, который хранит сжатые байты сам:
+    utils/response_cache.py держит их рядом с телом записи (повторные
+    попадания в кэш не жмут заново), utils/file_delivery.py — для
+    небольших файлов из uploads;
+  - `@compress_level(gzip=..., br=...)` — бюджет CPU на роут: уровень
+    вместо COMPRESS_GZIP_LEVEL / COMPRESS_BR_LEVEL из конфига, 0 —
+    кодировка на роуте выключена. Ставится сразу под `@bp.route(...)`,
+    как и `@query_budget`.
+
+Strong ETag сжатого ответа становится weak (W/"..."): байты другие, а
+If-None-Match сравнивается слабо, так что 304 работает для обоих
+вариантов. Если сжимает фронтовой nginx, уровни можно обнулить.
+"""
+
+import zlib
+from typing import Iterable, Iterator, Optional
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - зависит от окружения
+    brotli = None
+
+
+DEFAULT_MIN_BYTES = 1024
+DEFAULT_LEVELS = {'br': 4, 'gzip': 6}
+COMPRESSIBLE_TYPES = frozenset((
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+))
+# SSE: прокси и EventSource ждут каждое событие сразу, сжатие их задержит.
+SKIP_TYPES = frozenset(('text/event-stream',))
+COMPRESS_STATUSES = frozenset((200, 201))
+
+
+def compress_level(gzip: Optional[int] = None, br: Optional[int] = None):
+    """
+    Уровни сжатия для view: None — из конфига, 0 — не сжимать этой
+    кодировкой. Ставится сразу под `@bp.route(...)`.
+    """
+    def decorator(fn):
+        fn.compress_level = {'gzip': gzip, 'br': br}
+        return fn
+    return decorator
+
+
+def compressible(mimetype: Optional[str]) -> bool:
+    if not mimetype or mimetype in SKIP_TYPES:
+        return False
+    return mimetype in COMPRESSIBLE_TYPES or mimetype.startswith('text/')
+
+
+def _levels() -> dict:
+    config = current_app.config
+    levels = {
+        'br': config.get('COMPRESS_BR_LEVEL', DEFAULT_LEVELS['br']) if brotli is not None else 0,
+        'gzip': config.get('COMPRESS_GZIP_LEVEL', DEFAULT_LEVELS['gzip']),
+    }
+    view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+    for encoding, level in (getattr(view, 'compress_level', None) or {}).items():
+        if level is not None and levels[encoding] > 0:
+            levels[encoding] = level
+    return levels
+
+
+def choose(mimetype: Optional[str], size: Optional[int] = None) -> Optional[tuple]:
+    """
+    (кодировка, уровень) для текущего запроса или None — сжимать не
+    нужно. size=None — длина заранее неизвестна (поток).
+    """
+    if not compressible(mimetype):
+        return None
+    if size is not None and size < current_app.config.get('COMPRESS_MIN_BYTES', DEFAULT_MIN_BYTES):
+        return None
+    levels = _levels()
+    offered = [encoding for encoding in ('br', 'gzip') if levels[encoding] > 0]
+    if not offered:
+        return None
+    encoding = request.accept_encodings.best_match(offered)
+    if encoding is None:
+        return None
+    return encoding, levels[encoding]
+
+
+def encode(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return zlib.compress(data, level, wbits=zlib.MAX_WBITS | 16)
+
+
+def _encode_stream(chunks: Iterable[bytes], encoding: str, level: int) -> Iterator[bytes]:
+    # Сброс после каждой пачки: клиент получает данные по мере генерации,
+    # а не в конце потока. close() исходного итератора — чтобы
+    # stream_with_context закрыл контекст запроса и при обрыве клиента.
+    try:
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=level)
+            for chunk in chunks:
+                if chunk:
+                    yield compressor.process(chunk) + compressor.flush()
+            yield compressor.finish()
+        else:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+            for chunk in chunks:
+                if chunk:
+                    yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            yield compressor.flush()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def mark_encoded(response, encoding: str) -> None:
+    """Заголовки сжатого ответа: Content-Encoding, Vary, weak ETag."""
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def _after_request(response):
+    if (response.status_code not in COMPRESS_STATUSES
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or 'no-transform' in response.headers.get('Cache-Control', '')
+            or not compressible(response.mimetype)):
+        return response
+
+    if response.is_streamed:
+        choice = choose(response.mimetype)
+        response.vary.add('Accept-Encoding')
+        if choice is None:
+            return response
+        response.response = _encode_stream(response.response, *choice)
+        response.headers.pop('Content-Length', None)
+        mark_encoded(response, choice[0])
+        return response
+
+    body = response.get_data()
+    if len(body) >= current_app.config.get('COMPRESS_MIN_BYTES', DEFAULT_MIN_BYTES):
+        response.vary.add('Accept-Encoding')
+    choice = choose(response.mimetype, len(body))
+    if choice is None:
+        return response
+    encoded = encode(body, *choice)
+    if len(encoded) >= len(body):
+        return response
+    response.set_data(encoded)
+    mark_encoded(response, choice[0])
+    return response
+
+
+def init_app(app) -> None:
+    app.after_request(_after_request)
@@ -0,0 +1,183 @@
+"""
+Отдача файлов из UPLOAD_FOLDER: strong ETag, immutable-кэш, Range, offload
+тела на фронтовой прокси.
+
+  - ETag — sha256 содержимого (считается один раз на (путь, size, mtime)
+    и запоминается в процессе). Для файлов больше HASH_MAX_BYTES (видео,
+    архивы драйверов) — `size-mtime_ns`: файлы в uploads не
+    перезаписываются на месте, а читать 500МБ ради заголовка дороже, чем
+    отдать сам файл.
+  - immutable=True (блобы: имя — хэш содержимого) → `Cache-Control:
+    public, max-age=31536000, immutable`; остальное — `public, no-cache`
+    и ревалидация по If-None-Match (304 без тела).
+  - Range / If-Range отдаёт werkzeug (send_file с conditional=True).
+  - UPLOADS_X_ACCEL_PREFIX в конфиге (nginx internal location, например
+    `/_uploads/`) — тело отдаёт nginx по `X-Accel-Redirect`, поток
+    gunicorn освобождается сразу после заголовков. USE_X_SENDFILE — то же
+    для Apache/lighttpd средствами самого Flask.
+  - SVG/JSON и прочий текст до COMPRESS_FILE_MAX_BYTES без Range —
+    сжатым телом (utils/compression.py) из LRU в памяти процесса: файл
+    жмётся один раз на (ETag, кодировку, уровень). За X-Accel-Redirect
+    сжимает сам nginx (gzip_types).
+"""
+
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+
+from flask import Response, abort, current_app, request, send_file
+from werkzeug.security import safe_join
+
+from utils import compression
+
+
+HASH_MAX_BYTES = 64 * 1024 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+COMPRESS_FILE_MAX_BYTES = 2 * 1024 * 1024
+
+_hashes: 'OrderedDict[str, tuple]' = OrderedDict()
+_HASHES_MAX = 8192
+_hash_lock = threading.Lock()
+
+_encoded: 'OrderedDict[tuple, bytes]' = OrderedDict()
+_ENCODED_MAX_BYTES = 64 * 1024 * 1024
+_encoded_bytes = 0
+_encoded_lock = threading.Lock()
+
+
+def content_sha256(path, st=None):
+    """sha256 файла; пересчитывается только при смене size/mtime."""
+    st = st or os.stat(path)
+    with _hash_lock:
+        cached = _hashes.get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            _hashes.move_to_end(path)
+            return cached[2]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    sha = digest.hexdigest()
+    with _hash_lock:
+        _hashes[path] = (st.st_size, st.st_mtime_ns, sha)
+        while len(_hashes) > _HASHES_MAX:
+            _hashes.popitem(last=False)
+    return sha
+
+
+def content_etag(path, st=None):
+    st = st or os.stat(path)
+    if st.st_size > HASH_MAX_BYTES:
+        return f'{st.st_size:x}-{st.st_mtime_ns:x}'
+    return content_sha256(path, st)[:32]
+
+
+def _apply_cache_headers(response, immutable):
+    if immutable:
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'public, no-cache'
+
+
+def send_path(path, st=None, mimetype=None, etag=None, immutable=False,
+              as_attachment=False, download_name=None):
+    """Ответ с файлом по абсолютному пути (внутри UPLOAD_FOLDER)."""
+    try:
+        st = st or os.stat(path)
+    except OSError:
+        abort(404)
+    etag = etag or content_etag(path, st)
+
+    accel_prefix = current_app.config.get('UPLOADS_X_ACCEL_PREFIX')
+    if accel_prefix:
+        rel = os.path.relpath(path, current_app.config['UPLOAD_FOLDER'])
+        if not rel.startswith('..'):
+            return _accel_response(path, st, rel, accel_prefix, mimetype, etag, immutable,
+                                   as_attachment, download_name)
+
+    if not as_attachment and request.range is None and st.st_size <= COMPRESS_FILE_MAX_BYTES:
+        file_mimetype = mimetype or mimetypes.guess_type(path)[0]
+        choice = compression.choose(file_mimetype, st.st_size)
+        if choice is not None:
+            return _encoded_response(path, st, file_mimetype, etag, immutable, choice)
+
+    response = send_file(
+        path,
+        mimetype=mimetype,
+        as_attachment=as_attachment,
+        download_name=download_name,
+        conditional=True,
+        etag=etag,
+        last_modified=st.st_mtime,
+    )
+    if compression.compressible(response.mimetype):
+        response.vary.add('Accept-Encoding')
+    _apply_cache_headers(response, immutable)
+    return response
+
+
+def _encoded_body(path, etag, choice):
+    global _encoded_bytes
+    key = (path, etag, choice)
+    with _encoded_lock:
+        body = _encoded.get(key)
+        if body is not None:
+            _encoded.move_to_end(key)
+            return body
+    with open(path, 'rb') as f:
+        body = compression.encode(f.read(), *choice)
+    with _encoded_lock:
+        if key not in _encoded:
+            _encoded[key] = body
+            _encoded_bytes += len(body)
+        while _encoded_bytes > _ENCODED_MAX_BYTES and _encoded:
+            _, evicted = _encoded.popitem(last=False)
+            _encoded_bytes -= len(evicted)
+    return body
+
+
+def _encoded_response(path, st, mimetype, etag, immutable, choice):
+    response = Response(_encoded_body(path, etag, choice), status=200, mimetype=mimetype)
+    response.set_etag(etag)
+    response.last_modified = st.st_mtime
+    compression.mark_encoded(response, choice[0])
+    _apply_cache_headers(response, immutable)
+    return response.make_conditional(request)
+
+
+def _accel_response(path, st, rel, accel_prefix, mimetype, etag, immutable,
+                    as_attachment, download_name):
+    # Заголовки (тип, Content-Disposition, ETag) готовит send_file, тело
+    # выбрасываем — его отдаст nginx, он же обработает Range.
+    response = send_file(
+        path,
+        mimetype=mimetype,
+        as_attachment=as_attachment,
+        download_name=download_name,
+        conditional=False,
+        etag=etag,
+        last_modified=st.st_mtime,
+    )
+    response.close()
+    accel = Response(status=200, headers={
+        k: v for k, v in response.headers.items()
+        if k.lower() not in ('content-length', 'cache-control')
+    })
+    _apply_cache_headers(accel, immutable)
+    accel = accel.make_conditional(request)
+    if accel.status_code == 200:
+        accel.headers['X-Accel-Redirect'] = (
+            accel_prefix.rstrip('/') + '/' + quote(rel.replace(os.sep, '/'))
+        )
+    return accel
+
+
+def send_upload(directory, filename, **kwargs):
+    """send_from_directory с заголовками кэша: 404 на выход за directory и на отсутствующий файл."""
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    return send_path(path, **kwargs)
@@ -0,0 +1,236 @@
+"""
+Уменьшенные копии картинок из /uploads/... по запросу: `?w=&h=&fmt=webp`.
+
+Оригиналы товаров — часто многомегабайтные JPEG/PNG с CDN поставщиков, а
+карточке каталога нужно ~480px. Поэтому:
+
+  - `send_variant(directory, filename, args)` — генерирует производную
+    (Pillow: draft-декодирование JPEG, thumbnail без апскейла, перекодировка)
+    один раз и кладёт в `UPLOAD_FOLDER/.variants/ab/<sha256>.<ext>`. Имя —
+    хэш от содержимого исходника + параметров, так что одинаковые картинки
+    разных товаров делят один файл, а заменённый исходник сам даёт новый
+    ключ;
+  - размеры прижимаются к сетке VARIANT_SIZES — произвольные ?w= не могут
+    раздуть кэш;
+  - объём кэша ограничен IMAGE_VARIANT_CACHE_MAX_BYTES: фоновая чистка
+    удаляет самые давно использованные файлы (mtime обновляется при
+    попадании, не чаще раза в час);
+  - `card_image_url(url)` — URL карточного размера для сериализаторов
+    списков товаров.
+
+Отдача (ETag, immutable для блобов, X-Accel-Redirect) — utils/file_delivery.py.
+
+Pillow — необязательная зависимость: без неё (или на битом файле) отдаётся
+оригинал.
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+from flask import current_app
+from werkzeug.security import safe_join
+
+from utils import file_delivery
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - зависит от окружения
+    Image = None
+    ImageOps = None
+
+
+VARIANT_DIR = '.variants'
+VARIANT_SIZES = (64, 128, 160, 240, 320, 480, 640, 800, 960, 1280, 1600, 1920)
+CARD_WIDTH = 480
+CARD_FORMAT = 'webp'
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+# Версия алгоритма в ключе — поменяли качество/ресемплинг, старые файлы
+# просто перестают находиться и вытесняются LRU.
+_KEY_VERSION = 'v1'
+_TOUCH_INTERVAL = 3600
+# После скольких записанных байт (доля от лимита) запускать чистку.
+_SWEEP_FRACTION = 0.05
+_SWEEP_TARGET = 0.9
+
+_RASTER_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp', 'bmp'}
+_FORMATS = {
+    # fmt → (PIL format, extension, mimetype, save kwargs)
+    'webp': ('WEBP', 'webp', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'png': ('PNG', 'png', 'image/png', {'optimize': True}),
+}
+_EXT_TO_FMT = {'jpg': 'jpeg', 'jpeg': 'jpeg', 'png': 'png', 'webp': 'webp', 'bmp': 'png'}
+
+# Полосатые локи: два потока одного процесса не генерируют один и тот же
+# вариант дважды. Между воркерами гонка безвредна — запись через rename.
+_gen_locks = [threading.Lock() for _ in range(64)]
+_sweep_lock = threading.Lock()
+_written_since_sweep = float('inf')  # первая запись после старта — сразу чистка
+
+
+def _snap(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    if value <= 0:
+        return None
+    for size in VARIANT_SIZES:
+        if size >= value:
+            return size
+    return VARIANT_SIZES[-1]
+
+
+def parse_variant_args(args):
+    """(w, h, fmt) из query string или None, если вариант не запрошен."""
+    if not any(k in args for k in ('w', 'h', 'fmt')):
+        return None
+    w = _snap(args.get('w'))
+    h = _snap(args.get('h'))
+    fmt = (args.get('fmt') or '').lower() or None
+    if fmt == 'jpg':
+        fmt = 'jpeg'
+    if fmt is not None and fmt not in _FORMATS:
+        fmt = None
+    if w is None and h is None and fmt is None:
+        return None
+    return w, h, fmt
+
+
+def card_image_url(url):
+    """URL карточного варианта для локальной растровой картинки, иначе url как есть."""
+    if not url or not url.startswith('/uploads/') or '?' in url:
+        return url
+    ext = url.rsplit('.', 1)[-1].lower() if '.' in url else ''
+    if ext not in _RASTER_EXTENSIONS:
+        return url
+    return f'{url}?w={CARD_WIDTH}&fmt={CARD_FORMAT}'
+
+
+def _render(src_path, dst_path, w, h, fmt):
+    pil_format, _, _, save_kwargs = _FORMATS[fmt]
+    with Image.open(src_path) as img:
+        box = (w or img.width, h or img.height)
+        # JPEG умеет декодироваться сразу в уменьшенном масштабе (1/2..1/8) —
+        # на больших фото это основная экономия CPU и памяти.
+        img.draft('RGB', box)
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail(box, Image.LANCZOS)
+        if pil_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        elif pil_format == 'WEBP' and img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'A' in img.getbands() or 'transparency' in img.info else 'RGB')
+        tmp_path = f'{dst_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            img.save(tmp_path, pil_format, **save_kwargs)
+            os.replace(tmp_path, dst_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def send_variant(directory, filename, args, immutable=False):
+    """
+    Ответ с производной картинкой или None — тогда вызывающий отдаёт
+    оригинал (вариант не запрошен, не растровый файл, нет Pillow, файл
+    не декодируется). immutable=True — исходник неизменяем по построению
+    (блоб с хэшем в имени), значит, неизменяем и вариант.
+    """
+    params = parse_variant_args(args)
+    if params is None or Image is None:
+        return None
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if ext not in _RASTER_EXTENSIONS:
+        return None
+    src_path = safe_join(directory, filename)
+    if src_path is None:
+        return None
+    try:
+        st = os.stat(src_path)
+    except OSError:
+        return None
+
+    w, h, fmt = params
+    fmt = fmt or _EXT_TO_FMT[ext]
+    _, out_ext, mimetype, _ = _FORMATS[fmt]
+
+    upload_root = current_app.config['UPLOAD_FOLDER']
+    try:
+        src_sha = file_delivery.content_sha256(src_path, st)
+    except OSError:
+        return None
+    key = hashlib.sha256(f'{src_sha}:{w}x{h}:{fmt}:{_KEY_VERSION}'.encode()).hexdigest()
+    variant_dir = os.path.join(upload_root, VARIANT_DIR, key[:2])
+    variant_path = os.path.join(variant_dir, f'{key}.{out_ext}')
+
+    try:
+        vst = os.stat(variant_path)
+        if time.time() - vst.st_mtime > _TOUCH_INTERVAL:
+            os.utime(variant_path)
+    except FileNotFoundError:
+        with _gen_locks[int(key[:2], 16) % len(_gen_locks)]:
+            if not os.path.exists(variant_path):
+                try:
+                    os.makedirs(variant_dir, exist_ok=True)
+                    _render(src_path, variant_path, w, h, fmt)
+                except Exception as e:
+                    print(f"⚠️ image_variants: не удалось сделать вариант {filename}: {e}")
+                    return None
+                _note_written(os.path.getsize(variant_path), upload_root)
+
+    return file_delivery.send_path(variant_path, mimetype=mimetype, etag=key[:32], immutable=immutable)
+
+
+def _note_written(nbytes, upload_root):
+    global _written_since_sweep
+    max_bytes = current_app.config.get('IMAGE_VARIANT_CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES)
+    _written_since_sweep += nbytes
+    if _written_since_sweep < max_bytes * _SWEEP_FRACTION:
+        return
+    if not _sweep_lock.acquire(blocking=False):
+        return
+    _written_since_sweep = 0
+    threading.Thread(
+        target=_sweep, args=(os.path.join(upload_root, VARIANT_DIR), max_bytes),
+        name='image-variants-sweep', daemon=True,
+    ).start()
+
+
+def _sweep(root, max_bytes):
+    """Удаляет самые давно использованные варианты, пока кэш больше лимита."""
+    try:
+        files = []
+        total = 0
+        with os.scandir(root) as shards:
+            for shard in shards:
+                if not shard.is_dir(follow_symlinks=False):
+                    continue
+                with os.scandir(shard.path) as entries:
+                    for entry in entries:
+                        try:
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        files.append((st.st_mtime, st.st_size, entry.path))
+                        total += st.st_size
+        if total <= max_bytes:
+            return
+        target = max_bytes * _SWEEP_TARGET
+        files.sort()
+        removed = 0
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        print(f"🧹 image_variants: удалено {removed} вариантов, в кэше {total // (1024 * 1024)}МБ")
+    except OSError as e:
+        print(f"⚠️ image_variants: чистка кэша не удалась: {e}")
+    finally:
+        _sweep_lock.release()
@@ -0,0 +1,120 @@
+"""
+Быстрая сериализация JSON для ответов.
+
+Списочные ручки собирают большие списки вложенных dict'ов и отдают их
+через jsonify: штатный провайдер Flask — это stdlib json с sort_keys и
+ensure_ascii (кириллица раздувается в \\uXXXX в 6 раз). Здесь:
+
+  - FastJSONProvider — app.json: orjson, если установлен, иначе stdlib
+    json без сортировки ключей и без ASCII-экранирования. Нестандартные
+    типы сериализуются так же, как у штатного провайдера: date/datetime —
+    HTTP-дата, Decimal/UUID — строкой, dataclass — dict'ом; ответы API
+    не меняются, кроме порядка ключей и байтов кириллицы;
+  - dumps() — то же для кода вне jsonify (SSE-снимки и т.п.);
+  - stream_array() / stream_object() — потоковая запись больших списков
+    пачками: без одной гигантской строки в памяти воркера, первые байты
+    уходят клиенту сразу. Длина ответа заранее неизвестна — такие ответы
+    идут chunked.
+
+В debug-режиме Flask ответы форматируются с отступами, как и раньше.
+"""
+
+import json
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from flask import Response, current_app, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - зависит от окружения
+    orjson = None
+
+
+STREAM_BATCH = 500
+# date → HTTP-дата, Decimal/UUID → строка, dataclass → dict — как у Flask.
+_flask_default = DefaultJSONProvider.default
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def _stdlib_dumps(obj: Any, default: Callable) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=default).encode()
+
+
+def dumps(obj: Any, default: Optional[Callable] = None) -> bytes:
+    """
+    Компактный JSON в UTF-8. default — для типов, которых нет в JSON
+    (по умолчанию как у Flask). orjson не справился (целое больше 64 бит
+    и т.п.) — повтор через stdlib.
+    """
+    default = default or _flask_default
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS)
+        except TypeError:
+            pass
+    return _stdlib_dumps(obj, default)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    sort_keys = False
+    ensure_ascii = False
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj, self.default).decode()
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj, self.default), mimetype=self.mimetype)
+
+
+def _batches(items: Iterable, encode: Callable[[Any], bytes]) -> Iterator[bytes]:
+    batch = []
+    for item in items:
+        batch.append(encode(item))
+        if len(batch) >= STREAM_BATCH:
+            yield b','.join(batch)
+            batch = []
+    if batch:
+        yield b','.join(batch)
+
+
+def _join(head: bytes, chunks: Iterator[bytes], tail: bytes) -> Iterator[bytes]:
+    yield head
+    first = True
+    for chunk in chunks:
+        yield chunk if first else b',' + chunk
+        first = False
+    yield tail
+
+
+def stream_array(items: Iterable, status: int = 200) -> Response:
+    """
+    JSON-массив из итератора, пачками по STREAM_BATCH элементов. Итератор
+    может ходить в БД — контекст запроса сохраняется (stream_with_context).
+    """
+    body = _join(b'[', _batches(items, dumps), b']')
+    return current_app.response_class(stream_with_context(body), status=status, mimetype='application/json')
+
+
+def stream_object(pairs: Iterable[tuple], status: int = 200) -> Response:
+    """
+    JSON-объект из итератора пар (ключ, значение). Повтор ключа не
+    схлопывается — при разборе выигрывает последний, как в dict.
+    """
+    def encode(pair):
+        key, value = pair
+        return dumps(str(key)) + b':' + dumps(value)
+
+    body = _join(b'{', _batches(pairs, encode), b'}')
+    return current_app.response_class(stream_with_context(body), status=status, mimetype='application/json')
+
+
+def init_app(app) -> None:
+    app.json = FastJSONProvider(app)
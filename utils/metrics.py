@@ -0,0 +1,304 @@
+"""
+Метрики запросов и SQL: Prometheus-текст на /metrics + заголовок
+Server-Timing.
+
+Что считается (по endpoint'у Flask — имя view, а не URL, чтобы slug'и
+не раздували число рядов):
+
+  - pospro_http_requests_total{endpoint, method, status};
+  - pospro_http_request_duration_seconds — гистограмма времени до
+    отдачи заголовков (у потоковых ответов тело идёт дольше);
+  - pospro_http_response_bytes_total — только ответы с известной длиной;
+  - pospro_db_statements_total / pospro_db_seconds_total — SQL через
+    события before/after_cursor_execute; запросы вне HTTP (поток пересчёта
+    склада, сверка медиа) идут под endpoint="_background";
+  - pospro_http_in_flight / pospro_http_in_flight_peak — занятые потоки
+    gthread сейчас и максимум с запуска процесса.
+
+Сведение по gunicorn-воркерам: каждый процесс не чаще SNAPSHOT_SECONDS
+пишет свой снимок JSON-файлом в METRICS_DIR (атомарно, через replace),
+/metrics суммирует файлы живых процессов. Счётчики умершего воркера
+пропадают — для Prometheus это обычный сброс счётчика.
+
+Server-Timing: `app;dur=<мс>, db;dur=<мс>;desc="<N> SQL"` на каждом
+ответе — видно во вкладке Network браузера.
+
+/metrics включается ключом METRICS_KEY (Authorization: Bearer <ключ>);
+без ключа в конфиге отвечает 404.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import suppress
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+SNAPSHOT_SECONDS = 5.0
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BACKGROUND = '_background'
+
+_lock = threading.Lock()
+_requests: dict[str, int] = {}           # 'endpoint\tmethod\tstatus' → n
+_latency: dict[str, list] = {}           # endpoint → [bucket counts..., sum, count]
+_response_bytes: dict[str, int] = {}
+_db_statements: dict[str, int] = {}
+_db_seconds: dict[str, float] = {}
+_in_flight = 0
+_in_flight_peak = 0
+_snapshot_written_at = 0.0
+
+
+def _metrics_dir() -> str:
+    return current_app.config.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'pospro-metrics')
+
+
+# ---------- SQL ----------
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if has_request_context():
+        g.metrics_db_count = g.get('metrics_db_count', 0) + 1
+        g.metrics_db_seconds = g.get('metrics_db_seconds', 0.0) + elapsed
+    else:
+        with _lock:
+            _db_statements[BACKGROUND] = _db_statements.get(BACKGROUND, 0) + 1
+            _db_seconds[BACKGROUND] = _db_seconds.get(BACKGROUND, 0.0) + elapsed
+
+
+# ---------- HTTP ----------
+
+def _before_request():
+    global _in_flight, _in_flight_peak
+    g.metrics_started = time.perf_counter()
+    with _lock:
+        _in_flight += 1
+        _in_flight_peak = max(_in_flight_peak, _in_flight)
+
+
+def _after_request(response):
+    started = g.get('metrics_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    db_count = g.get('metrics_db_count', 0)
+    db_seconds = g.get('metrics_db_seconds', 0.0)
+    endpoint = request.endpoint or 'unmatched'
+
+    response.headers.add(
+        'Server-Timing',
+        f'app;dur={elapsed * 1000:.1f}, db;dur={db_seconds * 1000:.1f};desc="{db_count} SQL"',
+    )
+
+    key = f'{endpoint}\t{request.method}\t{response.status_code}'
+    with _lock:
+        _requests[key] = _requests.get(key, 0) + 1
+        hist = _latency.get(endpoint)
+        if hist is None:
+            hist = _latency[endpoint] = [0] * len(BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if elapsed <= bound:
+                hist[i] += 1
+                break
+        hist[-2] += elapsed
+        hist[-1] += 1
+        if response.content_length is not None and not response.is_streamed:
+            _response_bytes[endpoint] = _response_bytes.get(endpoint, 0) + response.content_length
+        _db_statements[endpoint] = _db_statements.get(endpoint, 0) + db_count
+        _db_seconds[endpoint] = _db_seconds.get(endpoint, 0.0) + db_seconds
+
+    _maybe_write_snapshot()
+    return response
+
+
+def _teardown_request(exc):
+    global _in_flight
+    if g.get('metrics_started') is None:
+        return
+    with _lock:
+        _in_flight -= 1
+
+
+# ---------- Сведение по процессам ----------
+
+def _snapshot() -> dict:
+    with _lock:
+        return {
+            'pid': os.getpid(),
+            'requests': dict(_requests),
+            'latency': {k: list(v) for k, v in _latency.items()},
+            'response_bytes': dict(_response_bytes),
+            'db_statements': dict(_db_statements),
+            'db_seconds': dict(_db_seconds),
+            'in_flight': _in_flight,
+            'in_flight_peak': _in_flight_peak,
+        }
+
+
+def _write_snapshot() -> None:
+    global _snapshot_written_at
+    _snapshot_written_at = time.monotonic()
+    directory = _metrics_dir()
+    try:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        # Пишут несколько потоков воркера сразу — у каждой записи свой
+        # временный файл, иначе один поток подменит чужой недописанный.
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=f'{os.getpid()}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(_snapshot(), f)
+            os.replace(tmp, path)
+        except BaseException:
+            with suppress(OSError):
+                os.unlink(tmp)
+            raise
+    except OSError as e:
+        print(f"⚠️ metrics: не удалось записать снимок: {e}")
+
+
+def _maybe_write_snapshot() -> None:
+    if time.monotonic() - _snapshot_written_at >= SNAPSHOT_SECONDS:
+        _write_snapshot()
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _load_snapshots() -> list[dict]:
+    _write_snapshot()
+    directory = _metrics_dir()
+    snapshots = []
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        names = []
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            with open(path) as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            continue
+        pid = int(snap.get('pid') or 0)
+        if pid <= 0 or not _pid_alive(pid):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        snapshots.append(snap)
+    return snapshots
+
+
+def _merge(snapshots: list[dict]) -> dict:
+    merged = {'requests': {}, 'latency': {}, 'response_bytes': {}, 'db_statements': {},
+              'db_seconds': {}, 'in_flight': 0, 'in_flight_peak': 0}
+    for snap in snapshots:
+        for section in ('requests', 'response_bytes', 'db_statements', 'db_seconds'):
+            target = merged[section]
+            for key, value in snap.get(section, {}).items():
+                target[key] = target.get(key, 0) + value
+        for key, hist in snap.get('latency', {}).items():
+            target = merged['latency'].get(key)
+            if target is None or len(target) != len(hist):
+                merged['latency'][key] = list(hist)
+            else:
+                merged['latency'][key] = [a + b for a, b in zip(target, hist)]
+        merged['in_flight'] += snap.get('in_flight', 0)
+        merged['in_flight_peak'] += snap.get('in_flight_peak', 0)
+    return merged
+
+
+# ---------- Prometheus-текст ----------
+
+def _label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render(merged: dict, workers: int) -> str:
+    lines = []
+
+    def header(name, kind, help_text):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    header('pospro_http_requests_total', 'counter', 'HTTP-запросы по endpoint, методу и статусу.')
+    for key, value in sorted(merged['requests'].items()):
+        endpoint, method, status = key.split('\t')
+        lines.append(
+            f'pospro_http_requests_total{{endpoint="{_label(endpoint)}",method="{method}",status="{status}"}} {value}'
+        )
+
+    header('pospro_http_request_duration_seconds', 'histogram', 'Время обработки запроса до отдачи заголовков.')
+    for endpoint, hist in sorted(merged['latency'].items()):
+        label = _label(endpoint)
+        cumulative = 0
+        for bound, count in zip(BUCKETS, hist):
+            cumulative += count
+            lines.append(f'pospro_http_request_duration_seconds_bucket{{endpoint="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'pospro_http_request_duration_seconds_bucket{{endpoint="{label}",le="+Inf"}} {hist[-1]}')
+        lines.append(f'pospro_http_request_duration_seconds_sum{{endpoint="{label}"}} {hist[-2]:.6f}')
+        lines.append(f'pospro_http_request_duration_seconds_count{{endpoint="{label}"}} {hist[-1]}')
+
+    header('pospro_http_response_bytes_total', 'counter', 'Байты тел ответов с известной длиной.')
+    for endpoint, value in sorted(merged['response_bytes'].items()):
+        lines.append(f'pospro_http_response_bytes_total{{endpoint="{_label(endpoint)}"}} {value}')
+
+    header('pospro_db_statements_total', 'counter', 'SQL-запросы; endpoint="_background" — вне HTTP.')
+    for endpoint, value in sorted(merged['db_statements'].items()):
+        lines.append(f'pospro_db_statements_total{{endpoint="{_label(endpoint)}"}} {value}')
+
+    header('pospro_db_seconds_total', 'counter', 'Суммарное время SQL.')
+    for endpoint, value in sorted(merged['db_seconds'].items()):
+        lines.append(f'pospro_db_seconds_total{{endpoint="{_label(endpoint)}"}} {value:.6f}')
+
+    header('pospro_http_in_flight', 'gauge', 'Запросы в обработке (занятые потоки gthread).')
+    lines.append(f'pospro_http_in_flight {merged["in_flight"]}')
+    header('pospro_http_in_flight_peak', 'gauge', 'Сумма по процессам максимума одновременных запросов с запуска.')
+    lines.append(f'pospro_http_in_flight_peak {merged["in_flight_peak"]}')
+    header('pospro_workers', 'gauge', 'Процессы, приславшие снимок.')
+    lines.append(f'pospro_workers {workers}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view():
+    key = current_app.config.get('METRICS_KEY')
+    if not key:
+        return Response('Not Found', status=404)
+    if request.headers.get('Authorization', '') != f'Bearer {key}':
+        return Response('Forbidden', status=403)
+    snapshots = _load_snapshots()
+    body = render(_merge(snapshots), len(snapshots))
+    return Response(body, mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_app(app) -> None:
+    """Хуки запроса + /metrics. SQL-события вешаются на Engine при импорте модуля."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view, methods=['GET'])
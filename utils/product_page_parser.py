@@ -0,0 +1,257 @@
+"""
+Single-pass, streaming cleaner for donor product pages (AI auto-fill).
+
+The old approach downloaded up to MAX_HTML_BYTES, then ran six DOTALL
+regexes plus a whitespace collapse over the whole document before
+truncating. `ProductPageParser` is fed decoded chunks straight from the
+HTTP stream instead:
+
+  - drops <script>/<style>/<svg>/<iframe>/<noscript> bodies and comments,
+    plus `style` / `on*` attributes, while the bytes arrive;
+  - collapses whitespace as it goes and reports `full` once the cleaned
+    output reaches its limit, so the caller can stop downloading;
+  - keeps JSON-LD (`<script type="application/ld+json">`) and OpenGraph
+    `<meta property="og:*">` aside, so structured product data can be
+    used directly — sometimes without calling the LLM at all.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+
+_SKIP_TAGS = frozenset(('script', 'style', 'svg', 'iframe', 'noscript'))
+_VOID_TAGS = frozenset((
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'param', 'source', 'track', 'wbr',
+))
+_WS_RE = re.compile(r'\s+')
+_CYRILLIC_RE = re.compile(r'[а-яё]', re.IGNORECASE)
+_LETTER_RE = re.compile(r'[^\W\d_]')
+
+
+class ProductPageParser(HTMLParser):
+    """Incremental cleaner. Call `feed()` per chunk, then `close()`."""
+
+    def __init__(self, max_chars: int):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self._out: list[str] = []
+        self._size = 0
+        self._last_space = True
+        # Skipped element currently open and how deep the same tag nests
+        # inside it (<svg> in <svg>). Other tags inside are ignored, so
+        # unclosed <br>/<p> in a <noscript> cannot break the count.
+        self._skip_tag: str | None = None
+        self._skip_nesting = 0
+        self._json_ld_buf: list[str] | None = None
+        self.json_ld: list = []
+        self.og: dict[str, list[str]] = {}
+
+    # ── output ──────────────────────────────────────────────────────────
+
+    @property
+    def full(self) -> bool:
+        return self._size >= self.max_chars
+
+    def _emit(self, s: str) -> None:
+        if not s or self.full:
+            return
+        self._out.append(s)
+        self._size += len(s)
+        self._last_space = s[-1] == ' '
+
+    def text(self) -> str:
+        return ''.join(self._out)[:self.max_chars].strip()
+
+    # ── HTMLParser callbacks ────────────────────────────────────────────
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_nesting += 1
+            return
+        if tag == 'script':
+            kind = (dict(attrs).get('type') or '').strip().lower()
+            if kind == 'application/ld+json':
+                self._json_ld_buf = []
+        if tag in _SKIP_TAGS:
+            self._skip_tag = tag
+            self._skip_nesting = 1
+            return
+        if tag == 'meta':
+            self._collect_meta(attrs)
+        self._emit_tag(tag, attrs, self_closing=False)
+
+    def handle_startendtag(self, tag, attrs):
+        if self._skip_tag is not None:
+            return
+        if tag == 'meta':
+            self._collect_meta(attrs)
+        if tag in _SKIP_TAGS:
+            return
+        self._emit_tag(tag, attrs, self_closing=True)
+
+    def handle_endtag(self, tag):
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_nesting -= 1
+                if self._skip_nesting <= 0:
+                    self._skip_tag = None
+                    if tag == 'script' and self._json_ld_buf is not None:
+                        self._finish_json_ld()
+            return
+        if tag in _VOID_TAGS:
+            return
+        self._emit(f'</{tag}>')
+
+    def handle_data(self, data):
+        if self._skip_tag is not None:
+            if self._json_ld_buf is not None:
+                self._json_ld_buf.append(data)
+            return
+        collapsed = _WS_RE.sub(' ', data)
+        if collapsed.startswith(' ') and self._last_space:
+            collapsed = collapsed[1:]
+        self._emit(collapsed)
+
+    def handle_comment(self, data):
+        pass
+
+    # ── helpers ─────────────────────────────────────────────────────────
+
+    def _emit_tag(self, tag, attrs, self_closing):
+        parts = [tag]
+        for name, value in attrs:
+            if name == 'style' or name.startswith('on'):
+                continue
+            if value is None:
+                parts.append(name)
+            else:
+                parts.append(f'{name}="{escape(_WS_RE.sub(" ", value), quote=True)}"')
+        self._emit('<' + ' '.join(parts) + ('/>' if self_closing else '>'))
+
+    def _collect_meta(self, attrs):
+        a = dict(attrs)
+        prop = (a.get('property') or a.get('name') or '').strip().lower()
+        content = (a.get('content') or '').strip()
+        if prop.startswith('og:') and content:
+            self.og.setdefault(prop, []).append(content)
+
+    def _finish_json_ld(self):
+        raw = ''.join(self._json_ld_buf or [])
+        self._json_ld_buf = None
+        try:
+            self.json_ld.append(json.loads(raw))
+        except (ValueError, TypeError):
+            pass
+
+    # ── structured data ─────────────────────────────────────────────────
+
+    def structured_product(self, source_url: str) -> dict:
+        """
+        Product data found in JSON-LD / OpenGraph, in the same shape the
+        LLM returns: {name, description, image_urls, characteristics}.
+        Missing fields are empty.
+        """
+        product = _find_json_ld_product(self.json_ld)
+        name = ''
+        description = ''
+        images: list[str] = []
+        characteristics: list[dict] = []
+
+        if product:
+            name = _as_text(product.get('name'))
+            description = _as_text(product.get('description'))
+            images = [urljoin(source_url, u) for u in _image_urls(product.get('image'))]
+            for prop in _as_list(product.get('additionalProperty')):
+                if not isinstance(prop, dict):
+                    continue
+                key = _as_text(prop.get('name'))
+                value = _as_text(prop.get('value'))
+                if key and value:
+                    characteristics.append({
+                        'key': key,
+                        'value': value,
+                        'unit': _as_text(prop.get('unitText')),
+                    })
+
+        name = name or _first(self.og.get('og:title'))
+        description = description or _first(self.og.get('og:description'))
+        if not images:
+            images = [urljoin(source_url, u) for u in self.og.get('og:image', [])]
+
+        return {
+            'name': name,
+            'description': description,
+            'image_urls': images,
+            'characteristics': characteristics,
+        }
+
+
+def is_complete_russian_product(data: dict) -> bool:
+    """
+    True when structured data already has everything the LLM would
+    produce: name, at least one photo, characteristics, and description /
+    characteristic keys already in Russian (the LLM's main job is the
+    translation). Then the LLM call can be skipped.
+    """
+    if not data.get('name') or not data.get('image_urls') or not data.get('characteristics'):
+        return False
+    text = ' '.join([data.get('description') or ''] + [c['key'] for c in data['characteristics']])
+    letters = _LETTER_RE.findall(text)
+    if len(letters) < 20:
+        return False
+    cyrillic = sum(1 for ch in letters if _CYRILLIC_RE.match(ch))
+    return cyrillic / len(letters) > 0.6
+
+
+def _find_json_ld_product(blocks) -> dict | None:
+    stack = list(blocks)
+    while stack:
+        node = stack.pop(0)
+        if isinstance(node, list):
+            stack.extend(node)
+            continue
+        if not isinstance(node, dict):
+            continue
+        types = _as_list(node.get('@type'))
+        if any(isinstance(t, str) and t.lower() == 'product' for t in types):
+            return node
+        if '@graph' in node:
+            stack.extend(_as_list(node['@graph']))
+    return None
+
+
+def _image_urls(value) -> list[str]:
+    out = []
+    for item in _as_list(value):
+        if isinstance(item, str):
+            out.append(item.strip())
+        elif isinstance(item, dict):
+            url = item.get('contentUrl') or item.get('url')
+            if isinstance(url, str):
+                out.append(url.strip())
+    return [u for u in out if u]
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _as_text(value) -> str:
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, str):
+        return _WS_RE.sub(' ', value).strip()
+    return ''
+
+
+def _first(values) -> str:
+    return values[0] if values else ''
@@ -0,0 +1,159 @@
+"""
+Dev/test-режим контроля SQL на запрос: детектор N+1 и бюджеты запросов.
+
+Включается QUERY_BUDGET_MODE (env / config):
+  - ''      — выключено (прод): ни слушателей, ни накладных расходов;
+  - 'warn'  — нарушения пишутся в лог WARNING с местами вызова;
+  - 'raise' — превышение бюджета превращает ответ в 500 с отчётом, так
+              что тест через test_client на этом endpoint'е падает.
+
+Что проверяется после каждого запроса:
+  - N+1: один и тот же «вид» SQL (литералы и списки IN схлопнуты)
+    повторился N_PLUS_ONE_THRESHOLD+ раз — в лог уходит запрос и
+    строки кода в приложении, откуда он шёл (Cart.to_dict → product,
+    ленивые relationship в циклах и т.п.). Только предупреждение;
+  - бюджет: view помечен `@query_budget(N)` и сделал больше N запросов.
+    N — число SQL в самой «дорогой» ветке view по коду плюс запас 2
+    (расчёт — комментарием у декоратора); tests/test_query_budgets.py
+    прогоняет эти ветки в режиме raise.
+
+Ограниченные повторы, число которых зависит от нагрузки, а не от данных
+(pg_try_advisory_xact_lock в цикле и т.п.), оборачиваются в `exempt()` —
+в бюджет, X-Query-Count и детектор N+1 они не попадают.
+
+Считаются запросы до отдачи заголовков — тело потоковых ответов
+(stream_with_context) в бюджет не входит. В dev-режиме на ответе есть
+X-Query-Count.
+"""
+
+import logging
+import re
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+MODE_WARN = 'warn'
+MODE_RAISE = 'raise'
+N_PLUS_ONE_THRESHOLD = 5
+MAX_SITES = 3
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAMS_LIST = re.compile(r'\(\s*(?:%\([^)]+\)s|\?)(?:\s*,\s*(?:%\([^)]+\)s|\?))*\s*\)')
+_PARAM_INDEX = re.compile(r'(%\([a-z_]+?)_\d+\)s')
+_SPACES = re.compile(r'\s+')
+
+_listening = False
+
+
+def query_budget(limit: int):
+    """
+    Объявить бюджет SQL-запросов для view. Ставится сразу под
+    `@bp.route(...)`, чтобы атрибут был у зарегистрированной функции.
+    """
+    def decorator(fn):
+        fn.query_budget = limit
+        return fn
+    return decorator
+
+
+def statement_shape(statement: str) -> str:
+    """SQL без литералов: запросы, отличающиеся только значениями, совпадут."""
+    shape = _STRING.sub('?', statement)
+    shape = _NUMBER.sub('?', shape)
+    shape = _PARAM_INDEX.sub(r'\1_N)s', shape)
+    shape = _PARAMS_LIST.sub('(?)', shape)
+    return _SPACES.sub(' ', shape).strip()
+
+
+def _call_site(root: str) -> str:
+    # Ближайший к запросу кадр из кода приложения (не SQLAlchemy и не этот модуль).
+    for frame in reversed(traceback.extract_stack()[:-3]):
+        filename = frame.filename
+        if filename.startswith(root) and 'site-packages' not in filename and not filename.endswith('query_budget.py'):
+            return f'{filename[len(root):].lstrip("/")}:{frame.lineno} {frame.name}'
+    return '?'
+
+
+@contextmanager
+def exempt():
+    """SQL внутри блока не считается в бюджет запроса."""
+    active = has_request_context()
+    if active:
+        g.query_budget_exempt = g.get('query_budget_exempt', 0) + 1
+    try:
+        yield
+    finally:
+        if active:
+            g.query_budget_exempt -= 1
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context() or not current_app.config.get('QUERY_BUDGET_MODE'):
+        return
+    if g.get('query_budget_exempt'):
+        return
+    log = g.setdefault('query_budget_log', [])
+    log.append((statement_shape(statement), _call_site(current_app.root_path)))
+
+
+def _after_request(response):
+    log = g.get('query_budget_log') or []
+    response.headers['X-Query-Count'] = str(len(log))
+    endpoint = request.endpoint or 'unmatched'
+
+    repeated = []
+    counts = Counter(shape for shape, _ in log)
+    for shape, n in counts.most_common():
+        if n < N_PLUS_ONE_THRESHOLD:
+            break
+        sites = Counter(site for s, site in log if s == shape)
+        repeated.append({
+            'count': n,
+            'statement': shape[:300],
+            'sites': [f'{site} ×{c}' for site, c in sites.most_common(MAX_SITES)],
+        })
+        logger.warning(
+            'N+1? %s: один и тот же SQL %d раз: %s | откуда: %s',
+            endpoint, n, shape[:300], '; '.join(repeated[-1]['sites']),
+        )
+
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, 'query_budget', None)
+    if budget is None or len(log) <= budget:
+        return response
+
+    logger.warning('Бюджет SQL превышен: %s — %d запросов при бюджете %d', endpoint, len(log), budget)
+    if current_app.config.get('QUERY_BUDGET_MODE') != MODE_RAISE:
+        return response
+    failed = jsonify({
+        'error': 'query_budget_exceeded',
+        'endpoint': endpoint,
+        'queries': len(log),
+        'budget': budget,
+        'repeated': repeated,
+    })
+    failed.status_code = 500
+    failed.headers['X-Query-Count'] = str(len(log))
+    return failed
+
+
+def init_app(app) -> None:
+    """Хуки только при включённом QUERY_BUDGET_MODE."""
+    global _listening
+    mode = app.config.get('QUERY_BUDGET_MODE')
+    if not mode:
+        return
+    if mode not in (MODE_WARN, MODE_RAISE):
+        raise ValueError(f'QUERY_BUDGET_MODE: ожидается "{MODE_WARN}" или "{MODE_RAISE}", получено "{mode}"')
+    if not _listening:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        _listening = True
+    app.after_request(_after_request)
@@ -0,0 +1,244 @@
+"""
+Кэш ответов публичных эндпоинтов витрины + strong ETag / 304.
+
+`/api/public/homepage`, `/api/public/catalog/categories`, `/api/public/header`
+и т.п. фронт (Next.js) дёргает на каждую загрузку страницы, а меняются они
+только когда админ правит контент. Поэтому:
+
+  - `@cached_response('homepage', 'products', ...)` — декоратор GET-роута.
+    Ключ кэша: endpoint + класс зрителя (public / system — админу видны
+    скрытые товары и категории) + аргументы пути (slug) + query string. Тело хранится в памяти
+    процесса вместе с поколениями перечисленных областей.
+  - `invalidate_on_write(bp, 'homepage')` — вешается на админский blueprint:
+    после любого успешного POST/PUT/PATCH/DELETE бампает поколение области
+    в таблице `response_cache_version` (см. models/response_cache_version.py).
+    Другие gunicorn-воркеры увидят новое поколение не позже чем через
+    VERSION_POLL_SECONDS, свой процесс — сразу.
+  - ETag — sha256 тела, одинаковый во всех воркерах. `If-None-Match` с
+    совпавшим тегом → 304 без тела, так что фронт и CDN ревалидируют
+    почти бесплатно.
+  - Сжатые варианты тела (gzip / br, utils/compression.py) хранятся в той
+    же записи: жмётся один раз на (кодировку, уровень), повторные
+    попадания отдают готовые байты.
+
+Данные, меняющиеся в обход админских blueprint'ов (пересчёт склада в
+фоновом потоке, выгрузки BIO/Equip), ограничены TTL — RESPONSE_CACHE_TTL
+в конфиге (по умолчанию 300 сек).
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, request
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from sqlalchemy import text
+
+from extensions import db
+from utils import compression
+
+
+# Как часто воркер перечитывает поколения из БД. Один SELECT на несколько
+# строк раз в секунду — вместо десятка запросов на каждый ответ.
+VERSION_POLL_SECONDS = 1.0
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAX_ENTRIES = 512
+
+WRITE_METHODS = frozenset(('POST', 'PUT', 'PATCH', 'DELETE'))
+
+
+class _Entry:
+    __slots__ = ('body', 'mimetype', 'etag', 'versions', 'created', 'encoded')
+
+    def __init__(self, body, mimetype, etag, versions, created):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = etag
+        self.versions = versions
+        self.created = created
+        # (кодировка, уровень) → сжатое тело.
+        self.encoded = {}
+
+
+_lock = threading.Lock()
+_entries: 'OrderedDict[tuple, _Entry]' = OrderedDict()
+_versions: dict[str, int] = {}
+_versions_fetched_at = 0.0
+
+
+def viewer_class() -> str:
+    """'system' для admin/system JWT (видят скрытое), иначе 'public'."""
+    try:
+        verify_jwt_in_request(optional=True)
+        if (get_jwt() or {}).get('role') in ('admin', 'system'):
+            return 'system'
+    except Exception:
+        pass
+    return 'public'
+
+
+def _refresh_versions() -> None:
+    global _versions_fetched_at
+    now = time.monotonic()
+    if now - _versions_fetched_at < VERSION_POLL_SECONDS:
+        return
+    try:
+        # Своё соединение, а не db.session: сбой здесь не должен
+        # откатывать сессию view, которая ещё будет работать.
+        with db.engine.connect() as conn:
+            rows = conn.execute(
+                text('SELECT scope, version FROM response_cache_version')
+            ).all()
+    except Exception as e:
+        # Таблицы ещё нет / БД моргнула — работаем без кэша до следующей
+        # попытки, а не валим публичную страницу.
+        current_app.logger.warning('response_cache: не удалось прочитать поколения: %s', e)
+        with _lock:
+            _entries.clear()
+            _versions_fetched_at = now
+        return
+    with _lock:
+        for scope, version in rows:
+            if version > _versions.get(scope, -1):
+                _versions[scope] = version
+        _versions_fetched_at = now
+
+
+def _scope_versions(scopes) -> tuple:
+    _refresh_versions()
+    with _lock:
+        return tuple(_versions.get(s, 0) for s in scopes)
+
+
+def invalidate(*scopes: str) -> None:
+    """
+    Бампает поколения областей в БД и сразу в памяти текущего процесса.
+
+    UPSERT идёт в отдельной транзакции на своём соединении
+    (`db.engine.begin()`), а не через db.session: вызывается из
+    after_request, и коммит/откат сессии зацепил бы незакоммиченное
+    состояние view.
+    """
+    if not scopes:
+        return
+    try:
+        with db.engine.begin() as conn:
+            rows = conn.execute(
+                text("""
+                    INSERT INTO response_cache_version (scope, version, updated_at)
+                    SELECT s, 1, NOW() FROM unnest(CAST(:scopes AS VARCHAR[])) AS s
+                    ON CONFLICT (scope) DO UPDATE
+                    SET version = response_cache_version.version + 1,
+                        updated_at = NOW()
+                    RETURNING scope, version
+                """),
+                {'scopes': list(scopes)},
+            ).all()
+    except Exception:
+        current_app.logger.exception(
+            'response_cache: не удалось инвалидировать %s — другие воркеры '
+            'отдают старые ответы до RESPONSE_CACHE_TTL', scopes,
+        )
+        # Хотя бы локально сбрасываем — остальные воркеры догонят по TTL.
+        with _lock:
+            _entries.clear()
+        return
+    with _lock:
+        for scope, version in rows:
+            _versions[scope] = max(version, _versions.get(scope, 0))
+
+
+def invalidate_on_write(bp, *scopes: str) -> None:
+    """
+    Регистрирует на blueprint хук: после успешного (2xx/3xx) изменяющего
+    запроса — `invalidate(*scopes)`. Вызывается рядом с объявлением
+    blueprint'а в модуле роутов.
+    """
+    @bp.after_request
+    def _invalidate_response_cache(response):
+        if request.method in WRITE_METHODS and response.status_code < 400:
+            invalidate(*scopes)
+        return response
+
+
+def _encoded_body(entry: _Entry, choice: tuple) -> bytes:
+    body = entry.encoded.get(choice)
+    if body is None:
+        # Вне _lock: два потока могут сжать одно тело параллельно —
+        # результат одинаковый, а остальные запросы не ждут компрессора.
+        body = compression.encode(entry.body, *choice)
+        entry.encoded[choice] = body
+    return body
+
+
+def _build_response(entry: _Entry, viewer: str) -> Response:
+    choice = compression.choose(entry.mimetype, len(entry.body))
+    body = entry.body if choice is None else _encoded_body(entry, choice)
+    response = Response(body, status=200, mimetype=entry.mimetype)
+    response.set_etag(entry.etag)
+    if choice is not None:
+        compression.mark_encoded(response, choice[0])
+    elif compression.compressible(entry.mimetype):
+        response.vary.add('Accept-Encoding')
+    # no-cache = «храни, но перед использованием ревалидируй» — как раз
+    # ETag/304. Ответы для админа не должны оседать в общем CDN-кэше.
+    response.headers['Cache-Control'] = (
+        'private, no-cache' if viewer == 'system' else 'public, no-cache'
+    )
+    response.vary.add('Authorization')
+    return response.make_conditional(request)
+
+
+def cached_response(*scopes: str):
+    """
+    Декоратор публичного GET-роута. `scopes` — области данных, от которых
+    зависит ответ; запись в любую из них выбрасывает закэшированное тело.
+    Кэшируются только 200-ответы.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return fn(*args, **kwargs)
+
+            viewer = viewer_class()
+            key = (
+                request.endpoint, viewer,
+                tuple(sorted((request.view_args or {}).items())),
+                request.query_string,
+            )
+            versions = _scope_versions(scopes)
+            ttl = current_app.config.get('RESPONSE_CACHE_TTL', DEFAULT_TTL_SECONDS)
+            now = time.monotonic()
+
+            with _lock:
+                entry = _entries.get(key)
+                if entry is not None and (entry.versions != versions or now - entry.created > ttl):
+                    entry = None
+                    del _entries[key]
+                if entry is not None:
+                    _entries.move_to_end(key)
+
+            if entry is None:
+                response = current_app.make_response(fn(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+                body = response.get_data()
+                entry = _Entry(
+                    body=body,
+                    mimetype=response.mimetype,
+                    etag=hashlib.sha256(body).hexdigest()[:32],
+                    versions=versions,
+                    created=now,
+                )
+                max_entries = current_app.config.get('RESPONSE_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+                with _lock:
+                    _entries[key] = entry
+                    while len(_entries) > max_entries:
+                        _entries.popitem(last=False)
+
+            return _build_response(entry, viewer)
+        return wrapper
+    return decorator